@@ -0,0 +1,290 @@
+"""
+Streaming latency histograms for real-time monitoring
+Log-bucketed, mergeable histograms with rolling time windows
+"""
+
+import math
+import time
+import threading
+import logging
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple, Iterable
+
+import psutil
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds (ms) used when exposing histograms to Prometheus
+DEFAULT_PROMETHEUS_BOUNDS = (
+    5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000
+)
+
+
+class LogHistogram:
+    """Mergeable histogram with logarithmic buckets and bounded relative error"""
+
+    def __init__(self, relative_accuracy: float = 0.01, min_value: float = 1e-3):
+        self.relative_accuracy = relative_accuracy
+        self.min_value = min_value
+        self._gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self._gamma)
+        self.buckets: Dict[int, int] = {}
+        self.zero_count = 0
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def _index(self, value: float) -> int:
+        """Bucket index for a positive value"""
+        return math.ceil(math.log(value) / self._log_gamma)
+
+    def _bucket_value(self, index: int) -> float:
+        """Representative value of a bucket (within relative_accuracy)"""
+        return 2 * self._gamma ** index / (self._gamma + 1)
+
+    def _bucket_upper(self, index: int) -> float:
+        """Inclusive upper bound of a bucket"""
+        return self._gamma ** index
+
+    def record(self, value: float, count: int = 1):
+        """Record a value"""
+        if value < self.min_value:
+            self.zero_count += count
+        else:
+            index = self._index(value)
+            self.buckets[index] = self.buckets.get(index, 0) + count
+        self.count += count
+        self.sum += value * count
+        if value > self.max:
+            self.max = value
+
+    def merge(self, other: "LogHistogram"):
+        """Merge another histogram with the same accuracy into this one"""
+        if other.relative_accuracy != self.relative_accuracy:
+            raise ValueError("Cannot merge histograms with different accuracy")
+        for index, count in other.buckets.items():
+            self.buckets[index] = self.buckets.get(index, 0) + count
+        self.zero_count += other.zero_count
+        self.count += other.count
+        self.sum += other.sum
+        self.max = max(self.max, other.max)
+
+    def quantile(self, q: float) -> float:
+        """Estimate the q-quantile (0 <= q <= 1) in O(buckets)"""
+        if self.count == 0:
+            return 0.0
+        rank = q * (self.count - 1)
+        seen = self.zero_count
+        if rank < seen:
+            return 0.0
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+            if rank < seen:
+                return min(self._bucket_value(index), self.max)
+        return self.max
+
+    def quantiles(self, qs: Iterable[float]) -> List[float]:
+        """Estimate several quantiles in a single pass over the buckets"""
+        qs = list(qs)
+        results = [0.0] * len(qs)
+        if self.count == 0:
+            return results
+
+        order = sorted(range(len(qs)), key=lambda i: qs[i])
+        pending = iter(order)
+        current = next(pending, None)
+        seen = self.zero_count
+
+        # Quantiles falling into the zero bucket stay at 0.0
+        while current is not None and qs[current] * (self.count - 1) < seen:
+            current = next(pending, None)
+
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+            while current is not None and qs[current] * (self.count - 1) < seen:
+                results[current] = min(self._bucket_value(index), self.max)
+                current = next(pending, None)
+            if current is None:
+                break
+
+        while current is not None:
+            results[current] = self.max
+            current = next(pending, None)
+        return results
+
+    def cumulative_counts(self, bounds: Iterable[float]) -> List[Tuple[float, int]]:
+        """Cumulative counts at the given upper bounds, for Prometheus export"""
+        result = []
+        items = sorted(self.buckets.items())
+        position = 0
+        running = self.zero_count
+        for bound in sorted(bounds):
+            while position < len(items) and self._bucket_upper(items[position][0]) <= bound:
+                running += items[position][1]
+                position += 1
+            result.append((bound, running))
+        return result
+
+    def copy(self) -> "LogHistogram":
+        """Return an independent copy"""
+        clone = LogHistogram(self.relative_accuracy, self.min_value)
+        clone.merge(self)
+        return clone
+
+
+class RollingHistogram:
+    """Histogram over a sliding time window made of rotating sub-histograms"""
+
+    def __init__(
+        self,
+        window_seconds: float = 300,
+        slices: int = 10,
+        relative_accuracy: float = 0.01,
+        clock=time.time
+    ):
+        self.window_seconds = window_seconds
+        self.slice_seconds = window_seconds / slices
+        self.relative_accuracy = relative_accuracy
+        self._clock = clock
+        self._slices: List[Optional[LogHistogram]] = [None] * slices
+        self._slice_epochs: List[int] = [-1] * slices
+        # Lifetime totals (never rotated out) for Prometheus counters
+        self.total = LogHistogram(relative_accuracy)
+
+    def _slot(self, now: float) -> Tuple[int, int]:
+        """Return (slot index, slice epoch) for a timestamp"""
+        epoch = int(now // self.slice_seconds)
+        return epoch % len(self._slices), epoch
+
+    def record(self, value: float):
+        """Record a value into the current slice"""
+        slot, epoch = self._slot(self._clock())
+        if self._slice_epochs[slot] != epoch:
+            # Slice expired: reuse the slot for the current period
+            self._slices[slot] = LogHistogram(self.relative_accuracy)
+            self._slice_epochs[slot] = epoch
+        self._slices[slot].record(value)
+        self.total.record(value)
+
+    def window(self, seconds: Optional[float] = None) -> LogHistogram:
+        """Merge the slices covering the last `seconds` (default: whole window)"""
+        now = self._clock()
+        _, current_epoch = self._slot(now)
+        span = len(self._slices)
+        if seconds is not None:
+            span = min(span, max(1, math.ceil(seconds / self.slice_seconds)))
+
+        merged = LogHistogram(self.relative_accuracy)
+        for slot, epoch in enumerate(self._slice_epochs):
+            if current_epoch - span < epoch <= current_epoch and self._slices[slot]:
+                merged.merge(self._slices[slot])
+        return merged
+
+
+class HistogramSeries:
+    """Keyed family of rolling histograms (e.g. per endpoint or per command)"""
+
+    def __init__(self, max_series: int = 200, **histogram_kwargs):
+        self.max_series = max_series
+        self.histogram_kwargs = histogram_kwargs
+        self.series: Dict[str, RollingHistogram] = {}
+
+    def record(self, key: str, value: float):
+        """Record a value for a key, folding excess keys into 'other'
+
+        One of the max_series slots is kept for 'other', so the family never
+        holds more than max_series histograms.
+        """
+        histogram = self.series.get(key)
+        if histogram is None:
+            if key != "other" and len(self.series) >= self.max_series - 1:
+                key = "other"
+                histogram = self.series.get(key)
+            if histogram is None:
+                histogram = RollingHistogram(**self.histogram_kwargs)
+                self.series[key] = histogram
+        histogram.record(value)
+
+    def percentiles(self, seconds: Optional[float] = None) -> Dict[str, Dict[str, float]]:
+        """p50/p95/p99 per key over the window"""
+        result = {}
+        for key, histogram in self.series.items():
+            window = histogram.window(seconds)
+            if window.count:
+                result[key] = percentile_summary(window)
+        return result
+
+
+def percentile_summary(histogram: LogHistogram) -> Dict[str, float]:
+    """Standard p50/p95/p99 summary rounded for display"""
+    p50, p95, p99 = histogram.quantiles((0.5, 0.95, 0.99))
+    return {
+        "p50": round(p50, 2),
+        "p95": round(p95, 2),
+        "p99": round(p99, 2)
+    }
+
+
+@dataclass(frozen=True)
+class SystemSample:
+    """Immutable system metrics sample"""
+    timestamp: float
+    cpu_usage: float
+    memory_usage: float
+    disk_usage: float
+
+
+class SystemSampler:
+    """Samples system metrics on a background thread
+
+    The latest sample is published by replacing a single immutable
+    reference, so readers never block and never see a partial update.
+    """
+
+    def __init__(self, interval: float = 2.0, disk_path: str = '/'):
+        self.interval = interval
+        self.disk_path = disk_path
+        self.latest: Optional[SystemSample] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    def _sample(self, cpu_interval: Optional[float]) -> SystemSample:
+        """Take one sample (blocks for cpu_interval on the sampler thread)"""
+        cpu = psutil.cpu_percent(interval=cpu_interval)
+        return SystemSample(
+            timestamp=time.time(),
+            cpu_usage=cpu,
+            memory_usage=psutil.virtual_memory().percent,
+            disk_usage=psutil.disk_usage(self.disk_path).percent
+        )
+
+    def _run(self):
+        """Sampler thread main loop"""
+        while not self._stop.is_set():
+            try:
+                # cpu_percent blocks for the interval, pacing the loop
+                self.latest = self._sample(self.interval)
+            except Exception as e:
+                logger.error(f"System sampler error: {e}")
+                self._stop.wait(self.interval)
+
+    def start(self):
+        """Start the sampler thread if it is not already running"""
+        if self._thread and self._thread.is_alive():
+            return
+        if self.latest is None:
+            # Non-blocking first sample so early readers get real values
+            self.latest = self._sample(None)
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="system-sampler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop the sampler thread"""
+        self._stop.set()
+
+    def get(self) -> SystemSample:
+        """Return the latest sample without blocking"""
+        if self.latest is None:
+            self.start()
+        return self.latest
@@ -6,18 +6,41 @@ Provides live metrics and event streaming
 import asyncio
 import json
 import time
-from typing import Dict, Any, List, Set
+from typing import Dict, Any, List, Set, Optional
 from datetime import datetime
 from fastapi import WebSocket, WebSocketDisconnect, APIRouter
-import psutil
 import logging
+import weakref
 from collections import deque
-from dataclasses import dataclass, asdict
+from dataclasses import dataclass, asdict, field
+
+from app.api.histograms import (
+    DEFAULT_PROMETHEUS_BOUNDS,
+    HistogramSeries,
+    LogHistogram,
+    RollingHistogram,
+    SystemSampler,
+    percentile_summary,
+)
+
+try:
+    from prometheus_client import REGISTRY
+    from prometheus_client.core import HistogramMetricFamily
+    PROMETHEUS_AVAILABLE = True
+except ImportError:
+    PROMETHEUS_AVAILABLE = False
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
+# Users count as active for as long as request data is kept
+ACTIVE_USER_RETENTION = 3600
+
+# Prometheus metric names exported by MetricsCollector.collect
+REQUEST_DURATION_METRIC = "memory_app_request_duration_milliseconds"
+COMMAND_DURATION_METRIC = "memory_app_command_duration_milliseconds"
+
 
 @dataclass
 class MetricSnapshot:
@@ -31,24 +54,34 @@ class MetricSnapshot:
     memory_usage: float
     disk_usage: float
     events: List[Dict[str, Any]]
+    endpoint_response_times: Dict[str, Dict[str, float]] = field(default_factory=dict)
+    command_response_times: Dict[str, Dict[str, float]] = field(default_factory=dict)
 
 
 class MetricsCollector:
     """Collects and aggregates system metrics"""
 
-    def __init__(self):
-        self.request_times = deque(maxlen=1000)
-        self.response_times = deque(maxlen=1000)
-        self.active_users = set()
+    def __init__(self, window_seconds: float = 300, slice_seconds: float = 5):
+        slices = max(1, int(window_seconds // slice_seconds))
+        self.response_times = RollingHistogram(window_seconds, slices)
+        self.endpoint_times = HistogramSeries(window_seconds=window_seconds, slices=slices)
+        self.command_times = HistogramSeries(window_seconds=window_seconds, slices=slices)
+        self.system_sampler = SystemSampler()
+        self.active_users: Dict[str, float] = {}  # user_id -> last request time
         self.memory_count = 0
         self.events = deque(maxlen=100)
         self.last_snapshot = None
 
-    def record_request(self, user_id: str, response_time: float):
+    def record_request(self, user_id: str, response_time: float, endpoint: Optional[str] = None):
         """Record a request"""
-        self.request_times.append(time.time())
-        self.response_times.append(response_time)
-        self.active_users.add(user_id)
+        self.response_times.record(response_time)
+        if endpoint:
+            self.endpoint_times.record(endpoint, response_time)
+        self.active_users[user_id] = time.time()
+
+    def record_command(self, command: str, response_time: float):
+        """Record the processing time of a bot command"""
+        self.command_times.record(command, response_time)
 
     def add_event(self, source: str, message: str, event_type: str = "info"):
         """Add an event"""
@@ -63,23 +96,12 @@ class MetricsCollector:
         """Get current metrics snapshot"""
         now = time.time()
 
-        # Calculate request rate (requests per minute)
-        recent_requests = [t for t in self.request_times if now - t < 60]
-        request_rate = len(recent_requests)
-
-        # Calculate response time percentiles
-        if self.response_times:
-            sorted_times = sorted(self.response_times)
-            p50 = sorted_times[len(sorted_times) // 2]
-            p95 = sorted_times[int(len(sorted_times) * 0.95)]
-            p99 = sorted_times[int(len(sorted_times) * 0.99)]
-        else:
-            p50 = p95 = p99 = 0
+        # Merge the rolling window once (O(buckets)) for rate and percentiles
+        window = self.response_times.window()
+        request_rate = self.response_times.window(60).count  # requests per minute
 
-        # Get system metrics
-        cpu_usage = psutil.cpu_percent(interval=0.1)
-        memory = psutil.virtual_memory()
-        disk = psutil.disk_usage('/')
+        # Get system metrics from the background sampler (never blocks)
+        system = self.system_sampler.get()
 
         # Get recent events
         recent_events = [
@@ -92,15 +114,13 @@ class MetricsCollector:
             active_users=len(self.active_users),
             memory_count=self.memory_count,
             request_rate=request_rate,
-            response_times={
-                "p50": round(p50, 2),
-                "p95": round(p95, 2),
-                "p99": round(p99, 2)
-            },
-            cpu_usage=cpu_usage,
-            memory_usage=memory.percent,
-            disk_usage=disk.percent,
-            events=recent_events[-5:]  # Last 5 events
+            response_times=percentile_summary(window),
+            cpu_usage=system.cpu_usage,
+            memory_usage=system.memory_usage,
+            disk_usage=system.disk_usage,
+            events=recent_events[-5:],  # Last 5 events
+            endpoint_response_times=self.endpoint_times.percentiles(),
+            command_response_times=self.command_times.percentiles()
         )
 
         self.last_snapshot = snapshot
@@ -109,29 +129,146 @@ class MetricsCollector:
     def cleanup_old_data(self):
         """Clean up old data"""
         now = time.time()
-        cutoff = now - 3600  # Keep 1 hour of data
-
-        # Clean request times
-        while self.request_times and self.request_times[0] < cutoff:
-            self.request_times.popleft()
+        cutoff = now - ACTIVE_USER_RETENTION  # Keep 1 hour of data
+
+        # Histogram slices rotate out on their own; drop users idle past the cutoff
+        idle = [user_id for user_id, last_seen in self.active_users.items() if last_seen < cutoff]
+        for user_id in idle:
+            del self.active_users[user_id]
+
+    def collect(self):
+        """Prometheus collector hook: expose the lifetime histograms"""
+        family = HistogramMetricFamily(
+            REQUEST_DURATION_METRIC,
+            "Request latency in milliseconds",
+            labels=["endpoint"]
+        )
+        series = [("all", self.response_times)] + list(self.endpoint_times.series.items())
+        for endpoint, histogram in series:
+            family.add_metric([endpoint], *_prometheus_buckets(histogram.total))
+        yield family
+
+        commands = HistogramMetricFamily(
+            COMMAND_DURATION_METRIC,
+            "Bot command processing time in milliseconds",
+            labels=["command"]
+        )
+        for command, histogram in self.command_times.series.items():
+            commands.add_metric([command], *_prometheus_buckets(histogram.total))
+        yield commands
+
+
+def _prometheus_buckets(histogram: LogHistogram):
+    """Convert a log histogram to Prometheus (buckets, sum) arguments"""
+    buckets = [
+        (str(bound), count)
+        for bound, count in histogram.cumulative_counts(DEFAULT_PROMETHEUS_BOUNDS)
+    ]
+    buckets.append(("+Inf", histogram.count))
+    return buckets, histogram.sum
+
+
+class ClientChannel:
+    """Per-connection send queue drained by a dedicated writer task
+
+    Metric frames use latest-value-wins: a client that falls behind only
+    ever receives the newest snapshot. Other frames go through a bounded
+    queue; overflowing it or stalling on a send marks the client as slow.
+    """
+
+    def __init__(
+        self,
+        websocket: WebSocket,
+        on_evict,
+        max_queue: int = 32,
+        send_timeout: float = 2.0
+    ):
+        self.websocket = websocket
+        self.on_evict = on_evict
+        self.max_queue = max_queue
+        self.send_timeout = send_timeout
+        self.queue: deque = deque()
+        self.latest_metrics: Optional[str] = None
+        self.wakeup = asyncio.Event()
+        self.closed = False
+        self.sent = 0
+        self.dropped = 0
+        self.writer_task = asyncio.create_task(self._writer())
+
+    def push_metrics(self, frame: str):
+        """Replace any unsent metrics frame with a newer one"""
+        if self.latest_metrics is not None:
+            self.dropped += 1
+        self.latest_metrics = frame
+        self.wakeup.set()
+
+    def push(self, frame: str) -> bool:
+        """Queue a frame; returns False if the client is too far behind"""
+        if len(self.queue) >= self.max_queue:
+            return False
+        self.queue.append(frame)
+        self.wakeup.set()
+        return True
+
+    async def _writer(self):
+        """Drain queued frames to the socket"""
+        try:
+            while not self.closed:
+                await self.wakeup.wait()
+                self.wakeup.clear()
+                while self.queue or self.latest_metrics is not None:
+                    if self.queue:
+                        frame = self.queue.popleft()
+                    else:
+                        frame, self.latest_metrics = self.latest_metrics, None
+                    await asyncio.wait_for(
+                        self.websocket.send_text(frame),
+                        timeout=self.send_timeout
+                    )
+                    self.sent += 1
+        except asyncio.CancelledError:
+            pass
+        except asyncio.TimeoutError:
+            logger.warning("Evicting slow WebSocket consumer (send timed out)")
+            self.on_evict(self.websocket)
+        except Exception as e:
+            logger.error(f"Failed to send message: {e}")
+            self.on_evict(self.websocket)
 
-        # Clean active users (remove if no activity in 5 minutes)
-        # This would need more sophisticated tracking in production
+    def close(self):
+        """Stop the writer task"""
+        self.closed = True
+        if self.writer_task is not asyncio.current_task():
+            self.writer_task.cancel()
 
 
 class ConnectionManager:
     """Manages WebSocket connections"""
 
-    def __init__(self):
-        self.active_connections: List[WebSocket] = []
+    def __init__(self, max_queue: int = 32, send_timeout: float = 2.0):
+        # Keyed by id(): Starlette WebSockets are Mappings and not hashable
+        self.channels: Dict[int, ClientChannel] = {}
         self.metrics_collector = MetricsCollector()
         self.broadcast_task = None
+        self.max_queue = max_queue
+        self.send_timeout = send_timeout
+        self.evicted = 0
+
+    @property
+    def active_connections(self) -> List[WebSocket]:
+        """Currently connected sockets"""
+        return [channel.websocket for channel in self.channels.values()]
 
     async def connect(self, websocket: WebSocket):
         """Accept new connection"""
         await websocket.accept()
-        self.active_connections.append(websocket)
-        logger.info(f"WebSocket connected. Total connections: {len(self.active_connections)}")
+        self.channels[id(websocket)] = ClientChannel(
+            websocket,
+            on_evict=self._evict,
+            max_queue=self.max_queue,
+            send_timeout=self.send_timeout
+        )
+        logger.info(f"WebSocket connected. Total connections: {len(self.channels)}")
 
         # Send initial data
         snapshot = self.metrics_collector.get_snapshot()
@@ -143,36 +280,51 @@ class ConnectionManager:
 
     def disconnect(self, websocket: WebSocket):
         """Remove connection"""
-        if websocket in self.active_connections:
-            self.active_connections.remove(websocket)
-            logger.info(f"WebSocket disconnected. Total connections: {len(self.active_connections)}")
+        channel = self.channels.pop(id(websocket), None)
+        if channel:
+            channel.close()
+            logger.info(f"WebSocket disconnected. Total connections: {len(self.channels)}")
 
         # Stop broadcast if no connections
-        if not self.active_connections and self.broadcast_task:
+        if not self.channels and self.broadcast_task:
             self.broadcast_task.cancel()
             self.broadcast_task = None
 
-    async def send_personal_message(self, websocket: WebSocket, message: str):
-        """Send message to specific connection"""
-        try:
-            await websocket.send_text(message)
-        except Exception as e:
-            logger.error(f"Failed to send message: {e}")
-            self.disconnect(websocket)
+    def _evict(self, websocket: WebSocket):
+        """Drop a slow or broken consumer and close its socket"""
+        if id(websocket) not in self.channels:
+            return
+        self.evicted += 1
+        self.disconnect(websocket)
+        asyncio.create_task(self._close_quietly(websocket))
 
-    async def broadcast(self, message: str):
-        """Broadcast message to all connections"""
-        disconnected = []
-        for connection in self.active_connections:
-            try:
-                await connection.send_text(message)
-            except Exception as e:
-                logger.error(f"Failed to broadcast: {e}")
-                disconnected.append(connection)
+    async def _close_quietly(self, websocket: WebSocket):
+        """Close a socket, ignoring errors from already-dead clients"""
+        try:
+            await websocket.close(code=1013)  # Try again later
+        except Exception:
+            pass
 
-        # Clean up disconnected clients
-        for conn in disconnected:
-            self.disconnect(conn)
+    async def send_personal_message(self, websocket: WebSocket, message: str):
+        """Send message to specific connection"""
+        channel = self.channels.get(id(websocket))
+        if channel and not channel.push(message):
+            logger.warning("WebSocket send queue full, evicting client")
+            self._evict(websocket)
+
+    async def broadcast(self, message: str, metrics: bool = True):
+        """Broadcast a pre-encoded frame to all connections without waiting on sends"""
+        slow = []
+        for channel in self.channels.values():
+            if metrics:
+                channel.push_metrics(message)
+            elif not channel.push(message):
+                slow.append(channel.websocket)
+
+        # Evict clients whose queues overflowed
+        for websocket in slow:
+            logger.warning("WebSocket send queue full, evicting client")
+            self._evict(websocket)
 
     def _format_message(self, snapshot: MetricSnapshot) -> str:
         """Format snapshot as JSON message"""
@@ -184,7 +336,9 @@ class ConnectionManager:
             "responseTime": snapshot.response_times,
             "cpu": snapshot.cpu_usage,
             "memory": snapshot.memory_usage,
-            "disk": snapshot.disk_usage
+            "disk": snapshot.disk_usage,
+            "endpoints": snapshot.endpoint_response_times,
+            "commands": snapshot.command_response_times
         }
 
         # Add latest event if any
@@ -195,12 +349,12 @@ class ConnectionManager:
 
     async def _broadcast_loop(self):
         """Periodic broadcast of metrics"""
-        while self.active_connections:
+        while self.channels:
             try:
                 # Get snapshot
                 snapshot = self.metrics_collector.get_snapshot()
 
-                # Broadcast to all clients
+                # Encode once and hand the shared frame to every client's writer
                 await self.broadcast(self._format_message(snapshot))
 
                 # Clean old data
@@ -219,6 +373,39 @@ class ConnectionManager:
 # Global connection manager
 manager = ConnectionManager()
 
+try:
+    _registered_collectors
+except NameError:
+    # The collector registered with each registry; kept when importlib.reload
+    # re-runs this module, so the reloaded manager replaces the old one
+    _registered_collectors: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
+
+
+def register_metrics_collector(registry=None) -> bool:
+    """Feed the manager's histograms to the Prometheus /metrics exporter
+
+    Called once at application startup. Calling it again, or after this
+    module was reloaded, replaces the previously registered collector.
+    """
+    if not PROMETHEUS_AVAILABLE:
+        return False
+    registry = registry or REGISTRY
+    collector = manager.metrics_collector
+    previous = _registered_collectors.get(registry)
+    if previous is collector:
+        return True
+
+    if previous is not None:
+        registry.unregister(previous)
+    try:
+        registry.register(collector)
+    except ValueError as e:
+        # The metric names belong to a collector registered some other way
+        logger.error(f"Metrics collector not registered: {e}")
+        return False
+    _registered_collectors[registry] = collector
+    return True
+
 
 @router.websocket("/ws/metrics")
 async def websocket_metrics(websocket: WebSocket):
@@ -231,7 +418,7 @@ async def websocket_metrics(websocket: WebSocket):
 
             # Handle commands from client
             if data == "ping":
-                await websocket.send_text("pong")
+                await manager.send_personal_message(websocket, "pong")
             elif data == "refresh":
                 snapshot = manager.metrics_collector.get_snapshot()
                 await manager.send_personal_message(
@@ -254,7 +441,7 @@ async def record_metric(
     endpoint: str
 ):
     """Record a metric (called internally by middleware)"""
-    manager.metrics_collector.record_request(user_id, response_time)
+    manager.metrics_collector.record_request(user_id, response_time, endpoint)
 
     # Add event for slow requests
     if response_time > 1000:  # More than 1 second
@@ -294,6 +481,8 @@ async def get_snapshot():
         "memory_count": snapshot.memory_count,
         "request_rate": snapshot.request_rate,
         "response_times": snapshot.response_times,
+        "endpoint_response_times": snapshot.endpoint_response_times,
+        "command_response_times": snapshot.command_response_times,
         "system": {
             "cpu": snapshot.cpu_usage,
             "memory": snapshot.memory_usage,
@@ -303,6 +492,13 @@ async def get_snapshot():
     }
 
 
+def route_label(request) -> str:
+    """Endpoint label for a request: the matched route's path template"""
+    route = request.scope.get("route")
+    path = getattr(route, "path", None)
+    return path or "unmatched"
+
+
 # Middleware to track metrics
 class MetricsMiddleware:
     """Middleware to automatically track request metrics"""
@@ -322,8 +518,8 @@ class MetricsMiddleware:
         # Calculate response time
         response_time = (time.time() - start_time) * 1000  # Convert to ms
 
-        # Record metric
-        manager.metrics_collector.record_request(user_id, response_time)
+        # Record metric under the route template, not the raw path, to keep labels bounded
+        manager.metrics_collector.record_request(user_id, response_time, route_label(request))
 
         # Add response time header
         response.headers["X-Response-Time"] = f"{response_time:.2f}ms"
@@ -8,6 +8,7 @@ from fastapi.responses import Response, RedirectResponse
 from prometheus_client import generate_latest, CONTENT_TYPE_LATEST
 from app.webhook import router as webhook_router
 from app.claude_router import router as claude_router
+from app.api.websocket import register_metrics_collector
 
 # Load environment variables from .env file
 env_path = Path(__file__).parent.parent / '.env'
@@ -23,6 +24,9 @@ app = FastAPI(title="MemoApp WhatsApp Bot", version="1.0.0")
 app.include_router(webhook_router)
 app.include_router(claude_router)
 
+# Export request/command latency histograms on /metrics
+register_metrics_collector()
+
 # Admin API key authentication
 ADMIN_API_KEY = os.getenv('ADMIN_API_KEY', '')
 security = HTTPBearer(auto_error=False)
@@ -5,11 +5,12 @@ Classifies messages into 5 memory categories using AI
 """
 
 import os
-import re
 import logging
-from typing import Optional
+from typing import Dict, List, Optional, Set
 from datetime import datetime
 
+from .rule_engine import CompiledRuleEngine
+
 logger = logging.getLogger(__name__)
 
 class MessageClassifier:
@@ -69,11 +70,20 @@ class MessageClassifier:
         }
     }
     
+    # Phrases that force a category regardless of score
+    EXPLICIT_MENTIONS = ["ultra secret", "ultrasecret", "ultra", "secret", "confidential",
+                         "tomorrow", "yesterday", "appointment", "meeting"]
+    
     def __init__(self):
         """Initialize the classifier"""
         self.user_patterns = {}  # Store user-specific patterns
+        self.engine = CompiledRuleEngine(self.CATEGORIES, self.EXPLICIT_MENTIONS)
         logger.info("📊 Message classifier initialized")
     
+    def reload_rules(self):
+        """Recompile the rule engine after CATEGORIES has been changed"""
+        self.engine.build(self.CATEGORIES, self.EXPLICIT_MENTIONS)
+    
     def classify(self, message: str, user_phone: Optional[str] = None) -> str:
         """
         Classify a message into one of the 5 categories
@@ -82,35 +92,24 @@ class MessageClassifier:
         if not message:
             return "GENERAL"
         
-        message_lower = message.lower()
-        scores = {}
-        
-        # Calculate scores for each category
-        for category, config in self.CATEGORIES.items():
-            score = 0
-            
-            # Check keywords
-            for keyword in config["keywords"]:
-                if keyword in message_lower:
-                    score += 2
-            
-            # Check patterns
-            for pattern in config["patterns"]:
-                if re.search(pattern, message_lower, re.IGNORECASE):
-                    score += 3
-            
-            # Apply priority weight
-            score *= config["priority"]
-            scores[category] = score
-        
+        # Keywords and patterns for every category are matched in one pass
+        scores, found = self.engine.analyze(message.lower())
+        return self._decide(scores, found)
+    
+    def classify_batch(self, messages: List[str], user_phone: Optional[str] = None) -> List[str]:
+        """Classify many messages with the compiled rules"""
+        return [self.classify(message, user_phone) for message in messages]
+    
+    def _decide(self, scores: Dict[str, int], found: Set[str]) -> str:
+        """Pick a category from scores and explicit mentions"""
         # Check for explicit category mentions
-        if "ultra secret" in message_lower or "ultrasecret" in message_lower:
+        if "ultra secret" in found or "ultrasecret" in found:
             return "ULTRA_SECRET"
-        elif "secret" in message_lower and "ultra" not in message_lower:
+        elif "secret" in found and "ultra" not in found:
             return "SECRET"
-        elif "confidential" in message_lower:
+        elif "confidential" in found:
             return "CONFIDENTIAL"
-        elif any(word in message_lower for word in ["tomorrow", "yesterday", "appointment", "meeting"]):
+        elif any(word in found for word in ["tomorrow", "yesterday", "appointment", "meeting"]):
             return "CHRONOLOGICAL"
         
         # Return category with highest score
@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+"""
+Compiled Rule Engine
+Single-pass keyword and regex matching for message classification
+"""
+
+import re
+import logging
+from collections import deque
+from typing import Dict, Iterable, List, Optional, Pattern, Set, Tuple
+
+try:
+    import re._parser as sre_parse
+    import re._constants as sre_constants
+except ImportError:  # Python < 3.11
+    import sre_parse
+    import sre_constants
+
+logger = logging.getLogger(__name__)
+
+_DIGIT = re.compile(r'\d')
+
+
+class AhoCorasick:
+    """Aho-Corasick automaton reporting every (possibly overlapping) keyword
+
+    Failure links are folded into a full transition table at build time, so
+    scanning is a single dict lookup per character.
+    """
+
+    def __init__(self, keywords: Iterable[str]):
+        self.goto: List[Dict[str, int]] = [{}]
+        self.fail: List[int] = [0]
+        self.output: List[Tuple[str, ...]] = [()]
+
+        for keyword in keywords:
+            if keyword:
+                self._add(keyword)
+        self._build_links()
+
+    def _add(self, keyword: str):
+        state = 0
+        for char in keyword:
+            next_state = self.goto[state].get(char)
+            if next_state is None:
+                next_state = len(self.goto)
+                self.goto[state][char] = next_state
+                self.goto.append({})
+                self.fail.append(0)
+                self.output.append(())
+            state = next_state
+        if keyword not in self.output[state]:
+            self.output[state] = self.output[state] + (keyword,)
+
+    def _build_links(self):
+        """Breadth-first construction of failure links and the transition table"""
+        self.delta: List[Dict[str, int]] = [dict(self.goto[0])] + [{} for _ in self.goto[1:]]
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            # States are visited in BFS order, so the fail state's row is final
+            self.delta[state] = {**self.delta[self.fail[state]], **self.goto[state]}
+            for char, child in self.goto[state].items():
+                queue.append(child)
+                link = self.delta[self.fail[state]].get(char, 0)
+                self.fail[child] = link
+                self.output[child] = self.output[child] + self.output[link]
+
+    def find_all(self, text: str) -> Set[str]:
+        """Return the set of keywords occurring anywhere in text"""
+        delta, output = self.delta, self.output
+        found: Set[str] = set()
+        state = 0
+        for char in text:
+            state = delta[state].get(char, 0)
+            if output[state]:
+                found.update(output[state])
+        return found
+
+
+DIGIT_TRIGGER = "\\d"
+
+
+def _leading_literals(items) -> Optional[Set[str]]:
+    """Literal strings one of which must start any match of a parsed regex
+
+    Returns None when no such set can be derived (the pattern is then always
+    run). Zero-width assertions at the start are skipped; a leading digit
+    class yields DIGIT_TRIGGER.
+    """
+    items = list(items)
+    while items and items[0][0] is sre_constants.AT:
+        items.pop(0)
+    if not items:
+        return None
+
+    op, arg = items[0]
+    if op is sre_constants.LITERAL:
+        prefix = ""
+        for op, arg in items:
+            if op is not sre_constants.LITERAL or arg > 127:
+                break
+            prefix += chr(arg).lower()
+        return {prefix} if prefix else None
+    if op is sre_constants.BRANCH:
+        literals: Set[str] = set()
+        for branch in arg[1]:
+            branch_literals = _leading_literals(branch)
+            if not branch_literals:
+                return None
+            literals |= branch_literals
+        return literals
+    if op is sre_constants.SUBPATTERN:
+        return _leading_literals(list(arg[-1]) + items[1:])
+    if op is sre_constants.MAX_REPEAT or op is sre_constants.MIN_REPEAT:
+        low, _, body = arg
+        if low >= 1:
+            return _leading_literals(body)
+        return None
+    if op is sre_constants.IN and arg == [(sre_constants.CATEGORY, sre_constants.CATEGORY_DIGIT)]:
+        return {DIGIT_TRIGGER}
+    return None
+
+
+def pattern_triggers(pattern: str) -> Optional[Set[str]]:
+    """Lower-cased literal prefixes gating a (case-insensitive) pattern"""
+    try:
+        return _leading_literals(sre_parse.parse(pattern))
+    except Exception:
+        return None
+
+
+class CompiledRuleEngine:
+    """Keyword/pattern category scoring compiled once per rule set
+
+    Keywords, explicit-mention phrases and the literal prefixes of every
+    pattern go into one Aho-Corasick automaton, so a single scan of the
+    message finds all keyword hits and tells which patterns can possibly
+    match. Only those patterns are then run, which gives exactly the same
+    result as searching every pattern.
+    """
+
+    def __init__(self, categories: Dict[str, Dict], signal_keywords: Iterable[str] = ()):
+        self.categories = categories
+        self.build(categories, signal_keywords)
+
+    def build(self, categories: Dict[str, Dict], signal_keywords: Iterable[str] = ()):
+        """(Re)compile the automaton and the pattern gates"""
+        self.categories = categories
+        self.category_names = list(categories)
+        self.priorities = {name: config["priority"] for name, config in categories.items()}
+
+        # Keyword -> categories it scores for
+        self.keyword_categories: Dict[str, List[str]] = {}
+        for name, config in categories.items():
+            for keyword in config["keywords"]:
+                self.keyword_categories.setdefault(keyword, []).append(name)
+
+        # Extra keywords that callers want reported (e.g. explicit mentions)
+        self.signal_keywords = set(signal_keywords)
+
+        # Compiled patterns, gated by trigger literal where one can be derived
+        self.patterns: List[Tuple[str, Pattern]] = []
+        self.trigger_patterns: Dict[str, List[int]] = {}
+        self.digit_patterns: List[int] = []
+        self.ungated_patterns: List[int] = []
+        for name, config in categories.items():
+            for pattern in config["patterns"]:
+                index = len(self.patterns)
+                self.patterns.append((name, re.compile(pattern, re.IGNORECASE)))
+                triggers = pattern_triggers(pattern)
+                if not triggers:
+                    self.ungated_patterns.append(index)
+                    continue
+                for trigger in triggers:
+                    if trigger == DIGIT_TRIGGER:
+                        self.digit_patterns.append(index)
+                    else:
+                        self.trigger_patterns.setdefault(trigger, []).append(index)
+
+        self.automaton = AhoCorasick(
+            set(self.keyword_categories) | self.signal_keywords | set(self.trigger_patterns)
+        )
+
+        logger.debug(
+            f"Rule engine compiled: {len(self.keyword_categories)} keywords, "
+            f"{len(self.patterns)} patterns ({len(self.ungated_patterns)} ungated)"
+        )
+
+    def analyze(self, text: str) -> Tuple[Dict[str, int], Set[str]]:
+        """Score every category for text; returns (scores, keywords found)
+
+        Matching is done on the lower-cased text, as the original classifier did.
+        """
+        text = text.lower()
+        found = self.automaton.find_all(text)
+        raw = dict.fromkeys(self.category_names, 0)
+
+        candidates = set(self.ungated_patterns)
+        for keyword in found:
+            for name in self.keyword_categories.get(keyword, ()):
+                raw[name] += 2
+            candidates.update(self.trigger_patterns.get(keyword, ()))
+        if self.digit_patterns and _DIGIT.search(text):
+            candidates.update(self.digit_patterns)
+
+        for index in candidates:
+            name, compiled = self.patterns[index]
+            if compiled.search(text):
+                raw[name] += 3
+
+        scores = {name: raw[name] * self.priorities[name] for name in self.category_names}
+        return scores, found
+
+    def analyze_batch(self, texts: Iterable[str]) -> List[Tuple[Dict[str, int], Set[str]]]:
+        """Analyze many texts with the same compiled rules"""
+        return [self.analyze(text) for text in texts]
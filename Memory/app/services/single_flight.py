@@ -0,0 +1,46 @@
+"""
+Single-flight coalescing for async caches
+Concurrent misses for the same key share one computation instead of each
+running it; used by the TTS cache and the conversation classification cache
+"""
+
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable, Tuple
+
+
+class SingleFlight:
+    """One in-flight computation per key, awaited by every concurrent caller
+
+    The computation's result (or exception) goes to all callers waiting on
+    it. Cancelling a waiter does not cancel the computation; cancelling the
+    caller running it cancels it for everyone.
+    """
+
+    def __init__(self):
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+
+    def __len__(self) -> int:
+        return len(self._inflight)
+
+    async def run(self, key: Hashable, compute: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """Run `compute` for the key, or join the run in progress; returns (value, joined)"""
+        pending = self._inflight.get(key)
+        if pending is not None:
+            return await asyncio.shield(pending), True
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            value = await compute()
+            future.set_result(value)
+            return value, False
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Mark retrieved so an unawaited failure is not logged
+            future.exception()
+            raise
+        finally:
+            self._inflight.pop(key, None)
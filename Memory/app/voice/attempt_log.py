@@ -0,0 +1,197 @@
+"""
+Authentication attempt log for Voice Guard
+Per-user fixed-size binary ring files with an in-memory sliding failure counter
+"""
+
+import os
+import json
+import time
+import struct
+import logging
+import threading
+from collections import deque
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Any, List, Optional, Deque
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b'VGAL'
+VERSION = 1
+
+# Header: magic, version, capacity, next slot, stored record count
+HEADER = struct.Struct('<4sHHII')
+# Record (56 bytes): unix timestamp, action code, success flag, details (utf-8, padded)
+RECORD = struct.Struct('<dBB46s')
+
+ACTIONS = ["authentication", "enrollment", "reset"]
+ACTION_CODES = {name: code for code, name in enumerate(ACTIONS)}
+UNKNOWN_ACTION = 255
+
+
+def _log_name(user_phone: str) -> str:
+    return user_phone.replace('+', '')
+
+
+class AttemptLog:
+    """Append-only attempt ring per user
+
+    Each user has a file holding the last `capacity` attempts in fixed-size
+    records, so appending is one record write plus a header update. Recent
+    authentication failures are also kept in memory so rate-limit checks
+    are O(1) and never touch the disk after the first load.
+    """
+
+    def __init__(self, data_dir: Path, capacity: int = 100, window_seconds: int = 3600):
+        self.data_dir = Path(data_dir)
+        self.data_dir.mkdir(parents=True, exist_ok=True)
+        self.capacity = capacity
+        self.window_seconds = window_seconds
+        self._failures: Dict[str, Deque[float]] = {}
+        self._lock = threading.Lock()
+
+    def _path(self, user_phone: str) -> Path:
+        return self.data_dir / f"auth_log_{_log_name(user_phone)}.bin"
+
+    # ------------------------------------------------------------------
+    # Ring file I/O
+    # ------------------------------------------------------------------
+
+    def _open(self, user_phone: str) -> int:
+        """Open (creating if needed) a user's ring file"""
+        path = self._path(user_phone)
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        if os.fstat(fd).st_size < HEADER.size:
+            os.pwrite(fd, HEADER.pack(MAGIC, VERSION, self.capacity, 0, 0), 0)
+        return fd
+
+    def _read_header(self, fd: int):
+        magic, version, capacity, head, count = HEADER.unpack(os.pread(fd, HEADER.size, 0))
+        if magic != MAGIC or version != VERSION:
+            raise ValueError("Not a Voice Guard attempt log")
+        return capacity, head, count
+
+    def append(self, user_phone: str, action: str, success: bool, details: str,
+               timestamp: Optional[float] = None):
+        """Append one attempt"""
+        timestamp = time.time() if timestamp is None else timestamp
+        record = RECORD.pack(
+            timestamp,
+            ACTION_CODES.get(action, UNKNOWN_ACTION),
+            1 if success else 0,
+            details.encode('utf-8')[:RECORD.size - 10]
+        )
+
+        with self._lock:
+            failures = None
+            if action == "authentication" and not success:
+                # Load the window before writing so this attempt is counted once
+                failures = self._failure_window(user_phone)
+
+            fd = self._open(user_phone)
+            try:
+                capacity, head, count = self._read_header(fd)
+                os.pwrite(fd, record, HEADER.size + head * RECORD.size)
+                head = (head + 1) % capacity
+                count = min(count + 1, capacity)
+                os.pwrite(fd, HEADER.pack(MAGIC, VERSION, capacity, head, count), 0)
+            finally:
+                os.close(fd)
+
+            if failures is not None:
+                failures.append(timestamp)
+
+    def read(self, user_phone: str) -> List[Dict[str, Any]]:
+        """Return the stored attempts, oldest first"""
+        path = self._path(user_phone)
+        if not path.exists():
+            return []
+
+        with open(path, 'rb') as f:
+            data = f.read()
+        magic, version, capacity, head, count = HEADER.unpack_from(data)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"Not a Voice Guard attempt log: {path}")
+
+        start = (head - count) % capacity
+        attempts = []
+        for i in range(count):
+            slot = (start + i) % capacity
+            timestamp, action, success, details = RECORD.unpack_from(
+                data, HEADER.size + slot * RECORD.size
+            )
+            attempts.append({
+                "timestamp": datetime.fromtimestamp(timestamp).isoformat(),
+                "action": ACTIONS[action] if action < len(ACTIONS) else "unknown",
+                "success": bool(success),
+                "details": details.rstrip(b'\x00').decode('utf-8', errors='ignore')
+            })
+        return attempts
+
+    # ------------------------------------------------------------------
+    # Sliding failure counter
+    # ------------------------------------------------------------------
+
+    def _failure_window(self, user_phone: str) -> Deque[float]:
+        """In-memory failure timestamps, loaded from the ring on first use"""
+        key = _log_name(user_phone)
+        window = self._failures.get(key)
+        if window is None:
+            window = deque()
+            cutoff = time.time() - self.window_seconds
+            for attempt in self.read(user_phone):
+                if attempt["action"] == "authentication" and not attempt["success"]:
+                    ts = datetime.fromisoformat(attempt["timestamp"]).timestamp()
+                    if ts > cutoff:
+                        window.append(ts)
+            self._failures[key] = window
+        return window
+
+    def recent_failures(self, user_phone: str) -> int:
+        """Authentication failures within the sliding window"""
+        with self._lock:
+            window = self._failure_window(user_phone)
+            cutoff = time.time() - self.window_seconds
+            while window and window[0] <= cutoff:
+                window.popleft()
+            return len(window)
+
+    # ------------------------------------------------------------------
+    # Migration
+    # ------------------------------------------------------------------
+
+    def import_json(self, json_file: Path, remove: bool = False) -> int:
+        """Convert a legacy auth_log_<phone>.json file into a ring file"""
+        json_file = Path(json_file)
+        user_key = json_file.stem[len("auth_log_"):]
+        with open(json_file, 'r') as f:
+            logs = json.load(f)
+
+        attempts = logs.get("attempts", [])[-self.capacity:]
+        for attempt in attempts:
+            self.append(
+                user_key,
+                attempt.get("action", "unknown"),
+                bool(attempt.get("success")),
+                attempt.get("details", ""),
+                timestamp=datetime.fromisoformat(attempt["timestamp"]).timestamp()
+            )
+        # Rebuild the counter from disk on next use
+        self._failures.pop(user_key, None)
+
+        if remove:
+            json_file.unlink()
+        return len(attempts)
+
+    def migrate_directory(self, remove: bool = False) -> Dict[str, int]:
+        """Convert every legacy JSON log in the data directory"""
+        migrated = {}
+        for json_file in sorted(self.data_dir.glob("auth_log_*.json")):
+            if self._path(json_file.stem[len("auth_log_"):]).exists():
+                logger.info(f"Skipping {json_file.name}: already migrated")
+                continue
+            try:
+                migrated[json_file.name] = self.import_json(json_file, remove=remove)
+            except Exception as e:
+                logger.error(f"Failed to migrate {json_file.name}: {e}")
+        return migrated
@@ -9,11 +9,12 @@ import json
 import hashlib
 import logging
 from datetime import datetime, timedelta
-from typing import Dict, Any, Optional, Tuple
+from typing import Dict, Any, List, Optional, Tuple
 from pathlib import Path
 import base64
 
 from app.voice.azure_voice_service import AzureVoiceService
+from app.voice.attempt_log import AttemptLog
 
 logger = logging.getLogger(__name__)
 
@@ -30,6 +31,10 @@ class VoiceGuard:
         self.voice_service = AzureVoiceService()
         self.user_passphrases = {}
         self.authentication_attempts = {}
+        self.attempt_log = AttemptLog(self.data_dir, capacity=100, window_seconds=3600)
+        
+        # Convert any legacy JSON attempt logs so rate limits carry over
+        self.attempt_log.migrate_directory()
         
         # Load existing passphrases
         self._load_passphrases()
@@ -242,50 +247,16 @@ class VoiceGuard:
     
     def _get_recent_attempts(self, user_phone: str) -> int:
         """Get number of recent authentication attempts"""
-        log_file = self.data_dir / f"auth_log_{user_phone.replace('+', '')}.json"
-        
-        if not log_file.exists():
-            return 0
-        
-        with open(log_file, 'r') as f:
-            logs = json.load(f)
-        
-        # Count attempts in last hour
-        one_hour_ago = datetime.now() - timedelta(hours=1)
-        recent_attempts = 0
-        
-        for log in logs.get("attempts", []):
-            timestamp = datetime.fromisoformat(log["timestamp"])
-            if timestamp > one_hour_ago and log["action"] == "authentication" and not log["success"]:
-                recent_attempts += 1
-        
-        return recent_attempts
+        # Failed attempts in the last hour, from the in-memory sliding counter
+        return self.attempt_log.recent_failures(user_phone)
     
     def _log_authentication(self, user_phone: str, action: str, success: bool, details: str):
         """Log authentication attempt"""
-        log_file = self.data_dir / f"auth_log_{user_phone.replace('+', '')}.json"
-        
-        # Load existing logs
-        if log_file.exists():
-            with open(log_file, 'r') as f:
-                logs = json.load(f)
-        else:
-            logs = {"attempts": []}
-        
-        # Add new log entry
-        logs["attempts"].append({
-            "timestamp": datetime.now().isoformat(),
-            "action": action,
-            "success": success,
-            "details": details
-        })
-        
-        # Keep only last 100 attempts
-        logs["attempts"] = logs["attempts"][-100:]
-        
-        # Save logs
-        with open(log_file, 'w') as f:
-            json.dump(logs, f, indent=2)
+        self.attempt_log.append(user_phone, action, success, details)
+    
+    def get_authentication_log(self, user_phone: str) -> List[Dict[str, Any]]:
+        """Get the user's stored authentication attempts (oldest first)"""
+        return self.attempt_log.read(user_phone)
     
     def reset_passphrase(self, user_phone: str) -> bool:
         """Reset user's passphrase (requires admin action)"""
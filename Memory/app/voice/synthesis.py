@@ -5,14 +5,14 @@ Generates audio responses using Azure Speech SDK or OpenAI TTS
 """
 
 import os
-import tempfile
 import logging
 from typing import Optional, Tuple, Dict, Any
 from pathlib import Path
 import requests
-from pydub import AudioSegment
 import base64
 
+from app.voice.transcoder import get_transcoder
+
 # Set up logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -205,6 +205,8 @@ class VoiceSynthesizer:
         """
         Convert audio to OGG/Opus format for WhatsApp
         
+        Streams the bytes through ffmpeg's stdin/stdout without temp files.
+        
         Args:
             audio_data: Raw audio bytes
             source_format: Source format
@@ -213,37 +215,12 @@ class VoiceSynthesizer:
             OGG audio bytes or None if failed
         """
         try:
-            # Create temporary files
-            with tempfile.NamedTemporaryFile(suffix=f'.{source_format}', delete=False) as src_file:
-                src_file.write(audio_data)
-                src_path = src_file.name
-            
-            with tempfile.NamedTemporaryFile(suffix='.ogg', delete=False) as ogg_file:
-                ogg_path = ogg_file.name
-            
-            # Load audio with pydub
-            audio = AudioSegment.from_file(src_path, format=source_format)
-            
-            # Export as OGG
-            audio.export(ogg_path, format='ogg', codec='libopus', parameters=['-b:a', '64k'])
-            
-            # Read OGG file
-            with open(ogg_path, 'rb') as f:
-                ogg_data = f.read()
-            
-            # Clean up temp files
-            os.unlink(src_path)
-            os.unlink(ogg_path)
-            
+            ogg_data = get_transcoder().to_ogg_opus_sync(audio_data, source_format)
             logger.info(f"✅ Converted to OGG/Opus ({len(ogg_data)} bytes)")
             return ogg_data
             
         except Exception as e:
             logger.error(f"❌ Failed to convert to OGG: {e}")
-            # Clean up temp files if they exist
-            for path in [src_path, ogg_path]:
-                if 'path' in locals() and os.path.exists(path):
-                    os.unlink(path)
             return None
     
     def synthesize_speech(self, text: str, auto_detect_mood: bool = True) -> Tuple[bool, Optional[bytes]]:
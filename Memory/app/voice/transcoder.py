@@ -0,0 +1,243 @@
+"""
+Audio transcoding service for voice notes
+Streams audio through ffmpeg pipes on a bounded subprocess pool, with an
+in-process OGG/Opus decoder that avoids spawning ffmpeg at all
+"""
+
+import io
+import os
+import wave
+import asyncio
+import logging
+import weakref
+import subprocess
+from typing import Optional, List
+
+logger = logging.getLogger(__name__)
+
+# In-process decoding (libsndfile >= 1.0.29 reads OGG/Opus)
+try:
+    import numpy as np
+    import soundfile as sf
+    INPROCESS_AVAILABLE = True
+except ImportError:
+    INPROCESS_AVAILABLE = False
+
+FFMPEG_BINARY = os.environ.get('FFMPEG_BINARY', 'ffmpeg')
+TARGET_SAMPLE_RATE = 16000
+
+
+class TranscodeError(Exception):
+    """Raised when a transcoding job fails or times out"""
+    pass
+
+
+def pcm_to_wav(pcm: bytes, sample_rate: int = TARGET_SAMPLE_RATE, channels: int = 1) -> bytes:
+    """Wrap raw signed 16-bit PCM in a WAV container (in memory)"""
+    buffer = io.BytesIO()
+    with wave.open(buffer, 'wb') as wav:
+        wav.setnchannels(channels)
+        wav.setsampwidth(2)
+        wav.setframerate(sample_rate)
+        wav.writeframes(pcm)
+    return buffer.getvalue()
+
+
+def _ffmpeg_args(source_format: Optional[str], output_args: List[str]) -> List[str]:
+    """Build an ffmpeg command line reading stdin and writing stdout"""
+    args = [FFMPEG_BINARY, '-hide_banner', '-loglevel', 'error', '-nostdin']
+    if source_format:
+        args += ['-f', source_format]
+    return args + ['-i', 'pipe:0'] + output_args + ['pipe:1']
+
+
+# Raw PCM output: WAV written to a pipe has no valid length header, so we
+# ask for s16le and add the header ourselves
+PCM16K_ARGS = ['-vn', '-ac', '1', '-ar', str(TARGET_SAMPLE_RATE), '-f', 's16le', '-acodec', 'pcm_s16le']
+OGG_OPUS_ARGS = ['-vn', '-c:a', 'libopus', '-b:a', '64k', '-f', 'ogg']
+
+# ffmpeg demuxer names differ from file extensions for a few formats
+DEMUXER_NAMES = {
+    'opus': 'ogg',
+    'oga': 'ogg',
+    'm4a': 'mov',
+    'mp4': 'mov',
+}
+
+
+def decode_opus_inprocess(audio_data: bytes) -> Optional[bytes]:
+    """Decode OGG/Opus to 16 kHz mono 16-bit PCM without spawning a process
+
+    Returns None when the in-process decoder is unavailable or cannot read
+    the input, so callers can fall back to ffmpeg.
+    """
+    if not INPROCESS_AVAILABLE:
+        return None
+    try:
+        samples, rate = sf.read(io.BytesIO(audio_data), dtype='float32', always_2d=True)
+    except Exception as e:
+        logger.debug(f"In-process decode unavailable for input: {e}")
+        return None
+
+    mono = samples.mean(axis=1)
+    if rate != TARGET_SAMPLE_RATE:
+        if rate % TARGET_SAMPLE_RATE == 0:
+            # Integer decimation (Opus decodes at 48 kHz): average each
+            # group of samples as a simple anti-aliasing low-pass
+            factor = rate // TARGET_SAMPLE_RATE
+            usable = len(mono) - len(mono) % factor
+            mono = mono[:usable].reshape(-1, factor).mean(axis=1)
+        else:
+            positions = np.arange(0, len(mono), rate / TARGET_SAMPLE_RATE)
+            mono = np.interp(positions, np.arange(len(mono)), mono)
+
+    pcm = np.clip(mono * 32767.0, -32768, 32767).astype('<i2')
+    return pcm.tobytes()
+
+
+class AudioTranscoder:
+    """Bounded pool of ffmpeg pipe jobs with per-job timeouts"""
+
+    def __init__(
+        self,
+        max_concurrency: Optional[int] = None,
+        timeout: float = 30.0,
+        prefer_inprocess: bool = True
+    ):
+        self.max_concurrency = max_concurrency or int(
+            os.environ.get('TRANSCODE_CONCURRENCY', os.cpu_count() or 2)
+        )
+        self.timeout = timeout
+        self.prefer_inprocess = prefer_inprocess
+        # asyncio primitives bind to one event loop, so each loop gets its own cap
+        self._semaphores: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+        self.stats = {
+            'ffmpeg_jobs': 0,
+            'inprocess_jobs': 0,
+            'timeouts': 0,
+            'failures': 0
+        }
+
+    @property
+    def semaphore(self) -> asyncio.Semaphore:
+        """Concurrency cap for the running event loop"""
+        loop = asyncio.get_running_loop()
+        semaphore = self._semaphores.get(loop)
+        if semaphore is None:
+            semaphore = self._semaphores[loop] = asyncio.Semaphore(self.max_concurrency)
+        return semaphore
+
+    async def run_ffmpeg(
+        self,
+        audio_data: bytes,
+        source_format: Optional[str],
+        output_args: List[str]
+    ) -> bytes:
+        """Pipe bytes through ffmpeg and return its stdout"""
+        args = _ffmpeg_args(DEMUXER_NAMES.get(source_format, source_format), output_args)
+        async with self.semaphore:
+            process = await asyncio.create_subprocess_exec(
+                *args,
+                stdin=asyncio.subprocess.PIPE,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE
+            )
+            try:
+                stdout, stderr = await asyncio.wait_for(
+                    process.communicate(audio_data),
+                    timeout=self.timeout
+                )
+            except asyncio.TimeoutError:
+                process.kill()
+                await process.wait()
+                self.stats['timeouts'] += 1
+                raise TranscodeError(f"ffmpeg timed out after {self.timeout}s")
+
+        self.stats['ffmpeg_jobs'] += 1
+        if process.returncode != 0:
+            self.stats['failures'] += 1
+            raise TranscodeError(f"ffmpeg failed: {stderr.decode(errors='ignore').strip()}")
+        return stdout
+
+    def run_ffmpeg_sync(
+        self,
+        audio_data: bytes,
+        source_format: Optional[str],
+        output_args: List[str]
+    ) -> bytes:
+        """Blocking variant of run_ffmpeg for synchronous callers"""
+        args = _ffmpeg_args(DEMUXER_NAMES.get(source_format, source_format), output_args)
+        try:
+            result = subprocess.run(
+                args,
+                input=audio_data,
+                capture_output=True,
+                timeout=self.timeout
+            )
+        except subprocess.TimeoutExpired:
+            self.stats['timeouts'] += 1
+            raise TranscodeError(f"ffmpeg timed out after {self.timeout}s")
+
+        self.stats['ffmpeg_jobs'] += 1
+        if result.returncode != 0:
+            self.stats['failures'] += 1
+            raise TranscodeError(f"ffmpeg failed: {result.stderr.decode(errors='ignore').strip()}")
+        return result.stdout
+
+    def _decode_inprocess(self, audio_data: bytes, source_format: str) -> Optional[bytes]:
+        """Try the in-process decoder for OGG/Opus input"""
+        if not self.prefer_inprocess or source_format not in ('ogg', 'opus', 'oga'):
+            return None
+        pcm = decode_opus_inprocess(audio_data)
+        if pcm is not None:
+            self.stats['inprocess_jobs'] += 1
+        return pcm
+
+    async def to_wav(self, audio_data: bytes, source_format: str = 'ogg') -> bytes:
+        """Convert any input to 16 kHz mono 16-bit WAV"""
+        pcm = self._decode_inprocess(audio_data, source_format)
+        if pcm is None:
+            pcm = await self.run_ffmpeg(audio_data, source_format, PCM16K_ARGS)
+        return pcm_to_wav(pcm)
+
+    def to_wav_sync(self, audio_data: bytes, source_format: str = 'ogg') -> bytes:
+        """Blocking variant of to_wav"""
+        pcm = self._decode_inprocess(audio_data, source_format)
+        if pcm is None:
+            pcm = self.run_ffmpeg_sync(audio_data, source_format, PCM16K_ARGS)
+        return pcm_to_wav(pcm)
+
+    async def to_ogg_opus(self, audio_data: bytes, source_format: str = 'mp3') -> bytes:
+        """Encode any input to OGG/Opus for WhatsApp"""
+        return await self.run_ffmpeg(audio_data, source_format, OGG_OPUS_ARGS)
+
+    def to_ogg_opus_sync(self, audio_data: bytes, source_format: str = 'mp3') -> bytes:
+        """Blocking variant of to_ogg_opus"""
+        return self.run_ffmpeg_sync(audio_data, source_format, OGG_OPUS_ARGS)
+
+    async def convert(self, audio_data: bytes, source_format: str, target_format: str) -> bytes:
+        """Generic conversion between container formats"""
+        if target_format == 'wav':
+            return await self.to_wav(audio_data, source_format)
+        if target_format in ('ogg', 'opus'):
+            return await self.to_ogg_opus(audio_data, source_format)
+        target = DEMUXER_NAMES.get(target_format, target_format)
+        if target == 'mov':
+            # MP4/M4A need a seekable output; fragment it for pipes
+            return await self.run_ffmpeg(
+                audio_data, source_format,
+                ['-vn', '-movflags', 'frag_keyframe+empty_moov', '-f', 'mp4']
+            )
+        return await self.run_ffmpeg(audio_data, source_format, ['-vn', '-f', target])
+
+
+# Shared transcoder instance
+_transcoder: Optional[AudioTranscoder] = None
+
+
+def get_transcoder() -> AudioTranscoder:
+    """Get the shared transcoder"""
+    global _transcoder
+    if _transcoder is None:
+        _transcoder = AudioTranscoder()
+    return _transcoder
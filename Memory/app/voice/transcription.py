@@ -5,14 +5,14 @@ Handles audio format conversion and transcription using Azure Speech SDK or Open
 """
 
 import os
+import asyncio
 import tempfile
 import logging
 from typing import Optional, Tuple, Dict, Any
 from pathlib import Path
 import requests
-from pydub import AudioSegment
-import soundfile as sf
-import numpy as np
+
+from app.voice.transcoder import get_transcoder
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
@@ -92,6 +92,9 @@ class VoiceTranscriber:
         """
         Convert audio from OGG/Opus to WAV format (16kHz, mono)
         
+        Decodes in-process when possible, otherwise streams the bytes
+        through ffmpeg's stdin/stdout without touching the filesystem.
+        
         Args:
             audio_data: Raw audio bytes
             source_format: Source format (ogg, opus, mp3, etc.)
@@ -100,42 +103,32 @@ class VoiceTranscriber:
             WAV audio bytes or None if failed
         """
         try:
-            # Create temporary files
-            with tempfile.NamedTemporaryFile(suffix=f'.{source_format}', delete=False) as src_file:
-                src_file.write(audio_data)
-                src_path = src_file.name
-            
-            with tempfile.NamedTemporaryFile(suffix='.wav', delete=False) as wav_file:
-                wav_path = wav_file.name
-            
-            # Load audio with pydub
-            audio = AudioSegment.from_file(src_path, format=source_format)
-            
-            # Convert to mono 16kHz WAV
-            audio = audio.set_channels(1)  # Mono
-            audio = audio.set_frame_rate(16000)  # 16kHz
-            audio = audio.set_sample_width(2)  # 16-bit
-            
-            # Export as WAV
-            audio.export(wav_path, format='wav')
-            
-            # Read WAV file
-            with open(wav_path, 'rb') as f:
-                wav_data = f.read()
+            wav_data = get_transcoder().to_wav_sync(audio_data, source_format)
+            logger.info(f"✅ Converted audio to WAV (16kHz, mono, {len(wav_data)} bytes)")
+            return wav_data
             
-            # Clean up temp files
-            os.unlink(src_path)
-            os.unlink(wav_path)
+        except Exception as e:
+            logger.error(f"❌ Failed to convert audio: {e}")
+            return None
+    
+    async def convert_to_wav_async(self, audio_data: bytes, source_format: str = 'ogg') -> Optional[bytes]:
+        """
+        Async variant of convert_to_wav that runs on the bounded transcoder pool
+        
+        Args:
+            audio_data: Raw audio bytes
+            source_format: Source format (ogg, opus, mp3, etc.)
             
+        Returns:
+            WAV audio bytes or None if failed
+        """
+        try:
+            wav_data = await get_transcoder().to_wav(audio_data, source_format)
             logger.info(f"✅ Converted audio to WAV (16kHz, mono, {len(wav_data)} bytes)")
             return wav_data
             
         except Exception as e:
             logger.error(f"❌ Failed to convert audio: {e}")
-            # Clean up temp files if they exist
-            for path in [src_path, wav_path]:
-                if 'path' in locals() and os.path.exists(path):
-                    os.unlink(path)
             return None
     
     def transcribe_with_azure(self, wav_data: bytes) -> Optional[str]:
@@ -266,6 +259,42 @@ class VoiceTranscriber:
             logger.error("❌ All transcription methods failed")
             return (False, None)
     
+    async def transcribe_audio_async(self, audio_data: bytes, source_format: str = 'ogg') -> Tuple[bool, Optional[str]]:
+        """
+        Async variant of transcribe_audio for request handlers
+        
+        Converts on the bounded transcoder pool and runs the blocking
+        speech SDK calls in worker threads, so the event loop keeps serving.
+        
+        Args:
+            audio_data: Raw audio bytes
+            source_format: Source format (ogg, opus, mp3, etc.)
+            
+        Returns:
+            Tuple of (success, transcribed_text)
+        """
+        if not self.voice_enabled:
+            logger.warning("⚠️ Voice transcription disabled")
+            return (False, None)
+        
+        # Convert to WAV
+        wav_data = await self.convert_to_wav_async(audio_data, source_format)
+        if not wav_data:
+            return (False, None)
+        
+        # Try Azure first
+        text = await asyncio.to_thread(self.transcribe_with_azure, wav_data)
+        
+        # Fall back to Whisper if Azure fails
+        if not text:
+            text = await asyncio.to_thread(self.transcribe_with_whisper, wav_data)
+        
+        if text:
+            return (True, text)
+        else:
+            logger.error("❌ All transcription methods failed")
+            return (False, None)
+    
     def process_voice_command(self, text: str) -> Dict[str, Any]:
         """
         Process transcribed text for commands or queries
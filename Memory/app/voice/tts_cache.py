@@ -0,0 +1,320 @@
+"""
+Content-addressed TTS cache for the async voice service
+In-memory LRU index over a byte-budgeted disk store with W-TinyLFU admission
+and single-flight coalescing of concurrent identical requests
+"""
+
+import os
+import json
+import struct
+import hashlib
+import logging
+import unicodedata
+from pathlib import Path
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional, Dict, Any, Awaitable, Callable, Tuple
+
+import aiofiles
+
+from app.services.single_flight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+try:
+    from prometheus_client import Counter, Gauge
+    TTS_CACHE_REQUESTS = Counter(
+        'tts_cache_requests_total', 'TTS cache lookups', ['result']
+    )
+    TTS_CACHE_EVICTIONS = Counter(
+        'tts_cache_evictions_total', 'TTS cache entries removed', ['reason']
+    )
+    TTS_CACHE_BYTES = Gauge('tts_cache_bytes', 'Bytes of audio held in the TTS cache')
+    TTS_CACHE_ENTRIES = Gauge('tts_cache_entries', 'Entries held in the TTS cache')
+    PROMETHEUS_AVAILABLE = True
+except ImportError:
+    PROMETHEUS_AVAILABLE = False
+
+# On-disk entry: 4-byte big-endian header length, JSON header, audio bytes
+HEADER_STRUCT = struct.Struct('>I')
+ENTRY_SUFFIX = '.tts'
+
+
+def normalize_text(text: str) -> str:
+    """Normalize text so trivially different requests share a cache entry"""
+    text = unicodedata.normalize('NFC', text)
+    return ' '.join(text.split())
+
+
+def make_cache_key(text: str, voice: str, style: Optional[str], format: str) -> str:
+    """Content address for a synthesis request"""
+    material = '\x1f'.join([normalize_text(text), voice, style or '', format])
+    return hashlib.sha256(material.encode('utf-8')).hexdigest()
+
+
+class FrequencySketch:
+    """Count-min sketch with periodic halving (TinyLFU popularity estimate)"""
+
+    def __init__(self, width: int = 4096, depth: int = 4, sample_factor: int = 10):
+        self.width = width
+        self.depth = depth
+        self.table = [[0] * width for _ in range(depth)]
+        self.additions = 0
+        self.sample_size = width * sample_factor
+        self.max_count = 15  # 4-bit counters
+
+    def _indexes(self, key: str):
+        digest = hashlib.blake2b(key.encode(), digest_size=4 * self.depth).digest()
+        for row in range(self.depth):
+            yield row, int.from_bytes(digest[row * 4:row * 4 + 4], 'little') % self.width
+
+    def increment(self, key: str):
+        """Record one access"""
+        for row, col in self._indexes(key):
+            if self.table[row][col] < self.max_count:
+                self.table[row][col] += 1
+        self.additions += 1
+        if self.additions >= self.sample_size:
+            self._age()
+
+    def estimate(self, key: str) -> int:
+        """Estimated access frequency"""
+        return min(self.table[row][col] for row, col in self._indexes(key))
+
+    def _age(self):
+        """Halve all counters so old popularity fades"""
+        for row in self.table:
+            for i in range(len(row)):
+                row[i] >>= 1
+        self.additions //= 2
+
+
+@dataclass
+class CacheEntry:
+    """Index entry for one cached synthesis"""
+    key: str
+    size: int
+    metadata: Dict[str, Any]
+
+
+class TTSCache:
+    """Byte-budgeted synthesis cache
+
+    New entries land in a small admission window. When the window
+    overflows, its oldest entry only enters the main LRU region if the
+    frequency sketch says it is more popular than the main region's
+    eviction victim, so one-off replies cannot flush hot phrases.
+    """
+
+    def __init__(
+        self,
+        cache_dir: Path,
+        max_bytes: int = 256 * 1024 * 1024,
+        window_fraction: float = 0.01
+    ):
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.window_bytes_limit = max(int(max_bytes * window_fraction), 1)
+        self.main_bytes_limit = max_bytes - self.window_bytes_limit
+
+        self.window: "OrderedDict[str, CacheEntry]" = OrderedDict()
+        self.main: "OrderedDict[str, CacheEntry]" = OrderedDict()
+        self.window_bytes = 0
+        self.main_bytes = 0
+        self.sketch = FrequencySketch()
+        self._flights = SingleFlight()
+
+        self.stats = {
+            'hits': 0,
+            'misses': 0,
+            'coalesced': 0,
+            'evictions': 0,
+            'rejections': 0
+        }
+        self._load_index()
+
+    # ------------------------------------------------------------------
+    # Index maintenance
+    # ------------------------------------------------------------------
+
+    def _path(self, key: str) -> Path:
+        return self.cache_dir / f"{key}{ENTRY_SUFFIX}"
+
+    def _load_index(self):
+        """Rebuild the in-memory index from the disk store (oldest first)"""
+        files = sorted(self.cache_dir.glob(f"*{ENTRY_SUFFIX}"), key=lambda p: p.stat().st_mtime)
+        for path in files:
+            try:
+                with open(path, 'rb') as f:
+                    (header_len,) = HEADER_STRUCT.unpack(f.read(HEADER_STRUCT.size))
+                    metadata = json.loads(f.read(header_len))
+                size = path.stat().st_size
+            except Exception as e:
+                logger.warning(f"Dropping unreadable TTS cache entry {path.name}: {e}")
+                path.unlink(missing_ok=True)
+                continue
+            entry = CacheEntry(path.stem, size, metadata)
+            self.main[entry.key] = entry
+            self.main_bytes += size
+
+        # Enforce the budget if it shrank since the last run
+        while self.main_bytes > self.main_bytes_limit and self.main:
+            self._evict_main_lru('budget')
+        self._publish_gauges()
+        if self.main:
+            logger.info(f"TTS cache loaded {len(self.main)} entries ({self.main_bytes} bytes)")
+
+    def _publish_gauges(self):
+        if PROMETHEUS_AVAILABLE:
+            TTS_CACHE_BYTES.set(self.total_bytes)
+            TTS_CACHE_ENTRIES.set(len(self.window) + len(self.main))
+
+    def _remove_file(self, key: str):
+        try:
+            self._path(key).unlink(missing_ok=True)
+        except OSError as e:
+            logger.error(f"Failed to delete TTS cache entry {key}: {e}")
+
+    def _evict_main_lru(self, reason: str):
+        key, entry = self.main.popitem(last=False)
+        self.main_bytes -= entry.size
+        self._remove_file(key)
+        self.stats['evictions'] += 1
+        if PROMETHEUS_AVAILABLE:
+            TTS_CACHE_EVICTIONS.labels(reason=reason).inc()
+
+    def _admit_from_window(self):
+        """Move window overflow into the main region via TinyLFU admission"""
+        while self.window_bytes > self.window_bytes_limit and self.window:
+            key, candidate = self.window.popitem(last=False)
+            self.window_bytes -= candidate.size
+
+            if candidate.size > self.main_bytes_limit:
+                self._reject(key)
+                continue
+
+            candidate_freq = self.sketch.estimate(key)
+            admitted = True
+            while self.main_bytes + candidate.size > self.main_bytes_limit and self.main:
+                victim_key = next(iter(self.main))
+                if candidate_freq > self.sketch.estimate(victim_key):
+                    self._evict_main_lru('capacity')
+                else:
+                    admitted = False
+                    break
+
+            if admitted:
+                self.main[key] = candidate
+                self.main_bytes += candidate.size
+            else:
+                self._reject(key)
+
+    def _reject(self, key: str):
+        self._remove_file(key)
+        self.stats['rejections'] += 1
+        if PROMETHEUS_AVAILABLE:
+            TTS_CACHE_EVICTIONS.labels(reason='admission').inc()
+
+    @property
+    def total_bytes(self) -> int:
+        return self.window_bytes + self.main_bytes
+
+    def _lookup(self, key: str) -> Optional[CacheEntry]:
+        """Find an entry and refresh its recency"""
+        if key in self.main:
+            self.main.move_to_end(key)
+            return self.main[key]
+        if key in self.window:
+            self.window.move_to_end(key)
+            return self.window[key]
+        return None
+
+    def _forget(self, key: str):
+        """Drop an index entry whose file has gone missing"""
+        entry = self.main.pop(key, None)
+        if entry:
+            self.main_bytes -= entry.size
+        entry = self.window.pop(key, None)
+        if entry:
+            self.window_bytes -= entry.size
+
+    # ------------------------------------------------------------------
+    # Public API
+    # ------------------------------------------------------------------
+
+    async def get(self, key: str) -> Optional[Tuple[bytes, Dict[str, Any]]]:
+        """Return (audio, metadata) for a key, or None on a miss"""
+        self.sketch.increment(key)
+        entry = self._lookup(key)
+        if entry is None:
+            self._record('miss')
+            return None
+        try:
+            async with aiofiles.open(self._path(key), 'rb') as f:
+                data = await f.read()
+        except FileNotFoundError:
+            self._forget(key)
+            self._record('miss')
+            return None
+        (header_len,) = HEADER_STRUCT.unpack_from(data)
+        self._record('hit')
+        return data[HEADER_STRUCT.size + header_len:], entry.metadata
+
+    async def put(self, key: str, audio: bytes, metadata: Dict[str, Any]):
+        """Store an entry (atomically) and apply admission and eviction"""
+        if self._lookup(key) is not None:
+            return
+        header = json.dumps(metadata).encode('utf-8')
+        blob = HEADER_STRUCT.pack(len(header)) + header + audio
+
+        path = self._path(key)
+        tmp_path = path.with_suffix('.tmp')
+        try:
+            async with aiofiles.open(tmp_path, 'wb') as f:
+                await f.write(blob)
+            os.replace(tmp_path, path)
+        except Exception as e:
+            logger.error(f"Cache write failed: {e}")
+            return
+
+        self.window[key] = CacheEntry(key, len(blob), metadata)
+        self.window_bytes += len(blob)
+        self._admit_from_window()
+        self._publish_gauges()
+
+    async def get_or_create(
+        self,
+        key: str,
+        factory: Callable[[], Awaitable[Tuple[bytes, Dict[str, Any]]]]
+    ) -> Tuple[bytes, Dict[str, Any]]:
+        """Return a cached entry or create it, coalescing concurrent misses"""
+        cached = await self.get(key)
+        if cached is not None:
+            return cached
+
+        async def create():
+            audio, metadata = await factory()
+            await self.put(key, audio, metadata)
+            return audio, metadata
+
+        entry, joined = await self._flights.run(key, create)
+        if joined:
+            self.stats['coalesced'] += 1
+        return entry
+
+    def _record(self, result: str):
+        self.stats['hits' if result == 'hit' else 'misses'] += 1
+        if PROMETHEUS_AVAILABLE:
+            TTS_CACHE_REQUESTS.labels(result=result).inc()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Cache statistics for health endpoints"""
+        lookups = self.stats['hits'] + self.stats['misses']
+        return {
+            **self.stats,
+            'hit_rate': self.stats['hits'] / lookups if lookups else 0.0,
+            'entries': len(self.window) + len(self.main),
+            'bytes': self.total_bytes,
+            'max_bytes': self.max_bytes
+        }
@@ -7,7 +7,6 @@ import asyncio
 import aiohttp
 import os
 import logging
-import tempfile
 from typing import Optional, Dict, Any, Tuple
 from datetime import datetime, timedelta
 import hashlib
@@ -18,6 +17,9 @@ import backoff
 from enum import Enum
 from dataclasses import dataclass
 
+from app.voice.transcoder import get_transcoder
+from app.voice.tts_cache import TTSCache, make_cache_key
+
 logger = logging.getLogger(__name__)
 
 
@@ -129,6 +131,12 @@ class AsyncVoiceService:
         self.cache_dir = Path("./cache/voice")
         self.cache_dir.mkdir(parents=True, exist_ok=True)
 
+        # Size-bounded synthesis cache
+        self.tts_cache = TTSCache(
+            self.cache_dir / "tts",
+            max_bytes=int(os.getenv("TTS_CACHE_MAX_BYTES", 256 * 1024 * 1024))
+        )
+
     async def __aenter__(self):
         """Async context manager entry"""
         await self.initialize()
@@ -263,27 +271,32 @@ class AsyncVoiceService:
         self,
         text: str,
         voice: str = "en-US-JennyNeural",
-        format: VoiceFormat = VoiceFormat.OGG
+        format: VoiceFormat = VoiceFormat.OGG,
+        style: Optional[str] = None
     ) -> SynthesisResult:
         """Synthesize speech with error handling"""
         if not self.azure_key:
             raise VoiceServiceError("Azure Speech key not configured")
 
-        # Check cache
-        cache_key = self._generate_cache_key(text, voice, format.value)
-        cached_result = await self._get_cached_synthesis(cache_key)
-        if cached_result:
-            logger.info(f"Synthesis cache hit for text: {text[:50]}...")
-            return cached_result
-
-        try:
-            # Call Azure Speech API
-            result = await self._call_azure_synthesis(text, voice, format)
+        cache_key = make_cache_key(text, voice, style, format.value)
 
-            # Cache result
-            await self._cache_synthesis(cache_key, result)
+        async def synthesize():
+            result = await self._call_azure_synthesis(text, voice, format, style)
+            return result.audio_data, {
+                "format": result.format,
+                "duration": result.duration,
+                "voice": result.voice
+            }
 
-            return result
+        try:
+            # Cached, or a single provider call shared by concurrent requests
+            audio_data, metadata = await self.tts_cache.get_or_create(cache_key, synthesize)
+            return SynthesisResult(
+                audio_data=audio_data,
+                format=metadata["format"],
+                duration=metadata["duration"],
+                voice=metadata["voice"]
+            )
 
         except aiohttp.ClientError as e:
             logger.error(f"Network error during synthesis: {e}")
@@ -302,7 +315,8 @@ class AsyncVoiceService:
         self,
         text: str,
         voice: str,
-        format: VoiceFormat
+        format: VoiceFormat,
+        style: Optional[str] = None
     ) -> SynthesisResult:
         """Call Azure Speech API for synthesis"""
         url = f"{self.azure_endpoint}/cognitiveservices/v1"
@@ -314,10 +328,13 @@ class AsyncVoiceService:
         }
 
         # Create SSML
+        content = self._escape_ssml(text)
+        if style:
+            content = f"<mstts:express-as style='{self._escape_ssml(style)}'>{content}</mstts:express-as>"
         ssml = f"""
-        <speak version='1.0' xml:lang='en-US'>
+        <speak version='1.0' xml:lang='en-US' xmlns:mstts='https://www.w3.org/2001/mstts'>
             <voice xml:lang='en-US' name='{voice}'>
-                {self._escape_ssml(text)}
+                {content}
             </voice>
         </speak>
         """
@@ -359,36 +376,9 @@ class AsyncVoiceService:
         from_format: VoiceFormat,
         to_format: VoiceFormat
     ) -> bytes:
-        """Convert audio format using ffmpeg"""
+        """Convert audio format by piping through the shared ffmpeg pool"""
         try:
-            import ffmpeg
-
-            # Save input to temp file
-            with tempfile.NamedTemporaryFile(suffix=f".{from_format.value}", delete=False) as input_file:
-                input_file.write(audio_data)
-                input_path = input_file.name
-
-            # Create output temp file
-            output_path = input_path.replace(f".{from_format.value}", f".{to_format.value}")
-
-            # Convert using ffmpeg
-            stream = ffmpeg.input(input_path)
-            stream = ffmpeg.output(stream, output_path)
-            await asyncio.create_subprocess_exec(
-                *ffmpeg.compile(stream),
-                stdout=asyncio.subprocess.PIPE,
-                stderr=asyncio.subprocess.PIPE
-            )
-
-            # Read converted file
-            async with aiofiles.open(output_path, 'rb') as f:
-                converted_data = await f.read()
-
-            # Cleanup
-            os.unlink(input_path)
-            os.unlink(output_path)
-
-            return converted_data
+            return await get_transcoder().convert(audio_data, from_format.value, to_format.value)
 
         except Exception as e:
             logger.error(f"Audio conversion failed: {e}")
@@ -428,49 +418,6 @@ class AsyncVoiceService:
         except Exception as e:
             logger.error(f"Cache write failed: {e}")
 
-    async def _get_cached_synthesis(self, cache_key: str) -> Optional[SynthesisResult]:
-        """Get cached synthesis"""
-        cache_file = self.cache_dir / f"synth_{cache_key}.audio"
-        if cache_file.exists():
-            try:
-                async with aiofiles.open(cache_file, 'rb') as f:
-                    audio_data = await f.read()
-                    # Get metadata from companion file
-                    meta_file = self.cache_dir / f"synth_{cache_key}.json"
-                    if meta_file.exists():
-                        async with aiofiles.open(meta_file, 'r') as mf:
-                            import json
-                            metadata = json.loads(await mf.read())
-                            return SynthesisResult(
-                                audio_data=audio_data,
-                                format=metadata["format"],
-                                duration=metadata["duration"],
-                                voice=metadata["voice"]
-                            )
-            except Exception as e:
-                logger.error(f"Cache read failed: {e}")
-        return None
-
-    async def _cache_synthesis(self, cache_key: str, result: SynthesisResult):
-        """Cache synthesis result"""
-        cache_file = self.cache_dir / f"synth_{cache_key}.audio"
-        meta_file = self.cache_dir / f"synth_{cache_key}.json"
-        try:
-            # Save audio data
-            async with aiofiles.open(cache_file, 'wb') as f:
-                await f.write(result.audio_data)
-
-            # Save metadata
-            import json
-            async with aiofiles.open(meta_file, 'w') as f:
-                await f.write(json.dumps({
-                    "format": result.format,
-                    "duration": result.duration,
-                    "voice": result.voice
-                }))
-        except Exception as e:
-            logger.error(f"Cache write failed: {e}")
-
     def _get_azure_format(self, format: VoiceFormat) -> str:
         """Get Azure format string"""
         format_map = {
@@ -502,7 +449,8 @@ class AsyncVoiceService:
             "azure_configured": bool(self.azure_key),
             "transcription_circuit": self.transcription_breaker.state,
             "synthesis_circuit": self.synthesis_breaker.state,
-            "session_active": self.session is not None
+            "session_active": self.session is not None,
+            "tts_cache": self.tts_cache.get_stats()
         }
 
         # Test Azure connectivity
@@ -1,4 +1,4 @@
-import os, logging, uuid, json
+import os, re, time, logging, uuid, json
 from typing import List, Optional
 from pathlib import Path
 from datetime import datetime, timedelta
@@ -17,6 +17,7 @@ from .tenancy.rbac import whoami as whoami_user, can_search, can_perform
 from .tenancy.model import TENANCY
 from .memory.search_multi import search_many
 from .audit import audit_event, get_user_audit_logs
+from .api.websocket import manager as metrics_manager
 
 router = APIRouter()
 
@@ -35,6 +36,31 @@ async def verify(request: Request):
         return PlainTextResponse(p.get('hub.challenge',''), status_code=200)
     return PlainTextResponse('verification failed', status_code=403)
 
+# Commands reported to the metrics histograms; other text is labelled 'text'
+COMMANDS = {
+    'help', 'whoami', 'search', 'enroll', 'set', 'verify', 'passphrase', 'recent', 'stats', 'delete',
+    'clear', 'voice', 'login', 'logout', 'export', 'backup', 'restore', 'category', 'settings',
+    'profile', 'audit'
+}
+
+def _command_name(msg: dict) -> str:
+    """Bounded metrics label for the command a message carries"""
+    if msg.get('type') != 'text':
+        return msg.get('type') or 'unknown'
+    low = msg.get('text', {}).get('body', '').strip().lower()
+    word = re.split(r'[:\s]', low, 1)[0]
+    return word if word in COMMANDS else 'text'
+
+def _timed_commands(messages):
+    """Yield messages, recording how long each one took to handle per command"""
+    for msg in messages:
+        started = time.perf_counter()
+        try:
+            yield msg
+        finally:
+            elapsed = (time.perf_counter() - started) * 1000
+            metrics_manager.metrics_collector.record_command(_command_name(msg), elapsed)
+
 def _allowed_self(phone: str) -> List[str]:
     base = ['GENERAL','CHRONOLOGICAL','CONFIDENTIAL']
     if is_verified(phone):
@@ -48,7 +74,7 @@ async def inbound(request: Request):
         for entry in body.get('entry', []):
             for ch in entry.get('changes', []):
                 value = ch.get('value', {})
-                for msg in value.get('messages', []):
+                for msg in _timed_commands(value.get('messages', [])):
                     mtype = msg.get('type'); frm = msg.get('from')
                     if not frm: 
                         continue
@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+"""
+Achievement Engine
+Incremental achievement evaluation. Each rule names the counter it depends
+on and the events that advance that counter. The engine maps events to
+counters and counters to their rules, ordered from easiest to hardest, and
+keeps a per-user pointer to the first locked rule on each counter. An event
+therefore costs O(counters it touches + achievements it unlocks) however
+large the catalogue grows. Unlocks are buffered so callers can notify in
+batches.
+"""
+
+import bisect
+from collections import Counter
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# Comparisons: the counter must reach the target, or stay at or under it
+AT_LEAST = "at_least"
+AT_MOST = "at_most"
+
+
+@dataclass(frozen=True)
+class AchievementRule:
+    """An achievement unlocked when `counter` reaches `target`
+
+    `events` are the event types that add to the counter; counters can also
+    be set directly (streaks, best times) with AchievementEngine.set_counter.
+    """
+    id: str
+    counter: str
+    target: int
+    events: Tuple[str, ...] = ()
+    comparison: str = AT_LEAST
+
+    def satisfied_by(self, value: int) -> bool:
+        if self.comparison == AT_MOST:
+            return value <= self.target
+        return value >= self.target
+
+    @property
+    def difficulty(self) -> int:
+        """Sort key: a value meeting a rule meets every easier rule on its counter"""
+        return -self.target if self.comparison == AT_MOST else self.target
+
+
+class AchievementEngine:
+    """Counters, the rules that depend on them, and per-user unlock state"""
+
+    def __init__(self, rules: Iterable[AchievementRule] = ()):
+        self.rules: Dict[str, AchievementRule] = {}
+        self._by_counter: Dict[str, List[AchievementRule]] = {}
+        self._difficulties: Dict[str, List[int]] = {}
+        self._positions: Dict[str, int] = {}
+        self._by_event: Dict[str, List[str]] = {}
+
+        self._counters: Dict[str, Dict[str, int]] = {}
+        # user -> counter -> index of the first rule still locked
+        self._next: Dict[str, Dict[str, int]] = {}
+        self._pending: Dict[str, List[AchievementRule]] = {}
+        self.unlock_counts: Counter = Counter()
+
+        for rule in rules:
+            self.add_rule(rule)
+
+    # ==================== CATALOGUE ====================
+
+    def add_rule(self, rule: AchievementRule) -> List[Tuple[str, AchievementRule]]:
+        """Add a rule; users already past it unlock it now (returned as (user, rule))"""
+        if rule.id in self.rules:
+            raise ValueError(f"Achievement {rule.id} is already defined")
+        rules = self._by_counter.setdefault(rule.counter, [])
+        if rules and rules[0].comparison != rule.comparison:
+            raise ValueError(f"Counter {rule.counter} mixes {rules[0].comparison} and {rule.comparison} rules")
+
+        difficulties = self._difficulties.setdefault(rule.counter, [])
+        index = bisect.bisect_right(difficulties, rule.difficulty)
+        rules.insert(index, rule)
+        difficulties.insert(index, rule.difficulty)
+        for position in range(index, len(rules)):
+            self._positions[rules[position].id] = position
+        self.rules[rule.id] = rule
+        for event in rule.events:
+            counters = self._by_event.setdefault(event, [])
+            if rule.counter not in counters:
+                counters.append(rule.counter)
+
+        # Shift the pointers of users already at or beyond the insertion point
+        unlocked = []
+        for user_id, counters in self._counters.items():
+            if rule.counter not in counters:
+                continue
+            pointers = self._next.setdefault(user_id, {})
+            pointer = pointers.get(rule.counter, 0)
+            if pointer < index:
+                continue
+            if pointer > index:
+                # Past a harder rule, so this one is met too
+                pointers[rule.counter] = pointer + 1
+                self._unlock(user_id, [rule])
+                unlocked.append((user_id, rule))
+            else:
+                unlocked.extend((user_id, r) for r in self._advance(user_id, rule.counter))
+        return unlocked
+
+    def rules_for_event(self, event: str) -> List[AchievementRule]:
+        return [rule for counter in self._by_event.get(event, ()) for rule in self._by_counter[counter]]
+
+    # ==================== EVENTS ====================
+
+    def record(self, user_id: str, event: str, amount: int = 1) -> List[AchievementRule]:
+        """Add `amount` to every counter the event advances; returns new unlocks"""
+        unlocked = []
+        for counter in self._by_event.get(event, ()):
+            unlocked.extend(self.increment(user_id, counter, amount))
+        return unlocked
+
+    def increment(self, user_id: str, counter: str, amount: int = 1) -> List[AchievementRule]:
+        counters = self._counters.setdefault(user_id, {})
+        return self.set_counter(user_id, counter, counters.get(counter, 0) + amount)
+
+    def set_counter(self, user_id: str, counter: str, value: int) -> List[AchievementRule]:
+        """Set a counter and evaluate only the rules that depend on it"""
+        counters = self._counters.setdefault(user_id, {})
+        if counters.get(counter) == value:
+            return []
+        counters[counter] = value
+        return self._advance(user_id, counter)
+
+    def _advance(self, user_id: str, counter: str) -> List[AchievementRule]:
+        rules = self._by_counter.get(counter)
+        if not rules:
+            return []
+        pointers = self._next.setdefault(user_id, {})
+        index = start = pointers.get(counter, 0)
+        value = self._counters[user_id][counter]
+        while index < len(rules) and rules[index].satisfied_by(value):
+            index += 1
+        if index == start:
+            return []
+        pointers[counter] = index
+        unlocked = rules[start:index]
+        self._unlock(user_id, unlocked)
+        return unlocked
+
+    def _unlock(self, user_id: str, rules: List[AchievementRule]):
+        self._pending.setdefault(user_id, []).extend(rules)
+        for rule in rules:
+            self.unlock_counts[rule.id] += 1
+
+    def drain_unlocks(self) -> Dict[str, List[AchievementRule]]:
+        """Unlocks since the last drain, grouped by user, for batched notifications"""
+        pending, self._pending = self._pending, {}
+        return pending
+
+    # ==================== QUERIES ====================
+
+    def counter(self, user_id: str, counter: str, default: int = 0) -> int:
+        return self._counters.get(user_id, {}).get(counter, default)
+
+    def is_unlocked(self, user_id: str, rule_id: str) -> bool:
+        rule = self.rules[rule_id]
+        return self._positions[rule_id] < self._next.get(user_id, {}).get(rule.counter, 0)
+
+    def unlocked(self, user_id: str) -> List[str]:
+        return [rule.id for counter, pointer in self._next.get(user_id, {}).items()
+                for rule in self._by_counter[counter][:pointer]]
+
+    def progress(self, user_id: str, rule_id: str) -> Dict[str, Optional[int]]:
+        rule = self.rules[rule_id]
+        return {
+            'value': self._counters.get(user_id, {}).get(rule.counter),
+            'target': rule.target,
+            'unlocked': self.is_unlocked(user_id, rule_id)
+        }
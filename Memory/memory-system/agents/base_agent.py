@@ -6,11 +6,14 @@ Provides core functionality for all specialized agents
 import asyncio
 import logging
 from datetime import datetime
-from typing import Dict, List, Any, Optional
+from typing import Dict, List, Any, Optional, TYPE_CHECKING
 from dataclasses import dataclass, asdict
 from enum import Enum
 from abc import ABC, abstractmethod
 
+if TYPE_CHECKING:
+    from .message_bus import MessageBus
+
 logger = logging.getLogger(__name__)
 
 class AgentState(Enum):
@@ -58,6 +61,19 @@ class AgentMessage:
             'correlation_id': self.correlation_id,
             'reply_to': self.reply_to
         }
+    
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'AgentMessage':
+        """Rebuild a message from ``to_dict`` output"""
+        return cls(
+            sender_id=data['sender_id'],
+            recipient_id=data['recipient_id'],
+            message_type=data['message_type'],
+            content=data['content'],
+            timestamp=datetime.fromisoformat(data['timestamp']),
+            correlation_id=data.get('correlation_id'),
+            reply_to=data.get('reply_to')
+        )
 
 class BaseAgent(ABC):
     """
@@ -70,7 +86,17 @@ class BaseAgent(ABC):
         self.config = config or {}
         self.state = AgentState.IDLE
         self.is_initialized = False
-        self.message_queue = asyncio.Queue()
+        
+        # Messaging: config['message_bus'] (e.g. a SocketMessageBus), else the
+        # in-process bus of the running event loop; the mailbox is bounded
+        self._message_bus: Optional['MessageBus'] = self.config.get('message_bus')
+        self._mailbox_bus: Optional['MessageBus'] = None
+        self.mailbox_size = self.config.get('mailbox_size')
+        # Set by shutdown(); serve() stops taking messages once it is, and
+        # shutdown() waits for serve() and the handlers it started to finish
+        self._stop_event: Optional[asyncio.Event] = None
+        self._serve_stopped: Optional[asyncio.Event] = None
+        self._handlers: set = set()
         self.statistics = {
             'messages_processed': 0,
             'errors': 0,
@@ -106,8 +132,37 @@ class BaseAgent(ABC):
         """Initialize agent-specific components (override in subclasses)"""
         pass
     
-    async def send_message(self, recipient_id: str, message_type: str, content: Dict[str, Any]) -> AgentMessage:
-        """Send a message to another agent"""
+    @property
+    def message_bus(self) -> 'MessageBus':
+        """Bus this agent sends and receives on"""
+        if self._message_bus is not None:
+            return self._message_bus
+        from .message_bus import default_message_bus
+        return default_message_bus()
+    
+    @property
+    def stop_event(self) -> asyncio.Event:
+        """Set when the agent is shutting down"""
+        if self._stop_event is None:
+            self._stop_event = asyncio.Event()
+        return self._stop_event
+    
+    def _set_state(self, state: AgentState):
+        """Change state; a terminated agent stays terminated"""
+        if self.state != AgentState.TERMINATED:
+            self.state = state
+    
+    async def _ensure_mailbox(self) -> 'MessageBus':
+        """Register this agent's mailbox on its bus (once per bus)"""
+        bus = self.message_bus
+        if self._mailbox_bus is not bus:
+            await bus.register(self.agent_id, self.mailbox_size)
+            self._mailbox_bus = bus
+        return bus
+    
+    async def send_message(self, recipient_id: str, message_type: str, content: Dict[str, Any],
+                           timeout: Optional[float] = None) -> AgentMessage:
+        """Send a message to another agent, waiting up to `timeout` while its mailbox is full"""
         message = AgentMessage(
             sender_id=self.agent_id,
             recipient_id=recipient_id,
@@ -116,36 +171,121 @@ class BaseAgent(ABC):
             timestamp=datetime.now()
         )
         
-        # In a real implementation, this would send to a message broker
         logger.debug(f"Agent {self.agent_id} sending message to {recipient_id}: {message_type}")
+        await self.message_bus.publish(message, timeout)
         return message
     
-    async def receive_message(self) -> Optional[AgentMessage]:
-        """Receive a message from the queue"""
+    async def request(self, recipient_id: str, message_type: str, content: Dict[str, Any],
+                      timeout: Optional[float] = 30.0) -> Dict[str, Any]:
+        """Send a message and wait for the recipient's reply content
+        
+        Raises asyncio.TimeoutError when no reply arrives in time and
+        AgentRequestError when the recipient's handler failed.
+        """
+        message = AgentMessage(
+            sender_id=self.agent_id,
+            recipient_id=recipient_id,
+            message_type=message_type,
+            content=content,
+            timestamp=datetime.now()
+        )
+        return await self.message_bus.request(message, timeout)
+    
+    async def receive_messages(self, max_messages: int = 1, timeout: Optional[float] = 0) -> List[AgentMessage]:
+        """Receive up to `max_messages` from the mailbox, waiting up to `timeout` for the first"""
         try:
-            if not self.message_queue.empty():
-                message = await self.message_queue.get()
-                self.statistics['messages_processed'] += 1
-                self.statistics['last_activity'] = datetime.now()
-                return message
-            return None
+            bus = await self._ensure_mailbox()
+            messages = await bus.receive(self.agent_id, max_messages, timeout)
         except Exception as e:
             logger.error(f"Error receiving message: {e}")
             self.statistics['errors'] += 1
-            return None
+            return []
+        
+        if messages:
+            self.statistics['messages_processed'] += len(messages)
+            self.statistics['last_activity'] = datetime.now()
+        return messages
+    
+    async def receive_message(self) -> Optional[AgentMessage]:
+        """Receive a message from the queue"""
+        messages = await self.receive_messages(1)
+        return messages[0] if messages else None
+    
+    async def serve(self, concurrency: Optional[int] = None, batch_size: Optional[int] = None,
+                    poll_interval: float = 1.0):
+        """Handle mailbox messages until shutdown, up to `concurrency` at a time
+        
+        Messages are taken only while a handler slot is free, so a busy agent
+        leaves them in its bounded mailbox and senders wait. Requests (messages
+        with reply_to) are answered with the handler's result or error.
+        """
+        from .message_bus import REPLY, ERROR_REPLY, MessageBusError
+        
+        concurrency = concurrency or self.config.get('consumer_concurrency', 4)
+        batch_size = batch_size or self.config.get('receive_batch_size', 32)
+        bus = await self._ensure_mailbox()
+        stop = self.stop_event
+        running = self._handlers
+        stopped = self._serve_stopped = asyncio.Event()
+        
+        async def consume(message: AgentMessage):
+            try:
+                result = await self.process_message(message)
+                content, message_type = result or {}, REPLY
+            except Exception as e:
+                content, message_type = {'error': str(e)}, ERROR_REPLY
+            if message.reply_to:
+                try:
+                    await bus.publish(AgentMessage(
+                        sender_id=self.agent_id,
+                        recipient_id=message.reply_to,
+                        message_type=message_type,
+                        content=content,
+                        timestamp=datetime.now(),
+                        correlation_id=message.correlation_id
+                    ), timeout=poll_interval)
+                except Exception as e:
+                    logger.warning(f"Agent {self.agent_id} could not reply to {message.reply_to}: {e}")
+        
+        try:
+            while not stop.is_set():
+                if len(running) >= concurrency:
+                    await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+                    continue
+                
+                try:
+                    messages = await bus.receive(self.agent_id, min(batch_size, concurrency - len(running)),
+                                                 poll_interval)
+                except (ConnectionError, MessageBusError) as e:
+                    # Expected once shutdown() has released the mailbox
+                    if not stop.is_set():
+                        logger.error(f"Agent {self.agent_id} lost its mailbox: {e}")
+                    break
+                
+                if messages:
+                    self.statistics['messages_processed'] += len(messages)
+                    self.statistics['last_activity'] = datetime.now()
+                for message in messages:
+                    task = asyncio.create_task(consume(message))
+                    running.add(task)
+                    task.add_done_callback(running.discard)
+        finally:
+            if running:
+                await asyncio.gather(*list(running), return_exceptions=True)
+            stopped.set()
     
     async def process_message(self, message: AgentMessage) -> Optional[Dict[str, Any]]:
         """Process an incoming message"""
-        self.state = AgentState.PROCESSING
+        self._set_state(AgentState.PROCESSING)
         
         try:
             result = await self._handle_message(message)
-            self.state = AgentState.IDLE
+            self._set_state(AgentState.IDLE)
             return result
             
         except Exception as e:
             logger.error(f"Error processing message: {e}")
-            self.state = AgentState.ERROR
+            self._set_state(AgentState.ERROR)
             self.statistics['errors'] += 1
             raise
     
@@ -172,14 +312,35 @@ class BaseAgent(ABC):
             'metrics': self.metrics
         }
     
+    async def _stop_serving(self):
+        """Stop serve() taking messages and wait for the handlers it has running"""
+        self.state = AgentState.TERMINATED
+        self.stop_event.set()
+        current = asyncio.current_task()
+        if current not in self._handlers and self._serve_stopped is not None:
+            # serve() returns within its poll interval, once its handlers are done;
+            # a handler shutting its own agent down cannot wait for that
+            await self._serve_stopped.wait()
+        pending = self._handlers - {current}
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
+    
     async def shutdown(self):
         """Gracefully shutdown the agent"""
         logger.info(f"Shutting down agent {self.agent_id}")
-        self.state = AgentState.TERMINATED
+        await self._stop_serving()
         
         # Perform cleanup
         await self._cleanup()
         
+        # Release the mailbox
+        if self._mailbox_bus is not None:
+            try:
+                await self._mailbox_bus.unregister(self.agent_id)
+            except Exception as e:
+                logger.warning(f"Agent {self.agent_id} could not release its mailbox: {e}")
+            self._mailbox_bus = None
+        
         logger.info(f"Agent {self.agent_id} shutdown complete")
     
     async def _cleanup(self):
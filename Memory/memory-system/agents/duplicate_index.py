@@ -0,0 +1,380 @@
+"""
+Duplicate Index - exact and near-duplicate lookup for harvested content
+Texts are reduced to MinHash signatures (one-permutation hashing over
+character shingles) and bucketed per user with banded LSH, so a near-copy
+is found by probing a handful of buckets instead of comparing every stored
+memory. Signatures live in an append-only, memory-mapped file so the index
+survives restarts; a Bloom filter over exact content digests answers "never
+seen" without touching the index.
+"""
+
+import os
+import re
+import math
+import mmap
+import zlib
+import struct
+import hashlib
+import logging
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple, Union
+
+logger = logging.getLogger(__name__)
+
+NON_WORD = re.compile(r'[\W_]+')
+
+_MASK64 = (1 << 64) - 1
+_MIX = 0x9E3779B97F4A7C15
+_EMPTY = 1 << 32
+
+
+def normalize_text(text: str) -> str:
+    """Lower-case words separated by single spaces; punctuation and layout dropped"""
+    return ' '.join(NON_WORD.sub(' ', text.lower()).split())
+
+
+def shingle_hashes(text: str, size: int = 5) -> set:
+    """CRC32 of every `size`-character shingle of the normalized text"""
+    data = normalize_text(text).encode()
+    crc32 = zlib.crc32
+    return {crc32(data[i:i + size]) for i in range(max(1, len(data) - size + 1))}
+
+
+def minhash_signature(hashes, num_perm: int = 64) -> List[int]:
+    """One-permutation MinHash: each hash lands in one of `num_perm` bins, which keep their minimum
+
+    Empty bins borrow from the next filled bin (rotation densification), so
+    short texts still get a full signature. The fraction of equal positions
+    in two signatures estimates the Jaccard similarity of their shingle sets.
+    """
+    shift = 64 - (num_perm.bit_length() - 1)
+    signature = [_EMPTY] * num_perm
+    for value in hashes:
+        mixed = (value * _MIX) & _MASK64
+        position = mixed >> shift
+        low = (mixed >> 16) & 0xFFFFFFFF
+        if low < signature[position]:
+            signature[position] = low
+
+    if _EMPTY in signature:
+        filled = list(signature)
+        for i in range(num_perm):
+            if signature[i] == _EMPTY:
+                j, distance = (i + 1) % num_perm, 1
+                while signature[j] == _EMPTY:
+                    j, distance = (j + 1) % num_perm, distance + 1
+                filled[i] = (signature[j] + distance * 0x9E3779B1) & 0xFFFFFFFF
+        signature = filled
+    return signature
+
+
+def lsh_bands(num_perm: int, threshold: float, recall: float = 0.95) -> Tuple[int, int]:
+    """(bands, rows): the most selective banding that still makes a pair at
+    `threshold` similarity a candidate with probability >= `recall`"""
+    best = (num_perm, 1)
+    for rows in range(1, num_perm + 1):
+        bands = num_perm // rows
+        if 1 - (1 - threshold ** rows) ** bands >= recall:
+            best = (bands, rows)
+    return best
+
+
+def content_digest(user_id: str, content: str) -> int:
+    return int.from_bytes(
+        hashlib.blake2b(f"{user_id}\0{content}".encode(), digest_size=8).digest(), 'little'
+    )
+
+
+def user_key(user_id: str) -> int:
+    return int.from_bytes(hashlib.blake2b(str(user_id).encode(), digest_size=8).digest(), 'little')
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter over 64-bit digests"""
+
+    def __init__(self, capacity: int, error_rate: float = 0.01):
+        self.capacity = max(1, capacity)
+        self.size = max(64, int(-self.capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / self.capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, digest: int):
+        first, second = digest & 0xFFFFFFFF, (digest >> 32) | 1
+        return ((first + i * second) % self.size for i in range(self.hashes))
+
+    def add(self, digest: int):
+        for position in self._positions(digest):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, digest: int) -> bool:
+        bits = self.bits
+        return all(bits[position >> 3] & (1 << (position & 7)) for position in self._positions(digest))
+
+
+class SignatureStore:
+    """Append-only records of (user key, content digest, previous record of the user, signature)
+
+    The file is memory-mapped and grown by doubling; a header holds the
+    signature width and the record count. Each record links to the same
+    user's previous record, so one user's signatures can be loaded without
+    scanning everyone else's. `path=None` keeps the records in memory only.
+    """
+
+    MAGIC = b'MHSIG01\0'
+    HEADER = struct.Struct('<8sIIQQ')
+    RECORD_HEAD = struct.Struct('<QQI4x')
+
+    def __init__(self, path: Optional[Path], num_perm: int, initial_capacity: int = 4096):
+        self.path = Path(path) if path else None
+        self.num_perm = num_perm
+        self.signature_format = struct.Struct(f'<{num_perm}I')
+        self.record_size = self.RECORD_HEAD.size + self.signature_format.size
+        self.count = 0
+        self.capacity = initial_capacity
+        self._file = None
+
+        if self.path is None:
+            self._buffer = bytearray(self._offset(self.capacity))
+            return
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        exists = self.path.exists() and self.path.stat().st_size >= self.HEADER.size
+        self._file = open(self.path, 'r+b' if exists else 'w+b')
+        if exists:
+            magic, stored_perm, _, self.count, self.capacity = self.HEADER.unpack(self._file.read(self.HEADER.size))
+            if magic != self.MAGIC or stored_perm != num_perm:
+                self._file.close()
+                raise ValueError(f"{self.path} is not a {num_perm}-wide signature store")
+        else:
+            self._file.truncate(self._offset(self.capacity))
+        self._buffer = mmap.mmap(self._file.fileno(), 0)
+        if not exists:
+            self._write_header()
+
+    def _offset(self, record: int) -> int:
+        return self.HEADER.size + record * self.record_size
+
+    def _write_header(self):
+        self.HEADER.pack_into(self._buffer, 0, self.MAGIC, self.num_perm, 0, self.count, self.capacity)
+
+    def _grow(self):
+        self.capacity *= 2
+        if self._file is None:
+            self._buffer.extend(bytes(self._offset(self.capacity) - len(self._buffer)))
+            return
+        self._buffer.close()
+        self._file.truncate(self._offset(self.capacity))
+        self._buffer = mmap.mmap(self._file.fileno(), 0)
+
+    def append(self, user: int, digest: int, previous: int, signature: List[int]) -> int:
+        """Store a record and return its number; `previous` is the user's last record number or -1"""
+        if self.count == self.capacity:
+            self._grow()
+        record, offset = self.count, self._offset(self.count)
+        self.RECORD_HEAD.pack_into(self._buffer, offset, user, digest, previous + 1)
+        self.signature_format.pack_into(self._buffer, offset + self.RECORD_HEAD.size, *signature)
+        self.count += 1
+        self._write_header()
+        return record
+
+    def head(self, record: int) -> Tuple[int, int, int]:
+        """(user key, digest, previous record number or -1)"""
+        user, digest, previous = self.RECORD_HEAD.unpack_from(self._buffer, self._offset(record))
+        return user, digest, previous - 1
+
+    def signature(self, record: int) -> Tuple[int, ...]:
+        return self.signature_format.unpack_from(self._buffer, self._offset(record) + self.RECORD_HEAD.size)
+
+    def flush(self):
+        if self._file is not None:
+            self._buffer.flush()
+
+    def close(self):
+        if self._file is not None:
+            self._buffer.flush()
+            self._buffer.close()
+            self._file.close()
+            self._file = None
+
+
+class _UserIndex:
+    """One user's digests and LSH buckets
+
+    All bands share one bucket dict (the band number is mixed into the key);
+    a bucket holding a single record stores the bare record number.
+    """
+    __slots__ = ('digests', 'buckets')
+
+    def __init__(self):
+        self.digests: Dict[int, int] = {}
+        self.buckets: Dict[int, Union[int, List[int]]] = {}
+
+    def add(self, record: int, digest: int, band_keys: List[int]):
+        self.digests.setdefault(digest, record)
+        buckets = self.buckets
+        for key in band_keys:
+            held = buckets.get(key)
+            if held is None:
+                buckets[key] = record
+            elif held.__class__ is int:
+                buckets[key] = [held, record]
+            else:
+                held.append(record)
+
+    def candidates(self, band_keys: List[int]) -> set:
+        found = set()
+        buckets = self.buckets
+        for key in band_keys:
+            held = buckets.get(key)
+            if held is None:
+                continue
+            if held.__class__ is int:
+                found.add(held)
+            else:
+                found.update(held)
+        return found
+
+
+@dataclass
+class DuplicateMatch:
+    record: int
+    digest: int
+    similarity: float
+
+
+class DuplicateIndex:
+    """Per-user exact and near-duplicate detection over a SignatureStore
+
+    `threshold` is the estimated Jaccard similarity of shingle sets from
+    which a text counts as a near-duplicate; setting it re-derives the LSH
+    banding, and user indexes are rebuilt from the store on next use.
+    At most `max_users` user indexes are kept in memory.
+    """
+
+    def __init__(self, path: Optional[Path] = None, threshold: float = 0.85, num_perm: int = 64,
+                 shingle_size: int = 5, max_users: Optional[int] = None,
+                 bloom_capacity: Optional[int] = None):
+        if num_perm & (num_perm - 1):
+            raise ValueError("num_perm must be a power of two")
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+        self.max_users = max_users or int(os.getenv('DUPLICATE_INDEXED_USERS', 4096))
+        self.store = SignatureStore(path, num_perm)
+        self.users: "OrderedDict[int, _UserIndex]" = OrderedDict()
+        self.stats = {'bloom_negative': 0, 'exact': 0, 'near': 0, 'candidates': 0, 'added': 0}
+
+        # Newest record of every user, and the Bloom filter, are rebuilt from the store
+        self.last_record: Dict[int, int] = {}
+        capacity = bloom_capacity or int(os.getenv('DUPLICATE_BLOOM_CAPACITY', 1_000_000))
+        self.bloom = BloomFilter(max(capacity, self.store.count * 2))
+        for record in range(self.store.count):
+            user, digest, _ = self.store.head(record)
+            self.last_record[user] = record
+            self.bloom.add(digest)
+
+        self.threshold = threshold
+
+    @property
+    def threshold(self) -> float:
+        return self._threshold
+
+    @threshold.setter
+    def threshold(self, value: float):
+        if not 0 < value <= 1:
+            raise ValueError("threshold must be in (0, 1]")
+        self._threshold = value
+        self.bands, self.rows = lsh_bands(self.num_perm, value)
+        self._spans = [(band * self.rows, (band + 1) * self.rows) for band in range(self.bands)]
+        self.users.clear()
+
+    def _band_keys(self, signature) -> List[int]:
+        signature = tuple(signature)
+        return [hash(signature[start:end]) * 31 + band for band, (start, end) in enumerate(self._spans)]
+
+    def _user_index(self, user: int) -> _UserIndex:
+        index = self.users.get(user)
+        if index is not None:
+            self.users.move_to_end(user)
+            return index
+
+        index = _UserIndex()
+        heads = []
+        record = self.last_record.get(user, -1)
+        while record >= 0:
+            _, digest, previous = self.store.head(record)
+            heads.append((record, digest))
+            record = previous
+        for record, digest in reversed(heads):
+            index.add(record, digest, self._band_keys(self.store.signature(record)))
+
+        self.users[user] = index
+        if len(self.users) > self.max_users:
+            self.users.popitem(last=False)
+        return index
+
+    def signature(self, content: str) -> List[int]:
+        return minhash_signature(shingle_hashes(content, self.shingle_size), self.num_perm)
+
+    def check(self, user_id: str, content: str, add: bool = True) -> Optional[DuplicateMatch]:
+        """The stored text this one duplicates (exactly, or at least `threshold` similar), else None
+
+        A new text is added to the index unless `add` is False.
+        """
+        user, digest = user_key(user_id), content_digest(user_id, content)
+        index = None
+        if digest in self.bloom:
+            index = self._user_index(user)
+            record = index.digests.get(digest)
+            if record is not None:
+                self.stats['exact'] += 1
+                return DuplicateMatch(record, digest, 1.0)
+        else:
+            self.stats['bloom_negative'] += 1
+
+        if self._threshold >= 1.0 and not add:
+            return None
+        signature = self.signature(content)
+        index = index or self._user_index(user)
+        band_keys = self._band_keys(signature)
+
+        if self._threshold < 1.0:
+            candidates = index.candidates(band_keys)
+            self.stats['candidates'] += len(candidates)
+
+            best, best_similarity = None, 0.0
+            for record in candidates:
+                stored = self.store.signature(record)
+                similarity = sum(map(int.__eq__, signature, stored)) / self.num_perm
+                if similarity > best_similarity:
+                    best, best_similarity = record, similarity
+            if best is not None and best_similarity >= self._threshold:
+                self.stats['near'] += 1
+                return DuplicateMatch(best, self.store.head(best)[1], best_similarity)
+
+        if add:
+            record = self.store.append(user, digest, self.last_record.get(user, -1), signature)
+            self.last_record[user] = record
+            self.bloom.add(digest)
+            if self.bloom.count > self.bloom.capacity:
+                self._rebuild_bloom()
+            index.add(record, digest, band_keys)
+            self.stats['added'] += 1
+        return None
+
+    def _rebuild_bloom(self):
+        self.bloom = BloomFilter(self.bloom.capacity * 2)
+        for record in range(self.store.count):
+            self.bloom.add(self.store.head(record)[1])
+
+    def __len__(self) -> int:
+        return self.store.count
+
+    def flush(self):
+        self.store.flush()
+
+    def close(self):
+        self.store.close()
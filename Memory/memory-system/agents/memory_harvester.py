@@ -16,7 +16,7 @@ import hashlib
 import json
 import re
 from datetime import datetime, timedelta
-from typing import Dict, List, Any, Optional, Union, Tuple
+from typing import Dict, List, Any, Optional, Union, Tuple, Iterable, AsyncIterable, AsyncIterator
 from dataclasses import dataclass, asdict
 from enum import Enum
 import aiofiles
@@ -106,7 +106,23 @@ class ValidationResult:
     issues: List[str]
     suggestions: List[str]
 
+@dataclass
+class _HarvestItem:
+    """An input on its way through the ingestion pipeline"""
+    raw_input: RawMemoryInput
+    start_time: datetime
+    content: Dict[str, Any] = None
+    metadata: Dict[str, Any] = None
+    context: Dict[str, Any] = None
+
+# Default bound of each queue between pipeline stages
+PIPELINE_QUEUE_SIZE = 64
+
+_MISSING = object()
+
 from .base_agent import BaseAgent, AgentCapability
+from .staged_pipeline import StagedPipeline, Stage, Finished
+from .duplicate_index import DuplicateIndex
 
 class MemoryHarvesterAgent(BaseAgent):
     """
@@ -126,7 +142,10 @@ class MemoryHarvesterAgent(BaseAgent):
         self.content_processors = {}
         self.quality_validators = {}
         self.metadata_extractors = {}
-        self.duplicate_detector = DuplicateDetector()
+        self.duplicate_detector = DuplicateDetector(
+            self.config.get('data_dir', 'memory-system/data'),
+            self.config.get('similarity_threshold', 0.85)
+        )
         self.adaptive_learner = AdaptiveLearner()
         
         # Performance metrics
@@ -137,6 +156,8 @@ class MemoryHarvesterAgent(BaseAgent):
             'processing_times': [],
             'error_count': 0
         }
+        # Latest ingestion pipeline, for its per-stage counters
+        self.pipeline: Optional[StagedPipeline] = None
         
         # Cache for frequently accessed data
         self.cache = {}
@@ -208,64 +229,17 @@ class MemoryHarvesterAgent(BaseAgent):
         """
         Main entry point for processing raw memory input
         """
-        start_time = datetime.now()
-        
         try:
             logger.info(f"Processing memory from {raw_input.source_type.value}")
             
-            # Step 1: Validate input
-            if not await self._validate_input(raw_input):
-                raise ValueError("Invalid input data")
-            
-            # Step 2: Detect and handle duplicates
-            duplicate_check = await self.duplicate_detector.check_duplicate(raw_input)
-            if duplicate_check.is_duplicate:
-                return await self._handle_duplicate(raw_input, duplicate_check)
-            
-            # Step 3: Process content based on source type
-            processed_content = await self._process_content_by_source(raw_input)
-            
-            # Step 4: Normalize content
-            normalized_content = await self._normalize_content(processed_content, raw_input)
-            
-            # Step 5: Extract metadata and context
-            metadata = await self._extract_metadata(raw_input, normalized_content)
-            context = await self._extract_context(normalized_content, metadata)
+            item = await self._intake_stage(raw_input)
+            if isinstance(item, Finished):
+                return item.value
+            for stage in (self._content_stage, self._metadata_stage, self._quality_stage):
+                item = await stage(item)
             
-            # Step 6: Validate quality
-            validation_result = await self._validate_quality(normalized_content, context)
-            
-            # Step 7: Enrich with additional data
-            enriched_data = await self._enrich_content(normalized_content, context, metadata)
-            
-            # Step 8: Create processed memory object
-            processed_memory = ProcessedMemory(
-                id=self._generate_memory_id(raw_input, normalized_content),
-                user_id=raw_input.user_id,
-                content=enriched_data['content'],
-                source_type=raw_input.source_type,
-                content_type=enriched_data['content_type'],
-                timestamp=raw_input.timestamp or datetime.now(),
-                participants=enriched_data['participants'],
-                context=context,
-                metadata=metadata,
-                quality_score=validation_result.quality_score,
-                quality_level=validation_result.quality_level,
-                language=enriched_data['language'],
-                sentiment=enriched_data['sentiment'],
-                tags=enriched_data['tags'],
-                location=enriched_data.get('location'),
-                attachments=enriched_data.get('attachments', [])
-            )
-            
-            # Step 9: Learn from processing
-            await self.adaptive_learner.learn_from_processing(raw_input, processed_memory)
-            
-            # Step 10: Update statistics
-            await self._update_processing_stats(raw_input, processed_memory, start_time)
-            
-            logger.info(f"✅ Memory processed successfully: {processed_memory.id}")
-            return processed_memory
+            logger.info(f"✅ Memory processed successfully: {item.id}")
+            return item
             
         except Exception as e:
             logger.error(f"Error processing memory: {e}")
@@ -278,17 +252,131 @@ class MemoryHarvesterAgent(BaseAgent):
         """
         logger.info(f"Processing batch of {len(raw_inputs)} memories")
         
-        # Group by source type for optimized processing
+        # Group by source type; results keep this grouped order
         grouped_inputs = self._group_by_source_type(raw_inputs)
+        ordered = [raw_input for inputs in grouped_inputs.values() for raw_input in inputs]
         
-        results = []
-        for source_type, inputs in grouped_inputs.items():
-            batch_results = await self._process_batch_by_source(source_type, inputs)
-            results.extend(batch_results)
+        results = [_MISSING] * len(ordered)
+        async for index, result, error in self._pipeline().run(ordered):
+            if error is None:
+                results[index] = result
+            else:
+                logger.error(f"Failed to process memory in batch: {error}")
+                await self._update_error_stats(ordered[index], error)
+        results = [result for result in results if result is not _MISSING]
         
         logger.info(f"✅ Batch processing complete: {len(results)} memories processed")
         return results
     
+    async def process_stream(self, raw_inputs: Union[Iterable[RawMemoryInput], AsyncIterable[RawMemoryInput]]
+                             ) -> AsyncIterator[ProcessedMemory]:
+        """
+        Process an unbounded stream of inputs through the staged pipeline
+        
+        Memories are yielded as they complete, not in input order; duplicates
+        and failures are skipped (and counted in the processing stats). Inputs
+        are pulled only as fast as the slowest stage drains them.
+        """
+        # Inputs by pipeline index, only while they are in flight
+        in_flight: Dict[int, RawMemoryInput] = {}
+        
+        async def tracked():
+            index = 0
+            if hasattr(raw_inputs, '__aiter__'):
+                async for raw_input in raw_inputs:
+                    in_flight[index] = raw_input
+                    index += 1
+                    yield raw_input
+            else:
+                for raw_input in raw_inputs:
+                    in_flight[index] = raw_input
+                    index += 1
+                    yield raw_input
+        
+        async for index, result, error in self._pipeline().run(tracked()):
+            raw_input = in_flight.pop(index)
+            if error is not None:
+                logger.error(f"Failed to process memory in stream: {error}")
+                await self._update_error_stats(raw_input, error)
+            elif result is not None:
+                yield result
+    
+    def _pipeline(self) -> StagedPipeline:
+        """Ingestion pipeline: intake -> content -> metadata -> quality
+        
+        Worker counts and queue sizes come from config['pipeline'][stage].
+        Intake keeps a single worker so duplicates are detected in input order.
+        """
+        config = self.config.get('pipeline', {})
+        stages = []
+        for name, handler, workers in (('intake', self._intake_stage, 1),
+                                       ('content', self._content_stage, 4),
+                                       ('metadata', self._metadata_stage, 4),
+                                       ('quality', self._quality_stage, 4)):
+            options = config.get(name, {})
+            stages.append(Stage(name, handler,
+                                workers=options.get('workers', workers),
+                                queue_size=options.get('queue_size', PIPELINE_QUEUE_SIZE)))
+        pipeline = StagedPipeline(stages, output_queue_size=config.get('output_queue_size', PIPELINE_QUEUE_SIZE))
+        self.pipeline = pipeline
+        return pipeline
+    
+    # Pipeline stages - process_memory runs them back to back for one input
+    
+    async def _intake_stage(self, raw_input: RawMemoryInput):
+        """Steps 1-2: validate input and detect duplicates"""
+        start_time = datetime.now()
+        if not await self._validate_input(raw_input):
+            raise ValueError("Invalid input data")
+        
+        duplicate_check = await self.duplicate_detector.check_duplicate(raw_input)
+        if duplicate_check.is_duplicate:
+            return Finished(await self._handle_duplicate(raw_input, duplicate_check))
+        return _HarvestItem(raw_input, start_time)
+    
+    async def _content_stage(self, item: _HarvestItem) -> _HarvestItem:
+        """Steps 3-4: source-specific processing and normalization"""
+        processed_content = await self._process_content_by_source(item.raw_input)
+        item.content = await self._normalize_content(processed_content, item.raw_input)
+        return item
+    
+    async def _metadata_stage(self, item: _HarvestItem) -> _HarvestItem:
+        """Step 5: metadata and context"""
+        item.metadata = await self._extract_metadata(item.raw_input, item.content)
+        item.context = await self._extract_context(item.content, item.metadata)
+        return item
+    
+    async def _quality_stage(self, item: _HarvestItem) -> ProcessedMemory:
+        """Steps 6-10: quality, enrichment, the memory object, learning and stats"""
+        raw_input, normalized_content = item.raw_input, item.content
+        context, metadata = item.context, item.metadata
+        
+        validation_result = await self._validate_quality(normalized_content, context)
+        enriched_data = await self._enrich_content(normalized_content, context, metadata)
+        
+        processed_memory = ProcessedMemory(
+            id=self._generate_memory_id(raw_input, normalized_content),
+            user_id=raw_input.user_id,
+            content=enriched_data['content'],
+            source_type=raw_input.source_type,
+            content_type=enriched_data['content_type'],
+            timestamp=raw_input.timestamp or datetime.now(),
+            participants=enriched_data['participants'],
+            context=context,
+            metadata=metadata,
+            quality_score=validation_result.quality_score,
+            quality_level=validation_result.quality_level,
+            language=enriched_data['language'],
+            sentiment=enriched_data['sentiment'],
+            tags=enriched_data['tags'],
+            location=enriched_data.get('location'),
+            attachments=enriched_data.get('attachments', [])
+        )
+        
+        await self.adaptive_learner.learn_from_processing(raw_input, processed_memory)
+        await self._update_processing_stats(raw_input, processed_memory, item.start_time)
+        return processed_memory
+    
     async def _initialize_content_processors(self):
         """Initialize content processors for different source types"""
         self.content_processors = {
@@ -353,14 +441,16 @@ class MemoryHarvesterAgent(BaseAgent):
         """Extract comprehensive metadata from content"""
         metadata = {}
         
-        # Extract metadata using all extractors
-        for name, extractor in self.metadata_extractors.items():
-            try:
-                extracted = await extractor.extract(raw_input, normalized_content)
-                metadata[name] = extracted
-            except Exception as e:
-                logger.warning(f"Metadata extraction failed for {name}: {e}")
-                metadata[name] = {}
+        # Run all extractors concurrently
+        extracted = await asyncio.gather(
+            *(extractor.extract(raw_input, normalized_content) for extractor in self.metadata_extractors.values()),
+            return_exceptions=True
+        )
+        for name, result in zip(self.metadata_extractors, extracted):
+            if isinstance(result, Exception):
+                logger.warning(f"Metadata extraction failed for {name}: {result}")
+                result = {}
+            metadata[name] = result
         
         # Add processing metadata
         metadata['processing'] = {
@@ -382,12 +472,16 @@ class MemoryHarvesterAgent(BaseAgent):
         """Validate content quality using multiple validators"""
         validation_results = []
         
-        for name, validator in self.quality_validators.items():
-            try:
-                result = await validator.validate(normalized_content, context)
+        # Run all validators concurrently
+        results = await asyncio.gather(
+            *(validator.validate(normalized_content, context) for validator in self.quality_validators.values()),
+            return_exceptions=True
+        )
+        for name, result in zip(self.quality_validators, results):
+            if isinstance(result, Exception):
+                logger.warning(f"Quality validation failed for {name}: {result}")
+            else:
                 validation_results.append(result)
-            except Exception as e:
-                logger.warning(f"Quality validation failed for {name}: {e}")
         
         # Combine validation results
         return self._combine_validation_results(validation_results)
@@ -436,27 +530,6 @@ class MemoryHarvesterAgent(BaseAgent):
             grouped[raw_input.source_type].append(raw_input)
         return grouped
     
-    async def _process_batch_by_source(self, source_type: SourceType, 
-                                      inputs: List[RawMemoryInput]) -> List[ProcessedMemory]:
-        """Process batch of inputs from same source type"""
-        processor = self.content_processors.get(source_type)
-        if not processor:
-            raise ValueError(f"No processor for source type: {source_type}")
-        
-        # Use processor's batch processing if available
-        if hasattr(processor, 'process_batch'):
-            return await processor.process_batch(inputs)
-        else:
-            # Fall back to individual processing
-            results = []
-            for raw_input in inputs:
-                try:
-                    result = await self.process_memory(raw_input)
-                    results.append(result)
-                except Exception as e:
-                    logger.error(f"Failed to process memory in batch: {e}")
-            return results
-    
     def _combine_validation_results(self, results: List[ValidationResult]) -> ValidationResult:
         """Combine multiple validation results into single result"""
         if not results:
@@ -550,6 +623,8 @@ class MemoryHarvesterAgent(BaseAgent):
             stats['avg_processing_time'] = sum(stats['processing_times']) / len(stats['processing_times'])
             stats['max_processing_time'] = max(stats['processing_times'])
             stats['min_processing_time'] = min(stats['processing_times'])
+        if self.pipeline:
+            stats['pipeline'] = self.pipeline.stats.to_dict()
         
         return stats
     
@@ -581,37 +656,51 @@ class MemoryHarvesterAgent(BaseAgent):
 # Supporting Classes
 
 class DuplicateDetector:
-    """Detects duplicate memories using multiple strategies"""
+    """Detects exact and near-duplicate memories per user
     
-    def __init__(self):
-        self.content_hashes = set()
-        self.similarity_threshold = 0.85
+    Backed by a DuplicateIndex: MinHash/LSH signatures persisted under
+    `data_dir` (in memory only when it is None). `similarity_threshold` is the
+    estimated shingle similarity from which content counts as a duplicate;
+    1.0 keeps exact matches only.
+    """
+    
+    def __init__(self, data_dir: Optional[str] = None, similarity_threshold: float = 0.85):
+        self.data_dir = Path(data_dir) if data_dir else None
+        self._similarity_threshold = similarity_threshold
+        self.index: Optional[DuplicateIndex] = None
+    
+    @property
+    def similarity_threshold(self) -> float:
+        return self._similarity_threshold
+    
+    @similarity_threshold.setter
+    def similarity_threshold(self, value: float):
+        self._similarity_threshold = value
+        if self.index is not None:
+            self.index.threshold = value
     
     async def initialize(self):
-        """Initialize duplicate detection"""
-        # Load existing content hashes from database
-        pass
+        """Open the signature store and rebuild the in-memory filters from it"""
+        if self.index is not None:
+            return
+        path = self.data_dir / "content_signatures.idx" if self.data_dir else None
+        self.index = DuplicateIndex(path, threshold=self._similarity_threshold)
+        logger.info(f"Duplicate index loaded: {len(self.index)} signatures")
     
     async def check_duplicate(self, raw_input: RawMemoryInput) -> 'DuplicateCheckResult':
         """Check if memory is duplicate"""
-        content_str = str(raw_input.content)
-        content_hash = hashlib.sha256(content_str.encode()).hexdigest()
+        if self.index is None:
+            await self.initialize()
         
-        # Exact match check
-        if content_hash in self.content_hashes:
+        match = self.index.check(raw_input.user_id or '', str(raw_input.content))
+        if match is not None:
             return DuplicateCheckResult(
                 is_duplicate=True,
-                similarity_score=1.0,
-                original_id=f"hash_{content_hash}",
+                similarity_score=match.similarity,
+                original_id=f"hash_{match.digest:016x}",
                 original_memory=None  # Would fetch from database
             )
         
-        # Similarity check (simplified - would use more sophisticated algorithms)
-        # This is where you'd implement fuzzy matching, semantic similarity, etc.
-        
-        # Add to known hashes
-        self.content_hashes.add(content_hash)
-        
         return DuplicateCheckResult(
             is_duplicate=False,
             similarity_score=0.0,
@@ -620,8 +709,10 @@ class DuplicateDetector:
         )
     
     async def shutdown(self):
-        """Shutdown duplicate detector"""
-        pass
+        """Flush and close the signature store"""
+        if self.index is not None:
+            self.index.close()
+            self.index = None
 
 @dataclass
 class DuplicateCheckResult:
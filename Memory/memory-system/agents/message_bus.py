@@ -0,0 +1,458 @@
+"""
+Agent Message Bus
+Delivers AgentMessages between agents through bounded mailboxes. The
+in-process bus keeps the mailboxes in the current event loop; the socket bus
+talks to a MessageBroker over a Unix domain socket, so agents in other
+processes share the same mailboxes. Several consumers may receive from one
+mailbox, which is how an agent type is spread over the cores of a host.
+"""
+
+import os
+import json
+import uuid
+import struct
+import asyncio
+import logging
+import itertools
+import importlib
+import multiprocessing
+import weakref
+from abc import ABC, abstractmethod
+from collections import Counter
+from datetime import date, datetime
+from enum import Enum
+from typing import Any, Dict, List, Optional
+
+from .base_agent import AgentMessage
+
+logger = logging.getLogger(__name__)
+
+# Messages a mailbox holds before senders wait (AGENT_MAILBOX_SIZE overrides)
+MAILBOX_SIZE = int(os.getenv('AGENT_MAILBOX_SIZE', 1000))
+
+# Message types of the answer to a request
+REPLY = "reply"
+ERROR_REPLY = "error_reply"
+
+# Largest frame accepted on the broker socket
+MAX_FRAME_SIZE = 64 * 1024 * 1024
+
+_HEADER = struct.Struct('>I')
+
+
+class MessageBusError(Exception):
+    """Base class for message bus errors"""
+
+
+class UnknownAgentError(MessageBusError, LookupError):
+    """No mailbox is registered for the agent"""
+
+
+class MailboxFullError(MessageBusError):
+    """The recipient's mailbox stayed full for the whole send timeout"""
+
+
+class AgentRequestError(MessageBusError):
+    """The recipient failed to handle a request"""
+
+
+class MessageBus(ABC):
+    """Mailbox registry and delivery; subclasses decide where the mailboxes live"""
+
+    def __init__(self):
+        self._replies: Dict[str, asyncio.Future] = {}
+        self._reply_box: Optional[str] = None
+        self._reply_listener: Optional[asyncio.Task] = None
+        self._reply_lock: Optional[asyncio.Lock] = None
+
+    @abstractmethod
+    async def register(self, agent_id: str, capacity: Optional[int] = None):
+        """Create the agent's mailbox, or join it if another consumer already has"""
+
+    @abstractmethod
+    async def unregister(self, agent_id: str):
+        """Leave the agent's mailbox; it is dropped when its last consumer leaves"""
+
+    @abstractmethod
+    async def publish(self, message: AgentMessage, timeout: Optional[float] = None):
+        """Deliver to the recipient's mailbox, waiting up to `timeout` while it is full"""
+
+    @abstractmethod
+    async def receive(self, agent_id: str, max_messages: int = 1,
+                      timeout: Optional[float] = None) -> List[AgentMessage]:
+        """Up to `max_messages` waiting messages; waits up to `timeout` for the first"""
+
+    async def request(self, message: AgentMessage, timeout: Optional[float] = None) -> Dict[str, Any]:
+        """Send `message` and return the content of the reply with its correlation id"""
+        await self._listen_for_replies()
+        message.correlation_id = message.correlation_id or uuid.uuid4().hex
+        message.reply_to = self._reply_box
+
+        future = asyncio.get_running_loop().create_future()
+        self._replies[message.correlation_id] = future
+        try:
+            reply = await asyncio.wait_for(self._send_and_wait(message, future), timeout)
+        finally:
+            self._replies.pop(message.correlation_id, None)
+
+        if reply.message_type == ERROR_REPLY:
+            raise AgentRequestError(reply.content.get('error', 'request failed'))
+        return reply.content
+
+    async def _send_and_wait(self, message: AgentMessage, future: asyncio.Future) -> AgentMessage:
+        await self.publish(message)
+        return await future
+
+    async def _listen_for_replies(self):
+        if self._reply_listener is not None:
+            return
+        if self._reply_lock is None:
+            self._reply_lock = asyncio.Lock()
+        async with self._reply_lock:
+            if self._reply_listener is None:
+                self._reply_box = f"_replies.{uuid.uuid4().hex}"
+                await self.register(self._reply_box)
+                self._reply_listener = asyncio.create_task(self._route_replies())
+
+    async def _route_replies(self):
+        try:
+            while True:
+                for reply in await self.receive(self._reply_box, 256):
+                    future = self._replies.get(reply.correlation_id)
+                    if future is not None and not future.done():
+                        future.set_result(reply)
+        except ConnectionError as e:
+            for future in self._replies.values():
+                if not future.done():
+                    future.set_exception(e)
+
+    async def close(self):
+        """Stop routing replies and drop the reply mailbox"""
+        if self._reply_listener is not None:
+            self._reply_listener.cancel()
+            self._reply_listener = None
+            try:
+                await self.unregister(self._reply_box)
+            except (MessageBusError, ConnectionError):
+                pass
+
+
+async def _take(mailbox: asyncio.Queue, max_messages: int, timeout: Optional[float]) -> list:
+    """Up to `max_messages` items, waiting up to `timeout` for the first"""
+    batch = []
+    if mailbox.empty():
+        if timeout is not None and timeout <= 0:
+            return batch
+        try:
+            batch.append(await asyncio.wait_for(mailbox.get(), timeout))
+        except asyncio.TimeoutError:
+            return batch
+    while len(batch) < max_messages and not mailbox.empty():
+        batch.append(mailbox.get_nowait())
+    return batch
+
+
+class InProcessMessageBus(MessageBus):
+    """Mailboxes as bounded asyncio queues, for agents sharing an event loop"""
+
+    def __init__(self):
+        super().__init__()
+        self.mailboxes: Dict[str, asyncio.Queue] = {}
+        self._consumers: Counter = Counter()
+
+    async def register(self, agent_id: str, capacity: Optional[int] = None):
+        if agent_id not in self.mailboxes:
+            self.mailboxes[agent_id] = asyncio.Queue(maxsize=max(1, capacity or MAILBOX_SIZE))
+        self._consumers[agent_id] += 1
+
+    async def unregister(self, agent_id: str):
+        self._consumers[agent_id] -= 1
+        if self._consumers[agent_id] <= 0:
+            del self._consumers[agent_id]
+            self.mailboxes.pop(agent_id, None)
+
+    def _mailbox(self, agent_id: str) -> asyncio.Queue:
+        try:
+            return self.mailboxes[agent_id]
+        except KeyError:
+            raise UnknownAgentError(f"No mailbox registered for agent {agent_id}") from None
+
+    async def publish(self, message: AgentMessage, timeout: Optional[float] = None):
+        mailbox = self._mailbox(message.recipient_id)
+        try:
+            mailbox.put_nowait(message)
+            return
+        except asyncio.QueueFull:
+            if timeout is not None and timeout <= 0:
+                raise MailboxFullError(f"Mailbox of {message.recipient_id} is full") from None
+
+        try:
+            await asyncio.wait_for(mailbox.put(message), timeout)
+        except asyncio.TimeoutError:
+            raise MailboxFullError(f"Mailbox of {message.recipient_id} stayed full for {timeout}s") from None
+
+    async def receive(self, agent_id: str, max_messages: int = 1,
+                      timeout: Optional[float] = None) -> List[AgentMessage]:
+        return await _take(self._mailbox(agent_id), max_messages, timeout)
+
+
+_default_buses: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, InProcessMessageBus]" = \
+    weakref.WeakKeyDictionary()
+
+
+def default_message_bus() -> InProcessMessageBus:
+    """The in-process bus shared by agents on the running event loop"""
+    loop = asyncio.get_running_loop()
+    bus = _default_buses.get(loop)
+    if bus is None:
+        bus = _default_buses[loop] = InProcessMessageBus()
+    return bus
+
+
+# ==================== SOCKET TRANSPORT ====================
+
+def _json_default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Enum):
+        return value.value
+    if isinstance(value, (set, frozenset, tuple)):
+        return list(value)
+    raise TypeError(f"Message content of type {type(value).__name__} cannot cross processes")
+
+
+def _frame(payload: Dict[str, Any]) -> bytes:
+    data = json.dumps(payload, default=_json_default, separators=(',', ':')).encode('utf-8')
+    return _HEADER.pack(len(data)) + data
+
+
+async def _read_frame(reader: asyncio.StreamReader) -> Optional[Dict[str, Any]]:
+    try:
+        header = await reader.readexactly(_HEADER.size)
+    except asyncio.IncompleteReadError:
+        return None
+    size, = _HEADER.unpack(header)
+    if size > MAX_FRAME_SIZE:
+        raise ConnectionError(f"Frame of {size} bytes exceeds the {MAX_FRAME_SIZE} byte limit")
+    return json.loads(await reader.readexactly(size))
+
+
+_ERRORS = {cls.__name__: cls for cls in (UnknownAgentError, MailboxFullError, MessageBusError)}
+
+
+class MessageBroker:
+    """Owns the mailboxes for socket bus clients; one per host, in any process
+
+    Frames are a 4-byte length and a JSON object. Each request carries an id
+    echoed in its response, so a client multiplexes blocking receives and
+    sends over one connection. A client's mailbox registrations are released
+    when its connection closes.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.bus = InProcessMessageBus()
+        self.server: Optional[asyncio.AbstractServer] = None
+        self._clients = set()
+
+    async def start(self):
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        self.server = await asyncio.start_unix_server(self._serve, path=self.path)
+        os.chmod(self.path, 0o600)
+        logger.info(f"📮 Message broker listening on {self.path}")
+
+    async def close(self):
+        if self.server:
+            self.server.close()
+            clients = list(self._clients)
+            for writer in clients:
+                writer.close()
+            await asyncio.gather(*(writer.wait_closed() for writer in clients), return_exceptions=True)
+            await self.server.wait_closed()
+            self.server = None
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+    async def _serve(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        registered: Counter = Counter()
+        pending = set()
+        self._clients.add(writer)
+        try:
+            while True:
+                request = await _read_frame(reader)
+                if request is None:
+                    break
+                task = asyncio.create_task(self._answer(request, writer, registered))
+                pending.add(task)
+                task.add_done_callback(pending.discard)
+        except (ConnectionError, ValueError) as e:
+            logger.warning(f"Dropping message bus client: {e}")
+        finally:
+            for task in pending:
+                task.cancel()
+            for agent_id, count in registered.items():
+                for _ in range(count):
+                    await self.bus.unregister(agent_id)
+            self._clients.discard(writer)
+            writer.close()
+
+    async def _answer(self, request: Dict[str, Any], writer: asyncio.StreamWriter, registered: Counter):
+        response = {'rid': request.get('rid')}
+        try:
+            response['result'] = await self._handle(request, registered)
+        except MessageBusError as e:
+            response['error'] = e.__class__.__name__
+            response['message'] = str(e)
+        except Exception as e:
+            response['error'] = MessageBusError.__name__
+            response['message'] = f"{e.__class__.__name__}: {e}"
+        if not writer.is_closing():
+            writer.write(_frame(response))
+
+    async def _handle(self, request: Dict[str, Any], registered: Counter):
+        op = request['op']
+        if op == 'publish':
+            await self.bus.publish(AgentMessage.from_dict(request['message']), request.get('timeout'))
+        elif op == 'receive':
+            messages = await self.bus.receive(request['agent_id'], request.get('max_messages', 1),
+                                              request.get('timeout'))
+            return [message.to_dict() for message in messages]
+        elif op == 'register':
+            await self.bus.register(request['agent_id'], request.get('capacity'))
+            registered[request['agent_id']] += 1
+        elif op == 'unregister':
+            if registered[request['agent_id']] > 0:
+                registered[request['agent_id']] -= 1
+                await self.bus.unregister(request['agent_id'])
+        else:
+            raise MessageBusError(f"Unknown operation {op}")
+        return None
+
+
+class SocketMessageBus(MessageBus):
+    """Client of a MessageBroker on a Unix domain socket
+
+    Message content must be JSON-serialisable; datetimes and enums arrive as
+    ISO strings and values.
+    """
+
+    def __init__(self, path: str):
+        super().__init__()
+        self.path = path
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._reader_task: Optional[asyncio.Task] = None
+        self._calls: Dict[int, asyncio.Future] = {}
+        self._ids = itertools.count()
+        self._connect_lock: Optional[asyncio.Lock] = None
+
+    async def _connect(self):
+        if self._connect_lock is None:
+            self._connect_lock = asyncio.Lock()
+        async with self._connect_lock:
+            if self._writer is None:
+                reader, self._writer = await asyncio.open_unix_connection(self.path)
+                self._reader_task = asyncio.create_task(self._read_responses(reader))
+
+    async def _read_responses(self, reader: asyncio.StreamReader):
+        error: Exception = ConnectionError("Message broker closed the connection")
+        try:
+            while True:
+                response = await _read_frame(reader)
+                if response is None:
+                    break
+                future = self._calls.pop(response['rid'], None)
+                if future is not None and not future.done():
+                    future.set_result(response)
+        except (ConnectionError, ValueError) as e:
+            error = ConnectionError(f"Message broker connection failed: {e}")
+        finally:
+            self._writer = None
+            for future in self._calls.values():
+                if not future.done():
+                    future.set_exception(error)
+            self._calls.clear()
+
+    async def _call(self, op: str, **arguments):
+        if self._writer is None:
+            await self._connect()
+        rid = next(self._ids)
+        future = asyncio.get_running_loop().create_future()
+        self._calls[rid] = future
+        try:
+            self._writer.write(_frame(dict(arguments, op=op, rid=rid)))
+            await self._writer.drain()
+            response = await future
+        finally:
+            self._calls.pop(rid, None)
+
+        if 'error' in response:
+            raise _ERRORS.get(response['error'], MessageBusError)(response.get('message'))
+        return response.get('result')
+
+    async def register(self, agent_id: str, capacity: Optional[int] = None):
+        await self._call('register', agent_id=agent_id, capacity=capacity)
+
+    async def unregister(self, agent_id: str):
+        await self._call('unregister', agent_id=agent_id)
+
+    async def publish(self, message: AgentMessage, timeout: Optional[float] = None):
+        await self._call('publish', message=message.to_dict(), timeout=timeout)
+
+    async def receive(self, agent_id: str, max_messages: int = 1,
+                      timeout: Optional[float] = None) -> List[AgentMessage]:
+        messages = await self._call('receive', agent_id=agent_id, max_messages=max_messages, timeout=timeout)
+        return [AgentMessage.from_dict(message) for message in messages]
+
+    async def close(self):
+        if self._writer is not None:
+            await super().close()
+        if self._writer is not None:
+            self._writer.close()
+        if self._reader_task is not None:
+            self._reader_task.cancel()
+            self._reader_task = None
+
+
+# ==================== AGENT PROCESSES ====================
+
+def spawn_agent_process(agent_class: str, path: str, agent_id: Optional[str] = None,
+                        config: Optional[Dict[str, Any]] = None,
+                        concurrency: Optional[int] = None) -> multiprocessing.Process:
+    """Run an agent in a new process, serving its mailbox on the broker at `path`
+
+    `agent_class` is "module:Class", e.g.
+    "agents.pattern_analyzer:PatternAnalyzerAgent"; `config` must be
+    picklable. Processes started with the same agent id consume one mailbox,
+    so each extra process adds a core to that agent.
+    """
+    process = multiprocessing.get_context('spawn').Process(
+        target=_run_agent_process,
+        args=(agent_class, path, agent_id, config or {}, concurrency),
+        daemon=True
+    )
+    process.start()
+    return process
+
+
+def _run_agent_process(agent_class: str, path: str, agent_id: Optional[str],
+                       config: Dict[str, Any], concurrency: Optional[int]):
+    asyncio.run(_serve_agent(agent_class, path, agent_id, config, concurrency))
+
+
+async def _serve_agent(agent_class: str, path: str, agent_id: Optional[str],
+                       config: Dict[str, Any], concurrency: Optional[int]):
+    module_name, class_name = agent_class.split(':')
+    cls = getattr(importlib.import_module(module_name), class_name)
+    bus = SocketMessageBus(path)
+    arguments = {'config': dict(config, message_bus=bus)}
+    if agent_id:
+        arguments['agent_id'] = agent_id
+
+    agent = cls(**arguments)
+    await agent.initialize()
+    try:
+        await agent.serve(concurrency=concurrency)
+    finally:
+        await agent.shutdown()
+        await bus.close()
@@ -10,10 +10,11 @@ import numpy as np
 import pandas as pd
 from datetime import datetime, timedelta
 from typing import Dict, List, Any, Optional, Tuple, Set
-from dataclasses import dataclass, asdict
+from dataclasses import dataclass, asdict, fields
 from enum import Enum
 from collections import defaultdict, Counter
 import hashlib
+import math
 import statistics
 from sklearn.cluster import DBSCAN, KMeans
 from sklearn.preprocessing import StandardScaler
@@ -24,6 +25,7 @@ import re
 
 # Base agent imports
 from .base_agent import BaseAgent, AgentMessage, AgentCapability, AgentState
+from .pattern_state import PatternState
 
 class PatternType(Enum):
     """Types of patterns that can be detected"""
@@ -140,6 +142,7 @@ class PatternAnalyzerAgent(BaseAgent):
         self.behavioral_habits: Dict[str, BehavioralHabit] = {}
         self.routine_predictions: Dict[str, RoutinePrediction] = {}
         self.behavioral_insights: Dict[str, BehavioralInsight] = {}
+        self.pattern_states: Dict[str, PatternState] = {}
         
         # Analysis engines
         self.temporal_analyzer = None
@@ -241,100 +244,62 @@ class PatternAnalyzerAgent(BaseAgent):
             )
         ]
     
-    async def process_message(self, message: AgentMessage) -> Optional[AgentMessage]:
-        """Process incoming messages"""
+    async def process_message(self, message: AgentMessage) -> Optional[Dict[str, Any]]:
+        """Process incoming messages; the returned payload is the reply to a request
+        
+        Errors are raised, so serve() answers the request with an error reply.
+        """
         
         try:
-            if message.type == "analyze_patterns":
+            if message.message_type == "analyze_patterns":
                 # Analyze patterns from memory data
-                memories = message.payload.get("memories", [])
+                memories = message.content.get("memories", [])
                 patterns = await self._analyze_patterns_from_memories(memories)
                 
-                return AgentMessage(
-                    id=f"response_{message.id}",
-                    type="patterns_analyzed",
-                    sender_id=self.agent_id,
-                    recipient_id=message.sender_id,
-                    payload={"detected_patterns": patterns},
-                    timestamp=asyncio.get_event_loop().time()
-                )
+                return {"detected_patterns": patterns}
             
-            elif message.type == "identify_habits":
+            elif message.message_type == "identify_habits":
                 # Identify behavioral habits
-                behavioral_data = message.payload.get("behavioral_data", {})
+                behavioral_data = message.content.get("behavioral_data", {})
                 habits = await self._identify_habits_from_data(behavioral_data)
                 
-                return AgentMessage(
-                    id=f"response_{message.id}",
-                    type="habits_identified",
-                    sender_id=self.agent_id,
-                    recipient_id=message.sender_id,
-                    payload={"behavioral_habits": habits},
-                    timestamp=asyncio.get_event_loop().time()
-                )
+                return {"behavioral_habits": habits}
             
-            elif message.type == "predict_routines":
+            elif message.message_type == "predict_routines":
                 # Predict future routines
-                context_data = message.payload.get("context_data", {})
+                context_data = message.content.get("context_data", {})
                 predictions = await self._predict_routines(context_data)
                 
-                return AgentMessage(
-                    id=f"response_{message.id}",
-                    type="routines_predicted",
-                    sender_id=self.agent_id,
-                    recipient_id=message.sender_id,
-                    payload={"routine_predictions": predictions},
-                    timestamp=asyncio.get_event_loop().time()
-                )
+                return {"routine_predictions": predictions}
             
-            elif message.type == "generate_insights":
+            elif message.message_type == "generate_insights":
                 # Generate behavioral insights
-                analysis_data = message.payload.get("analysis_data", {})
+                analysis_data = message.content.get("analysis_data", {})
                 insights = await self._generate_behavioral_insights(analysis_data)
                 
-                return AgentMessage(
-                    id=f"response_{message.id}",
-                    type="insights_generated",
-                    sender_id=self.agent_id,
-                    recipient_id=message.sender_id,
-                    payload={"behavioral_insights": insights},
-                    timestamp=asyncio.get_event_loop().time()
-                )
+                return {"behavioral_insights": insights}
             
-            elif message.type == "analyze_trends":
+            elif message.message_type == "analyze_trends":
                 # Analyze behavioral trends
-                historical_data = message.payload.get("historical_data", {})
+                historical_data = message.content.get("historical_data", {})
                 trends = await self._analyze_behavioral_trends(historical_data)
                 
-                return AgentMessage(
-                    id=f"response_{message.id}",
-                    type="trends_analyzed",
-                    sender_id=self.agent_id,
-                    recipient_id=message.sender_id,
-                    payload={"trend_analysis": trends},
-                    timestamp=asyncio.get_event_loop().time()
-                )
+                return {"trend_analysis": trends}
             
-            elif message.type == "get_pattern_stats":
+            elif message.message_type == "get_pattern_stats":
                 # Return pattern analysis statistics
                 stats = await self._get_pattern_statistics()
                 
-                return AgentMessage(
-                    id=f"response_{message.id}",
-                    type="pattern_stats_response",
-                    sender_id=self.agent_id,
-                    recipient_id=message.sender_id,
-                    payload={"pattern_stats": stats},
-                    timestamp=asyncio.get_event_loop().time()
-                )
+                return {"pattern_stats": stats}
             
             else:
-                self.logger.warning(f"Unknown message type: {message.type}")
+                self.logger.warning(f"Unknown message type: {message.message_type}")
                 return None
                 
         except Exception as e:
-            self.logger.error(f"Error processing message {message.type}: {e}")
-            return self._create_error_response(message, str(e))
+            self.logger.error(f"Error processing message {message.message_type}: {e}")
+            self.statistics['errors'] += 1
+            raise
     
     async def _initialize_components(self):
         """Initialize agent-specific components (required by BaseAgent)"""
@@ -347,10 +312,7 @@ class PatternAnalyzerAgent(BaseAgent):
     
     async def _handle_message(self, message: AgentMessage) -> Optional[Dict[str, Any]]:
         """Handle incoming message (required by BaseAgent)"""
-        response = await self.process_message(message)
-        if response:
-            return asdict(response) if hasattr(response, '__dict__') else response
-        return None
+        return await self.process_message(message)
     
     # ==================== PATTERN DETECTION ====================
     
@@ -381,22 +343,10 @@ class PatternAnalyzerAgent(BaseAgent):
             social_patterns = await self._detect_social_patterns(analysis_data)
             detected_patterns.extend(social_patterns)
             
-            # Location pattern detection
-            location_patterns = await self._detect_location_patterns(analysis_data)
-            detected_patterns.extend(location_patterns)
-            
             # Emotional pattern detection
             emotional_patterns = await self._detect_emotional_patterns(analysis_data)
             detected_patterns.extend(emotional_patterns)
             
-            # Activity pattern detection
-            activity_patterns = await self._detect_activity_patterns(analysis_data)
-            detected_patterns.extend(activity_patterns)
-            
-            # Communication pattern detection
-            communication_patterns = await self._detect_communication_patterns(analysis_data)
-            detected_patterns.extend(communication_patterns)
-            
             # Filter and rank patterns by strength
             filtered_patterns = await self._filter_and_rank_patterns(detected_patterns)
             
@@ -417,6 +367,103 @@ class PatternAnalyzerAgent(BaseAgent):
             self.logger.error(f"Pattern analysis failed: {e}")
             return []
     
+    async def update_user_patterns(self, user_id: str, memories: List[Dict[str, Any]],
+                                   state: Optional[PatternState] = None) -> List[Dict[str, Any]]:
+        """Fold memories the user's pattern state has not seen into it and derive patterns from it
+        
+        Returns what ``_analyze_patterns_from_memories`` would for every
+        memory the state has seen, ordered by (timestamp, id), at the cost of
+        the new memories only. `state` replaces the one held for the user,
+        e.g. after loading it from storage. Unlike the other analyses this
+        raises on failure, after dropping the user's state; a new memory
+        older than the state's watermark is a failure, as the state must then
+        be rebuilt from every memory.
+        """
+        
+        if state is None:
+            state = self.pattern_states.setdefault(user_id, PatternState())
+        else:
+            self.pattern_states[user_id] = state
+        
+        start_time = asyncio.get_event_loop().time()
+        
+        try:
+            new_memories = state.select_new(memories)
+            if not state.follows_watermark(new_memories):
+                raise ValueError(f"Memories older than the pattern state of {user_id}; rebuild it")
+            if new_memories:
+                state.update(await self._prepare_memory_data_for_analysis(new_memories))
+            
+            filtered_patterns = await self._filter_and_rank_patterns(self._derive_patterns(state))
+            
+            for pattern in filtered_patterns:
+                self.detected_patterns[pattern.id] = pattern
+            
+            self.analysis_stats['patterns_detected'] += len(filtered_patterns)
+            processing_time = asyncio.get_event_loop().time() - start_time
+            self.analysis_stats['processing_times'].append(processing_time)
+            
+            self.logger.info(f"Detected {len(filtered_patterns)} patterns for {user_id} "
+                             f"({len(new_memories)} new of {state.memories} memories)")
+            
+            # Shallow: asdict() would deep-copy every daily pattern's list of
+            # supporting memories, making each run cost as much as the history
+            return [{field.name: getattr(pattern, field.name) for field in fields(pattern)}
+                    for pattern in filtered_patterns]
+        
+        except Exception as e:
+            # A half-updated state must not be kept, let alone saved
+            self.logger.error(f"Incremental pattern analysis failed: {e}")
+            self.pattern_states.pop(user_id, None)
+            raise
+    
+    def _derive_patterns(self, state: PatternState) -> List[DetectedPattern]:
+        """Patterns the detectors would report for the memories folded into `state`, in the same order"""
+        
+        patterns = []
+        
+        # Daily patterns, context shared (read-only) by every pattern of the same day
+        day_context = {}
+        for day, activity, count, frequency, hours in state.daily_rows():
+            if count < 3 or frequency < 0.3:
+                continue
+            if day not in day_context:
+                day_context[day] = state.day_context_lists(day)
+            time_windows = [{'start_hour': hour, 'end_hour': (hour + 1) % 24, 'frequency': hour_count}
+                            for hour, hour_count in hours.items() if hour_count >= 2]
+            patterns.append(self._daily_pattern(day, activity, count, frequency, time_windows, *day_context[day]))
+        
+        # Weekly patterns
+        for activity, counts_list in state.weekly_counts():
+            pattern = self._weekly_pattern(activity, counts_list) if len(counts_list) >= 3 else None
+            if pattern:
+                patterns.append(pattern)
+        
+        # Hourly patterns
+        for hour, activity, count, total in state.hourly_rows():
+            frequency = count / total
+            if total >= 5 and count >= 3 and frequency >= 0.4:
+                patterns.append(self._hourly_pattern(hour, activity, count, frequency))
+        
+        # Activity sequences
+        total_sequences = state.total_sequences
+        for (activity1, activity2), count in state.transitions.items():
+            frequency = count / total_sequences if total_sequences > 0 else 0
+            if count >= 3 and frequency >= 0.2:
+                patterns.append(self._sequence_pattern(activity1, activity2, count, frequency))
+        
+        # Social patterns
+        for participant, count in state.participants.items():
+            frequency = count / state.memories
+            if count >= 3 and frequency >= 0.1:
+                patterns.append(self._social_pattern(participant, count, frequency,
+                                                     state.common_activities(participant)))
+        
+        # Emotional patterns
+        patterns.extend(self._emotional_patterns(state.hourly_sentiment(), state.daily_sentiment()))
+        
+        return patterns
+    
     async def _detect_temporal_patterns(self, analysis_data: Dict[str, Any]) -> List[DetectedPattern]:
         """Detect time-based patterns in user behavior"""
         
@@ -444,10 +491,6 @@ class PatternAnalyzerAgent(BaseAgent):
             hourly_patterns = await self._analyze_hourly_patterns(df)
             patterns.extend(hourly_patterns)
             
-            # Seasonal patterns
-            seasonal_patterns = await self._analyze_seasonal_patterns(df)
-            patterns.extend(seasonal_patterns)
-            
         except Exception as e:
             self.logger.error(f"Temporal pattern detection failed: {e}")
         
@@ -459,112 +502,129 @@ class PatternAnalyzerAgent(BaseAgent):
         patterns = []
         
         try:
-            # Group by day of week
-            df['day_of_week'] = pd.to_datetime(df['timestamp']).dt.day_name()
-            daily_groups = df.groupby('day_of_week')
+            # Count activities per day of week
+            timestamps = pd.to_datetime(df['timestamp'])
+            df['day_of_week'] = timestamps.dt.day_name()
+            counts, group_ids = self._activity_counts(df['day_of_week'], df['activity'])
+            
+            # Calculate pattern strength against the distinct dates seen on that day
+            dates = pd.Series(timestamps.dt.normalize().unique()).dropna()
+            total_days = dates.dt.day_name().value_counts()
+            counts['rate'] = counts['count'] / counts['key'].map(total_days)
+            counts = counts[(counts['count'] >= 3) & (counts['rate'] >= 0.3)]
+            
+            if counts.empty:
+                return patterns
             
-            for day, group in daily_groups:
-                if len(group) < 3:  # Need minimum occurrences
-                    continue
-                
-                # Analyze activities for this day
-                activities = group['activity'].value_counts()
-                
-                for activity, count in activities.items():
-                    if count >= 3:  # Minimum frequency
-                        
-                        # Calculate pattern strength
-                        total_days = len(group['timestamp'].dt.date.unique())
-                        frequency = count / total_days if total_days > 0 else 0
-                        
-                        if frequency >= 0.3:  # Minimum pattern strength
-                            
-                            # Extract time windows
-                            activity_times = group[group['activity'] == activity]['timestamp']
-                            time_windows = self._extract_time_windows(activity_times)
-                            
-                            # Create pattern
-                            pattern = DetectedPattern(
-                                id=f"daily_{day}_{activity}_{hashlib.md5(f'{day}{activity}'.encode()).hexdigest()[:8]}",
-                                pattern_type=PatternType.TEMPORAL,
-                                strength=self._calculate_pattern_strength(frequency),
-                                confidence=min(frequency, 0.95),
-                                description=f"User typically does '{activity}' on {day}s",
-                                frequency={'type': 'daily', 'day': day, 'rate': frequency},
-                                triggers=[f"day_of_week:{day}"],
-                                participants=list(group['participants'].explode().unique()) if 'participants' in group.columns else [],
-                                locations=list(group['location'].unique()) if 'location' in group.columns else [],
-                                time_windows=time_windows,
-                                supporting_memories=list(group['memory_id'].unique()) if 'memory_id' in group.columns else [],
-                                first_detected=datetime.now(),
-                                last_updated=datetime.now(),
-                                prediction_accuracy=0.0,  # Will be updated with feedback
-                                metadata={'day_of_week': day, 'activity': activity, 'sample_size': count}
-                            )
-                            
-                            patterns.append(pattern)
+            # Extract time windows
+            time_windows = self._activity_time_windows(timestamps.dt.hour, group_ids, counts['group'])
+            
+            # Context shared (read-only) by every pattern of the same day
+            day_rows = df.groupby('day_of_week').indices
+            day_context = {}
+            for day in counts['key'].unique():
+                group = df.iloc[day_rows[day]]
+                day_context[day] = (
+                    group['participants'].explode().unique().tolist() if 'participants' in group.columns else [],
+                    group['location'].unique().tolist() if 'location' in group.columns else [],
+                    group['memory_id'].unique().tolist() if 'memory_id' in group.columns else []
+                )
             
+            for day, activity, count, frequency, group_id in counts[['key', 'activity', 'count', 'rate', 'group']].itertuples(index=False):
+                patterns.append(self._daily_pattern(day, activity, count, frequency,
+                                                    time_windows.get(group_id, []), *day_context[day]))
+        
         except Exception as e:
             self.logger.error(f"Daily pattern analysis failed: {e}")
         
         return patterns
     
+    def _daily_pattern(self, day: str, activity: str, count: int, frequency: float,
+                       time_windows: List[Dict[str, Any]], participants: List[Any],
+                       locations: List[Any], supporting_memories: List[str]) -> DetectedPattern:
+        """Pattern for an activity done on a given day of the week"""
+        
+        return DetectedPattern(
+            id=f"daily_{day}_{activity}_{hashlib.md5(f'{day}{activity}'.encode()).hexdigest()[:8]}",
+            pattern_type=PatternType.TEMPORAL,
+            strength=self._calculate_pattern_strength(frequency),
+            confidence=min(frequency, 0.95),
+            description=f"User typically does '{activity}' on {day}s",
+            frequency={'type': 'daily', 'day': day, 'rate': frequency},
+            triggers=[f"day_of_week:{day}"],
+            participants=participants,
+            locations=locations,
+            time_windows=time_windows,
+            supporting_memories=supporting_memories,
+            first_detected=datetime.now(),
+            last_updated=datetime.now(),
+            prediction_accuracy=0.0,  # Will be updated with feedback
+            metadata={'day_of_week': day, 'activity': activity, 'sample_size': count}
+        )
+    
     async def _analyze_weekly_patterns(self, df: pd.DataFrame) -> List[DetectedPattern]:
         """Analyze weekly behavioral patterns"""
         
         patterns = []
         
         try:
-            # Group by week
-            df['week'] = pd.to_datetime(df['timestamp']).dt.isocalendar().week
-            df['year'] = pd.to_datetime(df['timestamp']).dt.year
-            df['year_week'] = df['year'].astype(str) + '_' + df['week'].astype(str)
-            
-            weekly_groups = df.groupby('year_week')
-            
-            # Analyze recurring weekly activities
-            weekly_activities = defaultdict(list)
-            
-            for week, group in weekly_groups:
-                activities = group['activity'].value_counts()
-                for activity, count in activities.items():
-                    weekly_activities[activity].append(count)
+            # Group by week, labelling each distinct (year, week) once
+            timestamps = pd.to_datetime(df['timestamp'])
+            df['week'] = timestamps.dt.isocalendar().week
+            df['year'] = timestamps.dt.year
+            weeks = df[['year', 'week']].drop_duplicates()
+            weeks['year_week'] = weeks['year'].astype(str) + '_' + weeks['week'].astype(str)
+            df['year_week'] = df[['year', 'week']].merge(weeks, how='left', on=['year', 'week'])['year_week'].to_numpy()
+            
+            # Per-week counts of each activity, activities in order of first appearance
+            counts, _ = self._activity_counts(df['year_week'], df['activity'])
+            summary = counts.groupby('activity_id', sort=False)['count'].agg(['size', 'mean', 'std'])
+            
+            # Screen in bulk, then confirm the few survivors with exact statistics
+            candidates = summary[
+                (summary['size'] >= 3) & (summary['mean'] >= 2 - 1e-9) &
+                (1 - summary['std'] / summary['mean'] >= 0.6 - 1e-9)
+            ].index
+            candidate_weeks = counts[counts['activity_id'].isin(candidates)].groupby('activity_id', sort=False)
             
             # Identify consistent weekly patterns
-            for activity, counts in weekly_activities.items():
-                if len(counts) >= 3:  # Need multiple weeks of data
-                    
-                    avg_count = statistics.mean(counts)
-                    consistency = 1 - (statistics.stdev(counts) / avg_count) if avg_count > 0 else 0
-                    
-                    if consistency >= 0.6 and avg_count >= 2:  # Consistent weekly pattern
-                        
-                        # Create weekly pattern
-                        pattern = DetectedPattern(
-                            id=f"weekly_{activity}_{hashlib.md5(activity.encode()).hexdigest()[:8]}",
-                            pattern_type=PatternType.TEMPORAL,
-                            strength=self._calculate_pattern_strength(consistency),
-                            confidence=min(consistency, 0.95),
-                            description=f"User regularly does '{activity}' weekly",
-                            frequency={'type': 'weekly', 'avg_count': avg_count, 'consistency': consistency},
-                            triggers=["weekly_cycle"],
-                            participants=[],
-                            locations=[],
-                            time_windows=[],
-                            supporting_memories=[],
-                            first_detected=datetime.now(),
-                            last_updated=datetime.now(),
-                            prediction_accuracy=0.0,
-                            metadata={'activity': activity, 'weekly_average': avg_count, 'weeks_analyzed': len(counts)}
-                        )
-                        
-                        patterns.append(pattern)
-            
+            for _, activity_weeks in candidate_weeks:
+                pattern = self._weekly_pattern(activity_weeks['activity'].iloc[0], activity_weeks['count'].tolist())
+                if pattern:
+                    patterns.append(pattern)
+        
         except Exception as e:
             self.logger.error(f"Weekly pattern analysis failed: {e}")
         
         return patterns
     
+    def _weekly_pattern(self, activity: str, counts_list: List[int]) -> Optional[DetectedPattern]:
+        """Pattern for an activity done about as often every week, None if it is not consistent"""
+        
+        avg_count = statistics.mean(counts_list)
+        consistency = 1 - (statistics.stdev(counts_list) / avg_count) if avg_count > 0 else 0
+        
+        if consistency < 0.6 or avg_count < 2:  # Not a consistent weekly pattern
+            return None
+        
+        return DetectedPattern(
+            id=f"weekly_{activity}_{hashlib.md5(activity.encode()).hexdigest()[:8]}",
+            pattern_type=PatternType.TEMPORAL,
+            strength=self._calculate_pattern_strength(consistency),
+            confidence=min(consistency, 0.95),
+            description=f"User regularly does '{activity}' weekly",
+            frequency={'type': 'weekly', 'avg_count': avg_count, 'consistency': consistency},
+            triggers=["weekly_cycle"],
+            participants=[],
+            locations=[],
+            time_windows=[],
+            supporting_memories=[],
+            first_detected=datetime.now(),
+            last_updated=datetime.now(),
+            prediction_accuracy=0.0,
+            metadata={'activity': activity, 'weekly_average': avg_count, 'weeks_analyzed': len(counts_list)}
+        )
+    
     async def _analyze_hourly_patterns(self, df: pd.DataFrame) -> List[DetectedPattern]:
         """Analyze hourly behavioral patterns"""
         
@@ -574,50 +634,40 @@ class PatternAnalyzerAgent(BaseAgent):
             # Extract hour from timestamp
             df['hour'] = pd.to_datetime(df['timestamp']).dt.hour
             
-            # Group by hour
-            hourly_groups = df.groupby('hour')
-            
-            for hour, group in hourly_groups:
-                if len(group) < 5:  # Need minimum occurrences
-                    continue
-                
-                # Analyze activities for this hour
-                activities = group['activity'].value_counts()
-                
-                for activity, count in activities.items():
-                    if count >= 3:  # Minimum frequency
-                        
-                        # Calculate pattern strength
-                        total_hours = len(group)
-                        frequency = count / total_hours if total_hours > 0 else 0
-                        
-                        if frequency >= 0.4:  # Minimum pattern strength for hourly
-                            
-                            # Create hourly pattern
-                            pattern = DetectedPattern(
-                                id=f"hourly_{hour}_{activity}_{hashlib.md5(f'{hour}{activity}'.encode()).hexdigest()[:8]}",
-                                pattern_type=PatternType.TEMPORAL,
-                                strength=self._calculate_pattern_strength(frequency),
-                                confidence=min(frequency, 0.95),
-                                description=f"User typically does '{activity}' around {hour}:00",
-                                frequency={'type': 'hourly', 'hour': hour, 'rate': frequency},
-                                triggers=[f"hour:{hour}"],
-                                participants=[],
-                                locations=[],
-                                time_windows=[{'start_hour': hour, 'end_hour': (hour + 1) % 24}],
-                                supporting_memories=[],
-                                first_detected=datetime.now(),
-                                last_updated=datetime.now(),
-                                prediction_accuracy=0.0,
-                                metadata={'hour': hour, 'activity': activity, 'sample_size': count}
-                            )
-                            
-                            patterns.append(pattern)
+            # Count activities per hour, need minimum occurrences in the hour
+            counts, _ = self._activity_counts(df['hour'], df['activity'])
+            total_hours = counts['key'].map(df['hour'].value_counts())
+            counts['rate'] = counts['count'] / total_hours
+            counts = counts[(total_hours >= 5) & (counts['count'] >= 3) & (counts['rate'] >= 0.4)]
             
+            for hour, activity, count, frequency in counts[['key', 'activity', 'count', 'rate']].itertuples(index=False):
+                patterns.append(self._hourly_pattern(hour, activity, count, frequency))
+        
         except Exception as e:
             self.logger.error(f"Hourly pattern analysis failed: {e}")
         
         return patterns
+
+    def _hourly_pattern(self, hour: int, activity: str, count: int, frequency: float) -> DetectedPattern:
+        """Pattern for an activity done around a given hour"""
+        
+        return DetectedPattern(
+            id=f"hourly_{hour}_{activity}_{hashlib.md5(f'{hour}{activity}'.encode()).hexdigest()[:8]}",
+            pattern_type=PatternType.TEMPORAL,
+            strength=self._calculate_pattern_strength(frequency),
+            confidence=min(frequency, 0.95),
+            description=f"User typically does '{activity}' around {hour}:00",
+            frequency={'type': 'hourly', 'hour': hour, 'rate': frequency},
+            triggers=[f"hour:{hour}"],
+            participants=[],
+            locations=[],
+            time_windows=[{'start_hour': hour, 'end_hour': (hour + 1) % 24}],
+            supporting_memories=[],
+            first_detected=datetime.now(),
+            last_updated=datetime.now(),
+            prediction_accuracy=0.0,
+            metadata={'hour': hour, 'activity': activity, 'sample_size': count}
+        )
     
     async def _detect_behavioral_patterns(self, analysis_data: Dict[str, Any]) -> List[DetectedPattern]:
         """Detect behavioral patterns in user activities"""
@@ -638,14 +688,6 @@ class PatternAnalyzerAgent(BaseAgent):
             sequence_patterns = await self._analyze_activity_sequences(df)
             patterns.extend(sequence_patterns)
             
-            # Trigger-response patterns
-            trigger_patterns = await self._analyze_trigger_response_patterns(df)
-            patterns.extend(trigger_patterns)
-            
-            # Context-dependent patterns
-            context_patterns = await self._analyze_context_dependent_patterns(df)
-            patterns.extend(context_patterns)
-            
         except Exception as e:
             self.logger.error(f"Behavioral pattern detection failed: {e}")
         
@@ -657,70 +699,60 @@ class PatternAnalyzerAgent(BaseAgent):
         patterns = []
         
         try:
-            # Sort by timestamp
-            df_sorted = df.sort_values('timestamp')
-            
-            # Extract activity sequences
-            sequences = []
-            current_sequence = []
-            last_timestamp = None
+            # Sort by timestamp, memories with the same timestamp in the order given
+            df_sorted = df.sort_values('timestamp', kind='stable')
+            
+            # A gap of more than an hour starts a new sequence
+            gaps = pd.to_datetime(df_sorted['timestamp']).diff().dt.total_seconds().to_numpy()
+            breaks = ~(gaps <= 3600)
+            sequence_lengths = np.bincount(np.cumsum(breaks))
+            total_sequences = int(np.count_nonzero(sequence_lengths >= 2))
+            
+            # Transition counts between consecutive activities of the same sequence,
+            # pairs numbered in order of first occurrence
+            activity_codes, activity_names = pd.factorize(df_sorted['activity'], use_na_sentinel=False)
+            follows = ~breaks[1:]
+            transitions = activity_codes[:-1][follows] * len(activity_names) + activity_codes[1:][follows]
+            transition_ids, transition_pairs = pd.factorize(transitions)
+            sequence_counts = np.bincount(transition_ids, minlength=len(transition_pairs))
             
-            for _, row in df_sorted.iterrows():
-                current_time = pd.to_datetime(row['timestamp'])
+            # Create patterns for frequent sequences
+            for pair, count in zip(transition_pairs, sequence_counts.tolist()):
+                if count < 3:  # Minimum occurrences
+                    continue
                 
-                if last_timestamp is None or (current_time - last_timestamp).total_seconds() <= 3600:  # 1 hour window
-                    current_sequence.append(row['activity'])
-                else:
-                    if len(current_sequence) >= 2:
-                        sequences.append(current_sequence.copy())
-                    current_sequence = [row['activity']]
+                first, then = divmod(pair, len(activity_names))
+                frequency = count / total_sequences if total_sequences > 0 else 0
                 
-                last_timestamp = current_time
-            
-            # Add final sequence
-            if len(current_sequence) >= 2:
-                sequences.append(current_sequence)
-            
-            # Find common sequences
-            sequence_counts = Counter()
-            for seq in sequences:
-                for i in range(len(seq) - 1):
-                    pair = (seq[i], seq[i + 1])
-                    sequence_counts[pair] += 1
-            
-            # Create patterns for frequent sequences
-            total_sequences = len(sequences)
-            for (activity1, activity2), count in sequence_counts.items():
-                if count >= 3:  # Minimum occurrences
-                    frequency = count / total_sequences if total_sequences > 0 else 0
-                    
-                    if frequency >= 0.2:  # Minimum pattern strength
-                        
-                        pattern = DetectedPattern(
-                            id=f"sequence_{activity1}_{activity2}_{hashlib.md5(f'{activity1}{activity2}'.encode()).hexdigest()[:8]}",
-                            pattern_type=PatternType.BEHAVIORAL,
-                            strength=self._calculate_pattern_strength(frequency),
-                            confidence=min(frequency, 0.95),
-                            description=f"User typically does '{activity2}' after '{activity1}'",
-                            frequency={'type': 'sequence', 'rate': frequency, 'count': count},
-                            triggers=[f"activity:{activity1}"],
-                            participants=[],
-                            locations=[],
-                            time_windows=[],
-                            supporting_memories=[],
-                            first_detected=datetime.now(),
-                            last_updated=datetime.now(),
-                            prediction_accuracy=0.0,
-                            metadata={'sequence': [activity1, activity2], 'sample_size': count}
-                        )
-                        
-                        patterns.append(pattern)
-            
+                if frequency >= 0.2:  # Minimum pattern strength
+                    patterns.append(self._sequence_pattern(activity_names[first], activity_names[then], count, frequency))
+        
         except Exception as e:
             self.logger.error(f"Activity sequence analysis failed: {e}")
         
         return patterns
     
+    def _sequence_pattern(self, activity1: str, activity2: str, count: int, frequency: float) -> DetectedPattern:
+        """Pattern for one activity habitually following another"""
+        
+        return DetectedPattern(
+            id=f"sequence_{activity1}_{activity2}_{hashlib.md5(f'{activity1}{activity2}'.encode()).hexdigest()[:8]}",
+            pattern_type=PatternType.BEHAVIORAL,
+            strength=self._calculate_pattern_strength(frequency),
+            confidence=min(frequency, 0.95),
+            description=f"User typically does '{activity2}' after '{activity1}'",
+            frequency={'type': 'sequence', 'rate': frequency, 'count': count},
+            triggers=[f"activity:{activity1}"],
+            participants=[],
+            locations=[],
+            time_windows=[],
+            supporting_memories=[],
+            first_detected=datetime.now(),
+            last_updated=datetime.now(),
+            prediction_accuracy=0.0,
+            metadata={'sequence': [activity1, activity2], 'sample_size': count}
+        )
+    
     async def _detect_social_patterns(self, analysis_data: Dict[str, Any]) -> List[DetectedPattern]:
         """Detect social interaction patterns"""
         
@@ -734,65 +766,75 @@ class PatternAnalyzerAgent(BaseAgent):
                 return patterns
             
             # Convert to DataFrame
-            df = pd.DataFrame(social_data)
+            df = pd.DataFrame(social_data, columns=['participants', 'activity'])
             
             # Analyze interaction frequencies
             if 'participants' in df.columns:
-                # Flatten participants list
-                all_participants = []
-                for participants in df['participants']:
-                    if isinstance(participants, list):
-                        all_participants.extend(participants)
-                    elif participants:
-                        all_participants.append(participants)
+                # One entry per memory and participant; empty lists and blank names are no one
+                flattened = df['participants'].explode()
+                flattened = flattened[flattened.notna() & (flattened != '')]
                 
-                # Count interactions
-                participant_counts = Counter(all_participants)
+                # Count interactions, participants in order of first appearance
+                participant_codes, participant_names = pd.factorize(flattened)
+                participant_counts = pd.Series(np.bincount(participant_codes, minlength=len(participant_names)),
+                                               index=participant_names)
                 
                 # Create social patterns
                 total_interactions = len(df)
-                for participant, count in participant_counts.items():
-                    if count >= 3:  # Minimum interactions
-                        frequency = count / total_interactions if total_interactions > 0 else 0
-                        
-                        if frequency >= 0.1:  # Minimum social pattern strength
-                            
-                            # Analyze interaction contexts
-                            participant_data = df[df['participants'].apply(
-                                lambda x: participant in x if isinstance(x, list) else participant == x
-                            )]
-                            
-                            common_activities = participant_data['activity'].value_counts().head(3).to_dict()
-                            
-                            pattern = DetectedPattern(
-                                id=f"social_{participant}_{hashlib.md5(participant.encode()).hexdigest()[:8]}",
-                                pattern_type=PatternType.SOCIAL,
-                                strength=self._calculate_pattern_strength(frequency),
-                                confidence=min(frequency, 0.95),
-                                description=f"User frequently interacts with {participant}",
-                                frequency={'type': 'social', 'rate': frequency, 'count': count},
-                                triggers=[],
-                                participants=[participant],
-                                locations=[],
-                                time_windows=[],
-                                supporting_memories=[],
-                                first_detected=datetime.now(),
-                                last_updated=datetime.now(),
-                                prediction_accuracy=0.0,
-                                metadata={
-                                    'participant': participant,
-                                    'interaction_count': count,
-                                    'common_activities': common_activities
-                                }
-                            )
-                            
-                            patterns.append(pattern)
-            
+                frequent = participant_counts[
+                    (participant_counts >= 3) & (participant_counts / total_interactions >= 0.1)
+                ]
+                
+                # Activities of the memories each frequent participant appears in, most common first
+                activity_codes, activity_names = pd.factorize(df['activity'])
+                contexts = pd.DataFrame({'participant': participant_codes, 'row': flattened.index})
+                contexts = contexts[contexts['participant'].isin(participant_names.get_indexer(frequent.index))]
+                contexts = contexts[~contexts.duplicated()]
+                contexts['activity'] = activity_codes[contexts['row'].to_numpy()]
+                contexts = contexts[contexts['activity'] >= 0]
+                context_counts = contexts.groupby(['participant', 'activity'], sort=False).size().reset_index(name='count')
+                context_counts = context_counts.sort_values('count', ascending=False, kind='stable')
+                top_activities = context_counts.groupby('participant', sort=False).head(3)
+                common_by_participant = defaultdict(dict)
+                for participant, activity, activity_count in top_activities.itertuples(index=False):
+                    common_by_participant[participant_names[participant]][activity_names[activity]] = activity_count
+                
+                for participant, count in frequent.items():
+                    count = int(count)
+                    patterns.append(self._social_pattern(participant, count, count / total_interactions,
+                                                         common_by_participant[participant]))
+        
         except Exception as e:
             self.logger.error(f"Social pattern detection failed: {e}")
         
         return patterns
     
+    def _social_pattern(self, participant: str, count: int, frequency: float,
+                        common_activities: Dict[str, int]) -> DetectedPattern:
+        """Pattern for someone the user frequently interacts with"""
+        
+        return DetectedPattern(
+            id=f"social_{participant}_{hashlib.md5(participant.encode()).hexdigest()[:8]}",
+            pattern_type=PatternType.SOCIAL,
+            strength=self._calculate_pattern_strength(frequency),
+            confidence=min(frequency, 0.95),
+            description=f"User frequently interacts with {participant}",
+            frequency={'type': 'social', 'rate': frequency, 'count': count},
+            triggers=[],
+            participants=[participant],
+            locations=[],
+            time_windows=[],
+            supporting_memories=[],
+            first_detected=datetime.now(),
+            last_updated=datetime.now(),
+            prediction_accuracy=0.0,
+            metadata={
+                'participant': participant,
+                'interaction_count': count,
+                'common_activities': common_activities
+            }
+        )
+    
     async def _detect_emotional_patterns(self, analysis_data: Dict[str, Any]) -> List[DetectedPattern]:
         """Detect emotional state patterns"""
         
@@ -812,73 +854,92 @@ class PatternAnalyzerAgent(BaseAgent):
                 return patterns
             
             # Analyze emotional trends
-            df['timestamp'] = pd.to_datetime(df['timestamp'])
-            df['hour'] = df['timestamp'].dt.hour
-            df['day_of_week'] = df['timestamp'].dt.day_name()
-            
-            # Hourly emotional patterns
-            hourly_sentiment = df.groupby('hour')['sentiment'].mean()
-            
-            for hour, avg_sentiment in hourly_sentiment.items():
-                if abs(avg_sentiment) >= 0.3:  # Significant emotional pattern
-                    
-                    sentiment_label = "positive" if avg_sentiment > 0 else "negative"
-                    strength = abs(avg_sentiment)
-                    
-                    pattern = DetectedPattern(
-                        id=f"emotional_hourly_{hour}_{sentiment_label}_{hashlib.md5(f'{hour}{sentiment_label}'.encode()).hexdigest()[:8]}",
-                        pattern_type=PatternType.EMOTIONAL,
-                        strength=self._calculate_pattern_strength(strength),
-                        confidence=min(strength, 0.95),
-                        description=f"User tends to be {sentiment_label} around {hour}:00",
-                        frequency={'type': 'hourly_emotional', 'hour': hour, 'avg_sentiment': avg_sentiment},
-                        triggers=[f"hour:{hour}"],
-                        participants=[],
-                        locations=[],
-                        time_windows=[{'start_hour': hour, 'end_hour': (hour + 1) % 24}],
-                        supporting_memories=[],
-                        first_detected=datetime.now(),
-                        last_updated=datetime.now(),
-                        prediction_accuracy=0.0,
-                        metadata={'hour': hour, 'sentiment': sentiment_label, 'avg_score': avg_sentiment}
-                    )
-                    
-                    patterns.append(pattern)
-            
-            # Daily emotional patterns
-            daily_sentiment = df.groupby('day_of_week')['sentiment'].mean()
-            
-            for day, avg_sentiment in daily_sentiment.items():
-                if abs(avg_sentiment) >= 0.2:  # Significant daily emotional pattern
-                    
-                    sentiment_label = "positive" if avg_sentiment > 0 else "negative"
-                    strength = abs(avg_sentiment)
-                    
-                    pattern = DetectedPattern(
-                        id=f"emotional_daily_{day}_{sentiment_label}_{hashlib.md5(f'{day}{sentiment_label}'.encode()).hexdigest()[:8]}",
-                        pattern_type=PatternType.EMOTIONAL,
-                        strength=self._calculate_pattern_strength(strength),
-                        confidence=min(strength, 0.95),
-                        description=f"User tends to be {sentiment_label} on {day}s",
-                        frequency={'type': 'daily_emotional', 'day': day, 'avg_sentiment': avg_sentiment},
-                        triggers=[f"day_of_week:{day}"],
-                        participants=[],
-                        locations=[],
-                        time_windows=[],
-                        supporting_memories=[],
-                        first_detected=datetime.now(),
-                        last_updated=datetime.now(),
-                        prediction_accuracy=0.0,
-                        metadata={'day': day, 'sentiment': sentiment_label, 'avg_score': avg_sentiment}
-                    )
-                    
-                    patterns.append(pattern)
-            
+            timestamps = pd.to_datetime(df['timestamp'])
+            hourly_sentiment = self._sentiment_moments(timestamps.dt.hour, df['sentiment'])
+            daily_sentiment = self._sentiment_moments(timestamps.dt.day_name(), df['sentiment'])
+            patterns.extend(self._emotional_patterns(hourly_sentiment, daily_sentiment))
+        
         except Exception as e:
             self.logger.error(f"Emotional pattern detection failed: {e}")
         
         return patterns
     
+    @staticmethod
+    def _sentiment_moments(keys: pd.Series, scores: pd.Series) -> Dict[Any, Tuple[float, float, int]]:
+        """key -> (sum, sum of squares, count) of the sentiment scores under it, keys in order
+        
+        Sums are exact (math.fsum) so they do not depend on how the scores
+        were grouped or batched.
+        """
+        
+        moments = {}
+        for key, values in scores.astype(float).groupby(keys.to_numpy(dtype=object), sort=True):
+            values = values.tolist()
+            moments[key] = (math.fsum(values), math.fsum(value * value for value in values), len(values))
+        return moments
+    
+    def _emotional_patterns(self, hourly_sentiment: Dict[int, Tuple[float, float, int]],
+                            daily_sentiment: Dict[str, Tuple[float, float, int]]) -> List[DetectedPattern]:
+        """Patterns for hours and days of the week with a markedly positive or negative mean sentiment"""
+        
+        patterns = []
+        
+        # Hourly emotional patterns
+        for hour, (total, squares, count) in hourly_sentiment.items():
+            avg_sentiment = total / count
+            if abs(avg_sentiment) >= 0.3:  # Significant emotional pattern
+                
+                sentiment_label = "positive" if avg_sentiment > 0 else "negative"
+                strength = abs(avg_sentiment)
+                
+                patterns.append(DetectedPattern(
+                    id=f"emotional_hourly_{hour}_{sentiment_label}_{hashlib.md5(f'{hour}{sentiment_label}'.encode()).hexdigest()[:8]}",
+                    pattern_type=PatternType.EMOTIONAL,
+                    strength=self._calculate_pattern_strength(strength),
+                    confidence=min(strength, 0.95),
+                    description=f"User tends to be {sentiment_label} around {hour}:00",
+                    frequency={'type': 'hourly_emotional', 'hour': hour, 'avg_sentiment': avg_sentiment},
+                    triggers=[f"hour:{hour}"],
+                    participants=[],
+                    locations=[],
+                    time_windows=[{'start_hour': hour, 'end_hour': (hour + 1) % 24}],
+                    supporting_memories=[],
+                    first_detected=datetime.now(),
+                    last_updated=datetime.now(),
+                    prediction_accuracy=0.0,
+                    metadata={'hour': hour, 'sentiment': sentiment_label, 'avg_score': avg_sentiment,
+                              'score_variance': max(0.0, squares / count - avg_sentiment * avg_sentiment)}
+                ))
+        
+        # Daily emotional patterns
+        for day, (total, squares, count) in daily_sentiment.items():
+            avg_sentiment = total / count
+            if abs(avg_sentiment) >= 0.2:  # Significant daily emotional pattern
+                
+                sentiment_label = "positive" if avg_sentiment > 0 else "negative"
+                strength = abs(avg_sentiment)
+                
+                patterns.append(DetectedPattern(
+                    id=f"emotional_daily_{day}_{sentiment_label}_{hashlib.md5(f'{day}{sentiment_label}'.encode()).hexdigest()[:8]}",
+                    pattern_type=PatternType.EMOTIONAL,
+                    strength=self._calculate_pattern_strength(strength),
+                    confidence=min(strength, 0.95),
+                    description=f"User tends to be {sentiment_label} on {day}s",
+                    frequency={'type': 'daily_emotional', 'day': day, 'avg_sentiment': avg_sentiment},
+                    triggers=[f"day_of_week:{day}"],
+                    participants=[],
+                    locations=[],
+                    time_windows=[],
+                    supporting_memories=[],
+                    first_detected=datetime.now(),
+                    last_updated=datetime.now(),
+                    prediction_accuracy=0.0,
+                    metadata={'day': day, 'sentiment': sentiment_label, 'avg_score': avg_sentiment,
+                              'score_variance': max(0.0, squares / count - avg_sentiment * avg_sentiment)}
+                ))
+        
+        return patterns
+    
     # ==================== HABIT IDENTIFICATION ====================
     
     async def _identify_habits_from_data(self, behavioral_data: Dict[str, Any]) -> List[Dict[str, Any]]:
@@ -1067,33 +1128,56 @@ class PatternAnalyzerAgent(BaseAgent):
         else:
             return PatternStrength.WEAK
     
-    def _extract_time_windows(self, timestamps) -> List[Dict[str, Any]]:
-        """Extract time windows from timestamps"""
-        
-        try:
-            times = pd.to_datetime(timestamps)
-            hours = times.dt.hour
-            
-            if len(hours) == 0:
-                return []
-            
-            # Find common time ranges
-            hour_counts = Counter(hours)
-            common_hours = [hour for hour, count in hour_counts.items() if count >= 2]
-            
-            windows = []
-            for hour in common_hours:
-                windows.append({
-                    'start_hour': hour,
-                    'end_hour': (hour + 1) % 24,
-                    'frequency': hour_counts[hour]
-                })
-            
-            return windows
-            
-        except Exception:
-            return []
+    @staticmethod
+    def _activity_counts(keys: pd.Series, activities: pd.Series) -> Tuple[pd.DataFrame, np.ndarray]:
+        """Count each activity under each key
+        
+        Rows (key, activity, activity_id, count, group) come in the order
+        iterating ``groupby(keys)`` and each group's ``value_counts()`` would
+        list them; also returns the group of every input row, -1 where key or
+        activity is missing.
+        """
+        
+        key_codes, key_values = pd.factorize(keys, sort=True)
+        activity_codes, activity_values = pd.factorize(activities)
+        valid = (key_codes >= 0) & (activity_codes >= 0)
+        
+        # (key, activity) pairs numbered in order of first occurrence
+        group_ids = np.full(len(key_codes), -1)
+        group_ids[valid], pairs = pd.factorize(key_codes[valid] * len(activity_values) + activity_codes[valid])
+        pair_keys, pair_activities = np.divmod(pairs, len(activity_values))
+        count = np.bincount(group_ids[valid], minlength=len(pairs))
+        
+        # By key, then most frequent first; the sort is stable so ties stay in order of occurrence
+        order = np.lexsort((-count, pair_keys))
+        counts = pd.DataFrame({
+            'key': key_values[pair_keys[order]],
+            'activity': activity_values[pair_activities[order]],
+            'activity_id': pair_activities[order],
+            'count': count[order],
+            'group': order
+        })
+        return counts, group_ids
     
+    @staticmethod
+    def _activity_time_windows(hours: pd.Series, group_ids: np.ndarray, groups) -> Dict[int, List[Dict[str, Any]]]:
+        """Hours at which each of the given groups occurred at least twice, by first occurrence"""
+        
+        selected = np.isin(group_ids, np.asarray(groups))
+        hour_counts = pd.DataFrame({
+            'group': group_ids[selected],
+            'hour': hours.to_numpy()[selected]
+        }).groupby(['group', 'hour'], sort=False).size()
+        
+        windows = defaultdict(list)
+        for (group, hour), count in hour_counts[hour_counts >= 2].items():
+            windows[int(group)].append({
+                'start_hour': int(hour),
+                'end_hour': (int(hour) + 1) % 24,
+                'frequency': int(count)
+            })
+        return windows
+
     async def _prepare_memory_data_for_analysis(self, memories: List[Dict[str, Any]]) -> Dict[str, Any]:
         """Prepare memory data for pattern analysis"""
         
@@ -1213,22 +1297,6 @@ class PatternAnalyzerAgent(BaseAgent):
             self.logger.error(f"Statistics calculation failed: {e}")
             return {}
     
-    def _create_error_response(self, original_message: AgentMessage, error_msg: str) -> AgentMessage:
-        """Create error response message"""
-        
-        return AgentMessage(
-            id=f"error_{original_message.id}",
-            type="error_response",
-            sender_id=self.agent_id,
-            recipient_id=original_message.sender_id,
-            payload={
-                "error": error_msg,
-                "original_message_type": original_message.type,
-                "recoverable": True
-            },
-            timestamp=asyncio.get_event_loop().time()
-        )
-    
     # ==================== INITIALIZATION METHODS ====================
     
     async def _initialize_pattern_detectors(self):
@@ -1326,6 +1394,9 @@ class PatternAnalyzerAgent(BaseAgent):
         """Shutdown the Pattern Analyzer Agent gracefully"""
         
         try:
+            # Let requests in flight finish before their state is saved
+            await self._stop_serving()
+            
             # Save current state
             await self._save_analysis_state()
             
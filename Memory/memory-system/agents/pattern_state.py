@@ -0,0 +1,350 @@
+"""
+Pattern State - incremental statistics behind the pattern detectors
+Keeps, per user, the mergeable counts the temporal, behavioral, social and
+emotional detectors reduce memories to (day/hour/week activity histograms,
+activity transition counts, participant counters, sentiment moments), so a
+scheduled analysis only folds in memories it has not seen yet and derives
+its patterns from the counts instead of from every memory.
+"""
+
+import math
+import logging
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+SEQUENCE_GAP = pd.Timedelta(hours=1)
+
+_NAN = float('nan')
+
+
+def _distinct(value):
+    """Key under which pandas' unique() would treat `value` as a duplicate"""
+    return _NAN if isinstance(value, float) and math.isnan(value) else value
+
+
+def _exploded(value) -> list:
+    """What ``Series.explode()`` turns one participants cell into"""
+    if isinstance(value, (list, tuple, set, frozenset, np.ndarray)):
+        return list(value) if len(value) else [_NAN]
+    return [_NAN if value is None else value]
+
+
+def _pack(values: list) -> list:
+    """[values without NaN, position of the NaN or -1]: strict JSON (e.g. PostgreSQL) has no NaN"""
+    for position, value in enumerate(values):
+        if _distinct(value) is _NAN:
+            return [values[:position] + values[position + 1:], position]
+    return [values, -1]
+
+
+def _unpack(packed: list) -> list:
+    values, position = packed
+    return values[:position] + [_NAN] + values[position:] if position >= 0 else list(values)
+
+
+def _add_partial(partials: List[float], value: float):
+    """Add `value` to the non-overlapping partial sums whose exact total is the running sum
+
+    Shewchuk's algorithm, as used by math.fsum: ``math.fsum(partials)`` is
+    the correctly rounded sum of every value added so far, however many
+    batches they arrived in.
+    """
+    i = 0
+    for partial in partials:
+        if abs(value) < abs(partial):
+            value, partial = partial, value
+        high = value + partial
+        low = partial - (high - value)
+        if low:
+            partials[i] = low
+            i += 1
+        value = high
+    partials[i:] = [value]
+
+
+class PatternState:
+    """Sufficient statistics for one user's patterns, up to a watermark
+
+    Memories are folded in ordered by (timestamp, id) and each is counted
+    once: memories already folded in are skipped, as are memories without a
+    usable timestamp. Patterns derived from the state equal those of a full
+    analysis of every memory it has seen, in that order, so a memory that
+    sorts at or before the watermark (the last key folded in) cannot be added
+    and the state has to be rebuilt instead (see ``follows_watermark``).
+    """
+
+    def __init__(self):
+        self.watermark: Optional[Tuple[pd.Timestamp, str]] = None
+        self.memories = 0
+
+        # day name -> activity -> [count, first seen, {hour: count}]
+        self.daily: Dict[str, Dict[str, list]] = {}
+        # day name -> distinct dates (ordinals) seen on that day
+        self.day_dates: Dict[str, set] = {}
+        # day name -> ordered distinct participants, locations, memory ids
+        self.day_context: Dict[str, Tuple[dict, dict, dict]] = {}
+
+        # hour -> activity -> [count, first seen]; hour -> memories
+        self.hourly: Dict[int, Dict[str, list]] = {}
+        self.hour_totals: Dict[int, int] = {}
+
+        # "year_isoweek" -> activity -> [count, first seen]
+        self.weekly: Dict[str, Dict[str, list]] = {}
+
+        # (activity, next activity) -> count, in order of first occurrence,
+        # and the sequence still open at the watermark
+        self.transitions: Dict[Tuple[str, str], int] = {}
+        self.closed_sequences = 0
+        self.open_length = 0
+        self.last_timestamp: Optional[pd.Timestamp] = None
+        self.last_activity: Optional[str] = None
+
+        # participant -> interactions, and -> activity -> memories, in order of first occurrence
+        self.participants: Dict[Any, int] = {}
+        self.participant_activities: Dict[Any, Dict[str, int]] = {}
+
+        # hour / day name -> [sum partials, sum-of-squares partials, count]
+        self.hour_sentiment: Dict[int, list] = {}
+        self.day_sentiment: Dict[str, list] = {}
+
+    # ==================== UPDATES ====================
+
+    @staticmethod
+    def _key(timestamp: pd.Timestamp, memory_id) -> Tuple[pd.Timestamp, str]:
+        return timestamp, str(memory_id)
+
+    def seen(self, memory_id) -> bool:
+        """Whether the memory has been folded in (every one is in its day's context)"""
+        return any(memory_id in memory_ids for _, _, memory_ids in self.day_context.values())
+
+    def select_new(self, memories: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Memories not folded in yet, once each, in the order they must be folded in"""
+        if not memories:
+            return []
+        timestamps = pd.to_datetime(pd.Series([m.get('timestamp', '') for m in memories], dtype=object),
+                                    errors='coerce')
+        keyed = {}
+        for timestamp, memory in zip(timestamps, memories):
+            memory_id = memory.get('id', '')
+            if pd.isna(timestamp) or memory_id in keyed or self.seen(memory_id):
+                continue
+            keyed[memory_id] = (self._key(timestamp, memory_id), memory)
+        return [memory for _, memory in sorted(keyed.values(), key=lambda item: item[0])]
+
+    def follows_watermark(self, memories: List[Dict[str, Any]]) -> bool:
+        """Whether new memories (from ``select_new``) all sort after the watermark and can be folded in"""
+        if self.watermark is None or not memories:
+            return True
+        first = memories[0]
+        return self._key(pd.Timestamp(first['timestamp']), first.get('id', '')) > self.watermark
+
+    def update(self, analysis_data: Dict[str, Any]) -> int:
+        """Fold in prepared features (one row per memory, see ``select_new``); returns memories added"""
+        temporal = analysis_data.get('temporal_features', [])
+        social = analysis_data.get('social_features', [])
+        emotional = analysis_data.get('emotional_features', [])
+        if not temporal:
+            return 0
+
+        timestamps = pd.to_datetime(pd.Series([row['timestamp'] for row in temporal], dtype=object),
+                                    errors='coerce')
+        added = 0
+        for timestamp, row, social_row, emotional_row in zip(timestamps, temporal, social, emotional):
+            if pd.isna(timestamp):
+                continue
+            key = self._key(timestamp, row['memory_id'])
+            if self.watermark is not None and key <= self.watermark:
+                raise ValueError(f"Memory {row['memory_id']} sorts at or before the watermark {self.watermark}")
+            self._add_temporal(timestamp, row)
+            self._add_transition(timestamp, row['activity'])
+            self._add_social(social_row)
+            self._add_sentiment(timestamp, emotional_row['sentiment'])
+            self.memories += 1
+            self.watermark = key
+            added += 1
+        return added
+
+    def _add_temporal(self, timestamp: pd.Timestamp, row: Dict[str, Any]):
+        ordinal = self.memories
+        activity = row['activity']
+        day = timestamp.day_name()
+        hour = timestamp.hour
+
+        entry = self.daily.setdefault(day, {}).get(activity)
+        if entry is None:
+            entry = self.daily[day][activity] = [0, ordinal, {}]
+        entry[0] += 1
+        entry[2][hour] = entry[2].get(hour, 0) + 1
+        self.day_dates.setdefault(day, set()).add(timestamp.toordinal())
+
+        participants, locations, memory_ids = self.day_context.setdefault(day, ({}, {}, {}))
+        for participant in _exploded(row['participants']):
+            participants.setdefault(_distinct(participant), participant)
+        locations.setdefault(_distinct(row['location']), row['location'])
+        memory_ids.setdefault(row['memory_id'], row['memory_id'])
+
+        entry = self.hourly.setdefault(hour, {}).get(activity)
+        if entry is None:
+            entry = self.hourly[hour][activity] = [0, ordinal]
+        entry[0] += 1
+        self.hour_totals[hour] = self.hour_totals.get(hour, 0) + 1
+
+        week = f"{timestamp.year}_{timestamp.isocalendar()[1]}"
+        entry = self.weekly.setdefault(week, {}).get(activity)
+        if entry is None:
+            entry = self.weekly[week][activity] = [0, ordinal]
+        entry[0] += 1
+
+    def _add_transition(self, timestamp: pd.Timestamp, activity: str):
+        if self.last_timestamp is not None and timestamp - self.last_timestamp <= SEQUENCE_GAP:
+            pair = (self.last_activity, activity)
+            self.transitions[pair] = self.transitions.get(pair, 0) + 1
+            self.open_length += 1
+        else:
+            if self.open_length >= 2:
+                self.closed_sequences += 1
+            self.open_length = 1
+        self.last_timestamp = timestamp
+        self.last_activity = activity
+
+    def _add_social(self, row: Dict[str, Any]):
+        seen = set()
+        for participant in _exploded(row['participants']):
+            if pd.isna(participant) or participant == '':
+                continue
+            self.participants[participant] = self.participants.get(participant, 0) + 1
+            if participant not in seen:
+                seen.add(participant)
+                activities = self.participant_activities.setdefault(participant, {})
+                activities[row['activity']] = activities.get(row['activity'], 0) + 1
+
+    def _add_sentiment(self, timestamp: pd.Timestamp, score):
+        score = float(score)
+        for moments in (self.hour_sentiment.setdefault(timestamp.hour, [[], [], 0]),
+                        self.day_sentiment.setdefault(timestamp.day_name(), [[], [], 0])):
+            _add_partial(moments[0], score)
+            _add_partial(moments[1], score * score)
+            moments[2] += 1
+
+    # ==================== VIEWS ====================
+    # Rows come in the order the DataFrame detectors report them
+
+    def daily_rows(self) -> Iterator[Tuple[str, str, int, float, Dict[int, int]]]:
+        """(day, activity, count, rate over distinct dates, {hour: count})"""
+        for day in sorted(self.daily):
+            total_days = len(self.day_dates[day])
+            for activity, (count, _, hours) in sorted(self.daily[day].items(),
+                                                      key=lambda item: (-item[1][0], item[1][1])):
+                yield day, activity, count, count / total_days, hours
+
+    def day_context_lists(self, day: str) -> Tuple[list, list, list]:
+        """Distinct participants, locations and memory ids seen on a day, by first occurrence"""
+        return tuple(list(values.values()) for values in self.day_context[day])
+
+    def weekly_counts(self) -> Iterator[Tuple[str, List[int]]]:
+        """(activity, its count in every week it occurred)"""
+        first_listed, counts = {}, {}
+        for week in sorted(self.weekly):
+            for activity, (count, first_seen) in self.weekly[week].items():
+                rank = (week, -count, first_seen)
+                if activity not in first_listed or rank < first_listed[activity]:
+                    first_listed[activity] = rank
+                counts.setdefault(activity, []).append(count)
+        for activity in sorted(first_listed, key=first_listed.get):
+            yield activity, counts[activity]
+
+    def hourly_rows(self) -> Iterator[Tuple[int, str, int, int]]:
+        """(hour, activity, count, memories in that hour)"""
+        for hour in sorted(self.hourly):
+            for activity, (count, _) in sorted(self.hourly[hour].items(),
+                                               key=lambda item: (-item[1][0], item[1][1])):
+                yield hour, activity, count, self.hour_totals[hour]
+
+    @property
+    def total_sequences(self) -> int:
+        """Runs of at least two memories no more than SEQUENCE_GAP apart"""
+        return self.closed_sequences + (self.open_length >= 2)
+
+    def common_activities(self, participant, limit: int = 3) -> Dict[str, int]:
+        """The participant's most frequent activities, ties by first occurrence"""
+        ranked = sorted(self.participant_activities[participant].items(), key=lambda item: -item[1])
+        return dict(ranked[:limit])
+
+    @staticmethod
+    def _moments(sentiment: Dict[Any, list]) -> Dict[Any, Tuple[float, float, int]]:
+        return {key: (math.fsum(total), math.fsum(squares), count)
+                for key, (total, squares, count) in sorted(sentiment.items())}
+
+    def hourly_sentiment(self) -> Dict[int, Tuple[float, float, int]]:
+        """hour -> (sum, sum of squares, count) of sentiment scores"""
+        return self._moments(self.hour_sentiment)
+
+    def daily_sentiment(self) -> Dict[str, Tuple[float, float, int]]:
+        """day name -> (sum, sum of squares, count) of sentiment scores"""
+        return self._moments(self.day_sentiment)
+
+    # ==================== PERSISTENCE ====================
+
+    def to_dict(self) -> Dict[str, Any]:
+        """JSON-serialisable form, free of NaN"""
+        return {
+            'watermark': [self.watermark[0].isoformat(), self.watermark[1]] if self.watermark else None,
+            'memories': self.memories,
+            'daily': {day: {activity: [count, first_seen, list(hours.items())]
+                            for activity, (count, first_seen, hours) in activities.items()}
+                      for day, activities in self.daily.items()},
+            'day_dates': {day: sorted(dates) for day, dates in self.day_dates.items()},
+            'day_context': {day: [_pack(list(values.values())) for values in context]
+                            for day, context in self.day_context.items()},
+            'hourly': [[hour, activities] for hour, activities in self.hourly.items()],
+            'hour_totals': list(self.hour_totals.items()),
+            'weekly': self.weekly,
+            'transitions': [[first, then, count] for (first, then), count in self.transitions.items()],
+            'sequence': {
+                'closed': self.closed_sequences,
+                'open_length': self.open_length,
+                'last_timestamp': self.last_timestamp.isoformat() if self.last_timestamp is not None else None,
+                'last_activity': self.last_activity
+            },
+            'participants': [[participant, count, self.participant_activities[participant]]
+                             for participant, count in self.participants.items()],
+            'hour_sentiment': [[hour] + moments for hour, moments in self.hour_sentiment.items()],
+            'day_sentiment': self.day_sentiment
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'PatternState':
+        state = cls()
+        if data.get('watermark'):
+            timestamp, memory_id = data['watermark']
+            state.watermark = (pd.Timestamp(timestamp), memory_id)
+        state.memories = data.get('memories', 0)
+
+        state.daily = {day: {activity: [count, first_seen, {hour: hour_count for hour, hour_count in hours}]
+                             for activity, (count, first_seen, hours) in activities.items()}
+                       for day, activities in data.get('daily', {}).items()}
+        state.day_dates = {day: set(dates) for day, dates in data.get('day_dates', {}).items()}
+        state.day_context = {day: tuple({_distinct(value): value for value in _unpack(packed)} for packed in context)
+                             for day, context in data.get('day_context', {}).items()}
+        state.hourly = {hour: activities for hour, activities in data.get('hourly', [])}
+        state.hour_totals = {hour: count for hour, count in data.get('hour_totals', [])}
+        state.weekly = data.get('weekly', {})
+
+        state.transitions = {(first, then): count for first, then, count in data.get('transitions', [])}
+        sequence = data.get('sequence', {})
+        state.closed_sequences = sequence.get('closed', 0)
+        state.open_length = sequence.get('open_length', 0)
+        if sequence.get('last_timestamp'):
+            state.last_timestamp = pd.Timestamp(sequence['last_timestamp'])
+        state.last_activity = sequence.get('last_activity')
+
+        for participant, count, activities in data.get('participants', []):
+            state.participants[participant] = count
+            state.participant_activities[participant] = activities
+        state.hour_sentiment = {moments[0]: moments[1:] for moments in data.get('hour_sentiment', [])}
+        state.day_sentiment = data.get('day_sentiment', {})
+        return state
@@ -0,0 +1,217 @@
+"""
+Staged Pipeline - bounded-queue stages with per-stage worker pools
+Each stage takes an item from its input queue, runs its handler and puts the
+result on the next stage's queue. Queues are bounded, so a slow stage fills
+the queue in front of it, stalls the stages upstream and finally the intake:
+no more than the queued capacity is ever in flight.
+"""
+
+import time
+import asyncio
+import logging
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterable, AsyncIterator, Awaitable, Callable, Dict, Iterable, List, Optional, Tuple, Union
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+@dataclass
+class Stage:
+    """One pipeline step: `handler` is awaited once per item by `workers` tasks"""
+    name: str
+    handler: Callable[[Any], Awaitable[Any]]
+    workers: int = 1
+    queue_size: int = 64
+
+
+class Finished:
+    """Returned by a handler to end an item early; later stages pass it through"""
+    __slots__ = ('value',)
+
+    def __init__(self, value: Any):
+        self.value = value
+
+
+class _Failed:
+    __slots__ = ('error',)
+
+    def __init__(self, error: BaseException):
+        self.error = error
+
+
+@dataclass
+class StageStats:
+    """Counters for one stage; times are in seconds"""
+    workers: int
+    items: int = 0
+    failed: int = 0
+    busy: float = 0.0
+    blocked: float = 0.0
+    queue_high_water: int = 0
+
+    def to_dict(self, wall: float) -> Dict[str, Any]:
+        return {
+            'workers': self.workers,
+            'items': self.items,
+            'failed': self.failed,
+            'busy_seconds': round(self.busy, 3),
+            'blocked_seconds': round(self.blocked, 3),
+            'utilisation': round(self.busy / (self.workers * wall), 3) if wall else 0.0,
+            'queue_high_water': self.queue_high_water,
+        }
+
+
+@dataclass
+class PipelineStats:
+    stages: Dict[str, StageStats] = field(default_factory=dict)
+    intake_items: int = 0
+    intake_blocked: float = 0.0
+    wall: float = 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'items': self.intake_items,
+            'wall_seconds': round(self.wall, 3),
+            'throughput_per_second': round(self.intake_items / self.wall, 1) if self.wall else 0.0,
+            'intake_blocked_seconds': round(self.intake_blocked, 3),
+            'stages': {name: stats.to_dict(self.wall) for name, stats in self.stages.items()},
+        }
+
+
+class StagedPipeline:
+    """Runs items through stages connected by bounded queues
+
+    `run()` yields `(index, value, error)` for every input as it leaves the
+    last stage - in completion order, not input order. `error` is the
+    exception a handler raised (the item skips the remaining stages), else
+    None. A handler returning `Finished(value)` completes the item with
+    `value` without running the remaining stages.
+    """
+
+    def __init__(self, stages: List[Stage], output_queue_size: int = 64):
+        if not stages:
+            raise ValueError("A pipeline needs at least one stage")
+        self.stages = stages
+        self.output_queue_size = output_queue_size
+        self.stats = PipelineStats()
+
+    async def run(self, items: Union[Iterable[Any], AsyncIterable[Any]]) -> AsyncIterator[Tuple[int, Any, Optional[BaseException]]]:
+        self.stats = PipelineStats(stages={stage.name: StageStats(stage.workers) for stage in self.stages})
+        queues = [asyncio.Queue(stage.queue_size) for stage in self.stages]
+        queues.append(asyncio.Queue(self.output_queue_size))
+
+        tasks = [asyncio.create_task(self._feed(items, queues[0]))]
+        for position, stage in enumerate(self.stages):
+            live = [stage.workers]
+            next_workers = self.stages[position + 1].workers if position + 1 < len(self.stages) else 1
+            for _ in range(stage.workers):
+                tasks.append(asyncio.create_task(
+                    self._work(position, queues[position], queues[position + 1], live, next_workers)
+                ))
+
+        started = time.perf_counter()
+        try:
+            output = queues[-1]
+            while True:
+                entry = await output.get()
+                if entry is _STOP:
+                    break
+                index, value = entry
+                if isinstance(value, _Failed):
+                    yield index, None, value.error
+                elif isinstance(value, Finished):
+                    yield index, value.value, None
+                else:
+                    yield index, value, None
+            # Surface an exception raised while iterating the input
+            await asyncio.gather(*tasks)
+        finally:
+            self.stats.wall = time.perf_counter() - started
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _feed(self, items, queue: asyncio.Queue):
+        cancelled = False
+        try:
+            if hasattr(items, '__aiter__'):
+                index = 0
+                async for item in items:
+                    await self._put(queue, (index, item))
+                    index += 1
+            else:
+                for index, item in enumerate(items):
+                    await self._put(queue, (index, item))
+        except asyncio.CancelledError:
+            cancelled = True
+            raise
+        finally:
+            # Also on errors: the stages drain what was fed, run() re-raises afterwards
+            if not cancelled:
+                await self._stop(queue)
+
+    async def _stop(self, queue: asyncio.Queue):
+        for _ in range(self.stages[0].workers):
+            await queue.put(_STOP)
+
+    async def _put(self, queue: asyncio.Queue, entry):
+        stats = self.stats
+        stats.intake_items += 1
+        if queue.full():
+            blocked = time.perf_counter()
+            await queue.put(entry)
+            stats.intake_blocked += time.perf_counter() - blocked
+        else:
+            queue.put_nowait(entry)
+        stage_stats = stats.stages[self.stages[0].name]
+        stage_stats.queue_high_water = max(stage_stats.queue_high_water, queue.qsize())
+
+    async def _work(self, position: int, inbox: asyncio.Queue, outbox: asyncio.Queue,
+                    live: List[int], next_workers: int):
+        stage = self.stages[position]
+        stats = self.stats.stages[stage.name]
+        next_stats = None
+        if position + 1 < len(self.stages):
+            next_stats = self.stats.stages[self.stages[position + 1].name]
+        perf_counter = time.perf_counter
+
+        cancelled = False
+        try:
+            while True:
+                entry = await inbox.get()
+                if entry is _STOP:
+                    return
+
+                index, value = entry
+                if not isinstance(value, (Finished, _Failed)):
+                    started = perf_counter()
+                    try:
+                        value = await stage.handler(value)
+                    except Exception as e:
+                        logger.debug(f"Stage {stage.name} failed for item {index}: {e}")
+                        value = _Failed(e)
+                        stats.failed += 1
+                    stats.busy += perf_counter() - started
+                    stats.items += 1
+
+                if outbox.full():
+                    blocked = perf_counter()
+                    await outbox.put((index, value))
+                    stats.blocked += perf_counter() - blocked
+                else:
+                    outbox.put_nowait((index, value))
+                if next_stats is not None:
+                    next_stats.queue_high_water = max(next_stats.queue_high_water, outbox.qsize())
+        except asyncio.CancelledError:
+            cancelled = True  # run() is tearing the pipeline down
+            raise
+        finally:
+            # On the stop, and also when a handler's BaseException kills the
+            # worker: the last worker out passes the stop on, so run() finishes
+            if not cancelled:
+                live[0] -= 1
+                if live[0] == 0:
+                    for _ in range(next_workers):
+                        await outbox.put(_STOP)
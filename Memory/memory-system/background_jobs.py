@@ -13,7 +13,6 @@ from typing import Dict, Any, Optional, List
 from enum import Enum
 import json
 import traceback
-import uuid
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from apscheduler.triggers.cron import CronTrigger
 from apscheduler.triggers.interval import IntervalTrigger
@@ -28,9 +27,11 @@ sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 # Import database models
 from database.models import (
     DatabaseManager, Job, JobStatus, JobType,
-    HarvestedItem, DetectedPattern, BehavioralInsight,
+    HarvestedItem, DetectedPattern, BehavioralInsight, UserPatternState,
     AuditLog, SourceType, PatternType, SecurityLevel
 )
+from job_queue import JobQueue, JobWorkerPool, LeasedJob
+from job_unit_of_work import JobUnitOfWork
 
 # Import agents
 try:
@@ -39,8 +40,10 @@ try:
         MemoryHarvesterAgent,
         PatternAnalyzerAgent,
         RawMemoryInput,
-        ContentType
+        ContentType,
+        SourceType as HarvestSourceType
     )
+    from agents.pattern_state import PatternState
     AGENTS_AVAILABLE = True
 except ImportError:
     AGENTS_AVAILABLE = False
@@ -62,15 +65,49 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Lower bound of each of the analyzer's strength bands, for the numeric strength column
+PATTERN_STRENGTH_SCORES = {'weak': 0.3, 'moderate': 0.5, 'strong': 0.7, 'very_strong': 0.85}
+
+# Jobs of a type run at most this many at a time (JOB_LIMIT_<TYPE> overrides),
+# so a backup or a burst of harvests never holds every worker
+JOB_CONCURRENCY_LIMITS = {
+    JobType.HARVEST: 4,
+    JobType.PATTERN_ANALYSIS: 2,
+    JobType.INSIGHT_GENERATION: 2,
+    JobType.DAILY_DIGEST: 2,
+    JobType.BACKUP: 1
+}
+
+# Higher runs first; user-facing harvests ahead of the nightly batch work
+JOB_PRIORITIES = {
+    JobType.HARVEST: 10,
+    JobType.PATTERN_ANALYSIS: 5,
+    JobType.INSIGHT_GENERATION: 5,
+    JobType.DAILY_DIGEST: 3,
+    JobType.BACKUP: 0
+}
+
 class JobManager:
     """Manages background jobs and task execution"""
     
     def __init__(self, database_url: Optional[str] = None):
         self.db_manager = DatabaseManager(database_url)
         self.scheduler = None
-        self.job_queue = asyncio.Queue()
-        self.active_jobs: Dict[str, Job] = {}
+        self.job_queue = JobQueue(
+            self.db_manager,
+            concurrency_limits={
+                job_type: int(os.getenv(f'JOB_LIMIT_{job_type.name}', limit))
+                for job_type, limit in JOB_CONCURRENCY_LIMITS.items()
+            },
+            visibility_timeout=int(os.getenv('JOB_VISIBILITY_TIMEOUT', 300)),
+            max_attempts=int(os.getenv('JOB_MAX_ATTEMPTS', 3))
+        )
+        self.worker_pool: Optional[JobWorkerPool] = None
+        self.active_jobs: Dict[str, LeasedJob] = {}
         self.executor = ThreadPoolExecutor(max_workers=4)
+        # Pattern analysis re-reads items ingested this long before its last
+        # run, for commits still in flight and clock skew between writers
+        self.pattern_ingest_lag = timedelta(seconds=int(os.getenv('PATTERN_INGEST_LAG', 300)))
         
         # Initialize agents if available
         self.memory_harvester = None
@@ -177,103 +214,64 @@ class JobManager:
         logger.info("📅 Scheduled 5 daily jobs")
     
     async def enqueue_job(self, job_type: JobType, user_id: Optional[str] = None,
-                          metadata: Dict[str, Any] = None) -> str:
+                          metadata: Dict[str, Any] = None, priority: Optional[int] = None) -> str:
         """Enqueue a new job for processing"""
-        job_id = str(uuid.uuid4())
+        if priority is None:
+            priority = JOB_PRIORITIES.get(job_type, 0)
         
-        # Create job record
-        with self.db_manager.get_session() as session:
-            job = Job(
-                id=job_id,
-                job_type=job_type,
-                user_id=user_id,
-                status=JobStatus.PENDING,
-                metadata=metadata or {},
-                scheduled_at=datetime.utcnow()
-            )
-            session.add(job)
-            session.commit()
-        
-        # Add to queue
-        await self.job_queue.put(job_id)
+        # Create job record; it survives restarts until a worker completes it
+        job_id = await asyncio.get_running_loop().run_in_executor(
+            self.executor,
+            lambda: self.job_queue.enqueue(job_type, user_id, metadata, priority=priority)
+        )
+        
+        # Wake the local workers instead of waiting for their next poll
+        if self.worker_pool:
+            self.worker_pool.notify()
         
         logger.info(f"📥 Enqueued job {job_id} of type {job_type.value}")
         return job_id
     
     async def process_job_queue(self):
         """Process jobs from the queue"""
-        while True:
-            try:
-                # Get job from queue
-                job_id = await self.job_queue.get()
-                
-                # Process the job
-                await self._process_job(job_id)
-                
-            except Exception as e:
-                logger.error(f"Error processing job queue: {e}")
-                await asyncio.sleep(5)
+        self.worker_pool = JobWorkerPool(
+            self.job_queue,
+            self._process_job,
+            workers=int(os.getenv('JOB_WORKERS', 4)),
+            poll_interval=float(os.getenv('JOB_POLL_INTERVAL', 1.0))
+        )
+        await self.worker_pool.run()
     
-    async def _process_job(self, job_id: str):
-        """Process a single job"""
+    async def _process_job(self, job: LeasedJob) -> Dict[str, Any]:
+        """Process a single leased job; the worker pool records the result or failure"""
+        # Store in active jobs
+        self.active_jobs[job.id] = job
+        
         try:
-            with self.db_manager.get_session() as session:
-                job = session.query(Job).filter_by(id=job_id).first()
-                if not job:
-                    logger.error(f"Job {job_id} not found")
-                    return
-                
-                # Update job status
-                job.status = JobStatus.RUNNING
-                job.started_at = datetime.utcnow()
-                session.commit()
-            
-            # Store in active jobs
-            self.active_jobs[job_id] = job
-            
             # Execute job based on type
             if job.job_type == JobType.HARVEST:
-                result = await self._execute_harvest_job(job_id, job.user_id, job.metadata)
+                result = await self._execute_harvest_job(job.id, job.user_id, job.metadata)
             elif job.job_type == JobType.PATTERN_ANALYSIS:
-                result = await self._execute_pattern_analysis_job(job_id, job.user_id, job.metadata)
+                result = await self._execute_pattern_analysis_job(job.id, job.user_id, job.metadata)
             elif job.job_type == JobType.INSIGHT_GENERATION:
-                result = await self._execute_insight_generation_job(job_id, job.user_id, job.metadata)
+                result = await self._execute_insight_generation_job(job.id, job.user_id, job.metadata)
             elif job.job_type == JobType.DAILY_DIGEST:
-                result = await self._execute_daily_digest_job(job_id, job.user_id, job.metadata)
+                result = await self._execute_daily_digest_job(job.id, job.user_id, job.metadata)
             elif job.job_type == JobType.BACKUP:
-                result = await self._execute_backup_job(job_id, job.metadata)
+                result = await self._execute_backup_job(job.id, job.metadata)
             else:
                 raise ValueError(f"Unknown job type: {job.job_type}")
             
-            # Update job as completed
-            with self.db_manager.get_session() as session:
-                job = session.query(Job).filter_by(id=job_id).first()
-                job.status = JobStatus.COMPLETED
-                job.completed_at = datetime.utcnow()
-                job.progress = 100
-                job.result = result
-                session.commit()
-            
-            # Remove from active jobs
-            del self.active_jobs[job_id]
-            
-            logger.info(f"✅ Job {job_id} completed successfully")
+            logger.info(f"✅ Job {job.id} completed successfully")
+            return result
             
         except Exception as e:
-            logger.error(f"Job {job_id} failed: {e}")
-            
-            # Update job as failed
-            with self.db_manager.get_session() as session:
-                job = session.query(Job).filter_by(id=job_id).first()
-                if job:
-                    job.status = JobStatus.FAILED
-                    job.completed_at = datetime.utcnow()
-                    job.error = str(e)
-                    session.commit()
+            logger.error(f"Job {job.id} failed (attempt {job.attempts}/{job.max_attempts}): {e}")
+            raise
             
+        finally:
             # Remove from active jobs
-            if job_id in self.active_jobs:
-                del self.active_jobs[job_id]
+            del self.active_jobs[job.id]
     
     async def _execute_harvest_job(self, job_id: str, user_id: Optional[str], 
                                    metadata: Dict[str, Any]) -> Dict[str, Any]:
@@ -297,54 +295,59 @@ class JobManager:
             sources = metadata.get('sources', ['chat_message', 'email', 'calendar_event'])
             time_range = metadata.get('time_range', {'days': 1})
             
+            # Items submitted with the job, else one per source (this would come from actual sources)
+            raw_items = metadata.get('items') or [
+                {'source': source, 'content': "Sample memory content"} for source in sources
+            ]
+            
             harvested_items = []
-            total_items = 0
             
-            # Harvest from each source
-            for source in sources:
-                try:
-                    # Create raw memory input
-                    raw_input = RawMemoryInput(
-                        content="Sample memory content",  # This would come from actual sources
-                        source_type=SourceType[source.upper()],
-                        source_metadata={'user_id': user_id},
-                        timestamp=datetime.utcnow(),
-                        user_id=user_id,
-                        content_type=ContentType.TEXT
-                    )
-                    
-                    # Process with harvester
-                    processed = await self.memory_harvester.harvest_memory(raw_input)
-                    
-                    if processed:
-                        # Store in database
-                        with self.db_manager.get_session() as session:
-                            item = HarvestedItem(
-                                user_id=user_id,
-                                content=processed.content,
-                                source_type=SourceType[source.upper()],
-                                quality_score=processed.quality_score,
-                                extra_metadata=processed.metadata,
-                                tags=processed.tags,
-                                created_at=processed.timestamp
-                            )
-                            session.add(item)
-                            session.commit()
-                            
-                            harvested_items.append(item.id)
-                            total_items += 1
+            # Buffer the items and commit them in batches, with progress checkpoints
+            with JobUnitOfWork(self.db_manager, job_id) as unit:
+                for index, raw_item in enumerate(raw_items):
+                    source = raw_item['source']
+                    try:
+                        # Create raw memory input
+                        raw_input = RawMemoryInput(
+                            content=raw_item['content'],
+                            source_type=HarvestSourceType[source.upper()],
+                            source_metadata={'user_id': user_id},
+                            timestamp=datetime.fromisoformat(raw_item['timestamp'])
+                            if raw_item.get('timestamp') else datetime.utcnow(),
+                            user_id=user_id,
+                            content_type=ContentType.TEXT
+                        )
+                        
+                        # Process with harvester
+                        processed = await self.memory_harvester.process_memory(raw_input)
+                        
+                        if processed:
+                            harvested_items.append(unit.add(HarvestedItem, {
+                                'user_id': user_id,
+                                'content': processed.content,
+                                'source_type': SourceType[source.upper()],
+                                'quality_score': processed.quality_score,
+                                'extra_metadata': processed.metadata,
+                                'tags': processed.tags,
+                                'created_at': processed.timestamp
+                            }, key=index))
+                        
+                    except Exception as e:
+                        logger.error(f"Error harvesting from {source}: {e}")
                     
                     # Update progress
-                    await self._update_job_progress(job_id, (len(harvested_items) / len(sources)) * 100)
-                    
-                except Exception as e:
-                    logger.error(f"Error harvesting from {source}: {e}")
+                    unit.checkpoint(index + 1, len(raw_items))
+            
+            # Rows the database rejected were skipped
+            rejected = {row['id'] for row in unit.failed}
+            harvested_items = [item_id for item_id in harvested_items if item_id not in rejected]
             
             return {
                 'status': 'completed',
-                'items_harvested': total_items,
+                'items_harvested': len(harvested_items),
                 'item_ids': harvested_items,
-                'sources_processed': sources
+                'sources_processed': sources,
+                'writes': unit.summary()
             }
             
         except Exception as e:
@@ -368,50 +371,103 @@ class JobManager:
             if not self.pattern_analyzer.is_initialized:
                 await self.pattern_analyzer.initialize()
             
-            # Get recent memories for analysis
+            # Load the user's pattern state and the memories harvested since its last run.
+            # Items are read by ingestion time: a memory's own timestamp may be older
+            # than the watermark (backfills, late commits)
+            started_at = datetime.utcnow()
             with self.db_manager.get_session() as session:
-                recent_memories = session.query(HarvestedItem).filter_by(
-                    user_id=user_id
-                ).order_by(HarvestedItem.created_at.desc()).limit(100).all()
+                record = session.get(UserPatternState, user_id)
+                if record and record.state and record.ingested_through:
+                    state = PatternState.from_dict(record.state)
+                else:
+                    state = PatternState()
+                
+                query = session.query(HarvestedItem).filter_by(user_id=user_id)
+                if state.watermark is not None:
+                    query = query.filter(
+                        HarvestedItem.ingested_at >= record.ingested_through - self.pattern_ingest_lag
+                    )
+                new_memories = self._pattern_memories(query)
+                
+                state_rebuilt = not state.follows_watermark(state.select_new(new_memories))
+                if state_rebuilt:
+                    # A new memory sorts before ones already counted: recount them all
+                    logger.info(f"Rebuilding the pattern state of {user_id} for out-of-order memories")
+                    state = PatternState()
+                    new_memories = self._pattern_memories(session.query(HarvestedItem).filter_by(user_id=user_id))
             
-            # Analyze patterns
-            patterns = await self.pattern_analyzer.analyze_memories([
-                {
-                    'id': m.id,
-                    'content': m.content,
-                    'timestamp': m.created_at,
-                    'metadata': m.extra_metadata
-                }
-                for m in recent_memories
-            ])
+            # Fold them in and derive the user's patterns from the updated state
+            patterns = await self.pattern_analyzer.update_user_patterns(user_id, new_memories, state)
             
-            # Store detected patterns
+            # Store the patterns (ids are stable across runs) and the state in one transaction
             stored_patterns = []
-            for pattern in patterns:
-                with self.db_manager.get_session() as session:
-                    db_pattern = DetectedPattern(
+            with self.db_manager.get_session() as session:
+                for pattern in patterns:
+                    db_pattern = session.merge(DetectedPattern(
+                        id=f"{user_id}_{pattern['id']}",
                         user_id=user_id,
-                        pattern_type=pattern['type'],
-                        strength=pattern['strength'],
+                        pattern_type=PatternType(pattern['pattern_type'].value),
+                        strength=PATTERN_STRENGTH_SCORES[pattern['strength'].value],
                         confidence=pattern['confidence'],
                         description=pattern['description'],
+                        frequency=pattern['frequency'],
+                        triggers=pattern['triggers'],
+                        participants=[p for p in pattern['participants'] if p == p],  # NaN: no participant
+                        locations=pattern['locations'],
+                        time_windows=pattern['time_windows'],
+                        supporting_memories=pattern['supporting_memories'],
                         extra_metadata=pattern.get('metadata', {}),
-                        supporting_memories=pattern.get('supporting_memories', [])
-                    )
-                    session.add(db_pattern)
-                    session.commit()
+                        is_active=True
+                    ))
                     stored_patterns.append(db_pattern.id)
+                
+                # Patterns no longer derived from the state are retired
+                session.query(DetectedPattern).filter(
+                    DetectedPattern.user_id == user_id,
+                    DetectedPattern.is_active == True,
+                    DetectedPattern.id.notin_(stored_patterns)
+                ).update({'is_active': False}, synchronize_session=False)
+                
+                session.merge(UserPatternState(
+                    user_id=user_id,
+                    watermark_at=state.watermark[0].to_pydatetime() if state.watermark else None,
+                    watermark_id=state.watermark[1] if state.watermark else None,
+                    ingested_through=started_at,
+                    memories_seen=state.memories,
+                    state=state.to_dict()
+                ))
+                session.commit()
             
             return {
                 'status': 'completed',
                 'patterns_detected': len(stored_patterns),
-                'pattern_ids': stored_patterns
+                'pattern_ids': stored_patterns,
+                'memories_read': len(new_memories),
+                'memories_seen': state.memories,
+                'state_rebuilt': state_rebuilt
             }
             
         except Exception as e:
             logger.error(f"Pattern analysis job failed: {e}")
             raise
     
+    @staticmethod
+    def _pattern_memories(query) -> List[Dict[str, Any]]:
+        """Harvested items as the pattern analyzer takes them"""
+        return [
+            {
+                'id': m.id,
+                'content': m.content,
+                'timestamp': m.created_at,
+                'participants': m.participants or [],
+                'tags': m.tags or [],
+                'quality_score': m.quality_score or 0,
+                'sentiment': m.sentiment or {},
+                'metadata': m.extra_metadata or {}
+            }
+            for m in query.order_by(HarvestedItem.created_at, HarvestedItem.id).all()
+        ]
+    
     async def _execute_insight_generation_job(self, job_id: str, user_id: Optional[str],
                                              metadata: Dict[str, Any]) -> Dict[str, Any]:
         """Execute insight generation job"""
@@ -427,27 +483,24 @@ class JobManager:
             
             insights_generated = []
             
-            # Generate insights from patterns
-            for pattern in patterns:
-                if pattern.strength > 0.7:  # Strong patterns
-                    insight = BehavioralInsight(
-                        user_id=user_id,
-                        insight_type='pattern_based',
-                        title=f"Strong {pattern.pattern_type.value} Pattern Detected",
-                        description=pattern.description,
-                        confidence=pattern.confidence,
-                        supporting_patterns=[pattern.id],
-                        recommendations=[
-                            f"Consider this pattern in your daily routine",
-                            f"This behavior occurs frequently"
-                        ],
-                        impact_score=pattern.strength
-                    )
-                    
-                    with self.db_manager.get_session() as session:
-                        session.add(insight)
-                        session.commit()
-                        insights_generated.append(insight.id)
+            # Generate insights from patterns, stored in one transaction
+            with JobUnitOfWork(self.db_manager, job_id) as unit:
+                for index, pattern in enumerate(patterns):
+                    if pattern.strength > 0.7:  # Strong patterns
+                        insights_generated.append(unit.add(BehavioralInsight, {
+                            'user_id': user_id,
+                            'insight_type': 'pattern_based',
+                            'title': f"Strong {pattern.pattern_type.value} Pattern Detected",
+                            'description': pattern.description,
+                            'confidence': pattern.confidence,
+                            'supporting_patterns': [pattern.id],
+                            'recommendations': [
+                                f"Consider this pattern in your daily routine",
+                                f"This behavior occurs frequently"
+                            ],
+                            'impact_score': pattern.strength
+                        }, key=pattern.id))
+                    unit.checkpoint(index + 1, len(patterns))
             
             return {
                 'status': 'completed',
@@ -549,42 +602,25 @@ class JobManager:
             logger.error(f"Backup job failed: {e}")
             raise
     
-    async def _update_job_progress(self, job_id: str, progress: int):
-        """Update job progress"""
-        try:
-            with self.db_manager.get_session() as session:
-                job = session.query(Job).filter_by(id=job_id).first()
-                if job:
-                    job.progress = min(100, max(0, progress))
-                    job.updated_at = datetime.utcnow()
-                    session.commit()
-        except Exception as e:
-            logger.error(f"Failed to update job progress: {e}")
-    
     async def run_harvest_job(self, user_id: Optional[str] = None):
         """Run harvest job (called by scheduler)"""
-        job_id = await self.enqueue_job(JobType.HARVEST, user_id, {'scheduled': True})
-        await self._process_job(job_id)
+        await self.enqueue_job(JobType.HARVEST, user_id, {'scheduled': True})
     
     async def run_pattern_analysis_job(self, user_id: Optional[str] = None):
         """Run pattern analysis job (called by scheduler)"""
-        job_id = await self.enqueue_job(JobType.PATTERN_ANALYSIS, user_id, {'scheduled': True})
-        await self._process_job(job_id)
+        await self.enqueue_job(JobType.PATTERN_ANALYSIS, user_id, {'scheduled': True})
     
     async def run_insight_generation_job(self, user_id: Optional[str] = None):
         """Run insight generation job (called by scheduler)"""
-        job_id = await self.enqueue_job(JobType.INSIGHT_GENERATION, user_id, {'scheduled': True})
-        await self._process_job(job_id)
+        await self.enqueue_job(JobType.INSIGHT_GENERATION, user_id, {'scheduled': True})
     
     async def run_daily_digest_job(self, user_id: Optional[str] = None):
         """Run daily digest job (called by scheduler)"""
-        job_id = await self.enqueue_job(JobType.DAILY_DIGEST, user_id, {'scheduled': True})
-        await self._process_job(job_id)
+        await self.enqueue_job(JobType.DAILY_DIGEST, user_id, {'scheduled': True})
     
     async def run_backup_job(self):
         """Run backup job (called by scheduler)"""
-        job_id = await self.enqueue_job(JobType.BACKUP, None, {'scheduled': True})
-        await self._process_job(job_id)
+        await self.enqueue_job(JobType.BACKUP, None, {'scheduled': True})
     
     def start(self):
         """Start the job manager and scheduler"""
@@ -608,6 +644,10 @@ class JobManager:
         if self.scheduler:
             self.scheduler.shutdown()
         
+        # Stop leasing; running jobs finish or their leases expire and they retry
+        if self.worker_pool:
+            self.worker_pool.stop()
+        
         self.executor.shutdown(wait=True)
         
         logger.info("✅ Job Manager stopped")
@@ -621,6 +661,8 @@ class JobManager:
                     'id': job.id,
                     'type': job.job_type.value,
                     'status': job.status.value,
+                    'priority': job.priority,
+                    'attempts': job.attempts,
                     'progress': job.progress,
                     'result': job.result,
                     'error': job.error,
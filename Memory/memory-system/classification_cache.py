@@ -0,0 +1,257 @@
+#!/usr/bin/env python3
+"""
+Classification Cache - Bounded, shareable cache for conversation classification
+In-process LRU/TTL tier with an optional shared SQLite or Redis tier
+"""
+
+import os
+import re
+import json
+import time
+import hashlib
+import logging
+import sys
+import sqlite3
+import threading
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+# The repository root, for the helpers shared with the app
+_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if _ROOT not in sys.path:
+    sys.path.append(_ROOT)
+
+from app.services.single_flight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+try:
+    import redis
+    REDIS_AVAILABLE = True
+except ImportError:
+    REDIS_AVAILABLE = False
+
+
+def message_fingerprint(message: str, scope: str = "") -> str:
+    """Stable key for a message, ignoring case, spacing and trailing punctuation
+
+    `scope` keeps users apart (cached results carry extracted entities), but
+    incidental context such as conversation length is deliberately excluded.
+    """
+    normalized = unicodedata.normalize('NFKC', message).lower()
+    normalized = ' '.join(normalized.split())
+    normalized = re.sub(r'[\s.!?]+$', '', normalized)
+    return hashlib.sha256(f"{scope}\x1f{normalized}".encode('utf-8')).hexdigest()
+
+
+class LocalCacheTier:
+    """In-process LRU cache with per-entry TTL"""
+
+    def __init__(self, max_entries: int = 10000, ttl_seconds: float = 3600):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+
+    def get(self, key: str) -> Optional[Any]:
+        item = self._entries.get(key)
+        if item is None:
+            return None
+        expires_at, value = item
+        if expires_at < time.time():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key: str, value: Any):
+        self._entries[key] = (time.time() + self.ttl_seconds, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def values(self):
+        now = time.time()
+        return [value for expires_at, value in self._entries.values() if expires_at >= now]
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class SQLiteCacheTier:
+    """Shared cache tier in a local SQLite file (shared by worker processes)"""
+
+    def __init__(self, path: str, ttl_seconds: float = 3600):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=5)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS classification_cache ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+        )
+        self._conn.commit()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value FROM classification_cache WHERE key = ? AND expires_at >= ?",
+                (key, time.time())
+            ).fetchone()
+        return row[0] if row else None
+
+    def set(self, key: str, value: str):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO classification_cache (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, value, time.time() + self.ttl_seconds)
+            )
+            self._conn.commit()
+
+    def prune(self) -> int:
+        """Delete expired rows"""
+        with self._lock:
+            cursor = self._conn.execute(
+                "DELETE FROM classification_cache WHERE expires_at < ?", (time.time(),)
+            )
+            self._conn.commit()
+        return cursor.rowcount
+
+
+class RedisCacheTier:
+    """Shared cache tier in Redis (expiry handled by Redis)"""
+
+    def __init__(self, url: str, ttl_seconds: float = 3600, prefix: str = "classification:"):
+        if not REDIS_AVAILABLE:
+            raise RuntimeError("redis package not installed")
+        self.client = redis.Redis.from_url(url, decode_responses=True, socket_connect_timeout=1)
+        self.ttl_seconds = int(ttl_seconds)
+        self.prefix = prefix
+
+    def get(self, key: str) -> Optional[str]:
+        return self.client.get(self.prefix + key)
+
+    def set(self, key: str, value: str):
+        self.client.setex(self.prefix + key, self.ttl_seconds, value)
+
+
+class ClassificationCache:
+    """Two-tier classification cache with stampede protection
+
+    Lookups hit the in-process tier first, then the optional shared tier.
+    Concurrent misses for the same key share one computation.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 10000,
+        ttl_seconds: float = 3600,
+        shared_tier=None,
+        serialize: Callable[[Any], Dict[str, Any]] = None,
+        deserialize: Callable[[Dict[str, Any]], Any] = None
+    ):
+        self.local = LocalCacheTier(max_entries, ttl_seconds)
+        self.shared = shared_tier
+        self.serialize = serialize
+        self.deserialize = deserialize
+        self._flights = SingleFlight()
+        self.stats = {
+            'hits': 0,
+            'shared_hits': 0,
+            'misses': 0,
+            'coalesced': 0,
+            'shared_errors': 0
+        }
+
+    @classmethod
+    def from_env(cls, serialize=None, deserialize=None) -> "ClassificationCache":
+        """Build a cache from CLASSIFIER_CACHE_* environment variables"""
+        ttl = float(os.getenv('CLASSIFIER_CACHE_TTL', 3600))
+        backend = os.getenv('CLASSIFIER_CACHE_BACKEND', 'memory').lower()
+        shared = None
+        try:
+            if backend == 'sqlite':
+                shared = SQLiteCacheTier(
+                    os.getenv('CLASSIFIER_CACHE_PATH', 'classification_cache.db'), ttl
+                )
+            elif backend == 'redis':
+                shared = RedisCacheTier(
+                    os.getenv('CLASSIFIER_CACHE_URL', 'redis://localhost:6379/0'), ttl
+                )
+        except Exception as e:
+            logger.warning(f"⚠️ Shared classification cache unavailable ({backend}): {e}")
+        return cls(
+            max_entries=int(os.getenv('CLASSIFIER_CACHE_MAX_ENTRIES', 10000)),
+            ttl_seconds=ttl,
+            shared_tier=shared,
+            serialize=serialize,
+            deserialize=deserialize
+        )
+
+    def get(self, key: str) -> Optional[Any]:
+        """Look up a key in both tiers"""
+        value = self.local.get(key)
+        if value is not None:
+            self.stats['hits'] += 1
+            return value
+
+        if self.shared is not None and self.deserialize:
+            try:
+                raw = self.shared.get(key)
+            except Exception as e:
+                self.stats['shared_errors'] += 1
+                logger.debug(f"Shared cache read failed: {e}")
+                raw = None
+            if raw is not None:
+                value = self.deserialize(json.loads(raw))
+                self.local.set(key, value)
+                self.stats['shared_hits'] += 1
+                return value
+
+        self.stats['misses'] += 1
+        return None
+
+    def set(self, key: str, value: Any):
+        """Store a value in both tiers"""
+        self.local.set(key, value)
+        if self.shared is not None and self.serialize:
+            try:
+                self.shared.set(key, json.dumps(self.serialize(value)))
+            except Exception as e:
+                self.stats['shared_errors'] += 1
+                logger.debug(f"Shared cache write failed: {e}")
+
+    async def get_or_compute(self, key: str, compute: Callable[[], Awaitable[Any]],
+                             cacheable: Callable[[Any], bool] = None) -> Any:
+        """Return a cached value or compute it once for all concurrent callers"""
+        value = self.get(key)
+        if value is not None:
+            return value
+
+        async def compute_and_store():
+            value = await compute()
+            if cacheable is None or cacheable(value):
+                self.set(key, value)
+            return value
+
+        value, joined = await self._flights.run(key, compute_and_store)
+        if joined:
+            self.stats['coalesced'] += 1
+        return value
+
+    def values(self):
+        """Live values in the in-process tier"""
+        return self.local.values()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Hit-ratio and size statistics"""
+        lookups = self.stats['hits'] + self.stats['shared_hits'] + self.stats['misses']
+        hits = self.stats['hits'] + self.stats['shared_hits']
+        return {
+            **self.stats,
+            'lookups': lookups,
+            'hit_rate': hits / lookups if lookups else 0.0,
+            'local_entries': len(self.local),
+            'shared_backend': type(self.shared).__name__ if self.shared else None
+        }
@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+Contact Name Index - N-gram index over one user's contact names
+Backs PhoneDirectory name lookups: exact, partial (substring either way),
+prefix and fuzzy matches without scanning every contact
+"""
+
+from difflib import SequenceMatcher
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+
+def name_grams(name: str) -> Set[str]:
+    """Padded trigrams of a lower-cased name ("  el", " el", "ele", ..., "na ")"""
+    padded = f"  {name} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def _plain_grams(text: str) -> Set[str]:
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class ContactNameIndex:
+    """Contacts of one user keyed by lower-cased name, in insertion order
+
+    Every contact has a sequence number; lookups that the dict-based
+    directory answered with "first match in iteration order" return the
+    match with the lowest sequence, so results do not change.
+    """
+
+    def __init__(self, rows: List[Tuple[int, str, Dict[str, Any]]] = ()):
+        self.contacts: Dict[str, Dict[str, Any]] = {}
+        self.seq: Dict[str, int] = {}
+        self.grams: Dict[str, Set[str]] = {}
+        self.relationships: Dict[str, Set[str]] = {}
+        for seq, key, contact in rows:
+            self.put(seq, key, contact)
+
+    def __len__(self) -> int:
+        return len(self.contacts)
+
+    def put(self, seq: int, key: str, contact: Dict[str, Any]):
+        """Add or replace a contact (a replaced contact keeps its position)"""
+        if key in self.contacts:
+            self._unlink_relationship(key)
+            seq = self.seq[key]
+        else:
+            for gram in name_grams(key):
+                self.grams.setdefault(gram, set()).add(key)
+        self.contacts[key] = contact
+        self.seq[key] = seq
+        self.relationships.setdefault(contact['relationship'].lower(), set()).add(key)
+
+    def remove(self, key: str):
+        if key not in self.contacts:
+            return
+        self._unlink_relationship(key)
+        for gram in name_grams(key):
+            keys = self.grams.get(gram)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self.grams[gram]
+        del self.contacts[key]
+        del self.seq[key]
+
+    def _unlink_relationship(self, key: str):
+        relationship = self.contacts[key]['relationship'].lower()
+        keys = self.relationships.get(relationship)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self.relationships[relationship]
+
+    def _first(self, keys) -> Optional[str]:
+        return min(keys, key=self.seq.__getitem__, default=None)
+
+    # ------------------------------------------------------------------
+    # Lookups
+    # ------------------------------------------------------------------
+
+    def containing(self, query: str) -> Set[str]:
+        """Names that contain `query`"""
+        if len(query) < 3:
+            return {key for key in self.contacts if query in key}
+        candidates = None
+        for gram in sorted(_plain_grams(query), key=lambda g: len(self.grams.get(g, ()))):
+            keys = self.grams.get(gram)
+            if not keys:
+                return set()
+            candidates = set(keys) if candidates is None else candidates & keys
+            if not candidates:
+                return set()
+        return {key for key in candidates if query in key}
+
+    def contained_in(self, query: str) -> Set[str]:
+        """Names that are substrings of `query`"""
+        length = len(query)
+        if length * (length + 1) // 2 > len(self.contacts):
+            return {key for key in self.contacts if key in query}
+        return {query[i:j] for i in range(length) for j in range(i, length + 1)} & self.contacts.keys()
+
+    def find(self, query: str) -> Optional[Dict[str, Any]]:
+        """Exact name, else first partial name match, else first with that relationship"""
+        if query in self.contacts:
+            return self.contacts[query]
+        key = self._first(self.containing(query) | self.contained_in(query))
+        if key is None:
+            key = self._first(self.relationships.get(query, ()))
+        return self.contacts[key] if key is not None else None
+
+    def with_relationship(self, relationship: str) -> List[Dict[str, Any]]:
+        keys = self.relationships.get(relationship.lower(), ())
+        return [self.contacts[key] for key in sorted(keys, key=self.seq.__getitem__)]
+
+    def search(self, query: str, limit: int = 5, min_score: float = 0.5) -> List[Tuple[float, Dict[str, Any]]]:
+        """Ranked name matches: exact, prefix, substring, then spelling similarity
+
+        Names sharing a trigram with the query are the candidates; those that
+        neither start with nor contain it are scored by edit similarity, which
+        handles typos and swapped letters better than trigram overlap alone.
+        """
+        if not query:
+            return []
+        query_grams = name_grams(query)
+        candidates = set()
+        for gram in query_grams:
+            candidates.update(self.grams.get(gram, ()))
+
+        scored = []
+        for key in candidates:
+            if key == query:
+                score = 1.0
+            elif key.startswith(query):
+                score = 0.9
+            elif query in key:
+                score = 0.8
+            else:
+                score = 0.75 * SequenceMatcher(None, query, key).ratio()
+            if score >= min_score:
+                scored.append((score, key))
+
+        scored.sort(key=lambda item: (-item[0], self.seq[item[1]]))
+        return [(score, self.contacts[key]) for score, key in scored[:limit]]
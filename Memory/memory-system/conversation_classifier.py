@@ -8,16 +8,17 @@ import os
 import json
 import asyncio
 import logging
-import hashlib
-from datetime import datetime, timedelta
+import weakref
 from typing import Dict, Any, List, Optional, Tuple, Set
 from dataclasses import dataclass, asdict
+from contextlib import asynccontextmanager
 from enum import Enum
 import re
 import openai
 from pathlib import Path
 
 from md_file_manager import MemoryTag, MemoryEntry
+from classification_cache import ClassificationCache, message_fingerprint
 
 logger = logging.getLogger(__name__)
 
@@ -28,6 +29,12 @@ class ClassificationConfidence(Enum):
     HIGH = "high"
     VERY_HIGH = "very_high"
 
+# Rank of each confidence level, for threshold comparisons
+CONFIDENCE_RANK = {level.value: rank for rank, level in enumerate(ClassificationConfidence)}
+
+# Reasoning prefix of results produced without a usable model response
+FALLBACK_REASONING = 'Fallback classification'
+
 @dataclass
 class ClassificationResult:
     """Result of message classification"""
@@ -58,10 +65,53 @@ class ConversationContext:
         if self.recent_topics is None:
             self.recent_topics = []
 
+class RequestBudget:
+    """Caps concurrent model requests and the tokens they hold in flight"""
+    
+    def __init__(self, max_requests: int = 4, max_tokens: int = 40000):
+        self.max_requests = max_requests
+        self.max_tokens = max_tokens
+        self.in_flight_requests = 0
+        self.in_flight_tokens = 0
+        # asyncio primitives bind to one event loop, so each loop gets its own condition
+        self._conditions: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+    
+    @property
+    def condition(self) -> asyncio.Condition:
+        """Wake-up condition for the running event loop"""
+        loop = asyncio.get_running_loop()
+        condition = self._conditions.get(loop)
+        if condition is None:
+            condition = self._conditions[loop] = asyncio.Condition()
+        return condition
+    
+    def _fits(self, tokens: int) -> bool:
+        if self.in_flight_requests >= self.max_requests:
+            return False
+        # An oversized request may still run alone
+        return self.in_flight_requests == 0 or self.in_flight_tokens + tokens <= self.max_tokens
+    
+    @asynccontextmanager
+    async def reserve(self, tokens: int):
+        """Wait until the request fits the budget, then hold it while in flight"""
+        condition = self.condition
+        async with condition:
+            await condition.wait_for(lambda: self._fits(tokens))
+            self.in_flight_requests += 1
+            self.in_flight_tokens += tokens
+        try:
+            yield
+        finally:
+            async with condition:
+                self.in_flight_requests -= 1
+                self.in_flight_tokens -= tokens
+                condition.notify_all()
+
 class ConversationClassifier:
     """Advanced AI-powered conversation classifier"""
     
-    def __init__(self, openai_api_key: Optional[str] = None):
+    def __init__(self, openai_api_key: Optional[str] = None, pipeline_mode: Optional[str] = None,
+                 cache: Optional[ClassificationCache] = None):
         """Initialize the conversation classifier"""
         # Get API key from parameter or environment
         api_key = openai_api_key or os.getenv('OPENAI_API_KEY')
@@ -74,14 +124,41 @@ class ConversationClassifier:
             self.openai_client = None
             logger.warning("⚠️ OpenAI API key not configured - using fallback classification")
         
+        # Pipeline configuration: 'combined' issues one structured request per
+        # message, 'concurrent' runs the four stage prompts in parallel
+        self.model = os.getenv('CLASSIFIER_MODEL', 'gpt-3.5-turbo')
+        self.pipeline_mode = pipeline_mode or os.getenv('CLASSIFIER_PIPELINE_MODE', 'combined')
+        self.rule_confidence_threshold = os.getenv('CLASSIFIER_RULE_CONFIDENCE', 'high')
+        if self.rule_confidence_threshold not in CONFIDENCE_RANK:
+            logger.warning(f"Unknown CLASSIFIER_RULE_CONFIDENCE '{self.rule_confidence_threshold}', using 'high'")
+            self.rule_confidence_threshold = 'high'
+        
+        # Batch classification limits
+        self.batch_size = int(os.getenv('CLASSIFIER_BATCH_SIZE', 20))
+        self.batch_tokens_per_message = 120
+        self.batch_max_retries = int(os.getenv('CLASSIFIER_BATCH_RETRIES', 3))
+        self.batch_retry_base_delay = 1.0
+        self.request_budget = RequestBudget(
+            max_requests=int(os.getenv('CLASSIFIER_MAX_IN_FLIGHT', 4)),
+            max_tokens=int(os.getenv('CLASSIFIER_MAX_IN_FLIGHT_TOKENS', 40000))
+        )
+        
         # Classification prompts and rules
         self.classification_prompts = self._load_classification_prompts()
         self.entity_patterns = self._load_entity_patterns()
+        self._compile_entity_patterns()
+        self.sensitivity_rules = self._load_sensitivity_rules()
+        self.event_keywords = [
+            'appointment', 'meeting', 'deadline', 'birthday', 'anniversary',
+            'interview', 'flight', 'reservation', 'dinner', 'lunch', 'call'
+        ]
+        self._compile_keyword_rules()
         
-        # Cache for performance
-        self.classification_cache = {}
-        self.cache_expiry = {}
-        self.cache_duration = timedelta(hours=1)
+        # Bounded cache (in-process LRU/TTL plus optional shared tier)
+        self.cache = cache or ClassificationCache.from_env(
+            serialize=self._result_to_dict,
+            deserialize=self._result_from_dict
+        )
         
         logger.info("🤖 AI Conversation Classifier initialized")
     
@@ -155,6 +232,80 @@ Return in JSON format:
     "new_contacts": ["list of new contacts to track"],
     "relationship_context": "description of relationships mentioned"
 }}
+""",
+            
+            'combined_classification': """
+You are an expert AI assistant that analyzes personal conversations and messages for a memory system.
+
+Message: "{message}"
+Context: "{context}"
+User Profile: {user_profile}
+Recent Conversation: {conversation_history}
+Known Contacts: {known_contacts}
+Recent Topics: {recent_topics}
+
+Classify the message into ONE primary category:
+CHRONOLOGICAL (timeline events, appointments), GENERAL (facts, preferences),
+CONFIDENTIAL (private information), SECRET (highly sensitive information),
+ULTRA_SECRET (maximum security information).
+
+Also extract entities, contacts and topics. Respond with ONE JSON object:
+{{
+    "classification": {{
+        "primary_tag": "chronological|general|confidential|secret|ultra_secret",
+        "confidence": "low|medium|high|very_high",
+        "reasoning": "Brief explanation",
+        "importance_score": 0.0-1.0,
+        "sentiment": "positive|negative|neutral"
+    }},
+    "entities": {{
+        "people": [], "places": [], "organizations": [], "dates_times": [],
+        "topics": [], "action_items": [], "phone_numbers": [], "emails": [],
+        "urls": [], "financial_info": [], "health_info": []
+    }},
+    "contacts": {{
+        "speaker": "identified speaker or null",
+        "mentioned_contacts": [],
+        "new_contacts": [],
+        "relationship_context": "description of relationships mentioned"
+    }},
+    "topics": {{
+        "main_topics": [],
+        "subtopics": [],
+        "topic_relationships": [],
+        "topic_importance": {{}},
+        "new_topics": []
+    }}
+}}
+""",
+            
+            'batch_classification': """
+You are an expert AI assistant that analyzes personal conversations and messages for a memory system.
+
+Classify each of the {count} messages below. Each has an "index"; copy it into its result.
+Categories: CHRONOLOGICAL, GENERAL, CONFIDENTIAL, SECRET, ULTRA_SECRET.
+
+Messages (JSON): {messages}
+
+Respond with ONE JSON object:
+{{
+    "results": [
+        {{
+            "index": 0,
+            "classification": {{
+                "primary_tag": "chronological|general|confidential|secret|ultra_secret",
+                "confidence": "low|medium|high|very_high",
+                "reasoning": "Brief explanation",
+                "importance_score": 0.0-1.0,
+                "sentiment": "positive|negative|neutral"
+            }},
+            "entities": {{"people": [], "places": [], "dates_times": [], "action_items": [],
+                          "financial_info": [], "health_info": []}},
+            "contacts": {{"mentioned_contacts": [], "new_contacts": [], "relationship_context": ""}},
+            "topics": {{"main_topics": [], "new_topics": []}}
+        }}
+    ]
+}}
 """,
             
             'topic_analysis': """
@@ -180,6 +331,23 @@ Return in JSON format:
 """
         }
     
+    def _load_sensitivity_rules(self) -> List[Tuple[str, List[str]]]:
+        """Keyword rules for sensitive content, most sensitive first"""
+        return [
+            ('ultra_secret', [
+                'password', 'passcode', 'private key', 'seed phrase',
+                'recovery phrase', 'master key', '2fa code', 'pin code'
+            ]),
+            ('secret', [
+                'social security', 'ssn', 'bank account', 'routing number',
+                'credit card', 'cvv', 'passport number', 'account number'
+            ]),
+            ('confidential', [
+                'diagnosis', 'medication', 'prescription', 'therapy',
+                'therapist', 'salary', 'my debt', 'lawsuit'
+            ])
+        ]
+    
     def _load_entity_patterns(self) -> Dict[str, List[str]]:
         """Load regex patterns for entity extraction"""
         return {
@@ -209,58 +377,41 @@ Return in JSON format:
             ]
         }
     
+    @staticmethod
+    def _keyword_pattern(keywords: List[str]) -> re.Pattern:
+        """Whole-word match for any of the keywords ('call' but not 'recall')"""
+        return re.compile(r'\b(?:' + '|'.join(re.escape(keyword) for keyword in keywords) + r')\b')
+    
+    def _compile_keyword_rules(self):
+        """Compile the sensitivity and event keyword lists once"""
+        self.compiled_sensitivity_rules = [
+            (tag, self._keyword_pattern(keywords)) for tag, keywords in self.sensitivity_rules
+        ]
+        self.event_keyword_pattern = self._keyword_pattern(self.event_keywords)
+    
+    def _compile_entity_patterns(self):
+        """Compile entity patterns once, plus a combined any-entity prefilter"""
+        self.compiled_entity_patterns = {
+            entity_type: [re.compile(pattern, re.IGNORECASE) for pattern in patterns]
+            for entity_type, patterns in self.entity_patterns.items()
+        }
+        # One alternation matches iff at least one entity pattern matches
+        self.entity_prefilter = re.compile(
+            '|'.join(f'(?:{pattern})' for patterns in self.entity_patterns.values() for pattern in patterns),
+            re.IGNORECASE
+        )
+    
     async def classify_message(self, message: str, context: ConversationContext) -> ClassificationResult:
         """Classify a message using AI and rule-based approaches"""
         try:
-            # Check cache first
+            # Cached, or computed once for all concurrent identical requests
             cache_key = self._generate_cache_key(message, context)
-            if self._is_cache_valid(cache_key):
-                logger.debug(f"Using cached classification for message")
-                return self.classification_cache[cache_key]
-            
-            # Step 1: Primary classification using AI
-            primary_result = await self._classify_primary_tag(message, context)
-            
-            # Step 2: Extract entities
-            entities = await self._extract_entities(message, context)
-            
-            # Step 3: Identify contacts
-            contacts = await self._identify_contacts(message, context)
-            
-            # Step 4: Analyze topics
-            topics = await self._analyze_topics(message, context)
-            
-            # Step 5: Extract temporal references
-            temporal_refs = self._extract_temporal_references(message)
-            
-            # Step 6: Determine secondary tags
-            secondary_tags = self._determine_secondary_tags(
-                message, primary_result, entities, contacts, topics
+            return await self.cache.get_or_compute(
+                cache_key,
+                lambda: self._classify_uncached(message, context),
+                cacheable=self._is_cacheable
             )
             
-            # Create classification result
-            result = ClassificationResult(
-                primary_tag=MemoryTag(primary_result['primary_tag']),
-                confidence=ClassificationConfidence(primary_result['confidence']),
-                secondary_tags=secondary_tags,
-                extracted_entities=entities,
-                sentiment=primary_result['sentiment'],
-                importance_score=primary_result['importance_score'],
-                related_contacts=contacts['mentioned_contacts'] + contacts['new_contacts'],
-                topics=topics['main_topics'],
-                action_items=entities.get('action_items', []),
-                temporal_references=temporal_refs,
-                reasoning=primary_result['reasoning']
-            )
-            
-            # Cache the result
-            self.classification_cache[cache_key] = result
-            self.cache_expiry[cache_key] = datetime.now() + self.cache_duration
-            
-            logger.info(f"🏷️ Classified message: {result.primary_tag.value} (confidence: {result.confidence.value})")
-            
-            return result
-            
         except Exception as e:
             logger.error(f"Failed to classify message: {e}")
             # Return default classification
@@ -278,6 +429,185 @@ Return in JSON format:
                 reasoning=f"Classification failed: {str(e)}"
             )
     
+    async def _classify_uncached(self, message: str, context: ConversationContext) -> ClassificationResult:
+        """Run the classification pipeline for one message"""
+        # Step 1: Rule-based pass (no model calls)
+        regex_entities = self._extract_entities_regex(message)
+        temporal_refs = self._extract_temporal_references(message)
+        rule_result = self._classify_by_rules(message, regex_entities, temporal_refs)
+        
+        # Step 2: Model stages, skipped entirely when the rules are confident
+        if self._rules_are_confident(rule_result) or not self.openai_client:
+            primary_result = rule_result
+            entities = regex_entities
+            contacts = self._match_known_contacts(message, context)
+            topics = self._match_recent_topics(message, context)
+        elif self.pipeline_mode == 'combined':
+            primary_result, entities, contacts, topics = await self._classify_combined(
+                message, context, regex_entities
+            )
+        else:
+            # Independent stages run concurrently
+            primary_result, entities, contacts, topics = await asyncio.gather(
+                self._classify_primary_tag(message, context),
+                self._extract_entities(message, context, regex_entities),
+                self._identify_contacts(message, context),
+                self._analyze_topics(message, context)
+            )
+        
+        result = self._build_result(message, primary_result, entities, contacts, topics, temporal_refs)
+        
+        logger.info(f"🏷️ Classified message: {result.primary_tag.value} (confidence: {result.confidence.value})")
+        
+        return result
+    
+    def _build_result(self, message: str, primary_result: Dict[str, Any], entities: Dict[str, List[str]],
+                      contacts: Dict[str, Any], topics: Dict[str, Any],
+                      temporal_refs: List[str]) -> ClassificationResult:
+        """Assemble a ClassificationResult from the per-stage outputs"""
+        # Determine secondary tags
+        secondary_tags = self._determine_secondary_tags(
+            message, primary_result, entities, contacts, topics
+        )
+        
+        return ClassificationResult(
+            primary_tag=self._to_memory_tag(primary_result['primary_tag']),
+            confidence=ClassificationConfidence(primary_result['confidence']),
+            secondary_tags=secondary_tags,
+            extracted_entities=entities,
+            sentiment=primary_result['sentiment'],
+            importance_score=primary_result['importance_score'],
+            related_contacts=contacts['mentioned_contacts'] + contacts['new_contacts'],
+            topics=topics['main_topics'],
+            action_items=entities.get('action_items', []),
+            temporal_references=temporal_refs,
+            reasoning=primary_result['reasoning']
+        )
+    
+    def _classify_by_rules(self, message: str, regex_entities: Dict[str, List[str]],
+                           temporal_refs: List[str]) -> Dict[str, Any]:
+        """Rule-based primary classification used to short-circuit the model"""
+        message_lower = message.lower()
+        
+        # Highest-sensitivity rules win
+        for tag, pattern in self.compiled_sensitivity_rules:
+            matched = list(dict.fromkeys(pattern.findall(message_lower)))
+            if matched:
+                return {
+                    'primary_tag': tag,
+                    'confidence': 'very_high' if len(matched) > 1 else 'high',
+                    'reasoning': f"Rule match: {', '.join(matched)}",
+                    'importance_score': 0.9 if tag != 'confidential' else 0.7,
+                    'sentiment': 'neutral'
+                }
+        
+        # Dated events with an event keyword are chronological
+        event_words = self.event_keyword_pattern.findall(message_lower)
+        if temporal_refs and event_words:
+            return {
+                'primary_tag': 'chronological',
+                'confidence': 'high',
+                'reasoning': f"Rule match: event '{event_words[0]}' with time reference",
+                'importance_score': 0.6,
+                'sentiment': 'neutral'
+            }
+        
+        return {
+            'primary_tag': 'chronological' if temporal_refs else 'general',
+            'confidence': 'low',
+            'reasoning': 'Rule-based classification (no strong signals)',
+            'importance_score': 0.5,
+            'sentiment': 'neutral'
+        }
+    
+    def _to_memory_tag(self, tag: str) -> MemoryTag:
+        """Map a classification label to a MemoryTag (prompts say 'ultra_secret')"""
+        tag = str(tag).strip().lower()
+        return MemoryTag('ultrasecret' if tag == 'ultra_secret' else tag)
+    
+    def _rules_are_confident(self, rule_result: Dict[str, Any]) -> bool:
+        """Whether the rule-based result is good enough to skip the model"""
+        rank = CONFIDENCE_RANK.get(rule_result.get('confidence'), 0)
+        return rank >= CONFIDENCE_RANK[self.rule_confidence_threshold]
+    
+    def _match_known_contacts(self, message: str, context: ConversationContext) -> Dict[str, Any]:
+        """Find known contacts mentioned in the message without the model"""
+        message_lower = message.lower()
+        mentioned = [
+            contact for contact in context.known_contacts
+            if re.search(r'\b' + re.escape(contact.lower()) + r'\b', message_lower)
+        ]
+        return {
+            'speaker': '',
+            'mentioned_contacts': mentioned,
+            'new_contacts': [],
+            'relationship_context': ''
+        }
+    
+    def _match_recent_topics(self, message: str, context: ConversationContext) -> Dict[str, Any]:
+        """Find recent topics mentioned in the message without the model"""
+        message_lower = message.lower()
+        return {
+            'main_topics': [topic for topic in context.recent_topics if topic.lower() in message_lower],
+            'subtopics': [],
+            'topic_relationships': [],
+            'topic_importance': {},
+            'new_topics': []
+        }
+    
+    async def _classify_combined(self, message: str, context: ConversationContext,
+                                 regex_entities: Dict[str, List[str]]) -> Tuple[Dict[str, Any], ...]:
+        """Run every model stage as one structured-output request"""
+        prompt = self.classification_prompts['combined_classification'].format(
+            message=message,
+            context=context.user_phone,
+            user_profile=json.dumps(context.user_profile or {}),
+            conversation_history=json.dumps(context.conversation_history[-5:]),
+            known_contacts=json.dumps(context.known_contacts),
+            recent_topics=json.dumps(context.recent_topics)
+        )
+        
+        response = await self._call_openai(prompt, max_tokens=700, json_mode=True)
+        try:
+            data = json.loads(response)
+        except json.JSONDecodeError:
+            data = {}
+        return self._parse_combined_response(data, response, regex_entities)
+    
+    def _parse_combined_response(self, data: Dict[str, Any], raw_response: str,
+                                 regex_entities: Dict[str, List[str]]) -> Tuple[Dict[str, Any], ...]:
+        """Split a combined response into the per-stage result shapes"""
+        classification = data.get('classification')
+        if not isinstance(classification, dict) or 'primary_tag' not in classification:
+            classification = self._parse_classification_fallback(raw_response)
+        primary_result = {
+            'primary_tag': classification.get('primary_tag', 'general'),
+            'confidence': classification.get('confidence', 'medium'),
+            'reasoning': classification.get('reasoning', ''),
+            'importance_score': float(classification.get('importance_score', 0.5)),
+            'sentiment': classification.get('sentiment', 'neutral')
+        }
+        
+        entities = self._merge_entities(data.get('entities') or {}, regex_entities)
+        
+        contacts = data.get('contacts') or {}
+        contacts = {
+            'speaker': contacts.get('speaker') or '',
+            'mentioned_contacts': contacts.get('mentioned_contacts') or [],
+            'new_contacts': contacts.get('new_contacts') or [],
+            'relationship_context': contacts.get('relationship_context') or ''
+        }
+        
+        topics = data.get('topics') or {}
+        topics = {
+            'main_topics': topics.get('main_topics') or [],
+            'subtopics': topics.get('subtopics') or [],
+            'topic_relationships': topics.get('topic_relationships') or [],
+            'topic_importance': topics.get('topic_importance') or {},
+            'new_topics': topics.get('new_topics') or []
+        }
+        return primary_result, entities, contacts, topics
+    
     async def _classify_primary_tag(self, message: str, context: ConversationContext) -> Dict[str, Any]:
         """Use AI to classify the primary memory tag"""
         try:
@@ -308,8 +638,11 @@ Return in JSON format:
                 'sentiment': 'neutral'
             }
     
-    async def _extract_entities(self, message: str, context: ConversationContext) -> Dict[str, List[str]]:
+    async def _extract_entities(self, message: str, context: ConversationContext,
+                                regex_entities: Optional[Dict[str, List[str]]] = None) -> Dict[str, List[str]]:
         """Extract entities from the message"""
+        if regex_entities is None:
+            regex_entities = self._extract_entities_regex(message)
         try:
             # Use AI for entity extraction
             prompt = self.classification_prompts['entity_extraction'].format(
@@ -325,32 +658,39 @@ Return in JSON format:
                 ai_entities = {}
             
             # Combine with regex-based extraction
-            regex_entities = self._extract_entities_regex(message)
-            
-            # Merge results
-            combined_entities = {}
-            all_keys = set(ai_entities.keys()) | set(regex_entities.keys())
-            
-            for key in all_keys:
-                combined_entities[key] = list(set(
-                    ai_entities.get(key, []) + regex_entities.get(key, [])
-                ))
-            
-            return combined_entities
+            return self._merge_entities(ai_entities, regex_entities)
             
         except Exception as e:
             logger.error(f"Entity extraction failed: {e}")
-            return self._extract_entities_regex(message)
+            return regex_entities
+    
+    def _merge_entities(self, ai_entities: Dict[str, List[str]],
+                        regex_entities: Dict[str, List[str]]) -> Dict[str, List[str]]:
+        """Merge model-extracted and regex-extracted entities"""
+        combined_entities = {}
+        all_keys = set(ai_entities.keys()) | set(regex_entities.keys())
+        
+        for key in all_keys:
+            ai_values = ai_entities.get(key, [])
+            if not isinstance(ai_values, list):
+                ai_values = [ai_values]
+            combined_entities[key] = list(set(
+                [str(value) for value in ai_values] + regex_entities.get(key, [])
+            ))
+        
+        return combined_entities
     
     def _extract_entities_regex(self, message: str) -> Dict[str, List[str]]:
         """Extract entities using regex patterns"""
-        entities = {}
+        entities = {entity_type: [] for entity_type in self.compiled_entity_patterns}
         
-        for entity_type, patterns in self.entity_patterns.items():
-            entities[entity_type] = []
-            
+        # Most messages contain no entities at all: one scan settles that
+        if not self.entity_prefilter.search(message):
+            return entities
+        
+        for entity_type, patterns in self.compiled_entity_patterns.items():
             for pattern in patterns:
-                matches = re.findall(pattern, message, re.IGNORECASE)
+                matches = pattern.findall(message)
                 if matches:
                     if isinstance(matches[0], tuple):
                         # Handle grouped matches
@@ -364,6 +704,10 @@ Return in JSON format:
         
         return entities
     
+    def extract_entities_batch(self, messages: List[str]) -> List[Dict[str, List[str]]]:
+        """Regex entity extraction for many messages with the compiled patterns"""
+        return [self._extract_entities_regex(message) for message in messages]
+    
     async def _identify_contacts(self, message: str, context: ConversationContext) -> Dict[str, Any]:
         """Identify contacts mentioned in the message"""
         try:
@@ -471,7 +815,7 @@ Return in JSON format:
         
         return secondary_tags
     
-    async def _call_openai(self, prompt: str, max_tokens: int = 150) -> str:
+    async def _call_openai(self, prompt: str, max_tokens: int = 150, json_mode: bool = False) -> str:
         """Call OpenAI API with error handling"""
         # Check if OpenAI client is available
         if not self.openai_client:
@@ -480,16 +824,25 @@ Return in JSON format:
             return self._get_fallback_response(prompt)
         
         try:
-            response = await asyncio.to_thread(
-                self.openai_client.chat.completions.create,
-                model="gpt-3.5-turbo",
-                messages=[
-                    {"role": "system", "content": "You are an expert AI assistant for personal memory management and conversation analysis."},
-                    {"role": "user", "content": prompt}
-                ],
-                max_completion_tokens=max_tokens,
-                temperature=0.3
-            )
+            extra_args = {}
+            if json_mode:
+                # Structured output: the model must return a single JSON object
+                extra_args['response_format'] = {"type": "json_object"}
+            
+            # Rough token estimate (~4 characters per token) for the in-flight budget
+            estimated_tokens = len(prompt) // 4 + max_tokens
+            async with self.request_budget.reserve(estimated_tokens):
+                response = await asyncio.to_thread(
+                    self.openai_client.chat.completions.create,
+                    model=self.model,
+                    messages=[
+                        {"role": "system", "content": "You are an expert AI assistant for personal memory management and conversation analysis."},
+                        {"role": "user", "content": prompt}
+                    ],
+                    max_completion_tokens=max_tokens,
+                    temperature=0.3,
+                    **extra_args
+                )
             
             content = response.choices[0].message.content
             return content.strip() if content else ''
@@ -506,7 +859,7 @@ Return in JSON format:
             return json.dumps({
                 "primary_tag": "general",
                 "confidence": "medium",
-                "reasoning": "Fallback classification - AI not available",
+                "reasoning": f"{FALLBACK_REASONING} - AI not available",
                 "importance_score": 0.5,
                 "sentiment": "neutral"
             })
@@ -547,7 +900,7 @@ Return in JSON format:
         result = {
             'primary_tag': 'general',
             'confidence': 'medium',
-            'reasoning': 'Fallback classification',
+            'reasoning': FALLBACK_REASONING,
             'importance_score': 0.5,
             'sentiment': 'neutral'
         }
@@ -568,62 +921,186 @@ Return in JSON format:
         
         return result
     
+    @staticmethod
+    def _is_cacheable(result: ClassificationResult) -> bool:
+        """Degraded results are recomputed on the next request instead of cached"""
+        return not result.reasoning.startswith(FALLBACK_REASONING)
+    
     def _generate_cache_key(self, message: str, context: ConversationContext) -> str:
         """Generate cache key for classification result"""
-        content = f"{message}_{context.user_phone}_{len(context.conversation_history)}"
-        return hashlib.md5(content.encode()).hexdigest()
+        # Normalized message per user; conversation length is deliberately ignored
+        return message_fingerprint(message, scope=context.user_phone)
     
-    def _is_cache_valid(self, cache_key: str) -> bool:
-        """Check if cache entry is valid"""
-        if cache_key not in self.classification_cache:
-            return False
+    @staticmethod
+    def _result_to_dict(result: ClassificationResult) -> Dict[str, Any]:
+        """Serialize a result for the shared cache tier"""
+        data = asdict(result)
+        data['primary_tag'] = result.primary_tag.value
+        data['confidence'] = result.confidence.value
+        data['secondary_tags'] = [tag.value for tag in result.secondary_tags]
+        return data
+    
+    @staticmethod
+    def _result_from_dict(data: Dict[str, Any]) -> ClassificationResult:
+        """Rebuild a result read from the shared cache tier"""
+        data = dict(data)
+        data['primary_tag'] = MemoryTag(data['primary_tag'])
+        data['confidence'] = ClassificationConfidence(data['confidence'])
+        data['secondary_tags'] = [MemoryTag(tag) for tag in data['secondary_tags']]
+        return ClassificationResult(**data)
+    
+    async def batch_classify_messages(self, messages: List[Tuple[str, ConversationContext]],
+                                      batch_size: Optional[int] = None) -> List[ClassificationResult]:
+        """Classify multiple messages in batch
         
-        if cache_key not in self.cache_expiry:
-            return False
+        Cached and rule-confident messages are resolved locally. The rest are
+        packed `batch_size` at a time into one indexed prompt, sent under the
+        in-flight request and token budget, and only items missing from a
+        response are retried (with backoff). Results keep the input order.
+        """
+        batch_size = batch_size or self.batch_size
+        results: List[Optional[ClassificationResult]] = [None] * len(messages)
+        pending: List[Tuple[int, str, ConversationContext, Dict[str, Any]]] = []
         
-        return datetime.now() < self.cache_expiry[cache_key]
-    
-    async def batch_classify_messages(self, messages: List[Tuple[str, ConversationContext]]) -> List[ClassificationResult]:
-        """Classify multiple messages in batch"""
-        tasks = []
-        for message, context in messages:
-            task = self.classify_message(message, context)
-            tasks.append(task)
-        
-        results = await asyncio.gather(*tasks, return_exceptions=True)
-        
-        # Handle exceptions
-        processed_results = []
-        for i, result in enumerate(results):
-            if isinstance(result, Exception):
-                logger.error(f"Batch classification failed for message {i}: {result}")
-                # Create default result
-                processed_results.append(ClassificationResult(
-                    primary_tag=MemoryTag.GENERAL,
-                    confidence=ClassificationConfidence.LOW,
-                    secondary_tags=[],
-                    extracted_entities={},
-                    sentiment="neutral",
-                    importance_score=0.5,
-                    related_contacts=[],
-                    topics=[],
-                    action_items=[],
-                    temporal_references=[],
-                    reasoning=f"Batch processing failed: {str(result)}"
-                ))
+        # Resolve everything that needs no model call
+        for index, (message, context) in enumerate(messages):
+            cache_key = self._generate_cache_key(message, context)
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                results[index] = cached
+                continue
+            
+            regex_entities = self._extract_entities_regex(message)
+            temporal_refs = self._extract_temporal_references(message)
+            rule_result = self._classify_by_rules(message, regex_entities, temporal_refs)
+            if self._rules_are_confident(rule_result) or not self.openai_client:
+                result = self._build_result(
+                    message, rule_result, regex_entities,
+                    self._match_known_contacts(message, context),
+                    self._match_recent_topics(message, context),
+                    temporal_refs
+                )
+                self.cache.set(cache_key, result)
+                results[index] = result
             else:
-                processed_results.append(result)
+                pending.append((index, message, context, {
+                    'cache_key': cache_key,
+                    'regex_entities': regex_entities,
+                    'temporal_refs': temporal_refs
+                }))
         
-        return processed_results
+        # Model calls in micro-batches, retrying only the failed items
+        attempt = 0
+        while pending and attempt <= self.batch_max_retries:
+            if attempt:
+                delay = min(self.batch_retry_base_delay * (2 ** (attempt - 1)), 30)
+                logger.warning(f"Retrying {len(pending)} unclassified messages in {delay:.1f}s")
+                await asyncio.sleep(delay)
+            
+            chunks = [pending[i:i + batch_size] for i in range(0, len(pending), batch_size)]
+            outcomes = await asyncio.gather(
+                *(self._classify_micro_batch(chunk) for chunk in chunks),
+                return_exceptions=True
+            )
+            
+            failed = []
+            for chunk, outcome in zip(chunks, outcomes):
+                if isinstance(outcome, Exception):
+                    logger.error(f"Micro-batch of {len(chunk)} messages failed: {outcome}")
+                    failed.extend(chunk)
+                    continue
+                for item in chunk:
+                    result = outcome.get(item[0])
+                    if result is None:
+                        failed.append(item)
+                    else:
+                        if self._is_cacheable(result):
+                            self.cache.set(item[3]['cache_key'], result)
+                        results[item[0]] = result
+            pending = failed
+            attempt += 1
+        
+        # Anything still unresolved gets the default result
+        for index, message, context, _ in pending:
+            logger.error(f"Batch classification failed for message {index}")
+            results[index] = ClassificationResult(
+                primary_tag=MemoryTag.GENERAL,
+                confidence=ClassificationConfidence.LOW,
+                secondary_tags=[],
+                extracted_entities={},
+                sentiment="neutral",
+                importance_score=0.5,
+                related_contacts=[],
+                topics=[],
+                action_items=[],
+                temporal_references=[],
+                reasoning=f"Batch processing failed after {self.batch_max_retries} retries"
+            )
+        
+        return results
+    
+    async def _classify_micro_batch(self, items: List[Tuple[int, str, ConversationContext, Dict[str, Any]]]
+                                    ) -> Dict[int, ClassificationResult]:
+        """Classify several messages with one indexed structured request"""
+        payload = [
+            {
+                "index": index,
+                "message": message,
+                "known_contacts": context.known_contacts,
+                "recent_topics": context.recent_topics
+            }
+            for index, message, context, _ in items
+        ]
+        prompt = self.classification_prompts['batch_classification'].format(
+            count=len(items),
+            messages=json.dumps(payload, ensure_ascii=False)
+        )
+        response = await self._call_openai(
+            prompt,
+            max_tokens=self.batch_tokens_per_message * len(items),
+            json_mode=True
+        )
+        
+        try:
+            data = json.loads(response)
+        except json.JSONDecodeError:
+            return {}
+        
+        responses = {}
+        for entry in data.get('results', []) if isinstance(data, dict) else []:
+            if isinstance(entry, dict) and 'index' in entry:
+                try:
+                    responses[int(entry['index'])] = entry
+                except (TypeError, ValueError):
+                    continue
+        
+        results = {}
+        for index, message, context, prepared in items:
+            entry = responses.get(index)
+            if not entry or not isinstance(entry.get('classification'), dict):
+                continue
+            try:
+                primary_result, entities, contacts, topics = self._parse_combined_response(
+                    entry, json.dumps(entry), prepared['regex_entities']
+                )
+                results[index] = self._build_result(
+                    message, primary_result, entities, contacts, topics, prepared['temporal_refs']
+                )
+            except (ValueError, KeyError, TypeError) as e:
+                logger.debug(f"Discarding malformed batch result {index}: {e}")
+        return results
     
     def get_classification_stats(self) -> Dict[str, Any]:
         """Get classification statistics"""
-        total_classifications = len(self.classification_cache)
+        cached_results = self.cache.values()
+        cache_stats = self.cache.get_stats()
+        total_classifications = len(cached_results)
         
         if total_classifications == 0:
             return {
                 'total_classifications': 0,
-                'cache_hit_rate': 0,
+                'cache_hit_rate': cache_stats['hit_rate'],
+                'cache': cache_stats,
                 'tag_distribution': {},
                 'confidence_distribution': {}
             }
@@ -632,7 +1109,7 @@ Return in JSON format:
         tag_counts = {}
         confidence_counts = {}
         
-        for result in self.classification_cache.values():
+        for result in cached_results:
             tag = result.primary_tag.value
             confidence = result.confidence.value
             
@@ -641,10 +1118,12 @@ Return in JSON format:
         
         return {
             'total_classifications': total_classifications,
-            'cache_entries': len(self.classification_cache),
+            'cache_entries': len(self.cache.local),
+            'cache_hit_rate': cache_stats['hit_rate'],
+            'cache': cache_stats,
             'tag_distribution': tag_counts,
             'confidence_distribution': confidence_counts,
-            'average_importance': sum(r.importance_score for r in self.classification_cache.values()) / total_classifications
+            'average_importance': sum(r.importance_score for r in cached_results) / total_classifications
         }
 
 # Example usage and testing
@@ -212,7 +212,7 @@ def enqueue_harvest():
         job_id = run_async(job_manager.enqueue_job(
             JobType.HARVEST,
             user_id=user_id,
-            extra_metadata=metadata
+            metadata=metadata
         ))
         
         logger.info(f"Harvest job {job_id} enqueued for user {user_id}")
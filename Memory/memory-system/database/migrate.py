@@ -28,7 +28,7 @@ def init_database():
         
         logger.info("🔨 Creating database tables...")
         
-        # Create all tables
+        # Create missing tables and upgrade existing ones
         db_manager.create_tables()
         
         logger.info("✅ Database tables created successfully!")
@@ -61,6 +61,24 @@ def init_database():
         logger.error(f"❌ Failed to initialize database: {e}")
         return False
 
+def upgrade_database():
+    """Add columns and indexes missing from tables created by older releases"""
+    try:
+        database_url = os.environ.get('DATABASE_URL')
+        db_manager = DatabaseManager(database_url)
+        
+        logger.info("🔧 Upgrading existing tables...")
+        applied = db_manager.upgrade_schema()
+        for step in applied:
+            logger.info(f"  ✓ Added {step}")
+        logger.info(f"✅ Schema up to date ({len(applied)} changes)")
+        
+        return True
+        
+    except Exception as e:
+        logger.error(f"❌ Failed to upgrade database: {e}")
+        return False
+
 def drop_all_tables():
     """Drop all tables (use with caution!)"""
     try:
@@ -114,13 +132,15 @@ if __name__ == "__main__":
     import argparse
     
     parser = argparse.ArgumentParser(description="Database Migration Tool")
-    parser.add_argument('command', choices=['init', 'drop', 'verify'],
+    parser.add_argument('command', choices=['init', 'upgrade', 'drop', 'verify'],
                        help='Command to execute')
     
     args = parser.parse_args()
     
     if args.command == 'init':
         success = init_database()
+    elif args.command == 'upgrade':
+        success = upgrade_database()
     elif args.command == 'drop':
         success = drop_all_tables()
     elif args.command == 'verify':
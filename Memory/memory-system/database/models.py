@@ -6,7 +6,7 @@ SQLAlchemy models for production implementation
 
 from datetime import datetime
 from typing import Optional, Dict, Any, List
-from sqlalchemy import create_engine, Column, String, Float, DateTime, JSON, Text, Boolean, Integer, ForeignKey, Index, Enum
+from sqlalchemy import create_engine, inspect, text, Column, String, Float, DateTime, JSON, Text, Boolean, Integer, ForeignKey, Index, Enum
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship, sessionmaker
 from sqlalchemy.dialects.postgresql import UUID
@@ -90,6 +90,9 @@ class HarvestedItem(Base):
     processed = Column(Boolean, default=False)
     created_at = Column(DateTime, default=datetime.utcnow, index=True)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    # When the row was written; unlike created_at (the memory's own time) it
+    # only grows, so incremental readers can pick up what is new
+    ingested_at = Column(DateTime, default=datetime.utcnow)
     
     # Relationships
     patterns = relationship("DetectedPattern", back_populates="supporting_memories_rel", secondary="pattern_memories")
@@ -99,6 +102,7 @@ class HarvestedItem(Base):
         Index('idx_user_created', 'user_id', 'created_at'),
         Index('idx_user_source', 'user_id', 'source_type'),
         Index('idx_agreement_status', 'user_id', 'agreement_status'),
+        Index('idx_user_ingested', 'user_id', 'ingested_at'),
     )
 
 class DetectedPattern(Base):
@@ -135,6 +139,19 @@ class DetectedPattern(Base):
         Index('idx_active_patterns', 'user_id', 'is_active'),
     )
 
+class UserPatternState(Base):
+    """Model for a user's incremental pattern statistics (see agents.pattern_state)"""
+    __tablename__ = 'user_pattern_states'
+    
+    user_id = Column(String, primary_key=True)
+    watermark_at = Column(DateTime, nullable=True)  # Timestamp of the last memory folded in
+    watermark_id = Column(String, nullable=True)
+    ingested_through = Column(DateTime, nullable=True)  # Items ingested before this were read
+    memories_seen = Column(Integer, default=0)
+    state = Column(JSON, default={})
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
 class BehavioralInsight(Base):
     """Model for behavioral insights generated from patterns"""
     __tablename__ = 'behavioral_insights'
@@ -173,13 +190,18 @@ class Job(Base):
     job_type = Column(Enum(JobType), nullable=False)
     user_id = Column(String, nullable=True)  # Nullable for system-wide jobs
     status = Column(Enum(JobStatus), default=JobStatus.PENDING)
+    priority = Column(Integer, default=0)  # Higher runs first
+    attempts = Column(Integer, default=0)  # Times leased so far
+    max_attempts = Column(Integer, default=3)
+    lease_owner = Column(String, nullable=True)  # Worker holding the job while RUNNING
+    lease_expires_at = Column(DateTime, nullable=True)  # Job is leased again after this
     progress = Column(Integer, default=0)  # 0-100
     total_items = Column(Integer, default=0)
     processed_items = Column(Integer, default=0)
     result = Column(JSON, nullable=True)
     error = Column(Text, nullable=True)
     extra_metadata = Column(JSON, default={})
-    scheduled_at = Column(DateTime, nullable=True)
+    scheduled_at = Column(DateTime, nullable=True)  # Not leased before this (retry backoff)
     started_at = Column(DateTime, nullable=True)
     completed_at = Column(DateTime, nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow, index=True)
@@ -190,8 +212,28 @@ class Job(Base):
         Index('idx_job_status', 'status'),
         Index('idx_user_jobs', 'user_id', 'job_type'),
         Index('idx_scheduled_jobs', 'scheduled_at', 'status'),
+        Index('idx_job_lease_expiry', 'status', 'lease_expires_at'),
     )
 
+# Lease order, so workers read the next runnable jobs without sorting the queue
+Index('idx_job_lease', Job.status, Job.priority.desc(), Job.scheduled_at, Job.created_at)
+
+# Columns added to tables after their first release. create_all() creates
+# missing tables but never alters existing ones; see upgrade_schema()
+ADDED_COLUMNS = {
+    'jobs': ('priority', 'attempts', 'max_attempts', 'lease_owner', 'lease_expires_at'),
+    'harvested_items': ('ingested_at',),
+    'user_pattern_states': ('ingested_through',),
+}
+
+# Run once the columns above are added, to bring existing rows in line.
+# Workers only lease jobs whose scheduled_at has passed. Pattern states
+# without ingested_through are rebuilt on their next analysis
+BACKFILLS = {
+    'jobs': "UPDATE jobs SET scheduled_at = created_at WHERE scheduled_at IS NULL",
+    'harvested_items': "UPDATE harvested_items SET ingested_at = created_at WHERE ingested_at IS NULL",
+}
+
 class AuditLog(Base):
     """Model for security audit logging"""
     __tablename__ = 'audit_logs'
@@ -262,8 +304,45 @@ class DatabaseManager:
         self.SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=self.engine)
     
     def create_tables(self):
-        """Create all tables in the database"""
+        """Create all tables in the database and upgrade existing ones"""
         Base.metadata.create_all(bind=self.engine)
+        self.upgrade_schema()
+    
+    def upgrade_schema(self) -> List[str]:
+        """Add the columns and indexes that tables created by older releases lack
+        
+        Added columns take their model default, so existing rows are backfilled
+        (existing jobs get priority 0, attempts 0, max_attempts 3, and are due
+        from their creation time; harvested items count as ingested at their
+        creation time). Returns the steps applied, e.g.
+        ['jobs.priority', 'index idx_job_lease'].
+        """
+        inspector = inspect(self.engine)
+        tables = set(inspector.get_table_names())
+        applied = []
+        with self.engine.begin() as connection:
+            for table_name, column_names in ADDED_COLUMNS.items():
+                if table_name not in tables:
+                    continue
+                table = Base.metadata.tables[table_name]
+                existing = {column['name'] for column in inspector.get_columns(table_name)}
+                missing = [name for name in column_names if name not in existing]
+                for name in missing:
+                    column = table.c[name]
+                    ddl = f"ALTER TABLE {table_name} ADD COLUMN {name} {column.type.compile(dialect=self.engine.dialect)}"
+                    if column.default is not None and column.default.is_scalar:
+                        ddl += f" DEFAULT {int(column.default.arg)}"
+                    connection.execute(text(ddl))
+                    applied.append(f"{table_name}.{name}")
+                if missing and table_name in BACKFILLS:
+                    connection.execute(text(BACKFILLS[table_name]))
+                
+                indexed = {index['name'] for index in inspector.get_indexes(table_name)}
+                for index in table.indexes:
+                    if index.name not in indexed:
+                        index.create(bind=connection)
+                        applied.append(f"index {index.name}")
+        return applied
     
     def drop_tables(self):
         """Drop all tables (use with caution!)"""
@@ -283,6 +362,7 @@ __all__ = [
     'Base',
     'HarvestedItem',
     'DetectedPattern',
+    'UserPatternState',
     'BehavioralInsight',
     'Job',
     'AuditLog',
@@ -0,0 +1,530 @@
+#!/usr/bin/env python3
+"""
+Game State Store
+Bounded home for the gaming service's sessions, invites and notifications.
+Every collection is indexed by user, so per-user lookups never walk global
+history. Completed sessions stay in memory for a while, then move to daily
+gzip JSON Lines segments on disk; only per-player summaries of the archive
+stay in memory, rebuilt from the segments after a restart. Segments past the
+retention period are deleted. Caps on each collection are enforced by eviction.
+"""
+
+import os
+import re
+import json
+import gzip
+import asyncio
+import logging
+from collections import OrderedDict, deque
+from dataclasses import dataclass, fields
+from datetime import date, datetime, timedelta
+from enum import Enum
+from typing import Any, Callable, Deque, Dict, Iterator, List, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Completed sessions move to disk this long after they end (GAME_ARCHIVE_AFTER_HOURS)
+ARCHIVE_AFTER = timedelta(hours=int(os.getenv('GAME_ARCHIVE_AFTER_HOURS', 24)))
+# Completed sessions kept in memory; the oldest are archived early past this
+MAX_RECENT_SESSIONS = int(os.getenv('GAME_MAX_RECENT_SESSIONS', 10000))
+# Active sessions without a move for this long are abandoned and archived
+STALE_SESSION_AFTER = timedelta(hours=int(os.getenv('GAME_STALE_SESSION_HOURS', 72)))
+# Undelivered notifications kept per user; the oldest are dropped
+MAX_NOTIFICATIONS_PER_USER = int(os.getenv('GAME_MAX_NOTIFICATIONS_PER_USER', 100))
+# Undelivered notifications expire after this (GAME_NOTIFICATION_TTL_HOURS)
+NOTIFICATION_TTL = timedelta(hours=int(os.getenv('GAME_NOTIFICATION_TTL_HOURS', 168)))
+# Pending invites kept per recipient; the oldest are dropped
+MAX_PENDING_INVITES_PER_USER = int(os.getenv('GAME_MAX_PENDING_INVITES_PER_USER', 50))
+# Archive segments remembered per player for history lookups
+MAX_SEGMENTS_PER_USER = int(os.getenv('GAME_MAX_SEGMENTS_PER_USER', 60))
+# Archive segments are deleted once the day they hold is this old (GAME_ARCHIVE_RETENTION_DAYS)
+ARCHIVE_RETENTION = timedelta(days=int(os.getenv('GAME_ARCHIVE_RETENTION_DAYS', 365)))
+# Time-based archival and expiry run at most this often, so archived sessions
+# reach disk in batches (GAME_MAINTENANCE_INTERVAL, seconds)
+MAINTENANCE_INTERVAL = timedelta(seconds=int(os.getenv('GAME_MAINTENANCE_INTERVAL', 600)))
+
+# Session fields left out of archive records: the game's setup and move log
+_UNARCHIVED_FIELDS = {'game_data', 'moves'}
+
+_SEGMENT_NAME = re.compile(r'^sessions-(\d{4}-\d{2}-\d{2})\.jsonl\.gz$')
+
+
+def _json_default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Enum):
+        return value.value
+    if isinstance(value, (set, frozenset, tuple)):
+        return list(value)
+    return str(value)
+
+
+@dataclass
+class ArchiveSummary:
+    """What the archive holds for one player, kept in memory"""
+    sessions: int = 0
+    wins: int = 0
+    total_score: int = 0
+    best_score: int = 0
+    first_ended_at: Optional[datetime] = None
+    last_ended_at: Optional[datetime] = None
+
+    def add(self, score: int, won: bool, ended_at: datetime):
+        self.sessions += 1
+        self.wins += int(won)
+        self.total_score += score
+        self.best_score = max(self.best_score, score)
+        if self.first_ended_at is None or ended_at < self.first_ended_at:
+            self.first_ended_at = ended_at
+        if self.last_ended_at is None or ended_at > self.last_ended_at:
+            self.last_ended_at = ended_at
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'sessions': self.sessions,
+            'wins': self.wins,
+            'total_score': self.total_score,
+            'best_score': self.best_score,
+            'average_score': round(self.total_score / self.sessions, 1) if self.sessions else 0.0,
+            'first_ended_at': self.first_ended_at.isoformat() if self.first_ended_at else None,
+            'last_ended_at': self.last_ended_at.isoformat() if self.last_ended_at else None
+        }
+
+
+class GameStateStore:
+    """Sessions, invites and notifications with per-user indexes and caps
+
+    Items are duck-typed: sessions need id, players, status, created_at,
+    started_at, ended_at, scores and winner_id; invites need id, to_user_id
+    and expires_at. Time-ordered OrderedDicts make archival and expiry a pop
+    from the front.
+
+    The archive index is rebuilt from the segments on first use. From async
+    code use maintain_async(), archived_sessions_async() and
+    load_archive_async(), which do the segment I/O in a worker thread.
+    """
+
+    def __init__(self, archive_dir: str, archive_after: timedelta = ARCHIVE_AFTER,
+                 max_recent_sessions: int = MAX_RECENT_SESSIONS,
+                 stale_session_after: timedelta = STALE_SESSION_AFTER,
+                 max_notifications_per_user: int = MAX_NOTIFICATIONS_PER_USER,
+                 notification_ttl: timedelta = NOTIFICATION_TTL,
+                 max_pending_invites_per_user: int = MAX_PENDING_INVITES_PER_USER,
+                 maintenance_interval: timedelta = MAINTENANCE_INTERVAL,
+                 archive_retention: timedelta = ARCHIVE_RETENTION):
+        self.archive_dir = archive_dir
+        self.archive_after = archive_after
+        self.max_recent_sessions = max_recent_sessions
+        self.stale_session_after = stale_session_after
+        self.max_notifications_per_user = max_notifications_per_user
+        self.notification_ttl = notification_ttl
+        self.max_pending_invites_per_user = max_pending_invites_per_user
+        self.maintenance_interval = maintenance_interval
+        self.archive_retention = archive_retention
+        self._last_maintenance: Optional[datetime] = None
+
+        # Active sessions, least recently touched first
+        self.active_sessions: "OrderedDict[str, Any]" = OrderedDict()
+        self._active_by_user: Dict[str, Set[str]] = {}
+        self._last_activity: Dict[str, datetime] = {}
+
+        # Completed sessions still in memory, in the order they ended
+        self.recent_sessions: "OrderedDict[str, Any]" = OrderedDict()
+        self._recent_by_user: Dict[str, Set[str]] = {}
+
+        # Archive: per-player summaries and the segments holding their sessions
+        self.archive_summaries: Dict[str, ArchiveSummary] = {}
+        self._segments_by_user: Dict[str, Deque[str]] = {}
+        self._archive_loaded = False
+        self._archiving = False  # An async pass is writing segments
+        self.stats = {'archived': 0, 'abandoned': 0, 'segments_pruned': 0,
+                      'notifications_dropped': 0, 'invites_dropped': 0}
+
+        # Invites in the order they were sent (and so expire), by recipient
+        self.invites: "OrderedDict[str, Any]" = OrderedDict()
+        self._pending_invites_by_user: Dict[str, "OrderedDict[str, None]"] = {}
+
+        # Undelivered notifications per user, and (queued at, user) in queue order for expiry
+        self._notifications: Dict[str, Deque[Tuple[datetime, Dict[str, Any]]]] = {}
+        self._notification_order: Deque[Tuple[datetime, str]] = deque()
+
+    def maintain(self, on_abandon: Callable[[Any], None], now: Optional[datetime] = None,
+                 force: bool = False) -> Dict[str, int]:
+        """Abandon stale sessions, archive old ones, expire invites, notifications and segments
+
+        Runs when the maintenance interval has passed (or `force`); the
+        recent-session cap is enforced on every call.
+        """
+        now = now or datetime.now()
+        result, due, full = self._plan_maintenance(on_abandon, now, force)
+        if due:
+            self._archive(due)
+        if full:
+            result['segments_pruned'] = self.prune_archive(now)
+        return result
+
+    async def maintain_async(self, on_abandon: Callable[[Any], None], now: Optional[datetime] = None,
+                             force: bool = False) -> Dict[str, int]:
+        """maintain() with the segment writes and deletions in a worker thread
+
+        While one pass is writing, others return without doing anything; the
+        sessions being archived stay in recent_sessions until they are on disk.
+        """
+        await self.load_archive_async()
+        now = now or datetime.now()
+        if self._archiving:
+            return self._maintenance_result()
+        result, due, full = self._plan_maintenance(on_abandon, now, force)
+        if not due and not full:
+            return result
+
+        self._archiving = True
+        try:
+            pruned, index = await asyncio.to_thread(self._write_and_prune, self._segment_lines(due),
+                                                    now if full else None)
+        finally:
+            self._archiving = False
+        if index is not None:
+            # Rebuilt after the write, so it already holds the sessions just archived
+            self._install_archive_index(*index)
+        self._archived(due, index=index is None)
+        self.stats['segments_pruned'] += pruned
+        result['segments_pruned'] = pruned
+        return result
+
+    @staticmethod
+    def _maintenance_result() -> Dict[str, int]:
+        return {'abandoned': 0, 'archived': 0, 'segments_pruned': 0, 'invites_expired': 0,
+                'notifications_expired': 0}
+
+    def _plan_maintenance(self, on_abandon: Callable[[Any], None], now: datetime,
+                          force: bool) -> Tuple[Dict[str, int], List[Any], bool]:
+        """The in-memory part of a pass: (result, sessions to archive, whether it is a full pass)"""
+        result = self._maintenance_result()
+        due: List[Any] = []
+        full = force or self._last_maintenance is None or now - self._last_maintenance >= self.maintenance_interval
+        if full:
+            self._last_maintenance = now
+            result['abandoned'] = self.expire_stale_sessions(on_abandon, now)
+            due = self._due_sessions(now)
+            result['invites_expired'] = self.expire_invites(now)
+            result['notifications_expired'] = self.expire_notifications(now)
+        elif len(self.recent_sessions) > self.max_recent_sessions:
+            # Archive a tenth of the cap at once rather than a session per call
+            due = self._due_sessions(now, keep=self.max_recent_sessions * 9 // 10)
+        result['archived'] = len(due)
+        return result, due, full
+
+    # ==================== SESSIONS ====================
+
+    def add_session(self, session: Any):
+        self.active_sessions[session.id] = session
+        self._last_activity[session.id] = session.created_at
+        for player_id in session.players:
+            self._active_by_user.setdefault(player_id, set()).add(session.id)
+
+    def add_player(self, session: Any, user_id: str):
+        self._active_by_user.setdefault(user_id, set()).add(session.id)
+        self.touch(session)
+
+    def touch(self, session: Any, when: Optional[datetime] = None):
+        """Record activity, moving the session to the back of the stale queue"""
+        self._last_activity[session.id] = when or datetime.now()
+        self.active_sessions.move_to_end(session.id)
+
+    def get_session(self, session_id: str) -> Optional[Any]:
+        return self.active_sessions.get(session_id) or self.recent_sessions.get(session_id)
+
+    def active_session_ids(self, user_id: str) -> List[str]:
+        return list(self._active_by_user.get(user_id, ()))
+
+    def complete_session(self, session: Any):
+        """Move an ended session from active to recent"""
+        self.active_sessions.pop(session.id, None)
+        self._last_activity.pop(session.id, None)
+        self._discard(self._active_by_user, session.players, session.id)
+
+        self.recent_sessions[session.id] = session
+        for player_id in session.players:
+            self._recent_by_user.setdefault(player_id, set()).add(session.id)
+
+    def recent_user_sessions(self, user_id: str) -> List[Any]:
+        """The user's completed sessions still in memory, most recent first"""
+        sessions = [self.recent_sessions[session_id] for session_id in self._recent_by_user.get(user_id, ())]
+        return sorted(sessions, key=lambda session: session.ended_at, reverse=True)
+
+    def expire_stale_sessions(self, on_abandon: Callable[[Any], None], now: Optional[datetime] = None) -> int:
+        """Hand sessions idle past stale_session_after to `on_abandon`"""
+        cutoff = (now or datetime.now()) - self.stale_session_after
+        abandoned = 0
+        while self.active_sessions:
+            session_id = next(iter(self.active_sessions))
+            if self._last_activity[session_id] > cutoff:
+                break
+            session = self.active_sessions[session_id]
+            on_abandon(session)
+            if session_id in self.active_sessions:
+                self.complete_session(session)
+            abandoned += 1
+        self.stats['abandoned'] += abandoned
+        return abandoned
+
+    def archive_due(self, now: Optional[datetime] = None, keep: Optional[int] = None) -> int:
+        """Archive sessions that ended before the archive cutoff, and the oldest beyond `keep`"""
+        due = self._due_sessions(now or datetime.now(), keep)
+        if due:
+            self._archive(due)
+        return len(due)
+
+    def _due_sessions(self, now: datetime, keep: Optional[int] = None) -> List[Any]:
+        cutoff = now - self.archive_after
+        keep = self.max_recent_sessions if keep is None else keep
+        due = []
+        for session in self.recent_sessions.values():
+            if len(self.recent_sessions) - len(due) <= keep and session.ended_at > cutoff:
+                break
+            due.append(session)
+        return due
+
+    # ==================== ARCHIVE ====================
+
+    def _archive(self, sessions: List[Any]):
+        self.load_archive()
+        self._write_segments(self._segment_lines(sessions))
+        self._archived(sessions)
+
+    def _segment_lines(self, sessions: List[Any]) -> Dict[str, str]:
+        """Archive records of the sessions, as JSON Lines per day they ended"""
+        by_day: Dict[str, List[str]] = {}
+        for session in sessions:
+            by_day.setdefault(session.ended_at.date().isoformat(), []).append(
+                json.dumps(self._record(session), default=_json_default, separators=(',', ':')) + '\n')
+        return {day: ''.join(lines) for day, lines in by_day.items()}
+
+    def _write_segments(self, segments: Dict[str, str]):
+        os.makedirs(self.archive_dir, exist_ok=True)
+        for day, lines in segments.items():
+            # Each write appends a gzip member; readers see one stream
+            with gzip.open(self._segment_path(day), 'at', encoding='utf-8') as segment:
+                segment.write(lines)
+
+    def _write_and_prune(self, segments: Dict[str, str], now: Optional[datetime]) -> Tuple[int, Optional[tuple]]:
+        """The file side of an async pass: (segments pruned, the index rebuilt if any were)"""
+        self._write_segments(segments)
+        pruned = self._prune_segments(now) if now is not None else 0
+        return pruned, self._scan_archive() if pruned else None
+
+    def _archived(self, sessions: List[Any], index: bool = True):
+        """Drop sessions now on disk from memory, adding them to the archive index"""
+        for session in sessions:
+            if index:
+                self._index_session(self.archive_summaries, self._segments_by_user,
+                                    session.ended_at.date().isoformat(), session.players, session.scores,
+                                    session.winner_id, session.ended_at)
+            del self.recent_sessions[session.id]
+            self._discard(self._recent_by_user, session.players, session.id)
+        if sessions:
+            self.stats['archived'] += len(sessions)
+            logger.info(f"🗄️ Archived {len(sessions)} game sessions")
+
+    @staticmethod
+    def _index_session(summaries: Dict[str, ArchiveSummary], segments_by_user: Dict[str, Deque[str]], day: str,
+                       players: List[str], scores: Dict[str, int], winner_id: Optional[str], ended_at: datetime):
+        for player_id in players:
+            summary = summaries.setdefault(player_id, ArchiveSummary())
+            summary.add(scores.get(player_id, 0), winner_id == player_id, ended_at)
+            segments = segments_by_user.setdefault(player_id, deque(maxlen=MAX_SEGMENTS_PER_USER))
+            if day not in segments:
+                segments.append(day)
+
+    def load_archive(self):
+        """Build the archive summaries and segment index from the segments on disk, once"""
+        if not self._archive_loaded:
+            self._install_archive_index(*self._scan_archive())
+
+    async def load_archive_async(self):
+        """load_archive() with the segments read in a worker thread"""
+        if not self._archive_loaded:
+            index = await asyncio.to_thread(self._scan_archive)
+            if not self._archive_loaded:
+                self._install_archive_index(*index)
+
+    def _install_archive_index(self, summaries: Dict[str, ArchiveSummary], segments_by_user: Dict[str, Deque[str]]):
+        self.archive_summaries = summaries
+        self._segments_by_user = segments_by_user
+        self._archive_loaded = True
+
+    def _scan_archive(self) -> Tuple[Dict[str, ArchiveSummary], Dict[str, Deque[str]]]:
+        """Summaries and segment index of every record in the segments, oldest day first"""
+        summaries: Dict[str, ArchiveSummary] = {}
+        segments_by_user: Dict[str, Deque[str]] = {}
+        for day in self._segment_days():
+            for record in self._read_segment(day):
+                self._index_session(summaries, segments_by_user, day, record['players'], record['scores'],
+                                    record.get('winner_id'), datetime.fromisoformat(record['ended_at']))
+        return summaries, segments_by_user
+
+    def prune_archive(self, now: Optional[datetime] = None) -> int:
+        """Delete segments past the retention period, rebuilding the index without them"""
+        pruned = self._prune_segments(now or datetime.now())
+        if pruned:
+            self._install_archive_index(*self._scan_archive())
+            self.stats['segments_pruned'] += pruned
+        return pruned
+
+    def _prune_segments(self, now: datetime) -> int:
+        cutoff = (now - self.archive_retention).date().isoformat()
+        expired = [day for day in self._segment_days() if day < cutoff]
+        for day in expired:
+            os.remove(self._segment_path(day))
+        if expired:
+            logger.info(f"🗑️ Deleted {len(expired)} game archive segments older than {cutoff}")
+        return len(expired)
+
+    def _segment_days(self) -> List[str]:
+        try:
+            names = os.listdir(self.archive_dir)
+        except FileNotFoundError:
+            return []
+        return sorted(match.group(1) for match in map(_SEGMENT_NAME.match, names) if match)
+
+    def _read_segment(self, day: str) -> Iterator[Dict[str, Any]]:
+        """The records of a segment; a tail cut short (by a crash) is skipped"""
+        try:
+            with gzip.open(self._segment_path(day), 'rt', encoding='utf-8') as segment:
+                for line in segment:
+                    yield json.loads(line)
+        except FileNotFoundError:
+            return
+        except (EOFError, OSError, ValueError) as e:
+            logger.warning(f"Game archive segment {day} ends early: {e}")
+
+    def _record(self, session: Any) -> Dict[str, Any]:
+        record = {f.name: getattr(session, f.name) for f in fields(session) if f.name not in _UNARCHIVED_FIELDS}
+        record['move_count'] = len(getattr(session, 'moves', ()))
+        return record
+
+    def _segment_path(self, day: str) -> str:
+        return os.path.join(self.archive_dir, f"sessions-{day}.jsonl.gz")
+
+    def archived_sessions(self, user_id: str, limit: int = 20) -> List[Dict[str, Any]]:
+        """The user's most recent archived session records, read from their segments only"""
+        self.load_archive()
+        return self._read_archived(user_id, list(self._segments_by_user.get(user_id, ())), limit)
+
+    async def archived_sessions_async(self, user_id: str, limit: int = 20) -> List[Dict[str, Any]]:
+        """archived_sessions() with the segments read in a worker thread"""
+        await self.load_archive_async()
+        return await asyncio.to_thread(self._read_archived, user_id,
+                                       list(self._segments_by_user.get(user_id, ())), limit)
+
+    def _read_archived(self, user_id: str, days: List[str], limit: int) -> List[Dict[str, Any]]:
+        records: List[Dict[str, Any]] = []
+        for day in reversed(days):
+            day_records = [record for record in self._read_segment(day) if user_id in record['players']]
+            records.extend(reversed(day_records))
+            if len(records) >= limit:
+                break
+        return records[:limit]
+
+    def archive_summary(self, user_id: str) -> Dict[str, Any]:
+        self.load_archive()
+        return self.archive_summaries.get(user_id, ArchiveSummary()).to_dict()
+
+    # ==================== INVITES ====================
+
+    def add_invite(self, invite: Any, now: Optional[datetime] = None):
+        self.expire_invites(now)
+        self.invites[invite.id] = invite
+        pending = self._pending_invites_by_user.setdefault(invite.to_user_id, OrderedDict())
+        pending[invite.id] = None
+        while len(pending) > self.max_pending_invites_per_user:
+            oldest, _ = pending.popitem(last=False)
+            self.invites.pop(oldest, None)
+            self.stats['invites_dropped'] += 1
+
+    def get_invite(self, invite_id: str) -> Optional[Any]:
+        return self.invites.get(invite_id)
+
+    def close_invite(self, invite: Any):
+        """The invite was answered; it stays retrievable until it expires"""
+        pending = self._pending_invites_by_user.get(invite.to_user_id)
+        if pending is not None:
+            pending.pop(invite.id, None)
+            if not pending:
+                del self._pending_invites_by_user[invite.to_user_id]
+
+    def pending_invites(self, user_id: str, now: Optional[datetime] = None) -> List[Any]:
+        self.expire_invites(now)
+        return [self.invites[invite_id] for invite_id in self._pending_invites_by_user.get(user_id, ())]
+
+    def expire_invites(self, now: Optional[datetime] = None) -> int:
+        """Drop invites past their expiry, oldest first"""
+        now = now or datetime.now()
+        expired = 0
+        while self.invites:
+            invite = next(iter(self.invites.values()))
+            if invite.expires_at > now:
+                break
+            if invite.status == "pending":
+                invite.status = "expired"
+            self.close_invite(invite)
+            del self.invites[invite.id]
+            expired += 1
+        return expired
+
+    # ==================== NOTIFICATIONS ====================
+
+    def add_notification(self, notification: Dict[str, Any], now: Optional[datetime] = None):
+        now = now or datetime.now()
+        for user_id in notification['user_ids']:
+            queue = self._notifications.setdefault(user_id, deque())
+            if len(queue) >= self.max_notifications_per_user:
+                queue.popleft()
+                self.stats['notifications_dropped'] += 1
+            queue.append((now, notification))
+            self._notification_order.append((now, user_id))
+
+    def take_notifications(self, user_id: str) -> List[Dict[str, Any]]:
+        """Undelivered notifications for the user, delivered by this call"""
+        queue = self._notifications.pop(user_id, None)
+        return [dict(notification, delivered=True) for _, notification in queue or ()]
+
+    def expire_notifications(self, now: Optional[datetime] = None) -> int:
+        """Drop undelivered notifications older than the TTL, oldest first"""
+        cutoff = (now or datetime.now()) - self.notification_ttl
+        expired = 0
+        while self._notification_order and self._notification_order[0][0] <= cutoff:
+            _, user_id = self._notification_order.popleft()
+            # The user's oldest entry, if it is still there and expired
+            queue = self._notifications.get(user_id)
+            if queue and queue[0][0] <= cutoff:
+                queue.popleft()
+                expired += 1
+                if not queue:
+                    del self._notifications[user_id]
+        return expired
+
+    def pending_notification_count(self, user_id: str) -> int:
+        return len(self._notifications.get(user_id, ()))
+
+    # ==================== HELPERS ====================
+
+    @staticmethod
+    def _discard(index: Dict[str, Set[str]], user_ids: List[str], item_id: str):
+        for user_id in user_ids:
+            items = index.get(user_id)
+            if items is not None:
+                items.discard(item_id)
+                if not items:
+                    del index[user_id]
+
+    def sizes(self) -> Dict[str, int]:
+        """Item counts per collection, for monitoring memory use"""
+        return {
+            'active_sessions': len(self.active_sessions),
+            'recent_sessions': len(self.recent_sessions),
+            'archived_players': len(self.archive_summaries),
+            'invites': len(self.invites),
+            'notifications': sum(len(queue) for queue in self._notifications.values())
+        }
@@ -0,0 +1,382 @@
+#!/usr/bin/env python3
+"""
+Durable Job Queue for Digital Immortality Platform
+Jobs live in the jobs table and are leased by workers: highest priority
+first, then oldest. Where the database supports it the candidates are read
+with FOR UPDATE SKIP LOCKED, and every claim is a compare-and-set on the
+job's status, so no two workers run the same job. A lease not renewed
+within the visibility timeout expires and the job is retried, with
+exponential backoff after failures, until it runs out of attempts.
+Per-type concurrency limits keep one kind of job (a long backup, a burst of
+harvests) from occupying every worker.
+"""
+
+import os
+import uuid
+import random
+import socket
+import asyncio
+import logging
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional
+
+from sqlalchemy import func, select, update
+
+from database.models import Job, JobStatus, JobType
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class LeasedJob:
+    """A job claimed by a worker, valid while its lease is renewed"""
+    id: str
+    job_type: JobType
+    user_id: Optional[str]
+    metadata: Dict[str, Any]
+    priority: int
+    attempts: int
+    max_attempts: int
+
+
+class JobQueue:
+    """Priority job queue on the jobs table with leases, retries and per-type limits"""
+
+    def __init__(self, db_manager, concurrency_limits: Optional[Dict[JobType, int]] = None,
+                 visibility_timeout: float = 300.0, max_attempts: int = 3,
+                 backoff_base: float = 5.0, backoff_max: float = 600.0, backoff_jitter: float = 0.2):
+        self.db_manager = db_manager
+        self.concurrency_limits = dict(concurrency_limits or {})
+        self.visibility_timeout = visibility_timeout
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.backoff_jitter = backoff_jitter
+
+        # Expired leases are swept at most this often
+        self.reap_interval = min(5.0, visibility_timeout / 4)
+        self._next_reap = datetime.min
+
+    # ==================== PRODUCERS ====================
+
+    def enqueue(self, job_type: JobType, user_id: Optional[str] = None, metadata: Dict[str, Any] = None,
+                priority: int = 0, delay: float = 0.0, max_attempts: Optional[int] = None) -> str:
+        """Add a job, runnable after `delay` seconds; returns its id"""
+        return self.enqueue_many([{
+            'job_type': job_type, 'user_id': user_id, 'metadata': metadata,
+            'priority': priority, 'delay': delay, 'max_attempts': max_attempts
+        }])[0]
+
+    def enqueue_many(self, jobs: Iterable[Dict[str, Any]]) -> List[str]:
+        """Add several jobs (keyword arguments of ``enqueue``) in one transaction"""
+        now = datetime.utcnow()
+        job_ids = []
+        with self.db_manager.get_session() as session:
+            for spec in jobs:
+                job_id = str(uuid.uuid4())
+                session.add(Job(
+                    id=job_id,
+                    job_type=spec['job_type'],
+                    user_id=spec.get('user_id'),
+                    status=JobStatus.PENDING,
+                    priority=spec.get('priority', 0),
+                    attempts=0,
+                    max_attempts=spec.get('max_attempts') or self.max_attempts,
+                    extra_metadata=spec.get('metadata') or {},
+                    scheduled_at=now + timedelta(seconds=spec.get('delay', 0.0)),
+                    created_at=now
+                ))
+                job_ids.append(job_id)
+            session.commit()
+        return job_ids
+
+    # ==================== WORKERS ====================
+
+    def lease(self, owner: str, limit: int = 1) -> List[LeasedJob]:
+        """Claim up to `limit` runnable jobs for `owner`, within the per-type limits"""
+        now = datetime.utcnow()
+        leased = []
+        with self.db_manager.get_session() as session:
+            if now >= self._next_reap:
+                self._reap_expired(session, now)
+                self._next_reap = now + timedelta(seconds=self.reap_interval)
+
+            running = dict(session.query(Job.job_type, func.count(Job.id)).filter(
+                Job.status == JobStatus.RUNNING
+            ).group_by(Job.job_type).all())
+            capacity = {job_type: self.concurrency_limits[job_type] - running.get(job_type, 0)
+                        for job_type in self.concurrency_limits}
+
+            # Types that fill up are dropped and the next candidates read, so a
+            # limited type at the head of the queue cannot starve the others
+            while len(leased) < limit:
+                open_types = [job_type for job_type in JobType if capacity.get(job_type, limit) > 0]
+                if not open_types:
+                    break
+                candidates = session.execute(
+                    select(Job.id, Job.job_type, Job.user_id, Job.extra_metadata,
+                           Job.priority, Job.attempts, Job.max_attempts)
+                    .where(Job.status == JobStatus.PENDING, Job.job_type.in_(open_types),
+                           Job.scheduled_at <= now)
+                    .order_by(Job.priority.desc(), Job.scheduled_at, Job.created_at)
+                    .limit(limit - len(leased))
+                    .with_for_update(skip_locked=True)
+                ).all()
+                if not candidates:
+                    break
+
+                type_filled = False
+                for candidate in candidates:
+                    if capacity.get(candidate.job_type, limit) <= 0:
+                        type_filled = True
+                        continue
+                    if not self._claim(session, candidate, owner, now):
+                        continue  # Taken by another worker
+                    leased.append(LeasedJob(
+                        id=candidate.id,
+                        job_type=candidate.job_type,
+                        user_id=candidate.user_id,
+                        metadata=candidate.extra_metadata or {},
+                        priority=candidate.priority,
+                        attempts=candidate.attempts + 1,
+                        max_attempts=candidate.max_attempts
+                    ))
+                    if candidate.job_type in capacity:
+                        capacity[candidate.job_type] -= 1
+                if not type_filled:
+                    break
+
+            session.commit()
+        return leased
+
+    def _claim(self, session, candidate, owner: str, now: datetime) -> bool:
+        """Compare-and-set PENDING -> RUNNING; re-checks the type's limit in the same statement"""
+        claim = update(Job).where(Job.id == candidate.id, Job.status == JobStatus.PENDING)
+        limit = self.concurrency_limits.get(candidate.job_type)
+        if limit is not None:
+            others = Job.__table__.alias('running_jobs')
+            claim = claim.where(
+                select(func.count()).select_from(others).where(
+                    others.c.job_type == candidate.job_type,
+                    others.c.status == JobStatus.RUNNING
+                ).scalar_subquery() < limit
+            )
+        result = session.execute(claim.values(
+            status=JobStatus.RUNNING,
+            attempts=Job.attempts + 1,
+            lease_owner=owner,
+            lease_expires_at=now + timedelta(seconds=self.visibility_timeout),
+            started_at=now,
+            updated_at=now
+        ).execution_options(synchronize_session=False))
+        return result.rowcount == 1
+
+    def _reap_expired(self, session, now: datetime) -> int:
+        """Return jobs whose lease expired to the queue, or fail them when out of attempts"""
+        expired = (Job.status == JobStatus.RUNNING, Job.lease_expires_at < now)
+        failed = session.execute(update(Job).where(*expired, Job.attempts >= Job.max_attempts).values(
+            status=JobStatus.FAILED,
+            error='Lease expired on the last attempt',
+            lease_owner=None,
+            lease_expires_at=None,
+            completed_at=now,
+            updated_at=now
+        ).execution_options(synchronize_session=False)).rowcount
+        retried = session.execute(update(Job).where(*expired).values(
+            status=JobStatus.PENDING,
+            error='Lease expired',
+            lease_owner=None,
+            lease_expires_at=None,
+            scheduled_at=now,
+            updated_at=now
+        ).execution_options(synchronize_session=False)).rowcount
+        if failed or retried:
+            logger.warning(f"⏰ {retried} expired job leases requeued, {failed} jobs out of attempts")
+        return failed + retried
+
+    def renew(self, owner: str, job_ids: List[str]) -> int:
+        """Extend the leases `owner` still holds; returns how many were extended"""
+        if not job_ids:
+            return 0
+        now = datetime.utcnow()
+        with self.db_manager.get_session() as session:
+            renewed = session.execute(update(Job).where(
+                Job.id.in_(job_ids), Job.status == JobStatus.RUNNING, Job.lease_owner == owner
+            ).values(
+                lease_expires_at=now + timedelta(seconds=self.visibility_timeout),
+                updated_at=now
+            ).execution_options(synchronize_session=False)).rowcount
+            session.commit()
+        return renewed
+
+    def complete(self, job_id: str, owner: str, result: Any = None) -> bool:
+        """Record success; False if the lease was lost (the job may have run again elsewhere)"""
+        now = datetime.utcnow()
+        with self.db_manager.get_session() as session:
+            completed = session.execute(update(Job).where(
+                Job.id == job_id, Job.status == JobStatus.RUNNING, Job.lease_owner == owner
+            ).values(
+                status=JobStatus.COMPLETED,
+                progress=100,
+                result=result,
+                error=None,
+                lease_owner=None,
+                lease_expires_at=None,
+                completed_at=now,
+                updated_at=now
+            ).execution_options(synchronize_session=False)).rowcount
+            session.commit()
+        return completed == 1
+
+    def fail(self, job_id: str, owner: str, error: str, retry: bool = True) -> Optional[JobStatus]:
+        """Record a failure: back to PENDING after a backoff while attempts remain, else FAILED
+
+        Returns the job's new status, None if the lease was lost.
+        """
+        now = datetime.utcnow()
+        with self.db_manager.get_session() as session:
+            held = (Job.id == job_id, Job.status == JobStatus.RUNNING, Job.lease_owner == owner)
+            job = session.execute(select(Job.attempts, Job.max_attempts).where(*held)).first()
+            if job is None:
+                return None
+
+            if retry and job.attempts < job.max_attempts:
+                status = JobStatus.PENDING
+                values = {'scheduled_at': now + timedelta(seconds=self.backoff(job.attempts))}
+            else:
+                status = JobStatus.FAILED
+                values = {'completed_at': now}
+            updated = session.execute(update(Job).where(*held).values(
+                status=status,
+                error=error,
+                lease_owner=None,
+                lease_expires_at=None,
+                updated_at=now,
+                **values
+            ).execution_options(synchronize_session=False)).rowcount
+            session.commit()
+        return status if updated == 1 else None
+
+    def backoff(self, attempts: int) -> float:
+        """Seconds before a job that failed `attempts` times is retried"""
+        delay = min(self.backoff_max, self.backoff_base * 2 ** (attempts - 1))
+        return delay * (1 - self.backoff_jitter * random.random())
+
+    def counts(self) -> Dict[str, Dict[str, int]]:
+        """Number of jobs per type and status"""
+        counts: Dict[str, Dict[str, int]] = {}
+        with self.db_manager.get_session() as session:
+            for job_type, status, count in session.query(Job.job_type, Job.status, func.count(Job.id)).group_by(
+                    Job.job_type, Job.status).all():
+                counts.setdefault(job_type.value, {})[status.value] = count
+        return counts
+
+
+class JobWorkerPool:
+    """Runs leased jobs on up to `workers` concurrent tasks
+
+    Queue calls go through a single dedicated thread, keeping the event loop
+    free and giving the pool one database connection. Leases of running jobs
+    are renewed every third of the visibility timeout; a handler exception
+    fails the job (retried with backoff while attempts remain).
+    """
+
+    def __init__(self, queue: JobQueue, handler: Callable[[LeasedJob], Awaitable[Any]],
+                 workers: int = 4, poll_interval: float = 1.0, owner: Optional[str] = None):
+        self.queue = queue
+        self.handler = handler
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self.owner = owner or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+        self.running: Dict[str, asyncio.Task] = {}
+        self.stats = {'leased': 0, 'completed': 0, 'retried': 0, 'failed': 0, 'lost': 0}
+        self._db = ThreadPoolExecutor(max_workers=1, thread_name_prefix='job-queue')
+        self._wakeup = asyncio.Event()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._stopping = False
+
+    async def _call(self, method, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._db, functools.partial(method, *args))
+
+    def notify(self):
+        """Jobs were enqueued: lease now instead of at the next poll (safe from any thread)"""
+        if self._loop and not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+
+    def stop(self):
+        """Stop leasing; ``run`` returns once the running jobs finish"""
+        self._stopping = True
+        self.notify()
+
+    async def run(self):
+        """Lease and run jobs until ``stop`` is called"""
+        self._loop = asyncio.get_running_loop()
+        heartbeat = asyncio.create_task(self._heartbeat())
+        logger.info(f"👷 Job worker pool {self.owner} started with {self.workers} workers")
+        try:
+            while not self._stopping:
+                free = self.workers - len(self.running)
+                if free > 0:
+                    self._wakeup.clear()
+                    try:
+                        jobs = await self._call(self.queue.lease, self.owner, free)
+                    except Exception as e:
+                        logger.error(f"Failed to lease jobs: {e}")
+                        jobs = []
+                    for job in jobs:
+                        self.running[job.id] = asyncio.create_task(self._run_job(job))
+                    self.stats['leased'] += len(jobs)
+                    if jobs:
+                        continue
+
+                # Wait for a free worker, new jobs or the next poll
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            if self.running:
+                await asyncio.gather(*self.running.values(), return_exceptions=True)
+            heartbeat.cancel()
+            self._db.shutdown(wait=True)
+            logger.info(f"👷 Job worker pool {self.owner} stopped")
+
+    async def _run_job(self, job: LeasedJob):
+        try:
+            try:
+                result = await self.handler(job)
+            except Exception as e:
+                status = await self._call(self.queue.fail, job.id, self.owner, str(e))
+                if status is None:
+                    self.stats['lost'] += 1
+                    logger.warning(f"Lease on job {job.id} was lost before it failed: {e}")
+                elif status == JobStatus.PENDING:
+                    self.stats['retried'] += 1
+                    logger.warning(f"🔁 Job {job.id} failed (attempt {job.attempts}/{job.max_attempts}), will retry: {e}")
+                else:
+                    self.stats['failed'] += 1
+                    logger.error(f"Job {job.id} failed after {job.attempts} attempts: {e}")
+            else:
+                if await self._call(self.queue.complete, job.id, self.owner, result):
+                    self.stats['completed'] += 1
+                else:
+                    self.stats['lost'] += 1
+                    logger.warning(f"Lease on job {job.id} was lost before it completed")
+        except Exception as e:
+            # Recording the outcome failed; the lease expires and the job is retried
+            logger.error(f"Failed to record the outcome of job {job.id}: {e}")
+        finally:
+            del self.running[job.id]
+            self._wakeup.set()
+
+    async def _heartbeat(self):
+        while True:
+            await asyncio.sleep(self.queue.visibility_timeout / 3)
+            try:
+                await self._call(self.queue.renew, self.owner, list(self.running))
+            except Exception as e:
+                logger.error(f"Failed to renew job leases: {e}")
@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+"""
+Job Unit of Work for Digital Immortality Platform
+Buffers the rows a background job writes and flushes them in batches: one
+transaction per batch, a bulk INSERT per table, and the job's progress
+written with the batch as a checkpoint rather than committed on every tick.
+A batch with rows the database rejects (constraint or data errors) is
+retried row by row inside savepoints, so a bad row is skipped and reported
+without losing the rest of the batch; other errors fail the flush.
+Row ids are derived from the job, so when a failed job is retried the rows
+its earlier attempts committed are skipped rather than inserted again.
+"""
+
+import os
+import time
+import uuid
+import logging
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import insert, select, update
+from sqlalchemy.exc import DataError, IntegrityError
+
+from database.models import Job
+
+logger = logging.getLogger(__name__)
+
+# Namespace of the row ids derived from a job id and a row key
+ROW_ID_NAMESPACE = uuid.UUID('3f5c1d2e-8a47-4b6e-9c0d-71e2a5b8f934')
+
+
+class JobUnitOfWork:
+    """Batched writes and progress checkpoints for one job run
+
+    Rows are flushed once `batch_size` are buffered, and buffered rows and
+    progress at least every `checkpoint_interval` seconds, so the job row
+    never lags the work committed for it. Use as a context manager: the last
+    batch is flushed on a clean exit and dropped if the job raises.
+    """
+
+    def __init__(self, db_manager, job_id: Optional[str] = None, batch_size: Optional[int] = None,
+                 checkpoint_interval: Optional[float] = None):
+        self.db_manager = db_manager
+        self.job_id = job_id
+        self.batch_size = batch_size or int(os.getenv('JOB_BATCH_SIZE', 500))
+        self.checkpoint_interval = (checkpoint_interval if checkpoint_interval is not None
+                                    else float(os.getenv('JOB_CHECKPOINT_INTERVAL', 5)))
+
+        self.pending: List[Tuple[Any, Dict[str, Any]]] = []
+        self._keys: Dict[Any, int] = {}
+        self._derived: set = set()  # (model, id) of the ids derived from the job
+        self.processed = 0
+        self.total: Optional[int] = None
+        self._progress_written = True
+        self._last_checkpoint = time.monotonic()
+
+        # Outcome counters
+        self.written = 0
+        self.skipped = 0
+        self.failed: List[Dict[str, Any]] = []
+        self.commits = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.flush()
+        elif self.pending:
+            logger.warning(f"Dropping {len(self.pending)} unflushed rows of job {self.job_id}: {exc}")
+            self.pending = []
+        return False
+
+    def add(self, model, values: Dict[str, Any], key: Any = None) -> Any:
+        """Buffer a row of `model`; returns its primary key (generated now if it has a default)
+
+        Within a job the generated key is derived from the job id and `key`
+        (by default the row's position among the job's `model` rows), so a
+        retry that adds the same rows produces the same ids.
+        """
+        values = dict(values)
+        if key is None:
+            key = self._keys.get(model, 0)
+            self._keys[model] = key + 1
+        for column in model.__table__.primary_key.columns:
+            if column.key not in values and column.default is not None and column.default.is_callable:
+                if self.job_id:
+                    values[column.key] = str(uuid.uuid5(ROW_ID_NAMESPACE, f"{self.job_id}/{model.__tablename__}/{key}"))
+                    self._derived.add((model, values[column.key]))
+                else:
+                    values[column.key] = column.default.arg(None)
+        self.pending.append((model, values))
+
+        if len(self.pending) >= self.batch_size:
+            self.flush()
+        return values.get('id')
+
+    def checkpoint(self, processed: int, total: Optional[int] = None):
+        """Record progress; written with the next batch, or now once the interval has passed"""
+        self.processed = processed
+        if total is not None:
+            self.total = total
+        self._progress_written = False
+
+        if time.monotonic() - self._last_checkpoint >= self.checkpoint_interval:
+            self.flush()
+
+    def flush(self):
+        """Write the buffered rows and progress in one transaction"""
+        if not self.pending and (self._progress_written or not self.job_id):
+            return
+        rows, self.pending = self.pending, []
+
+        with self.db_manager.get_session() as session:
+            if rows:
+                self._insert(session, rows)
+            if self.job_id and not self._progress_written:
+                values = {'processed_items': self.processed, 'updated_at': datetime.utcnow()}
+                if self.total:
+                    values['total_items'] = self.total
+                    values['progress'] = min(100, max(0, int(self.processed * 100 / self.total)))
+                session.execute(update(Job).where(Job.id == self.job_id).values(**values)
+                                .execution_options(synchronize_session=False))
+            session.commit()
+
+        self.commits += 1
+        self._progress_written = True
+        self._last_checkpoint = time.monotonic()
+
+    def _insert(self, session, rows: List[Tuple[Any, Dict[str, Any]]]):
+        if self._derived:
+            rows = self._skip_committed(session, rows)
+            if not rows:
+                return
+        by_model: Dict[Any, List[Dict[str, Any]]] = {}
+        for model, values in rows:
+            by_model.setdefault(model, []).append(values)
+
+        try:
+            with session.begin_nested():
+                for model, batch in by_model.items():
+                    session.execute(insert(model), batch)
+            self.written += len(rows)
+            return
+        except (IntegrityError, DataError) as e:
+            logger.warning(f"Batch of {len(rows)} rows rejected ({e.__class__.__name__}), retrying row by row")
+
+        # Isolate the rows the database rejects; the others still go in with this batch
+        for model, values in rows:
+            try:
+                with session.begin_nested():
+                    session.execute(insert(model), [values])
+                self.written += 1
+            except (IntegrityError, DataError) as e:
+                logger.error(f"Skipping {model.__tablename__} row {values.get('id')}: {e.__class__.__name__}")
+                self.failed.append({'table': model.__tablename__, 'id': values.get('id'),
+                                    'error': str(e.orig if getattr(e, 'orig', None) else e)})
+
+    def _skip_committed(self, session, rows: List[Tuple[Any, Dict[str, Any]]]) -> List[Tuple[Any, Dict[str, Any]]]:
+        """Drop the rows with derived ids that an earlier attempt of the job already committed
+
+        Rows given an explicit id are left to the insert, which reports a clash.
+        """
+        derived: Dict[Any, List[Any]] = {}
+        for model, values in rows:
+            column = list(model.__table__.primary_key.columns)[0]
+            if (model, values.get(column.key)) in self._derived:
+                derived.setdefault(model, []).append(values[column.key])
+
+        committed = set()
+        for model, ids in derived.items():
+            column = list(model.__table__.primary_key.columns)[0]
+            committed.update((model, row_id) for row_id in session.execute(
+                select(column).where(column.in_(ids))).scalars())
+        if not committed:
+            return rows
+
+        remaining = []
+        for model, values in rows:
+            column = list(model.__table__.primary_key.columns)[0]
+            if (model, values.get(column.key)) not in committed:
+                remaining.append((model, values))
+        self.skipped += len(rows) - len(remaining)
+        logger.info(f"Skipping {len(rows) - len(remaining)} rows already written by job {self.job_id}")
+        return remaining
+
+    def summary(self) -> Dict[str, Any]:
+        """Counters for the job's result"""
+        return {'rows_written': self.written, 'rows_skipped': self.skipped, 'rows_failed': len(self.failed),
+                'commits': self.commits}
@@ -0,0 +1,263 @@
+#!/usr/bin/env python3
+"""
+Leaderboards
+Order-statistic rankings kept up to date as scores change, so a top-k, the
+rank of a player or the window around them costs O(log n) instead of a sort
+of every player. RankedScores is an indexable skip list; WindowedScores adds
+per-member sums over a sliding window of time buckets (the weekly board).
+"""
+
+import random
+from collections import Counter, deque
+from datetime import datetime, timedelta
+from typing import Deque, Dict, Iterator, List, Optional, Tuple
+
+MAX_LEVEL = 32
+LEVEL_PROBABILITY = 0.25
+
+
+class _Node:
+    __slots__ = ('key', 'forward', 'span')
+
+    def __init__(self, key: Optional[Tuple[int, str]], level: int):
+        self.key = key
+        self.forward: List[Optional['_Node']] = [None] * level
+        # Positions advanced by following forward[i]; to the end when it is None
+        self.span = [0] * level
+
+
+class RankedScores:
+    """Members ordered by score, highest first, ties by member id
+
+    Ranks are 1-based positions in that order. Updates, rank and selection by
+    rank are O(log n) expected; a top-k or window of w members adds O(k) or
+    O(w) for the walk along the bottom level.
+    """
+
+    def __init__(self, seed: Optional[int] = None):
+        self._head = _Node(None, MAX_LEVEL)
+        self._level = 1
+        self._scores: Dict[str, int] = {}
+        self._random = random.Random(seed)
+
+    def __len__(self) -> int:
+        return len(self._scores)
+
+    def __contains__(self, member: str) -> bool:
+        return member in self._scores
+
+    def score(self, member: str, default: Optional[int] = None) -> Optional[int]:
+        return self._scores.get(member, default)
+
+    def set(self, member: str, score: int):
+        """Insert the member or move it to its new score"""
+        current = self._scores.get(member)
+        if current == score:
+            return
+        if current is not None:
+            self._delete((-current, member))
+        self._insert((-score, member))
+        self._scores[member] = score
+
+    def increment(self, member: str, points: int) -> int:
+        score = self._scores.get(member, 0) + points
+        self.set(member, score)
+        return score
+
+    def remove(self, member: str) -> bool:
+        score = self._scores.pop(member, None)
+        if score is None:
+            return False
+        self._delete((-score, member))
+        return True
+
+    def rank(self, member: str) -> Optional[int]:
+        """1-based position of the member, or None if it has no score"""
+        score = self._scores.get(member)
+        if score is None:
+            return None
+        key = (-score, member)
+        node, rank = self._head, 0
+        for level in reversed(range(self._level)):
+            while node.forward[level] is not None and node.forward[level].key <= key:
+                rank += node.span[level]
+                node = node.forward[level]
+            if node.key == key:
+                return rank
+        return None
+
+    def top(self, k: int) -> List[Tuple[int, str, int]]:
+        """(rank, member, score) for the k highest scores"""
+        return self.range(1, k)
+
+    def around(self, member: str, window: int) -> List[Tuple[int, str, int]]:
+        """(rank, member, score) for up to `window` places either side of the member"""
+        rank = self.rank(member)
+        if rank is None:
+            return []
+        start = max(1, rank - window)
+        return self.range(start, rank + window - start + 1)
+
+    def range(self, start: int, count: int) -> List[Tuple[int, str, int]]:
+        """(rank, member, score) for `count` places from rank `start`"""
+        node = self._select(start)
+        entries = []
+        rank = start
+        while node is not None and len(entries) < count:
+            score, member = node.key
+            entries.append((rank, member, -score))
+            node = node.forward[0]
+            rank += 1
+        return entries
+
+    def __iter__(self) -> Iterator[Tuple[str, int]]:
+        node = self._head.forward[0]
+        while node is not None:
+            yield node.key[1], -node.key[0]
+            node = node.forward[0]
+
+    def _select(self, rank: int) -> Optional[_Node]:
+        if rank < 1 or rank > len(self._scores):
+            return None
+        node, traversed = self._head, 0
+        for level in reversed(range(self._level)):
+            while node.forward[level] is not None and traversed + node.span[level] <= rank:
+                traversed += node.span[level]
+                node = node.forward[level]
+            if traversed == rank:
+                return node
+        return None
+
+    def _random_level(self) -> int:
+        level = 1
+        while level < MAX_LEVEL and self._random.random() < LEVEL_PROBABILITY:
+            level += 1
+        return level
+
+    def _insert(self, key: Tuple[int, str]):
+        update = [self._head] * MAX_LEVEL
+        ranks = [0] * MAX_LEVEL
+        node, rank = self._head, 0
+        for level in reversed(range(self._level)):
+            while node.forward[level] is not None and node.forward[level].key < key:
+                rank += node.span[level]
+                node = node.forward[level]
+            update[level] = node
+            ranks[level] = rank
+
+        new_level = self._random_level()
+        if new_level > self._level:
+            for level in range(self._level, new_level):
+                self._head.span[level] = len(self._scores)
+            self._level = new_level
+
+        new = _Node(key, new_level)
+        for level in range(new_level):
+            previous = update[level]
+            new.forward[level] = previous.forward[level]
+            previous.forward[level] = new
+            new.span[level] = previous.span[level] - (rank - ranks[level])
+            previous.span[level] = rank - ranks[level] + 1
+        for level in range(new_level, self._level):
+            update[level].span[level] += 1
+
+    def _delete(self, key: Tuple[int, str]):
+        update = [self._head] * MAX_LEVEL
+        node = self._head
+        for level in reversed(range(self._level)):
+            while node.forward[level] is not None and node.forward[level].key < key:
+                node = node.forward[level]
+            update[level] = node
+
+        target = node.forward[0]
+        for level in range(self._level):
+            if update[level].forward[level] is target:
+                update[level].span[level] += target.span[level] - 1
+                update[level].forward[level] = target.forward[level]
+            else:
+                update[level].span[level] -= 1
+        while self._level > 1 and self._head.forward[self._level - 1] is None:
+            self._head.span[self._level - 1] = 0
+            self._level -= 1
+
+
+class WindowedScores:
+    """Member score sums over the last `window`, ranked like RankedScores
+
+    Points land in buckets of `bucket` width; whole buckets leave the sums
+    once they end before the window, so expiry costs once per bucket entry
+    rather than a rescan of history, and the window is exact to one bucket.
+    """
+
+    def __init__(self, window: timedelta = timedelta(days=7), bucket: timedelta = timedelta(hours=1)):
+        self.window = window
+        self.bucket = bucket
+        self.ranking = RankedScores()
+        self.buckets: Deque[Tuple[datetime, Dict[str, int]]] = deque()
+        self._bucket_counts: Counter = Counter()
+
+    def __len__(self) -> int:
+        return len(self.ranking)
+
+    def _bucket_start(self, when: datetime) -> datetime:
+        return datetime.min + (when - datetime.min) // self.bucket * self.bucket
+
+    def add(self, member: str, points: int, when: Optional[datetime] = None, now: Optional[datetime] = None):
+        """Count `points` scored at `when` (default now)"""
+        now = now or datetime.now()
+        when = when or now
+        self.expire(now)
+        start = self._bucket_start(when)
+        if start + self.bucket <= now - self.window:
+            return
+
+        entries = self._bucket(start)
+        if member not in entries:
+            entries[member] = 0
+            self._bucket_counts[member] += 1
+        entries[member] += points
+        self.ranking.increment(member, points)
+
+    def _bucket(self, start: datetime) -> Dict[str, int]:
+        if not self.buckets or self.buckets[-1][0] < start:
+            self.buckets.append((start, {}))
+            return self.buckets[-1][1]
+        # Late points for an older bucket: search back from the newest
+        for index in range(len(self.buckets) - 1, -1, -1):
+            bucket_start, entries = self.buckets[index]
+            if bucket_start == start:
+                return entries
+            if bucket_start < start:
+                self.buckets.insert(index + 1, (start, {}))
+                return self.buckets[index + 1][1]
+        self.buckets.appendleft((start, {}))
+        return self.buckets[0][1]
+
+    def expire(self, now: Optional[datetime] = None):
+        """Drop the buckets that ended before the window"""
+        cutoff = (now or datetime.now()) - self.window
+        while self.buckets and self.buckets[0][0] + self.bucket <= cutoff:
+            _, entries = self.buckets.popleft()
+            for member, points in entries.items():
+                self._bucket_counts[member] -= 1
+                if self._bucket_counts[member] <= 0:
+                    del self._bucket_counts[member]
+                    self.ranking.remove(member)
+                else:
+                    self.ranking.increment(member, -points)
+
+    def score(self, member: str, now: Optional[datetime] = None) -> Optional[int]:
+        self.expire(now)
+        return self.ranking.score(member)
+
+    def rank(self, member: str, now: Optional[datetime] = None) -> Optional[int]:
+        self.expire(now)
+        return self.ranking.rank(member)
+
+    def top(self, k: int, now: Optional[datetime] = None) -> List[Tuple[int, str, int]]:
+        self.expire(now)
+        return self.ranking.top(k)
+
+    def around(self, member: str, window: int, now: Optional[datetime] = None) -> List[Tuple[int, str, int]]:
+        self.expire(now)
+        return self.ranking.around(member, window)
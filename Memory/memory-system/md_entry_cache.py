@@ -0,0 +1,265 @@
+#!/usr/bin/env python3
+"""
+MD Entry Cache - Parsed memory entries per markdown file
+Entries are parsed once per (mtime, size) of the .md file; entries appended to
+its section log since then are parsed record by record, never the whole file
+"""
+
+import os
+import re
+import threading
+from bisect import bisect_left
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from md_section_log import SectionLogStore, _insertion_point
+
+# "**Key:** value" metadata lines of an entry
+METADATA_LINE = re.compile(r'\*\*([^*:]+):\*\*\s*(.*?)\s*$')
+# Where a "### Section" of entries ends
+SECTION_END = re.compile(r'^(?:#{1,3}(?!#)|---)', re.MULTILINE)
+
+
+def iter_entries(content: str, section: Optional[str] = None) -> Iterator[Tuple[int, Dict[str, Any]]]:
+    """Yield (offset, entry) for each memory entry, in file order
+
+    An entry starts at a "#### <id>" heading and runs until the next heading
+    or "---" rule. Lines are scanned lazily, so a caller that stops early
+    only pays for what it read. With `section` (e.g. "### General Information")
+    only that section is scanned.
+    """
+    position, end = 0, len(content)
+    if section is not None:
+        match = re.search(rf'^[ \t]*{re.escape(section)}[ \t]*$', content, re.MULTILINE)
+        if not match:
+            return
+        position = match.end() + 1
+        boundary = SECTION_END.search(content, position)
+        end = boundary.start() if boundary else end
+
+    entry, entry_offset = None, 0
+    while position < end:
+        newline = content.find('\n', position, end)
+        if newline == -1:
+            newline = end
+        line = content[position:newline]
+
+        if line.startswith('#### '):
+            if entry:
+                yield entry_offset, entry
+            entry = {'id': line[4:].strip(), 'content': '', 'metadata': {}}
+            entry_offset = position
+        elif entry is not None:
+            if line.startswith('#') or line.startswith('---'):
+                yield entry_offset, entry
+                entry = None
+            elif line.startswith('**'):
+                match = METADATA_LINE.match(line)
+                if match:
+                    entry['metadata'][match.group(1).strip().lower()] = match.group(2).strip('`')
+                elif ':' in line:
+                    key, value = line.split(':', 1)
+                    entry['metadata'][key.replace('**', '').strip().lower()] = value.strip()
+            elif line.strip() and not line.startswith('*'):
+                entry['content'] += line + '\n'
+        position = newline + 1
+
+    if entry:
+        yield entry_offset, entry
+
+
+def parse_entries(content: str) -> List[Dict[str, Any]]:
+    """All memory entries of a markdown file, in file order"""
+    return [entry for _, entry in iter_entries(content)]
+
+
+class _FileEntries:
+    """Cached parse of one file: entries in file order and newest first
+
+    Each entry has a file-order key that never changes as records are
+    added: (offset, 1, 0) for an entry of the .md itself and (offset, 0, -seq)
+    for a log record spliced in at `offset`, which puts records ahead of the
+    base text there, newest first - the order `render()` produces.
+    """
+
+    __slots__ = ('base_key', 'log_size', 'log_end', 'base_ids', 'mismatch', 'anchors',
+                 'seq', 'fallback', 'keys', 'entries', 'time_keys', 'by_time')
+
+    def __init__(self, base_key: Tuple[int, int]):
+        self.base_key = base_key
+        self.log_size = 0
+        self.log_end = 0
+        self.base_ids = set()
+        self.mismatch = False  # log written for an older .md (see SectionLogStore.pending)
+        self.anchors: Dict[Tuple[str, str], Optional[int]] = {}
+        self.seq = 0
+        self.fallback = False  # a record the splice cannot place: parse the rendered text
+        self.keys: List[Tuple[int, int, int]] = []
+        self.entries: List[Dict[str, Any]] = []
+        # Ascending (time, reversed file-order key); read backwards for newest first
+        self.time_keys: List[Tuple[str, int, int, int]] = []
+        self.by_time: List[Dict[str, Any]] = []
+
+    def copy(self) -> '_FileEntries':
+        clone = _FileEntries(self.base_key)
+        for name in self.__slots__:
+            value = getattr(self, name)
+            setattr(clone, name, value.copy() if isinstance(value, (list, dict)) else value)
+        return clone
+
+    @staticmethod
+    def _time_key(key: Tuple[int, int, int], entry: Dict[str, Any]) -> Tuple[str, int, int, int]:
+        return (entry['metadata'].get('time', ''), -key[0], -key[1], -key[2])
+
+    def build(self, items: List[Tuple[Tuple[int, int, int], Dict[str, Any]]]):
+        items.sort(key=lambda item: item[0])
+        self.keys = [key for key, _ in items]
+        self.entries = [entry for _, entry in items]
+        timeline = sorted(((self._time_key(key, entry), entry) for key, entry in items),
+                          key=lambda item: item[0])
+        self.time_keys = [key for key, _ in timeline]
+        self.by_time = [entry for _, entry in timeline]
+
+    def insert(self, key: Tuple[int, int, int], entry: Dict[str, Any]):
+        position = bisect_left(self.keys, key)
+        self.keys.insert(position, key)
+        self.entries.insert(position, entry)
+        time_key = self._time_key(key, entry)
+        position = bisect_left(self.time_keys, time_key)
+        self.time_keys.insert(position, time_key)
+        self.by_time.insert(position, entry)
+
+
+class EntryCache:
+    """Parsed memory entries per file, kept current without reparsing
+
+    A lookup stats the .md file and its section log. If neither changed the
+    cached entries are returned as they are. If only the log grew, just the
+    records past the cached log offset are parsed and spliced in at the
+    position `render()` would put them. A rewritten .md (compaction or an
+    outside edit) is parsed again from scratch.
+    """
+
+    def __init__(self, store: SectionLogStore, max_files: int = None):
+        self.store = store
+        self.max_files = max_files or int(os.getenv('MD_ENTRY_CACHE_FILES', 1024))
+        self._files: "OrderedDict[str, _FileEntries]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'incremental': 0, 'full': 0, 'records_parsed': 0}
+
+    def _keys(self, path: Path) -> Tuple[Tuple[int, int], int]:
+        st = os.stat(path)
+        try:
+            log_size = os.stat(self.store.log_path(path)).st_size
+        except FileNotFoundError:
+            log_size = 0
+        return (st.st_mtime_ns, st.st_size), log_size
+
+    def peek(self, path: Path) -> Optional[List[Dict[str, Any]]]:
+        """Cached entries if still current, without reading or parsing anything"""
+        try:
+            base_key, log_size = self._keys(path)
+        except OSError:
+            return None
+        with self._lock:
+            state = self._files.get(str(path))
+        if state and state.base_key == base_key and state.log_size == log_size:
+            return state.entries
+        return None
+
+    def entries(self, path: Path) -> List[Dict[str, Any]]:
+        """Entries of a file in file order (shared objects: copy before mutating)"""
+        return self._state(Path(path)).entries
+
+    def newest_first(self, path: Path) -> Iterator[Dict[str, Any]]:
+        """Entries newest first; ties keep file order"""
+        return reversed(self._state(Path(path)).by_time)
+
+    def invalidate(self, path: Path):
+        with self._lock:
+            self._files.pop(str(path), None)
+
+    def _state(self, path: Path) -> _FileEntries:
+        key = str(path)
+        base_key, log_size = self._keys(path)
+        with self._lock:
+            state = self._files.get(key)
+            if state and state.base_key == base_key and state.log_size == log_size:
+                self._files.move_to_end(key)
+                self.stats['hits'] += 1
+                return state
+
+        # Appends and compaction hold the store lock, so .md and log are read as a pair
+        with self.store.lock(path):
+            base_key, log_size = self._keys(path)
+            if state is None or state.base_key != base_key or log_size < state.log_end:
+                state = self._load(path, base_key)
+            else:
+                state = self._extend(path, state)
+            state.log_size = log_size
+
+        with self._lock:
+            self._files[key] = state
+            self._files.move_to_end(key)
+            while len(self._files) > self.max_files:
+                self._files.popitem(last=False)
+        return state
+
+    def _read_base(self, path: Path) -> str:
+        with open(path, 'r', encoding='utf-8') as f:
+            return f.read()
+
+    def _load(self, path: Path, base_key: Tuple[int, int]) -> _FileEntries:
+        self.stats['full'] += 1
+        state = _FileEntries(base_key)
+        content = self._read_base(path)
+        base = [((offset, 1, 0), entry) for offset, entry in iter_entries(content)]
+        state.base_ids = {entry['id'] for _, entry in base}
+
+        records, state.log_end, identity = self.store.read_records(path, 0)
+        state.mismatch = bool(records) and identity != (base_key[1], base_key[0])
+        state.build(base + self._record_entries(path, state, records, content))
+        self._check_fallback(path, state)
+        return state
+
+    def _extend(self, path: Path, state: _FileEntries) -> _FileEntries:
+        self.stats['incremental'] += 1
+        records, end, _ = self.store.read_records(path, state.log_end)
+        # Other threads may be reading the cached state: update a copy
+        state = state.copy()
+        if end:
+            state.log_end = end
+        if records:
+            for key, entry in self._record_entries(path, state, records, None):
+                state.insert(key, entry)
+            self._check_fallback(path, state)
+        return state
+
+    def _record_entries(self, path: Path, state: _FileEntries, records: List[Dict[str, Any]],
+                        content: Optional[str]) -> List[Tuple[Tuple[int, int, int], Dict[str, Any]]]:
+        """Parse log records into (file-order key, entry) pairs"""
+        if state.mismatch:
+            records = [r for r in records if r['id'] not in state.base_ids]
+        items = []
+        for record in records:
+            anchor = (record['kind'], record['anchor'])
+            if anchor not in state.anchors:
+                if content is None:
+                    content = self._read_base(path)
+                state.anchors[anchor] = _insertion_point(content, record)
+            offset = state.anchors[anchor]
+            if offset is None:
+                state.fallback = True
+                continue
+            self.stats['records_parsed'] += 1
+            for _, entry in iter_entries(record['entry']):
+                state.seq += 1
+                items.append(((offset, 0, -state.seq), entry))
+        return items
+
+    def _check_fallback(self, path: Path, state: _FileEntries):
+        if state.fallback:
+            # Sections missing from the .md: parse what render() produces
+            state.build([((position, 1, 0), entry) for position, (_, entry)
+                         in enumerate(iter_entries(self.store.read_text(path)))])
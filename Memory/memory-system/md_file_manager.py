@@ -18,6 +18,11 @@ from enum import Enum
 import aiofiles
 import yaml
 
+from md_entry_cache import EntryCache, iter_entries, parse_entries
+from md_section_log import SectionLogStore
+from md_write_coordinator import WriteCoordinator
+from related_file_index import RelatedFileIndex
+
 logger = logging.getLogger(__name__)
 
 class MemoryTag(Enum):
@@ -36,6 +41,15 @@ class FileType(Enum):
     TOPIC = "topic"
     DAILY_DIGEST = "daily_digest"
 
+# Section of the user file each tag's entries go to
+TAG_SECTIONS = {
+    MemoryTag.CHRONOLOGICAL: "### Chronological Memories",
+    MemoryTag.GENERAL: "### General Information",
+    MemoryTag.CONFIDENTIAL: "### Confidential Information",
+    MemoryTag.SECRET: "### Secret Information",
+    MemoryTag.ULTRA_SECRET: "### Ultra-Secret Information"
+}
+
 @dataclass
 class MemoryEntry:
     """Represents a single memory entry"""
@@ -98,10 +112,22 @@ class MDFileManager:
         self.encryption_key = encryption_key
         self.file_locks = {}  # For concurrent access control
         
-        # Memory entry cache for performance
-        self.entry_cache = {}
-        self.cache_expiry = {}
-        self.cache_duration = timedelta(minutes=30)
+        # Entries are appended to per-file section logs and folded into the
+        # markdown on compaction (see md_section_log.py)
+        self.storage = SectionLogStore(on_compact=self._on_compact)
+        
+        # Parsed entries per file, validated by mtime/size of the file and its log
+        self.entry_cache = EntryCache(self.storage)
+        # Per-file locks; concurrent entries for one file share a single append
+        self.writes = WriteCoordinator(self.storage)
+        
+        # Reverse index: user -> contact/relationship/topic files
+        self.related_index = RelatedFileIndex(self.base_dir / "related_files.db")
+        if self.related_index.is_empty() and any(
+            any(directory.glob("*.md"))
+            for directory in [self.contacts_dir, self.relationships_dir, self.topics_dir]
+        ):
+            self.related_index.rebuild(self)
         
         logger.info(f"🗂️ MD File Manager initialized with base directory: {self.base_dir}")
     
@@ -274,6 +300,7 @@ class MDFileManager:
             
             async with aiofiles.open(file_path, 'w', encoding='utf-8') as f:
                 await f.write(content)
+            await self.related_index.record_write_async(file_path, "contact", user_phone, content)
             
             logger.info(f"✅ Created contact file: {contact_name}")
             
@@ -307,38 +334,19 @@ class MDFileManager:
                 confidence_score=1.0
             )
             
-            # Files to update
-            files_updated = []
-            
-            # 1. Update user's main file
-            user_result = await self._update_user_file(phone_number, entry)
-            if user_result['success']:
-                files_updated.append(user_result['file_path'])
+            # Independent file updates run concurrently; each file is locked
+            # on its own, so updates to different files never wait on each other
+            updates = [self._update_user_file(phone_number, entry)]
+            for contact in related_contacts or []:
+                updates.append(self._update_contact_and_relationship(phone_number, contact, entry))
+            for topic in self._extract_topics(message):
+                updates.append(self._update_topic_file(topic, entry, phone_number))
             
-            # 2. Update contact files if related contacts are mentioned
-            if related_contacts:
-                for contact in related_contacts:
-                    # Ensure contact file exists
-                    await self.create_contact_file(contact, phone_number)
-                    
-                    # Update contact file
-                    contact_result = await self._update_contact_file(contact, entry, phone_number)
-                    if contact_result['success']:
-                        files_updated.append(contact_result['file_path'])
-                    
-                    # Update relationship file
-                    relationship_result = await self._update_relationship_file(
-                        phone_number, contact, entry
-                    )
-                    if relationship_result['success']:
-                        files_updated.append(relationship_result['file_path'])
-            
-            # 3. Update topic files if applicable
-            topics = self._extract_topics(message)
-            for topic in topics:
-                topic_result = await self._update_topic_file(topic, entry, phone_number)
-                if topic_result['success']:
-                    files_updated.append(topic_result['file_path'])
+            files_updated = []
+            for result in await asyncio.gather(*updates):
+                for file_result in result if isinstance(result, list) else [result]:
+                    if file_result['success']:
+                        files_updated.append(file_result['file_path'])
             
             logger.info(f"📝 Updated {len(files_updated)} files for entry: {entry.id}")
             
@@ -358,6 +366,51 @@ class MDFileManager:
                 'error': str(e)
             }
     
+    async def _append_entry(self, file_path: Path, kind: str, anchor: str, entry: MemoryEntry,
+                            include_source: bool, touch: bool, template: Optional[str] = None):
+        """Append an entry to a file's section log (one small write, any file size)"""
+        record = {
+            'id': entry.id,
+            'kind': kind,
+            'anchor': anchor,
+            'entry': self._generate_entry_markdown(entry, include_source=include_source),
+            'touch': datetime.now().strftime("%Y-%m-%d %H:%M:%S") if touch else None
+        }
+        await self.writes.append(file_path, record, template)
+    
+    async def read_file(self, file_path: Path) -> str:
+        """Current markdown of a memory file, including entries not yet compacted"""
+        return await asyncio.to_thread(self.storage.read_text, file_path)
+    
+    def flush_files(self, paths) -> int:
+        """Fold pending entries into the markdown files (for direct readers)"""
+        return self.storage.flush(paths)
+    
+    def flush_all(self) -> int:
+        """Fold pending entries into every managed markdown file"""
+        return sum(
+            self.storage.flush_directory(directory)
+            for directory in [self.users_dir, self.contacts_dir, self.relationships_dir, self.topics_dir]
+        )
+    
+    def _on_compact(self, file_path: Path, content: str):
+        """Refresh entry offsets of shared files after their log is folded in"""
+        index = getattr(self, 'related_index', None)
+        if index is not None and file_path.parent != self.users_dir:
+            index.reindex(file_path, content)
+    
+    async def _update_contact_and_relationship(self, phone_number: str, contact: str,
+                                               entry: MemoryEntry) -> List[Dict[str, Any]]:
+        """Update a mentioned contact's file and the user's relationship file"""
+        # Ensure contact file exists (under its lock, so concurrent creators don't race)
+        async with self.writes.lock(self._get_contact_file_path(contact)):
+            await self.create_contact_file(contact, phone_number)
+        
+        return list(await asyncio.gather(
+            self._update_contact_file(contact, entry, phone_number),
+            self._update_relationship_file(phone_number, contact, entry)
+        ))
+    
     async def _update_user_file(self, phone_number: str, entry: MemoryEntry) -> Dict[str, Any]:
         """Update user's main memory file"""
         try:
@@ -365,63 +418,13 @@ class MDFileManager:
             
             # Ensure file exists
             if not file_path.exists():
-                await self.create_user_file(phone_number)
-            
-            # Read current content
-            async with aiofiles.open(file_path, 'r', encoding='utf-8') as f:
-                content = await f.read()
-            
-            # Generate entry markdown
-            entry_md = self._generate_entry_markdown(entry)
-            
-            # Find appropriate section based on tag
-            section_map = {
-                MemoryTag.CHRONOLOGICAL: "### Chronological Memories",
-                MemoryTag.GENERAL: "### General Information",
-                MemoryTag.CONFIDENTIAL: "### Confidential Information",
-                MemoryTag.SECRET: "### Secret Information",
-                MemoryTag.ULTRA_SECRET: "### Ultra-Secret Information"
-            }
-            
-            section_header = section_map[entry.tag]
-            
-            # Insert entry in appropriate section
-            if section_header in content:
-                # Find the section and add entry
-                lines = content.split('\n')
-                section_index = -1
-                
-                for i, line in enumerate(lines):
-                    if line.strip() == section_header:
-                        section_index = i
-                        break
-                
-                if section_index != -1:
-                    # Find next section or end of file
-                    insert_index = len(lines)
-                    for i in range(section_index + 1, len(lines)):
-                        if lines[i].startswith('###') or lines[i].startswith('---'):
-                            insert_index = i
-                            break
-                    
-                    # Insert entry
-                    lines.insert(insert_index, entry_md)
-                    lines.insert(insert_index + 1, "")
-                    content = '\n'.join(lines)
-            else:
-                # Append to end of file
-                content += f"\n\n{section_header}\n{entry_md}\n"
-            
-            # Update last modified timestamp
-            content = re.sub(
-                r'(\*\*Last Updated:\*\*) [^\n]+',
-                f'\\1 {datetime.now().strftime("%Y-%m-%d %H:%M:%S")}',
-                content
-            )
+                async with self.writes.lock(file_path):
+                    if not file_path.exists():
+                        await self.create_user_file(phone_number)
             
-            # Write updated content
-            async with aiofiles.open(file_path, 'w', encoding='utf-8') as f:
-                await f.write(content)
+            # Append to the section log; "Last Updated" is refreshed on render
+            await self._append_entry(file_path, 'user', TAG_SECTIONS[entry.tag], entry,
+                                     include_source=False, touch=True)
             
             return {
                 'success': True,
@@ -441,32 +444,13 @@ class MDFileManager:
         try:
             file_path = self._get_contact_file_path(contact_name)
             
-            # Read current content
-            async with aiofiles.open(file_path, 'r', encoding='utf-8') as f:
-                content = await f.read()
-            
-            # Generate entry markdown
-            entry_md = self._generate_entry_markdown(entry, include_source=True)
-            
             # Add to Recent Interactions section
-            if "### Recent Interactions" in content:
-                content = content.replace(
-                    "### Recent Interactions\n*Most recent conversations and interactions*",
-                    f"### Recent Interactions\n*Most recent conversations and interactions*\n\n{entry_md}"
-                )
-            else:
-                content += f"\n\n### Recent Interactions\n{entry_md}\n"
-            
-            # Update last modified
-            content = re.sub(
-                r'(\*\*Last Updated:\*\*) [^\n]+',
-                f'\\1 {datetime.now().strftime("%Y-%m-%d %H:%M:%S")}',
-                content
+            await self._append_entry(
+                file_path, 'contact',
+                "### Recent Interactions\n*Most recent conversations and interactions*",
+                entry, include_source=True, touch=True
             )
-            
-            # Write updated content
-            async with aiofiles.open(file_path, 'w', encoding='utf-8') as f:
-                await f.write(content)
+            await self.related_index.record_write_async(file_path, "contact", user_phone, entry_id=entry.id)
             
             return {
                 'success': True,
@@ -486,9 +470,8 @@ class MDFileManager:
         try:
             file_path = self._get_relationship_file_path(user_phone, contact_name)
             
-            # Create file if it doesn't exist
-            if not file_path.exists():
-                content = f"""# Relationship: {user_phone} ↔ {contact_name}
+            # Used only if the file doesn't exist yet
+            template = f"""# Relationship: {user_phone} ↔ {contact_name}
 
 ## Relationship Profile
 - **User:** {user_phone}
@@ -499,32 +482,11 @@ class MDFileManager:
 ## Interaction History
 
 """
-            else:
-                async with aiofiles.open(file_path, 'r', encoding='utf-8') as f:
-                    content = await f.read()
-            
-            # Generate entry markdown
-            entry_md = self._generate_entry_markdown(entry, include_source=True)
             
             # Add to Interaction History
-            if "## Interaction History" in content:
-                content = content.replace(
-                    "## Interaction History\n",
-                    f"## Interaction History\n\n{entry_md}\n"
-                )
-            else:
-                content += f"\n\n## Interaction History\n{entry_md}\n"
-            
-            # Update last modified
-            content = re.sub(
-                r'(\*\*Last Updated:\*\*) [^\n]+',
-                f'\\1 {datetime.now().strftime("%Y-%m-%d %H:%M:%S")}',
-                content
-            )
-            
-            # Write updated content
-            async with aiofiles.open(file_path, 'w', encoding='utf-8') as f:
-                await f.write(content)
+            await self._append_entry(file_path, 'relationship', "## Interaction History\n", entry,
+                                     include_source=True, touch=True, template=template)
+            await self.related_index.record_write_async(file_path, "relationship", user_phone, entry_id=entry.id)
             
             return {
                 'success': True,
@@ -544,9 +506,8 @@ class MDFileManager:
         try:
             file_path = self._get_topic_file_path(topic)
             
-            # Create file if it doesn't exist
-            if not file_path.exists():
-                content = f"""# Topic: {topic.title()}
+            # Used only if the file doesn't exist yet
+            template = f"""# Topic: {topic.title()}
 
 ## Topic Information
 - **Topic:** {topic.title()}
@@ -556,25 +517,11 @@ class MDFileManager:
 ## Related Entries
 
 """
-            else:
-                async with aiofiles.open(file_path, 'r', encoding='utf-8') as f:
-                    content = await f.read()
-            
-            # Generate entry markdown
-            entry_md = self._generate_entry_markdown(entry, include_source=True)
             
             # Add to Related Entries
-            if "## Related Entries" in content:
-                content = content.replace(
-                    "## Related Entries\n",
-                    f"## Related Entries\n\n{entry_md}\n"
-                )
-            else:
-                content += f"\n\n## Related Entries\n{entry_md}\n"
-            
-            # Write updated content
-            async with aiofiles.open(file_path, 'w', encoding='utf-8') as f:
-                await f.write(content)
+            await self._append_entry(file_path, 'topic', "## Related Entries\n", entry,
+                                     include_source=True, touch=False, template=template)
+            await self.related_index.record_write_async(file_path, "topic", user_phone, entry_id=entry.id)
             
             return {
                 'success': True,
@@ -647,11 +594,8 @@ class MDFileManager:
                     'message': 'User file not found'
                 }
             
-            async with aiofiles.open(file_path, 'r', encoding='utf-8') as f:
-                content = await f.read()
-            
-            # Parse memories from content
-            memories = self._parse_memories_from_content(content, tag, limit)
+            # Parsed entries are cached; unchanged files are not read or parsed again
+            memories = await asyncio.to_thread(self._recent_memories, file_path, tag, limit)
             
             return {
                 'success': True,
@@ -667,50 +611,44 @@ class MDFileManager:
                 'error': str(e)
             }
     
-    def _parse_memories_from_content(self, content: str, tag: Optional[MemoryTag] = None,
-                                   limit: int = 50) -> List[Dict[str, Any]]:
-        """Parse memory entries from file content"""
+    def _recent_memories(self, file_path: Path, tag: Optional[MemoryTag],
+                         limit: int) -> List[Dict[str, Any]]:
+        """Newest `limit` memories of a file from the entry cache (copies, safe to modify)"""
         memories = []
-        lines = content.split('\n')
+        for memory in self.entry_cache.newest_first(file_path):
+            if tag and memory['metadata'].get('tag') != f'#{tag.value}':
+                continue
+            memories.append({**memory, 'metadata': dict(memory['metadata'])})
+            if len(memories) >= limit:
+                break
+        return memories
+    
+    async def iter_user_memories(self, phone_number: str, tag: Optional[MemoryTag] = None):
+        """Stream a user's memories in file order, parsing only as far as the caller reads
         
-        current_entry = None
-        in_entry = False
+        Meant for callers that need the first few entries or a single tag;
+        with a tag only that tag's section of the file is scanned.
+        """
+        file_path = self._get_user_file_path(phone_number)
+        if not file_path.exists():
+            return
         
-        for line in lines:
-            if line.startswith('#### mem_'):
-                # Start of new entry
-                if current_entry:
-                    memories.append(current_entry)
-                
-                current_entry = {
-                    'id': line[4:].strip(),
-                    'content': '',
-                    'metadata': {}
-                }
-                in_entry = True
-                
-            elif in_entry and line.startswith('**'):
-                # Metadata line
-                if ':' in line:
-                    key, value = line.split(':', 1)
-                    key = key.replace('**', '').strip().lower()
-                    value = value.strip()
-                    current_entry['metadata'][key] = value
-                    
-            elif in_entry and line.strip() and not line.startswith('*'):
-                # Content line
-                current_entry['content'] += line + '\n'
-                
-            elif in_entry and (line.startswith('####') or line.startswith('###')):
-                # End of entry
-                if current_entry:
-                    memories.append(current_entry)
-                    current_entry = None
-                in_entry = False
+        cached = self.entry_cache.peek(file_path)
+        if cached is not None:
+            memories = ((None, memory) for memory in cached)
+        else:
+            content = await self.read_file(file_path)
+            memories = iter_entries(content, section=TAG_SECTIONS[tag] if tag else None)
         
-        # Add last entry if exists
-        if current_entry:
-            memories.append(current_entry)
+        for _, memory in memories:
+            if tag and memory['metadata'].get('tag') != f'#{tag.value}':
+                continue
+            yield {**memory, 'metadata': dict(memory['metadata'])}
+    
+    def _parse_memories_from_content(self, content: str, tag: Optional[MemoryTag] = None,
+                                   limit: int = 50) -> List[Dict[str, Any]]:
+        """Parse memory entries from file content"""
+        memories = parse_entries(content)
         
         # Filter by tag if specified
         if tag:
@@ -22,6 +22,7 @@ import stat
 
 # Import local modules
 from md_file_manager import MDFileManager, MemoryTag, MemoryEntry
+from md_section_log import SectionLogStore
 from confidential_manager import SecurityLevel, AccessLevel
 
 logger = logging.getLogger(__name__)
@@ -110,6 +111,10 @@ class MDFileOrganizer:
         if not dry_run:
             self.users_dir.mkdir(parents=True, exist_ok=True)
             self.security_dir.mkdir(parents=True, exist_ok=True)
+        
+        # MDFileManager appends new entries to a section log beside each file;
+        # reads replay it so entries not yet compacted are not missed
+        self.storage = SectionLogStore()
             
         # Tag normalization mapping
         self.tag_normalization = {
@@ -238,8 +243,7 @@ class MDFileOrganizer:
         entries = []
         
         try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                content = f.read()
+            content = self.storage.read_text(file_path)
             
             # Split content by entry headers
             entry_pattern = r'(####\s*\[id:[^\]]+\]\s*\[tag:[^\]]+\]\s*\[ts:[^\]]+\])'
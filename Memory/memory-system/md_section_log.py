@@ -0,0 +1,368 @@
+#!/usr/bin/env python3
+"""
+MD Section Log - Append-only storage behind MDFileManager's markdown files
+New entries are appended to a sidecar log; the markdown view is rendered on read
+and folded back into the .md file on compaction
+"""
+
+import os
+import re
+import json
+import zlib
+import struct
+import logging
+import threading
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+LOG_MAGIC = b'MDLG'
+LOG_VERSION = 1
+# Log header: magic, version, size and mtime_ns of the base .md it applies to
+LOG_HEADER = struct.Struct('<4sHQQ')
+# Record frame: payload length, crc32 of payload
+FRAME = struct.Struct('<II')
+
+LAST_UPDATED = re.compile(r'(\*\*Last Updated:\*\*) [^\n]+')
+
+# Per-file locks shared by every store in the process: several MDFileManager
+# instances open the same files, and one must not compact a log while
+# another appends to it
+_FILE_LOCKS: Dict[str, threading.Lock] = {}
+_FILE_LOCKS_GUARD = threading.Lock()
+
+
+def file_lock(path: Path) -> threading.Lock:
+    """Process-wide lock for one markdown file and its log"""
+    key = os.path.abspath(path)
+    with _FILE_LOCKS_GUARD:
+        lock = _FILE_LOCKS.get(key)
+        if lock is None:
+            lock = _FILE_LOCKS[key] = threading.Lock()
+        return lock
+
+
+def _apply_record(content: str, record: Dict[str, Any]) -> str:
+    """Apply one record exactly as the original read-modify-write code did"""
+    kind, anchor, entry_md = record['kind'], record['anchor'], record['entry']
+
+    if kind == 'user':
+        if anchor in content:
+            lines = content.split('\n')
+            section_index = next((i for i, line in enumerate(lines) if line.strip() == anchor), -1)
+            if section_index != -1:
+                insert_index = len(lines)
+                for i in range(section_index + 1, len(lines)):
+                    if lines[i].startswith('###') or lines[i].startswith('---'):
+                        insert_index = i
+                        break
+                lines.insert(insert_index, entry_md)
+                lines.insert(insert_index + 1, "")
+                content = '\n'.join(lines)
+        else:
+            content += f"\n\n{anchor}\n{entry_md}\n"
+    elif kind == 'contact':
+        header = anchor.split('\n', 1)[0]
+        if anchor in content:
+            content = content.replace(anchor, f"{anchor}\n\n{entry_md}")
+        elif header in content:
+            content = content.replace(header, f"{header}\n\n{entry_md}", 1)
+        else:
+            content += f"\n\n{header}\n{entry_md}\n"
+    else:
+        # relationship / topic: anchor is the "## Section\n" heading
+        if anchor in content:
+            content = content.replace(anchor, f"{anchor}\n{entry_md}\n")
+        else:
+            content += f"\n\n{anchor}{entry_md}\n"
+    return content
+
+
+def _insertion_point(content: str, record: Dict[str, Any]) -> Optional[int]:
+    """Offset where repeated inserts for a section land
+
+    Every record for a section is inserted at the same spot, newest first,
+    so a batch can be spliced in one pass. Returns None for layouts the
+    splice does not cover; those fall back to `_apply_record`.
+    """
+    kind, anchor = record['kind'], record['anchor']
+    if kind == 'user':
+        match = re.search(rf'^[ \t]*{re.escape(anchor)}[ \t]*$', content, re.MULTILINE)
+        if not match:
+            return None
+        boundary = re.compile(r'^(?:###|---)', re.MULTILINE).search(content, match.end() + 1)
+        if not boundary:
+            return None
+        return boundary.start()
+    position = content.find(anchor)
+    if position == -1:
+        return None
+    return position + len(anchor)
+
+
+def render(base: str, records: List[Dict[str, Any]]) -> str:
+    """Markdown after applying `records` (oldest first) to `base`"""
+    if not records:
+        return base
+
+    splices: Dict[int, List[str]] = {}
+    anchors: Dict[Tuple[str, str], Optional[int]] = {}
+    sequential: List[Dict[str, Any]] = []
+
+    for record in records:
+        key = (record['kind'], record['anchor'])
+        if key not in anchors:
+            anchors[key] = _insertion_point(base, record)
+        offset = anchors[key]
+        if offset is None:
+            sequential.append(record)
+            continue
+        entry_md = record['entry']
+        if record['kind'] == 'user':
+            text = f"{entry_md}\n\n"
+        elif record['kind'] == 'contact':
+            text = f"\n\n{entry_md}"
+        else:
+            text = f"\n{entry_md}\n"
+        splices.setdefault(offset, []).append(text)
+
+    parts = []
+    previous = 0
+    for offset in sorted(splices):
+        parts.append(base[previous:offset])
+        parts.extend(reversed(splices[offset]))  # newest first
+        previous = offset
+    parts.append(base[previous:])
+    content = ''.join(parts)
+
+    for record in sequential:
+        content = _apply_record(content, record)
+
+    touched = [record['touch'] for record in records if record.get('touch')]
+    if touched:
+        content = LAST_UPDATED.sub(lambda m: f"{m.group(1)} {touched[-1]}", content)
+    return content
+
+
+class SectionLogStore:
+    """Append-only section log per markdown file
+
+    Appending an entry writes one CRC-framed record to `<file>.log` with a
+    single O_APPEND write (optionally fdatasync'd), so the cost does not
+    depend on the size of the markdown file. Torn records left by a crash
+    are ignored and truncated on the next append. The log is folded into
+    the markdown file (atomic tmp + rename) once it exceeds `compact_ratio`
+    of the markdown size, which keeps the amortised write cost constant.
+    """
+
+    def __init__(self, fsync: bool = None, compact_ratio: float = None,
+                 compact_min_bytes: int = None,
+                 on_compact: Optional[Callable[[Path, str], None]] = None):
+        self.fsync = fsync if fsync is not None else os.getenv('MD_LOG_FSYNC', '1') == '1'
+        self.compact_ratio = compact_ratio if compact_ratio is not None else \
+            float(os.getenv('MD_LOG_COMPACT_RATIO', 0.5))
+        self.compact_min_bytes = compact_min_bytes if compact_min_bytes is not None else \
+            int(os.getenv('MD_LOG_COMPACT_MIN_BYTES', 256 * 1024))
+        self.on_compact = on_compact
+        self._log_ends: Dict[str, int] = {}  # end of the last valid record per log
+        self.stats = {'appends': 0, 'records': 0, 'compactions': 0, 'torn_records': 0}
+
+    @staticmethod
+    def log_path(path: Path) -> Path:
+        path = Path(path)
+        return path.with_name(path.name + '.log')
+
+    @staticmethod
+    def lock(path: Path) -> threading.Lock:
+        return file_lock(path)
+
+    # ------------------------------------------------------------------
+    # Log I/O
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _base_identity(path: Path) -> Tuple[int, int]:
+        st = os.stat(path)
+        return st.st_size, st.st_mtime_ns
+
+    def _read_log(self, path: Path) -> Tuple[List[Dict[str, Any]], int, Optional[Tuple[int, int]]]:
+        """(records, end of last valid record, base identity in header)"""
+        return self.read_records(path, 0)
+
+    def read_records(self, path: Path, start: int = 0) -> Tuple[List[Dict[str, Any]], int,
+                                                                  Optional[Tuple[int, int]]]:
+        """Like `_read_log`, but only decodes records that begin at or after `start`
+
+        `start` must be the end of a valid record (as returned by an earlier
+        call); readers use it to pick up just what was appended since.
+        """
+        log_path = self.log_path(path)
+        try:
+            with open(log_path, 'rb') as f:
+                header = f.read(LOG_HEADER.size)
+                if len(header) < LOG_HEADER.size:
+                    return [], 0, None
+                position = max(start, LOG_HEADER.size)
+                f.seek(position)
+                data = f.read()
+        except FileNotFoundError:
+            return [], 0, None
+
+        magic, version, base_size, base_mtime = LOG_HEADER.unpack(header)
+        if magic != LOG_MAGIC or version != LOG_VERSION:
+            raise ValueError(f"Not a section log: {log_path}")
+
+        records = []
+        offset = 0
+        while offset + FRAME.size <= len(data):
+            length, crc = FRAME.unpack_from(data, offset)
+            payload = data[offset + FRAME.size:offset + FRAME.size + length]
+            if len(payload) < length or zlib.crc32(payload) != crc:
+                self.stats['torn_records'] += 1
+                break
+            records.append(json.loads(payload))
+            offset += FRAME.size + length
+        return records, position + offset, (base_size, base_mtime)
+
+    def pending(self, path: Path) -> List[Dict[str, Any]]:
+        """Records not yet folded into the markdown file"""
+        records, _, identity = self._read_log(path)
+        if records and identity != self._base_identity(path):
+            # The .md was replaced after the log was started (crash during
+            # compaction or an outside edit): keep only entries it lacks
+            with open(path, 'r', encoding='utf-8') as f:
+                base = f.read()
+            records = [r for r in records if f"#### {r['id']}\n" not in base]
+        return records
+
+    def append(self, path: Path, records: List[Dict[str, Any]], template: Optional[str] = None):
+        """Durably append records for a markdown file (created from `template` if missing)"""
+        path = Path(path)
+        with self.lock(path):
+            if not path.exists():
+                if template is None:
+                    raise FileNotFoundError(path)
+                self._atomic_write(path, template)
+                self._reset_log(path)
+
+            log_path = self.log_path(path)
+            valid_end = self._log_ends.get(str(path))
+            if valid_end is None:
+                # First append in this process: validate the log once
+                _, valid_end, identity = self._read_log(path)
+                if identity is None:
+                    self._reset_log(path)
+                    valid_end = LOG_HEADER.size
+
+            frames = b''
+            for record in records:
+                payload = json.dumps(record, ensure_ascii=False).encode('utf-8')
+                frames += FRAME.pack(len(payload), zlib.crc32(payload)) + payload
+
+            fd = os.open(log_path, os.O_WRONLY | os.O_APPEND)
+            try:
+                size = os.fstat(fd).st_size
+                if size != valid_end:
+                    # Appended elsewhere or torn by a crash: re-validate, drop a torn tail
+                    _, valid_end, _ = self._read_log(path)
+                    if size != valid_end:
+                        os.ftruncate(fd, valid_end)
+                os.write(fd, frames)
+                if self.fsync:
+                    os.fdatasync(fd) if hasattr(os, 'fdatasync') else os.fsync(fd)
+                log_size = valid_end + len(frames)
+            finally:
+                os.close(fd)
+            self._log_ends[str(path)] = log_size
+
+            self.stats['appends'] += 1
+            self.stats['records'] += len(records)
+            if log_size > max(self.compact_min_bytes, self.compact_ratio * path.stat().st_size):
+                self._compact_locked(path)
+
+    def _reset_log(self, path: Path):
+        """Start an empty log bound to the current markdown file"""
+        base_size, base_mtime = self._base_identity(path)
+        log_path = self.log_path(path)
+        tmp = log_path.with_name(log_path.name + '.tmp')
+        with open(tmp, 'wb') as f:
+            f.write(LOG_HEADER.pack(LOG_MAGIC, LOG_VERSION, base_size, base_mtime))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, log_path)
+        self._log_ends[str(path)] = LOG_HEADER.size
+
+    def _atomic_write(self, path: Path, content: str):
+        tmp = path.with_name(path.name + '.tmp')
+        with open(tmp, 'w', encoding='utf-8') as f:
+            f.write(content)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+
+    # ------------------------------------------------------------------
+    # Reading and compaction
+    # ------------------------------------------------------------------
+
+    def version(self, path: Path) -> Tuple[int, ...]:
+        """Stamp that changes whenever `read_text` may: size and mtime of the file and its log"""
+        stamp = self._base_identity(path)
+        try:
+            st = os.stat(self.log_path(path))
+        except FileNotFoundError:
+            return stamp
+        return stamp + (st.st_size, st.st_mtime_ns)
+
+    def read_text(self, path: Path) -> str:
+        """Current markdown (file plus pending log records)"""
+        path = Path(path)
+        with open(path, 'r', encoding='utf-8') as f:
+            base = f.read()
+        return render(base, self.pending(path))
+
+    def compact(self, path: Path) -> bool:
+        """Fold pending records into the markdown file; returns whether it changed"""
+        path = Path(path)
+        with self.lock(path):
+            return self._compact_locked(path)
+
+    def _compact_locked(self, path: Path) -> bool:
+        records, _, identity = self._read_log(path)
+        if not records:
+            return False
+        if identity != self._base_identity(path):
+            records = self.pending(path)
+            if not records:
+                # Everything in the log is already in the replaced .md
+                self._reset_log(path)
+                return False
+        with open(path, 'r', encoding='utf-8') as f:
+            content = render(f.read(), records)
+        # New .md first, then a fresh log bound to it; a crash in between
+        # leaves a log whose identity mismatch filters the folded records
+        self._atomic_write(path, content)
+        self._reset_log(path)
+        self.stats['compactions'] += 1
+        if self.on_compact:
+            try:
+                self.on_compact(path, content)
+            except Exception as e:
+                logger.error(f"Compaction hook failed for {path}: {e}")
+        return True
+
+    def flush(self, paths) -> int:
+        """Compact every given file that has pending records"""
+        compacted = 0
+        for path in paths:
+            try:
+                log_size = os.stat(self.log_path(path)).st_size
+            except FileNotFoundError:
+                continue
+            # A header-only log has nothing to fold in
+            if log_size > LOG_HEADER.size and Path(path).exists():
+                compacted += self.compact(path)
+        return compacted
+
+    def flush_directory(self, directory: Path) -> int:
+        return self.flush(Path(directory).glob('*.md'))
@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+MD Write Coordinator - Per-file locking and write batching for MDFileManager
+Entries queued for the same file while a write is in flight go out in one append
+"""
+
+import asyncio
+import logging
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from md_section_log import SectionLogStore
+
+logger = logging.getLogger(__name__)
+
+
+class WriteCoordinator:
+    """Serialises writes per path and coalesces concurrent ones
+
+    Each path has an asyncio lock. A writer enqueues its record and takes
+    the lock; whoever holds it writes every record queued for that path in
+    a single section-log append and resolves the other writers' futures.
+    """
+
+    def __init__(self, store: SectionLogStore):
+        self.store = store
+        self._locks: Dict[str, asyncio.Lock] = {}
+        self._pending: Dict[str, List[Tuple[Dict[str, Any], Optional[str], asyncio.Future]]] = {}
+        self.stats = {'writes': 0, 'records': 0, 'largest_batch': 0}
+
+    def lock(self, path: Path) -> asyncio.Lock:
+        key = str(path)
+        lock = self._locks.get(key)
+        if lock is None:
+            lock = self._locks[key] = asyncio.Lock()
+        return lock
+
+    async def append(self, path: Path, record: Dict[str, Any], template: Optional[str] = None):
+        """Append one record to a file, batched with any concurrent writers"""
+        key = str(path)
+        future = asyncio.get_running_loop().create_future()
+        self._pending.setdefault(key, []).append((record, template, future))
+
+        async with self.lock(path):
+            if not future.done():
+                batch = self._pending.pop(key, [])
+                write = asyncio.ensure_future(asyncio.to_thread(
+                    self.store.append,
+                    path,
+                    [item[0] for item in batch],
+                    next((item[1] for item in batch if item[1] is not None), None)
+                ))
+                # Resolve every waiter even if this writer is cancelled mid-write
+                write.add_done_callback(lambda done, batch=batch: self._resolve(done, batch))
+                self.stats['writes'] += 1
+                self.stats['records'] += len(batch)
+                self.stats['largest_batch'] = max(self.stats['largest_batch'], len(batch))
+                try:
+                    await asyncio.shield(write)
+                except Exception:
+                    pass  # reported through `future` below
+
+        await future
+
+    @staticmethod
+    def _resolve(write: asyncio.Future, batch):
+        error = write.exception() if not write.cancelled() else asyncio.CancelledError()
+        for _, _, future in batch:
+            if future.done():
+                continue
+            if error is None:
+                future.set_result(None)
+            else:
+                future.set_exception(error)
@@ -38,6 +38,8 @@ import socketio
 import requests
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 
+from achievement_engine import AchievementEngine, AchievementRule
+
 # Set up logging
 logging.basicConfig(
     level=logging.INFO,
@@ -1501,11 +1503,30 @@ class RealtimeNotificationManager:
 class GamificationManager:
     """Manages user achievements, streaks, levels, and rewards"""
     
+    # Activities and the achievements whose progress they advance
+    ACTIVITY_ACHIEVEMENTS = {
+        'store_memory': [AchievementType.FIRST_MEMORY, AchievementType.MEMORY_MASTER],
+        'create_secret': [AchievementType.FIRST_SECRET, AchievementType.SECRET_KEEPER],
+        'mutual_match': [AchievementType.FIRST_MUTUAL_MATCH, AchievementType.SOCIAL_BUTTERFLY],
+        'avatar_message': [AchievementType.AVATAR_COMMUNICATOR],
+        'create_group': [AchievementType.EARLY_ADOPTER],
+        'join_group': [AchievementType.SOCIAL_BUTTERFLY],
+        'share_memory': [AchievementType.MEMORY_MASTER],
+        'create_family_vault': [AchievementType.EARLY_ADOPTER],
+        'family_memory': [AchievementType.MEMORY_MASTER],
+        'create_challenge': [AchievementType.EARLY_ADOPTER],
+        'join_challenge': [AchievementType.SOCIAL_BUTTERFLY],
+        'generate_insights': [AchievementType.EARLY_ADOPTER],
+        'add_emergency_contact': [AchievementType.EARLY_ADOPTER],
+        'create_inheritance_rule': [AchievementType.EARLY_ADOPTER]
+    }
+    
     def __init__(self):
-        self.user_achievements: Dict[str, List[Achievement]] = {}
+        self.user_achievements: Dict[str, Dict[str, Achievement]] = {}
         self.user_streaks: Dict[str, UserStreak] = {}
         self.user_levels: Dict[str, UserLevel] = {}
         self.achievement_templates = self._create_achievement_templates()
+        self.achievement_engine = self._create_achievement_engine()
         
     def _create_achievement_templates(self) -> Dict[AchievementType, Dict[str, Any]]:
         """Create achievement templates with metadata"""
@@ -1570,10 +1591,24 @@ class GamificationManager:
             }
         }
     
+    def _create_achievement_engine(self) -> AchievementEngine:
+        """One progress counter per achievement, advanced by the activities mapped to it"""
+        rules = []
+        for achievement_type, template in self.achievement_templates.items():
+            events = tuple(activity for activity, types in self.ACTIVITY_ACHIEVEMENTS.items()
+                           if achievement_type in types)
+            rules.append(AchievementRule(
+                id=achievement_type.value,
+                counter=achievement_type.value,
+                target=template.get('target', 1),
+                events=events
+            ))
+        return AchievementEngine(rules)
+    
     def initialize_user(self, user_id: str):
         """Initialize gamification data for a new user"""
         if user_id not in self.user_achievements:
-            self.user_achievements[user_id] = []
+            self.user_achievements[user_id] = {}
             self.user_streaks[user_id] = UserStreak(user_id=user_id)
             self.user_levels[user_id] = UserLevel(user_id=user_id)
             
@@ -1588,7 +1623,7 @@ class GamificationManager:
                     points=template['points'],
                     target=template.get('target', 1)
                 )
-                self.user_achievements[user_id].append(achievement)
+                self.user_achievements[user_id][achievement_type.value] = achievement
     
     async def record_activity(self, user_id: str, activity_type: str) -> List[Dict[str, Any]]:
         """Record user activity and check for achievements/level ups"""
@@ -1652,55 +1687,32 @@ class GamificationManager:
         return None
     
     async def _check_achievements(self, user_id: str, activity_type: str) -> List[Dict[str, Any]]:
-        """Check and unlock achievements based on activity"""
-        rewards = []
+        """Advance the achievements this activity feeds and unlock any that reached their target"""
+        engine = self.achievement_engine
         user_achievements = self.user_achievements[user_id]
         
-        for achievement in user_achievements:
-            if achievement.unlocked:
-                continue
-                
-            # Update progress based on activity type
-            if self._should_update_achievement(achievement, activity_type):
-                achievement.progress += 1
-                
-                # Check if achievement is unlocked
-                if achievement.progress >= achievement.target:
-                    achievement.unlocked = True
-                    achievement.unlocked_at = datetime.now()
-                    
-                    rewards.append({
-                        'type': 'achievement_unlocked',
-                        'achievement': {
-                            'title': achievement.title,
-                            'description': achievement.description,
-                            'icon': achievement.icon,
-                            'points': achievement.points
-                        }
-                    })
+        engine.record(user_id, activity_type)
+        for rule in engine.rules_for_event(activity_type):
+            achievement = user_achievements[rule.id]
+            achievement.progress = min(engine.counter(user_id, rule.counter), achievement.target)
         
-        return rewards
-    
-    def _should_update_achievement(self, achievement: Achievement, activity_type: str) -> bool:
-        """Determine if activity should update achievement progress"""
-        activity_map = {
-            'store_memory': [AchievementType.FIRST_MEMORY, AchievementType.MEMORY_MASTER],
-            'create_secret': [AchievementType.FIRST_SECRET, AchievementType.SECRET_KEEPER],
-            'mutual_match': [AchievementType.FIRST_MUTUAL_MATCH, AchievementType.SOCIAL_BUTTERFLY],
-            'avatar_message': [AchievementType.AVATAR_COMMUNICATOR],
-            'create_group': [AchievementType.EARLY_ADOPTER],
-            'join_group': [AchievementType.SOCIAL_BUTTERFLY],
-            'share_memory': [AchievementType.MEMORY_MASTER],
-            'create_family_vault': [AchievementType.EARLY_ADOPTER],
-            'family_memory': [AchievementType.MEMORY_MASTER],
-            'create_challenge': [AchievementType.EARLY_ADOPTER],
-            'join_challenge': [AchievementType.SOCIAL_BUTTERFLY],
-            'generate_insights': [AchievementType.EARLY_ADOPTER],
-            'add_emergency_contact': [AchievementType.EARLY_ADOPTER],
-            'create_inheritance_rule': [AchievementType.EARLY_ADOPTER]
-        }
+        rewards = []
+        for rule in engine.drain_unlocks().get(user_id, []):
+            achievement = user_achievements[rule.id]
+            achievement.unlocked = True
+            achievement.unlocked_at = datetime.now()
+            
+            rewards.append({
+                'type': 'achievement_unlocked',
+                'achievement': {
+                    'title': achievement.title,
+                    'description': achievement.description,
+                    'icon': achievement.icon,
+                    'points': achievement.points
+                }
+            })
         
-        return achievement.type in activity_map.get(activity_type, [])
+        return rewards
     
     def _add_experience(self, user_id: str, activity_type: str) -> Optional[Dict[str, Any]]:
         """Add experience points and check for level up"""
@@ -1742,7 +1754,7 @@ class GamificationManager:
         """Get comprehensive user gamification stats"""
         self.initialize_user(user_id)
         
-        achievements = self.user_achievements[user_id]
+        achievements = list(self.user_achievements[user_id].values())
         streak = self.user_streaks[user_id]
         level = self.user_levels[user_id]
         
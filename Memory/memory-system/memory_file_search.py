@@ -0,0 +1,256 @@
+#!/usr/bin/env python3
+"""
+Memory File Search - Concurrent, early-terminating search over memory files
+Parsed memory blocks are cached per (path, version); files are scanned on a
+bounded thread pool and a global top-k heap stops work that cannot improve it
+"""
+
+import os
+import re
+import heapq
+import asyncio
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Memory entries as "- **[timestamp]** [tag]: content"
+MEMORY_PATTERN = re.compile(
+    r'-\s+\*\*\[([\d\-:\s]+)\]\*\*\s+\[([^\]]+)\]:\s+(.+?)(?=\n-\s+\*\*\[|\n##|\Z)',
+    re.DOTALL
+)
+
+
+class MemoryBlock:
+    """One parsed memory; the lower-cased body and word set are built on demand"""
+
+    __slots__ = ('timestamp', 'tag', 'content', '_lower', '_words')
+
+    def __init__(self, timestamp: str, tag: str, content: str):
+        self.timestamp = timestamp
+        self.tag = tag
+        self.content = content
+        self._lower = None
+        self._words = None
+
+    @property
+    def lower(self) -> str:
+        if self._lower is None:
+            self._lower = self.content.lower()
+        return self._lower
+
+    @property
+    def words(self) -> Set[str]:
+        if self._words is None:
+            self._words = set(self.lower.split())
+        return self._words
+
+
+class ParsedFile:
+    """Memory blocks of one file plus what is needed to bound its best score"""
+
+    __slots__ = ('blocks', 'text_lower', '_vocabulary')
+
+    def __init__(self, content: str):
+        self.blocks = [
+            MemoryBlock(timestamp.strip(), tag.strip(), body.strip())
+            for timestamp, tag, body in MEMORY_PATTERN.findall(content)
+        ]
+        self.text_lower = content.lower()
+        self._vocabulary = None
+
+    @property
+    def vocabulary(self) -> Set[str]:
+        if self._vocabulary is None:
+            self._vocabulary = set(self.text_lower.split())
+        return self._vocabulary
+
+
+def relevance(query_words: Set[str], phrase: str, block: MemoryBlock) -> float:
+    """Share of query words in the memory, +0.5 for the whole phrase, capped at 1"""
+    if not query_words:
+        return 0.0
+    score = len(query_words & block.words) / len(query_words)
+    if phrase in block.lower:
+        score += 0.5
+    return min(score, 1.0)
+
+
+def read_file(path: str) -> str:
+    with open(path, 'r', encoding='utf-8') as f:
+        return f.read()
+
+
+def file_version(path: str) -> Tuple[int, ...]:
+    st = os.stat(path)
+    return st.st_mtime_ns, st.st_size
+
+
+class ParsedFileCache:
+    """LRU of parsed files, valid while the file's version stamp is unchanged
+
+    `read_text` and `version` default to the plain file and its (mtime, size);
+    MDFileManager passes its storage's, so entries still in a section log are
+    searched without folding them into the file first.
+    """
+
+    def __init__(self, max_files: int = 2048, read_text: Callable[[str], str] = None,
+                 version: Callable[[str], Tuple[int, ...]] = None):
+        self.max_files = max_files
+        self.read_text = read_text or read_file
+        self.version = version or file_version
+        self._files: "OrderedDict[str, Tuple[Tuple[int, ...], ParsedFile]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0}
+
+    def peek(self, path: str) -> Optional[ParsedFile]:
+        """Cached parse if still current (stats only, no read)"""
+        try:
+            version = self.version(path)
+        except OSError:
+            return None
+        with self._lock:
+            item = self._files.get(path)
+        if item and item[0] == version:
+            return item[1]
+        return None
+
+    def get(self, path: str) -> ParsedFile:
+        version = self.version(path)
+        with self._lock:
+            item = self._files.get(path)
+            if item and item[0] == version:
+                self._files.move_to_end(path)
+                self.stats['hits'] += 1
+                return item[1]
+            self.stats['misses'] += 1
+
+        parsed = ParsedFile(self.read_text(path))
+
+        with self._lock:
+            self._files[path] = (version, parsed)
+            self._files.move_to_end(path)
+            while len(self._files) > self.max_files:
+                self._files.popitem(last=False)
+        return parsed
+
+
+class MemoryFileSearch:
+    """Searches many memory files concurrently for the top-k memories
+
+    Files whose cached parse shows they cannot beat the current k-th score
+    are skipped, and no new file is started once the latency budget is spent.
+    """
+
+    def __init__(self, max_workers: int = None, budget_seconds: float = None,
+                 cache: ParsedFileCache = None, threshold: float = 0.1):
+        self.max_workers = max_workers or int(os.getenv('VOICE_SEARCH_WORKERS', 8))
+        self.budget_seconds = budget_seconds if budget_seconds is not None else \
+            float(os.getenv('VOICE_SEARCH_BUDGET_MS', 1500)) / 1000
+        self.cache = cache or ParsedFileCache(int(os.getenv('VOICE_SEARCH_CACHE_FILES', 2048)))
+        self.threshold = threshold
+        self.pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="memsearch")
+        self.stats = {'searches': 0, 'files_scanned': 0, 'files_skipped': 0, 'budget_exceeded': 0}
+
+    def _bound(self, path: str, query_words: Set[str], phrase: str) -> float:
+        """Best score any memory in the file could reach (1.0 if not cached)"""
+        parsed = self.cache.peek(path)
+        if parsed is None or not query_words:
+            return 1.0
+        if not parsed.blocks:
+            return 0.0
+        score = len(query_words & parsed.vocabulary) / len(query_words)
+        if phrase in parsed.text_lower:
+            score += 0.5
+        return min(score, 1.0)
+
+    def _scan(self, order: int, path: str, query_words: Set[str], phrase: str,
+              tags: Set[str]) -> List[Tuple[float, int, Dict[str, Any]]]:
+        """Score one file (runs on the pool)"""
+        matches = []
+        for index, block in enumerate(self.cache.get(path).blocks):
+            # Tag check first: bodies of inaccessible memories are never lowered or split
+            if block.tag.lower() not in tags:
+                continue
+            score = relevance(query_words, phrase, block)
+            if score > self.threshold:
+                matches.append((score, order * 1_000_000 + index, {
+                    'timestamp': block.timestamp,
+                    'tag': block.tag,
+                    'content': block.content,
+                    'relevance_score': score
+                }))
+        return matches
+
+    async def search(self, files: List[Dict[str, str]], query: str, accessible_tags: Iterable[Any],
+                     k: int = 20) -> List[Dict[str, Any]]:
+        """Top-k memories across `files` ({'path', 'type'} dicts), best first"""
+        self.stats['searches'] += 1
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.budget_seconds
+        query_words = set(query.lower().split())
+        phrase = ' '.join(query_words)
+        tags = {getattr(tag, 'value', tag) for tag in accessible_tags}
+
+        # Most promising files first; uncached files have an unknown (1.0) bound
+        candidates = sorted(
+            ((self._bound(info['path'], query_words, phrase), order, info)
+             for order, info in enumerate(files)),
+            key=lambda item: (-item[0], item[1])
+        )
+
+        heap: List[Tuple[float, int, Dict[str, Any]]] = []  # min-heap of (score, -seq, memory)
+        pending = {}
+        position = 0
+
+        def kth_score() -> float:
+            return heap[0][0] if len(heap) >= k else -1.0
+
+        while position < len(candidates) or pending:
+            # Keep the pool busy with files that can still make the top k
+            while position < len(candidates) and len(pending) < self.max_workers:
+                bound, order, info = candidates[position]
+                if bound <= self.threshold or bound <= kth_score() or loop.time() >= deadline:
+                    break
+                future = loop.run_in_executor(
+                    self.pool, self._scan, order, info['path'], query_words, phrase, tags
+                )
+                pending[future] = info
+                position += 1
+
+            if not pending:
+                break
+
+            done, _ = await asyncio.wait(
+                pending, timeout=max(0.0, deadline - loop.time()),
+                return_when=asyncio.FIRST_COMPLETED
+            )
+            if not done:
+                self.stats['budget_exceeded'] += 1
+                logger.warning(f"Memory search budget exhausted with {len(pending)} files in flight")
+                break
+
+            for future in done:
+                info = pending.pop(future)
+                self.stats['files_scanned'] += 1
+                try:
+                    matches = future.result()
+                except Exception as e:
+                    logger.error(f"Error searching file {info['path']}: {e}")
+                    continue
+                for score, seq, memory in matches:
+                    memory['source_file'] = info['type']
+                    item = (score, -seq, memory)
+                    if len(heap) < k:
+                        heapq.heappush(heap, item)
+                    elif item[:2] > heap[0][:2]:
+                        heapq.heapreplace(heap, item)
+
+        self.stats['files_skipped'] += len(candidates) - position
+        for future in pending:
+            future.cancel()
+
+        return [memory for _, _, memory in sorted(heap, key=lambda item: (-item[0], -item[1]))]
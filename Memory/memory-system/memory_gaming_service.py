@@ -18,6 +18,10 @@ from enum import Enum
 import uuid
 import numpy as np
 
+from leaderboards import RankedScores, WindowedScores
+from game_state_store import GameStateStore
+from achievement_engine import AchievementEngine, AchievementRule, AT_LEAST, AT_MOST
+
 # Set up logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -279,14 +283,16 @@ class GameInvite:
 class MemoryGamingService:
     """Main service for memory gaming features"""
     
-    def __init__(self):
-        # Game sessions
-        self.active_sessions: Dict[str, GameSession] = {}
-        self.completed_sessions: List[GameSession] = []
+    def __init__(self, archive_dir: Optional[str] = None):
+        # Sessions, invites and notifications, indexed by user and bounded;
+        # completed sessions are archived to disk (GAME_ARCHIVE_DIR)
+        self.state = GameStateStore(
+            archive_dir or os.getenv('GAME_ARCHIVE_DIR', os.path.join('data', 'game_archive'))
+        )
+        self.active_sessions: Dict[str, GameSession] = self.state.active_sessions
         
         # Player data
         self.player_stats: Dict[str, PlayerStats] = {}
-        self.player_sessions: Dict[str, List[str]] = defaultdict(list)  # user_id -> session_ids
         
         # Daily challenges
         self.daily_challenges: Dict[str, DailyChallenge] = {}
@@ -294,14 +300,15 @@ class MemoryGamingService:
         
         # Achievements
         self.achievements: Dict[str, Achievement] = self._initialize_achievements()
+        self.achievement_engine = self._create_achievement_engine()
         self.player_achievements: Dict[str, List[str]] = defaultdict(list)
         
         # Invitations
-        self.game_invites: Dict[str, GameInvite] = {}
+        self.game_invites: Dict[str, GameInvite] = self.state.invites
         
-        # Leaderboards
-        self.global_leaderboard: List[Tuple[str, int]] = []
-        self.weekly_leaderboard: List[Tuple[str, int]] = []
+        # Leaderboards, kept ranked as games end
+        self.global_leaderboard = RankedScores()  # total_points
+        self.weekly_leaderboard = WindowedScores(window=timedelta(days=7))  # game scores
         self.friends_leaderboards: Dict[str, List[Tuple[str, int]]] = defaultdict(list)
         
         # Addiction mechanics
@@ -313,9 +320,6 @@ class MemoryGamingService:
             100: 5000 # 100 days
         }
         
-        # Notification queue
-        self.notification_queue: List[Dict[str, Any]] = []
-        
         # Initialize daily challenge
         self._create_daily_challenge()
         
@@ -434,6 +438,20 @@ class MemoryGamingService:
         
         return achievements
     
+    def _create_achievement_engine(self) -> AchievementEngine:
+        """Index achievements by the player stat they depend on"""
+        engine = AchievementEngine()
+        for achievement in self.achievements.values():
+            # Best win time must come in under the target
+            comparison = AT_MOST if achievement.requirement_type == "speed_win" else AT_LEAST
+            engine.add_rule(AchievementRule(
+                id=achievement.id,
+                counter=achievement.requirement_type,
+                target=achievement.requirement_value,
+                comparison=comparison
+            ))
+        return engine
+    
     async def create_game_session(
         self,
         creator_id: str,
@@ -442,6 +460,7 @@ class MemoryGamingService:
         settings: Optional[Dict[str, Any]] = None
     ) -> Dict[str, Any]:
         """Create a new game session"""
+        await self._maintain_state()
         try:
             session_id = f"game_{uuid.uuid4().hex[:12]}"
             
@@ -476,11 +495,7 @@ class MemoryGamingService:
             random.shuffle(session.turn_order)
             
             # Store session
-            self.active_sessions[session_id] = session
-            
-            # Track for players
-            for player_id in players:
-                self.player_sessions[player_id].append(session_id)
+            self.state.add_session(session)
             
             # Create notification
             self._queue_notification(
@@ -525,7 +540,7 @@ class MemoryGamingService:
         # Add player
         session.players.append(user_id)
         session.scores[user_id] = 0
-        self.player_sessions[user_id].append(session_id)
+        self.state.add_player(session, user_id)
         
         # Check if ready to start
         if len(session.players) >= 2:
@@ -592,6 +607,7 @@ class MemoryGamingService:
         # Update score
         if result.get('points'):
             session.scores[user_id] += result['points']
+        self.state.touch(session)
         
         # Move to next turn
         session.next_turn()
@@ -917,13 +933,15 @@ class MemoryGamingService:
             # Update stats
             opponent_id = [p for p in session.players if p != player_id][0] if len(session.players) == 2 else "multiple"
             stats.update_stats(result, session.scores[player_id], opponent_id)
+            self.global_leaderboard.set(player_id, stats.total_points)
+            self.weekly_leaderboard.add(player_id, session.scores[player_id], session.ended_at)
             
             # Check achievements
             await self._check_achievements(player_id)
+        self._notify_achievements()
         
         # Move to completed
-        self.completed_sessions.append(session)
-        del self.active_sessions[session_id]
+        self.state.complete_session(session)
         
         # Notify players
         self._queue_notification(
@@ -939,58 +957,85 @@ class MemoryGamingService:
         )
         
         logger.info(f"🏁 Game ended: {session_id}, Winner: {winner_id}")
+        await self._maintain_state()
+    
+    async def _maintain_state(self):
+        """Abandon stale sessions, archive old ones and expire invites (rate limited)"""
+        result = await self.state.maintain_async(self._abandon_session)
+        if result['archived'] or result['abandoned'] or result['segments_pruned']:
+            logger.info(f"🗄️ Game state maintenance: {result}")
     
-    async def _check_achievements(self, user_id: str):
-        """Check and award achievements for a player"""
+    def _abandon_session(self, session: GameSession):
+        """End a session nobody has played in for too long, without rewards"""
+        session.status = GameStatus.ABANDONED
+        session.ended_at = datetime.now()
+        self._queue_notification(
+            user_ids=session.players,
+            title="⌛ Game Abandoned",
+            message="This game was closed after a long time without moves",
+            priority=NotificationPriority.LOW,
+            data={'session_id': session.id}
+        )
+    
+    async def _check_achievements(self, user_id: str) -> List[str]:
+        """Award achievements whose stats changed; notifications go out in _notify_achievements"""
         if user_id not in self.player_stats:
-            return
+            return []
         
         stats = self.player_stats[user_id]
-        current_achievements = self.player_achievements.get(user_id, [])
-        
-        for achievement_id, achievement in self.achievements.items():
-            if achievement_id in current_achievements:
-                continue
+        engine = self.achievement_engine
+        
+        # Only rules on a stat that moved are evaluated
+        unlocked = engine.set_counter(user_id, "games_played", stats.games_played)
+        unlocked += engine.set_counter(user_id, "games_won", stats.games_won)
+        unlocked += engine.set_counter(user_id, "streak", stats.longest_streak)
+        unlocked += engine.set_counter(user_id, "unique_opponents", len(stats.unique_opponents))
+        if stats.fastest_win_time:
+            unlocked += engine.set_counter(user_id, "speed_win", stats.fastest_win_time)
+        
+        total_players = len(self.player_stats)
+        for rule in unlocked:
+            achievement = self.achievements[rule.id]
+            self.player_achievements[user_id].append(achievement.id)
+            stats.achievements_unlocked.append(achievement.id)
+            achievement.unlocked_by.append(user_id)
             
-            # Check requirement
-            unlocked = False
+            # Calculate unlock rate
+            if total_players > 0:
+                achievement.unlock_rate = len(achievement.unlocked_by) / total_players
             
-            if achievement.requirement_type == "games_played":
-                unlocked = stats.games_played >= achievement.requirement_value
-            elif achievement.requirement_type == "games_won":
-                unlocked = stats.games_won >= achievement.requirement_value
-            elif achievement.requirement_type == "streak":
-                unlocked = stats.longest_streak >= achievement.requirement_value
-            elif achievement.requirement_type == "unique_opponents":
-                unlocked = len(stats.unique_opponents) >= achievement.requirement_value
-            elif achievement.requirement_type == "speed_win":
-                unlocked = stats.fastest_win_time and stats.fastest_win_time <= achievement.requirement_value
+            logger.info(f"🏆 Achievement unlocked: {user_id} - {achievement.name}")
+        
+        return [rule.id for rule in unlocked]
+    
+    def _notify_achievements(self):
+        """Send each player one notification for everything unlocked since the last call"""
+        for user_id, rules in self.achievement_engine.drain_unlocks().items():
+            unlocked = [self.achievements[rule.id] for rule in rules]
+            if len(unlocked) == 1:
+                title = "🏆 Achievement Unlocked!"
+                message = f"{unlocked[0].name}: {unlocked[0].description}"
+            else:
+                title = f"🏆 {len(unlocked)} Achievements Unlocked!"
+                message = ", ".join(achievement.name for achievement in unlocked)
             
-            if unlocked:
-                # Award achievement
-                self.player_achievements[user_id].append(achievement_id)
-                stats.achievements_unlocked.append(achievement_id)
-                achievement.unlocked_by.append(user_id)
-                
-                # Calculate unlock rate
-                total_players = len(self.player_stats)
-                if total_players > 0:
-                    achievement.unlock_rate = len(achievement.unlocked_by) / total_players
-                
-                # Notify player
-                self._queue_notification(
-                    user_ids=[user_id],
-                    title="🏆 Achievement Unlocked!",
-                    message=f"{achievement.name}: {achievement.description}",
-                    priority=NotificationPriority.HIGH,
-                    data={
-                        'achievement_id': achievement_id,
-                        'points': achievement.points,
-                        'rarity': achievement.rarity
-                    }
-                )
-                
-                logger.info(f"🏆 Achievement unlocked: {user_id} - {achievement.name}")
+            self._queue_notification(
+                user_ids=[user_id],
+                title=title,
+                message=message,
+                priority=NotificationPriority.HIGH,
+                data={
+                    'achievements': [
+                        {
+                            'achievement_id': achievement.id,
+                            'points': achievement.points,
+                            'rarity': achievement.rarity
+                        }
+                        for achievement in unlocked
+                    ],
+                    'points': sum(achievement.points for achievement in unlocked)
+                }
+            )
     
     def _create_daily_challenge(self):
         """Create a new daily challenge"""
@@ -1015,6 +1060,10 @@ class MemoryGamingService:
         
         self.daily_challenges[challenge_id] = challenge
         
+        # Keep a week of challenges; older ones can no longer be played
+        for old_id in [cid for cid, c in self.daily_challenges.items() if (today - c.date.date()).days > 7]:
+            del self.daily_challenges[old_id]
+        
         logger.info(f"📅 Daily challenge created: {challenge.title}")
     
     async def participate_daily_challenge(
@@ -1056,18 +1105,19 @@ class MemoryGamingService:
         self,
         leaderboard_type: str = "global",
         user_id: Optional[str] = None,
-        limit: int = 100
+        limit: int = 100,
+        around_me: bool = False
     ) -> List[Dict[str, Any]]:
-        """Get leaderboard data"""
+        """Get leaderboard data
+        
+        With around_me, the global or weekly board is the window of `limit`
+        places centred on user_id instead of the top.
+        """
         leaderboard = []
         
         if leaderboard_type == "global":
             # Global leaderboard by total points
-            player_points = [(pid, stats.total_points) 
-                            for pid, stats in self.player_stats.items()]
-            player_points.sort(key=lambda x: x[1], reverse=True)
-            
-            for rank, (pid, points) in enumerate(player_points[:limit], 1):
+            for rank, pid, points in self._ranked_entries(self.global_leaderboard, user_id, limit, around_me):
                 stats = self.player_stats[pid]
                 leaderboard.append({
                     'rank': rank,
@@ -1080,17 +1130,8 @@ class MemoryGamingService:
                 
         elif leaderboard_type == "weekly":
             # Weekly leaderboard
-            week_start = datetime.now() - timedelta(days=7)
-            weekly_points = defaultdict(int)
-            
-            for session in self.completed_sessions:
-                if session.ended_at and session.ended_at >= week_start:
-                    for pid, score in session.scores.items():
-                        weekly_points[pid] += score
-            
-            weekly_sorted = sorted(weekly_points.items(), key=lambda x: x[1], reverse=True)
-            
-            for rank, (pid, points) in enumerate(weekly_sorted[:limit], 1):
+            self.weekly_leaderboard.expire()
+            for rank, pid, points in self._ranked_entries(self.weekly_leaderboard.ranking, user_id, limit, around_me):
                 stats = self.player_stats.get(pid, PlayerStats(user_id=pid))
                 leaderboard.append({
                     'rank': rank,
@@ -1121,6 +1162,37 @@ class MemoryGamingService:
         
         return leaderboard
     
+    def _ranked_entries(
+        self,
+        ranking: RankedScores,
+        user_id: Optional[str],
+        limit: int,
+        around_me: bool
+    ) -> List[Tuple[int, str, int]]:
+        """Top `limit` entries, or the `limit` places around user_id"""
+        if around_me and user_id:
+            rank = ranking.rank(user_id)
+            if rank is None:
+                return []
+            return ranking.range(max(1, rank - limit // 2), limit)
+        return ranking.top(limit)
+    
+    def get_player_rank(self, user_id: str, leaderboard_type: str = "global") -> Dict[str, Any]:
+        """Rank and points of a player on the global or weekly leaderboard"""
+        if leaderboard_type == "weekly":
+            self.weekly_leaderboard.expire()
+            ranking = self.weekly_leaderboard.ranking
+        else:
+            ranking = self.global_leaderboard
+        
+        return {
+            'user_id': user_id,
+            'leaderboard': leaderboard_type,
+            'rank': ranking.rank(user_id),
+            'points': ranking.score(user_id, 0),
+            'total_players': len(ranking)
+        }
+    
     def _queue_notification(
         self,
         user_ids: List[str],
@@ -1141,21 +1213,14 @@ class MemoryGamingService:
             'delivered': False
         }
         
-        self.notification_queue.append(notification)
+        self.state.add_notification(notification)
         
         # In production, this would trigger WebSocket events
         logger.info(f"📬 Notification queued: {title} for {len(user_ids)} users")
     
     def get_notifications(self, user_id: str) -> List[Dict[str, Any]]:
         """Get pending notifications for a user"""
-        user_notifications = []
-        
-        for notif in self.notification_queue:
-            if user_id in notif['user_ids'] and not notif['delivered']:
-                user_notifications.append(notif)
-                notif['delivered'] = True
-        
-        return user_notifications
+        return self.state.take_notifications(user_id)
     
     async def create_game_invite(
         self,
@@ -1175,7 +1240,7 @@ class MemoryGamingService:
             message=message
         )
         
-        self.game_invites[invite_id] = invite
+        self.state.add_invite(invite)
         
         # Notify recipient
         self._queue_notification(
@@ -1198,11 +1263,10 @@ class MemoryGamingService:
         user_id: str
     ) -> Dict[str, Any]:
         """Accept a game invitation"""
-        if invite_id not in self.game_invites:
+        invite = self.state.get_invite(invite_id)
+        if invite is None:
             return {'success': False, 'error': 'Invite not found'}
         
-        invite = self.game_invites[invite_id]
-        
         if invite.to_user_id != user_id:
             return {'success': False, 'error': 'Not your invitation'}
         
@@ -1211,6 +1275,7 @@ class MemoryGamingService:
         
         if datetime.now() > invite.expires_at:
             invite.status = "expired"
+            self.state.close_invite(invite)
             return {'success': False, 'error': 'Invite expired'}
         
         # Create game session
@@ -1223,19 +1288,59 @@ class MemoryGamingService:
         if result['success']:
             invite.status = "accepted"
             invite.game_session_id = result['session_id']
+            self.state.close_invite(invite)
         
         return result
     
+    def get_pending_invites(self, user_id: str) -> List[Dict[str, Any]]:
+        """Invites waiting for the user's answer"""
+        return [
+            {
+                'invite_id': invite.id,
+                'from_user': invite.from_user_id,
+                'game_type': invite.game_type.value,
+                'message': invite.message,
+                'expires_at': invite.expires_at.isoformat()
+            }
+            for invite in self.state.pending_invites(user_id)
+        ]
+    
+    async def get_session_history(self, user_id: str, limit: int = 20) -> List[Dict[str, Any]]:
+        """The user's completed games, most recent first, from memory then the archive"""
+        history = []
+        for session in self.state.recent_user_sessions(user_id)[:limit]:
+            history.append({
+                'session_id': session.id,
+                'game_type': session.game_type.value,
+                'status': session.status.value,
+                'players': session.players,
+                'scores': session.scores,
+                'winner_id': session.winner_id,
+                'ended_at': session.ended_at.isoformat()
+            })
+        if len(history) < limit:
+            for record in await self.state.archived_sessions_async(user_id, limit - len(history)):
+                history.append({
+                    'session_id': record['id'],
+                    'game_type': record['game_type'],
+                    'status': record['status'],
+                    'players': record['players'],
+                    'scores': record['scores'],
+                    'winner_id': record['winner_id'],
+                    'ended_at': record['ended_at']
+                })
+        return history
+    
     def get_player_stats(self, user_id: str) -> Dict[str, Any]:
         """Get comprehensive stats for a player"""
         if user_id not in self.player_stats:
             self.player_stats[user_id] = PlayerStats(user_id=user_id)
+            self.global_leaderboard.set(user_id, 0)
         
         stats = self.player_stats[user_id]
         
         # Calculate additional metrics
-        active_games = [sid for sid in self.player_sessions[user_id] 
-                       if sid in self.active_sessions]
+        active_games = self.state.active_session_ids(user_id)
         
         # Check streak status
         streak_active = False
@@ -1249,6 +1354,7 @@ class MemoryGamingService:
             'experience': stats.experience_points,
             'next_level_xp': stats.next_level_xp,
             'total_points': stats.total_points,
+            'global_rank': self.global_leaderboard.rank(user_id),
             'games_played': stats.games_played,
             'games_won': stats.games_won,
             'win_rate': round(stats.win_rate * 100, 1),
@@ -1258,6 +1364,7 @@ class MemoryGamingService:
             'achievements': stats.achievements_unlocked,
             'badges': stats.badges_earned,
             'active_games': active_games,
+            'archived_games': self.state.archive_summary(user_id),
             'unique_opponents': len(stats.unique_opponents),
             'favorite_game': stats.favorite_game_type.value if stats.favorite_game_type else None
         }
@@ -492,7 +492,12 @@ Important:
                         break
         
         if not target_phone:
-            # Contact not found - suggest registering them
+            # Contact not found - suggest close spellings, or registering them
+            suggestions = self.phone_directory.search_contacts(sender_phone, target_name, limit=3)
+            if suggestions:
+                names = ', '.join(contact['name'] for contact in suggestions)
+                return (f"❌ I couldn't find '{target_name}' in your contacts.\n\n"
+                       f"Did you mean: {names}?")
             return (f"❌ I couldn't find '{target_name}' in your contacts.\n\n"
                    f"To add them, please send:\n"
                    f"'Register contact {target_name}: [phone number] as [relationship]'\n\n"
@@ -6,47 +6,121 @@ Manages contact relationships and phone numbers for cross-profile memory managem
 
 import os
 import json
+import sqlite3
 import logging
+import threading
+from collections import OrderedDict
 from pathlib import Path
 from typing import Dict, List, Optional, Tuple, Any
 from datetime import datetime
 import re
 
+from contact_name_index import ContactNameIndex
+
 logger = logging.getLogger(__name__)
 
+NON_PHONE_CHARS = re.compile(r'[^\d+]')
+
 class PhoneDirectory:
     """
     Manages phone contacts and relationships for users
     Enables cross-profile memory management
+    
+    Contacts live in an SQLite database (WAL journal), so a change writes
+    only the affected row. Contacts are indexed by user and name and by
+    normalized phone number for reverse lookups; name lookups go through
+    a per-user n-gram index kept in an LRU of recently used users.
     """
     
     def __init__(self, data_dir: str = "memory-system/data"):
         """Initialize the Phone Directory"""
         self.data_dir = Path(data_dir)
         self.data_dir.mkdir(parents=True, exist_ok=True)
+        # Previous single-file format, imported once into the database
         self.directory_file = self.data_dir / "phone_directory.json"
-        self.directory = self._load_directory()
-        logger.info(f"📞 Phone Directory initialized with {len(self.directory)} users")
+        self.db_file = self.data_dir / "phone_directory.db"
+        
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(str(self.db_file), check_same_thread=False, timeout=5)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(f"PRAGMA cache_size=-{int(os.getenv('PHONE_DIRECTORY_CACHE_MB', 64)) * 1024}")
+        self._conn.executescript(
+            "CREATE TABLE IF NOT EXISTS users ("
+            " seq INTEGER PRIMARY KEY, phone TEXT NOT NULL UNIQUE, registered_at TEXT NOT NULL);"
+            "CREATE TABLE IF NOT EXISTS contacts ("
+            " seq INTEGER PRIMARY KEY, user_phone TEXT NOT NULL, name_key TEXT NOT NULL,"
+            " name TEXT NOT NULL, phone TEXT NOT NULL, relationship TEXT NOT NULL,"
+            " added_at TEXT, last_updated TEXT,"
+            " UNIQUE (user_phone, name_key));"
+            "CREATE INDEX IF NOT EXISTS contacts_phone ON contacts (phone);"
+        )
+        self._conn.commit()
+        
+        # Name indexes of recently used users
+        self.name_indexes: "OrderedDict[str, ContactNameIndex]" = OrderedDict()
+        self.max_indexed_users = int(os.getenv('PHONE_DIRECTORY_INDEXED_USERS', 4096))
+        
+        if self._count_users() == 0 and self.directory_file.exists():
+            self._import_legacy_file()
+        logger.info(f"📞 Phone Directory initialized with {self._count_users()} users")
     
-    def _load_directory(self) -> Dict[str, Dict]:
-        """Load the phone directory from JSON file"""
-        if self.directory_file.exists():
-            try:
-                with open(self.directory_file, 'r', encoding='utf-8') as f:
-                    return json.load(f)
-            except Exception as e:
-                logger.error(f"Failed to load directory: {e}")
-                return {}
-        return {}
+    def _count_users(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM users").fetchone()[0]
     
-    def _save_directory(self):
-        """Save the phone directory to JSON file"""
+    def _import_legacy_file(self):
+        """Load the old phone_directory.json into the database"""
         try:
-            with open(self.directory_file, 'w', encoding='utf-8') as f:
-                json.dump(self.directory, f, indent=2, ensure_ascii=False)
-            logger.info(f"💾 Phone directory saved with {len(self.directory)} users")
+            with open(self.directory_file, 'r', encoding='utf-8') as f:
+                directory = json.load(f)
+            self._replace_all(directory)
+            logger.info(f"📥 Imported {len(directory)} users from {self.directory_file}")
         except Exception as e:
-            logger.error(f"Failed to save directory: {e}")
+            logger.error(f"Failed to load directory: {e}")
+    
+    def _replace_all(self, directory: Dict[str, Dict]):
+        """Replace the whole directory in one transaction"""
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM contacts")
+            self._conn.execute("DELETE FROM users")
+            for user_phone, user_data in directory.items():
+                self._conn.execute(
+                    "INSERT INTO users (phone, registered_at) VALUES (?, ?)",
+                    (user_phone, user_data.get('registered_at') or datetime.now().isoformat())
+                )
+                self._conn.executemany(
+                    "INSERT INTO contacts (user_phone, name_key, name, phone, relationship, added_at, last_updated) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    [(user_phone, key, contact['name'], contact['phone'], contact['relationship'],
+                      contact.get('added_at'), contact.get('last_updated'))
+                     for key, contact in user_data.get('contacts', {}).items()]
+                )
+            self.name_indexes.clear()
+    
+    def _name_index(self, user_phone: str) -> Optional[ContactNameIndex]:
+        """Name index of a user's contacts (None if the user is unknown)"""
+        with self._lock:
+            index = self.name_indexes.get(user_phone)
+            if index is not None:
+                self.name_indexes.move_to_end(user_phone)
+                return index
+            
+            if self._conn.execute("SELECT 1 FROM users WHERE phone = ?", (user_phone,)).fetchone() is None:
+                return None
+            rows = self._conn.execute(
+                "SELECT seq, name_key, name, phone, relationship, added_at, last_updated "
+                "FROM contacts WHERE user_phone = ? ORDER BY seq", (user_phone,)
+            ).fetchall()
+            index = ContactNameIndex([
+                (seq, key, {'name': name, 'phone': phone, 'relationship': relationship,
+                            'added_at': added_at, 'last_updated': last_updated})
+                for seq, key, name, phone, relationship, added_at, last_updated in rows
+            ])
+            self.name_indexes[user_phone] = index
+            while len(self.name_indexes) > self.max_indexed_users:
+                self.name_indexes.popitem(last=False)
+            return index
     
     def _normalize_phone(self, phone: str) -> str:
         """
@@ -54,7 +128,7 @@ class PhoneDirectory:
         Handles international formats (+40, 0040, 07 prefixes)
         """
         # Remove all non-digit characters except +
-        phone = re.sub(r'[^\d+]', '', phone)
+        phone = NON_PHONE_CHARS.sub('', phone)
         
         # Handle Romanian phone numbers specifically
         if phone.startswith('0040'):
@@ -89,23 +163,7 @@ class PhoneDirectory:
         user_phone = self._normalize_phone(user_phone)
         contact_phone = self._normalize_phone(contact_phone)
         
-        # Initialize user if not exists
-        if user_phone not in self.directory:
-            self.directory[user_phone] = {
-                'registered_at': datetime.now().isoformat(),
-                'contacts': {}
-            }
-        
-        # Add or update contact
-        self.directory[user_phone]['contacts'][contact_name.lower()] = {
-            'name': contact_name,
-            'phone': contact_phone,
-            'relationship': relationship,
-            'added_at': datetime.now().isoformat(),
-            'last_updated': datetime.now().isoformat()
-        }
-        
-        self._save_directory()
+        self._upsert_contacts(user_phone, [(contact_name, contact_phone, relationship)])
         
         logger.info(f"✅ Registered contact {contact_name} ({relationship}) for user {user_phone}")
         return {
@@ -114,6 +172,58 @@ class PhoneDirectory:
             'contact_phone': contact_phone
         }
     
+    def register_contacts(self, user_phone: str, contacts: List[Dict[str, str]]) -> Dict[str, Any]:
+        """
+        Register many contacts for a user in one transaction (e.g. a phone book import)
+        
+        Args:
+            user_phone: The user's phone number
+            contacts: Dicts with 'name', 'phone' and optional 'relationship'
+        
+        Returns:
+            Dict with success status and number of contacts registered
+        """
+        user_phone = self._normalize_phone(user_phone)
+        self._upsert_contacts(user_phone, [
+            (contact['name'], self._normalize_phone(contact['phone']), contact.get('relationship', 'contact'))
+            for contact in contacts
+        ])
+        
+        logger.info(f"✅ Registered {len(contacts)} contacts for user {user_phone}")
+        return {
+            'success': True,
+            'message': f"{len(contacts)} contacts registered",
+            'count': len(contacts)
+        }
+    
+    def _upsert_contacts(self, user_phone: str, contacts: List[Tuple[str, str, str]]):
+        """Add or replace contacts (a replaced contact keeps its position)"""
+        now = datetime.now().isoformat()
+        with self._lock:
+            with self._conn:
+                self._conn.execute(
+                    "INSERT OR IGNORE INTO users (phone, registered_at) VALUES (?, ?)", (user_phone, now)
+                )
+                self._conn.executemany(
+                    "INSERT INTO contacts (user_phone, name_key, name, phone, relationship, added_at, last_updated) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?) "
+                    "ON CONFLICT (user_phone, name_key) DO UPDATE SET name = excluded.name, "
+                    "phone = excluded.phone, relationship = excluded.relationship, "
+                    "added_at = excluded.added_at, last_updated = excluded.last_updated",
+                    [(user_phone, name.lower(), name, phone, relationship, now, now)
+                     for name, phone, relationship in contacts]
+                )
+            
+            index = self.name_indexes.get(user_phone)
+            if index is not None:
+                if any(name.lower() not in index.contacts for name, _, _ in contacts):
+                    # New rows: their sequence numbers come from the database
+                    del self.name_indexes[user_phone]
+                else:
+                    for name, phone, relationship in contacts:
+                        index.put(0, name.lower(), {'name': name, 'phone': phone, 'relationship': relationship,
+                                                    'added_at': now, 'last_updated': now})
+    
     def find_phone_by_name(self, user_phone: str, contact_name: str) -> Optional[str]:
         """
         Find a contact's phone number by their name
@@ -126,26 +236,42 @@ class PhoneDirectory:
             Phone number if found, None otherwise
         """
         user_phone = self._normalize_phone(user_phone)
-        contact_name_lower = contact_name.lower()
         
-        if user_phone in self.directory:
-            contacts = self.directory[user_phone].get('contacts', {})
-            
-            # Exact match
-            if contact_name_lower in contacts:
-                return contacts[contact_name_lower]['phone']
-            
-            # Partial match
-            for name, contact in contacts.items():
-                if contact_name_lower in name or name in contact_name_lower:
-                    return contact['phone']
-            
-            # Check by relationship
-            for contact in contacts.values():
-                if contact['relationship'].lower() == contact_name_lower:
-                    return contact['phone']
+        # Exact match, then partial match, then by relationship
+        index = self._name_index(user_phone)
+        contact = index.find(contact_name.lower()) if index is not None else None
+        return contact['phone'] if contact else None
+    
+    def search_contacts(self, user_phone: str, query: str, limit: int = 5) -> List[Dict[str, Any]]:
+        """
+        Find contacts whose name matches a query, best first
+        
+        Exact names rank first, then prefixes, substrings, and finally
+        names with similar spelling (trigram similarity), so misspelled or
+        partial names still find the contact.
+        
+        Args:
+            user_phone: The user's phone number
+            query: (Part of) the contact's name
+            limit: Maximum number of contacts to return
         
-        return None
+        Returns:
+            List of matching contacts with a 'score' between 0 and 1
+        """
+        user_phone = self._normalize_phone(user_phone)
+        index = self._name_index(user_phone)
+        if index is None:
+            return []
+        
+        return [
+            {
+                'name': contact['name'],
+                'phone': contact['phone'],
+                'relationship': contact['relationship'],
+                'score': round(score, 3)
+            }
+            for score, contact in index.search(query.lower().strip(), limit)
+        ]
     
     def get_all_contacts(self, user_phone: str) -> List[Dict[str, Any]]:
         """
@@ -159,16 +285,16 @@ class PhoneDirectory:
         """
         user_phone = self._normalize_phone(user_phone)
         
-        if user_phone in self.directory:
-            contacts = self.directory[user_phone].get('contacts', {})
+        index = self._name_index(user_phone)
+        if index is not None:
             return [
                 {
                     'name': contact['name'],
                     'phone': contact['phone'],
                     'relationship': contact['relationship'],
-                    'added_at': contact.get('added_at', 'Unknown')
+                    'added_at': contact.get('added_at') or 'Unknown'
                 }
-                for contact in contacts.values()
+                for contact in index.contacts.values()
             ]
         
         return []
@@ -191,29 +317,37 @@ class PhoneDirectory:
         user_phone = self._normalize_phone(user_phone)
         contact_name_lower = contact_name.lower()
         
-        if user_phone not in self.directory:
-            return {
-                'success': False,
-                'message': f"User {user_phone} not found in directory"
-            }
-        
-        contacts = self.directory[user_phone].get('contacts', {})
-        
-        if contact_name_lower not in contacts:
-            return {
-                'success': False,
-                'message': f"Contact {contact_name} not found"
-            }
-        
-        # Update contact
-        if new_phone:
-            contacts[contact_name_lower]['phone'] = self._normalize_phone(new_phone)
-        if new_relationship:
-            contacts[contact_name_lower]['relationship'] = new_relationship
-        
-        contacts[contact_name_lower]['last_updated'] = datetime.now().isoformat()
-        
-        self._save_directory()
+        with self._lock:
+            index = self._name_index(user_phone)
+            if index is None:
+                return {
+                    'success': False,
+                    'message': f"User {user_phone} not found in directory"
+                }
+            
+            contact = index.contacts.get(contact_name_lower)
+            if contact is None:
+                return {
+                    'success': False,
+                    'message': f"Contact {contact_name} not found"
+                }
+            
+            # Update contact
+            contact = dict(contact)
+            if new_phone:
+                contact['phone'] = self._normalize_phone(new_phone)
+            if new_relationship:
+                contact['relationship'] = new_relationship
+            contact['last_updated'] = datetime.now().isoformat()
+            
+            with self._conn:
+                self._conn.execute(
+                    "UPDATE contacts SET phone = ?, relationship = ?, last_updated = ? "
+                    "WHERE user_phone = ? AND name_key = ?",
+                    (contact['phone'], contact['relationship'], contact['last_updated'],
+                     user_phone, contact_name_lower)
+                )
+            index.put(0, contact_name_lower, contact)
         
         logger.info(f"📝 Updated contact {contact_name} for user {user_phone}")
         return {
@@ -235,22 +369,26 @@ class PhoneDirectory:
         user_phone = self._normalize_phone(user_phone)
         contact_name_lower = contact_name.lower()
         
-        if user_phone not in self.directory:
-            return {
-                'success': False,
-                'message': f"User {user_phone} not found in directory"
-            }
-        
-        contacts = self.directory[user_phone].get('contacts', {})
-        
-        if contact_name_lower not in contacts:
-            return {
-                'success': False,
-                'message': f"Contact {contact_name} not found"
-            }
-        
-        del contacts[contact_name_lower]
-        self._save_directory()
+        with self._lock:
+            index = self._name_index(user_phone)
+            if index is None:
+                return {
+                    'success': False,
+                    'message': f"User {user_phone} not found in directory"
+                }
+            
+            if contact_name_lower not in index.contacts:
+                return {
+                    'success': False,
+                    'message': f"Contact {contact_name} not found"
+                }
+            
+            with self._conn:
+                self._conn.execute(
+                    "DELETE FROM contacts WHERE user_phone = ? AND name_key = ?",
+                    (user_phone, contact_name_lower)
+                )
+            index.remove(contact_name_lower)
         
         logger.info(f"🗑️ Deleted contact {contact_name} for user {user_phone}")
         return {
@@ -271,21 +409,18 @@ class PhoneDirectory:
         """
         user_phone = self._normalize_phone(user_phone)
         
-        if user_phone not in self.directory:
+        index = self._name_index(user_phone)
+        if index is None:
             return []
         
-        contacts = self.directory[user_phone].get('contacts', {})
-        matching = []
-        
-        for contact in contacts.values():
-            if contact['relationship'].lower() == relationship.lower():
-                matching.append({
-                    'name': contact['name'],
-                    'phone': contact['phone'],
-                    'relationship': contact['relationship']
-                })
-        
-        return matching
+        return [
+            {
+                'name': contact['name'],
+                'phone': contact['phone'],
+                'relationship': contact['relationship']
+            }
+            for contact in index.with_relationship(relationship)
+        ]
     
     def get_reverse_lookup(self, contact_phone: str) -> List[Dict[str, Any]]:
         """
@@ -298,37 +433,58 @@ class PhoneDirectory:
             List of users who have this contact
         """
         contact_phone = self._normalize_phone(contact_phone)
-        results = []
-        
-        for user_phone, user_data in self.directory.items():
-            contacts = user_data.get('contacts', {})
-            for contact in contacts.values():
-                if contact['phone'] == contact_phone:
-                    results.append({
-                        'user_phone': user_phone,
-                        'contact_name': contact['name'],
-                        'relationship': contact['relationship']
-                    })
-        
-        return results
+        
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT c.user_phone, c.name, c.relationship FROM contacts c "
+                "JOIN users u ON u.phone = c.user_phone "
+                "WHERE c.phone = ? ORDER BY u.seq, c.seq",
+                (contact_phone,)
+            ).fetchall()
+        
+        return [
+            {
+                'user_phone': user_phone,
+                'contact_name': name,
+                'relationship': relationship
+            }
+            for user_phone, name, relationship in rows
+        ]
     
     def export_directory(self) -> Dict[str, Any]:
         """Export the entire directory for backup purposes"""
+        directory = {}
+        with self._lock:
+            for user_phone, registered_at in self._conn.execute(
+                "SELECT phone, registered_at FROM users ORDER BY seq"
+            ).fetchall():
+                directory[user_phone] = {'registered_at': registered_at, 'contacts': {}}
+            for user_phone, key, name, phone, relationship, added_at, last_updated in self._conn.execute(
+                "SELECT user_phone, name_key, name, phone, relationship, added_at, last_updated "
+                "FROM contacts ORDER BY seq"
+            ):
+                directory[user_phone]['contacts'][key] = {
+                    'name': name,
+                    'phone': phone,
+                    'relationship': relationship,
+                    'added_at': added_at,
+                    'last_updated': last_updated
+                }
+        
         return {
             'exported_at': datetime.now().isoformat(),
-            'total_users': len(self.directory),
-            'directory': self.directory
+            'total_users': len(directory),
+            'directory': directory
         }
     
     def import_directory(self, data: Dict[str, Any]) -> Dict[str, Any]:
         """Import a directory backup"""
         try:
             if 'directory' in data:
-                self.directory = data['directory']
-                self._save_directory()
+                self._replace_all(data['directory'])
                 return {
                     'success': True,
-                    'message': f"Imported {len(self.directory)} users"
+                    'message': f"Imported {len(data['directory'])} users"
                 }
             else:
                 return {
@@ -343,15 +499,12 @@ class PhoneDirectory:
     
     def get_statistics(self) -> Dict[str, Any]:
         """Get statistics about the phone directory"""
-        total_users = len(self.directory)
-        total_contacts = sum(len(user_data.get('contacts', {})) 
-                           for user_data in self.directory.values())
-        
-        relationship_counts = {}
-        for user_data in self.directory.values():
-            for contact in user_data.get('contacts', {}).values():
-                rel = contact['relationship']
-                relationship_counts[rel] = relationship_counts.get(rel, 0) + 1
+        with self._lock:
+            total_users = self._conn.execute("SELECT COUNT(*) FROM users").fetchone()[0]
+            relationship_counts = dict(self._conn.execute(
+                "SELECT relationship, COUNT(*) FROM contacts GROUP BY relationship"
+            ).fetchall())
+        total_contacts = sum(relationship_counts.values())
         
         return {
             'total_users': total_users,
@@ -0,0 +1,256 @@
+#!/usr/bin/env python3
+"""
+Related File Index - Reverse index from users to shared memory files
+Maps each user to the contact, relationship and topic files that mention them,
+with byte offsets of every entry in those files
+"""
+
+import re
+import asyncio
+import logging
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+FILE_KINDS = ("contact", "relationship", "topic")
+
+# "#### <entry id>" headers written by MDFileManager._generate_entry_markdown
+ENTRY_HEADER = re.compile(rb'^#### (\S+)[ \t]*$', re.MULTILINE)
+# Any heading or rule that ends an entry block
+BLOCK_END = re.compile(rb'^(?:#{1,4} |---)', re.MULTILINE)
+
+
+def scan_entry_offsets(data: bytes) -> List[Tuple[str, int, int]]:
+    """Return (entry_id, byte offset, byte length) for every entry in a file"""
+    entries = []
+    for match in ENTRY_HEADER.finditer(data):
+        start = match.start()
+        end_match = BLOCK_END.search(data, match.end())
+        end = end_match.start() if end_match else len(data)
+        entries.append((match.group(1).decode('utf-8', errors='replace'), start, end - start))
+    return entries
+
+
+class RelatedFileIndex:
+    """SQLite-backed user -> file index with per-file entry offsets
+
+    MDFileManager records every write to a contact, relationship or topic
+    file here; all rows for one file are replaced in a single transaction.
+    `rebuild()` reconstructs the index from the files alone, and `check()`
+    reports drift between the two. Coroutines use the `_async` variants,
+    which run the queries in a worker thread.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False, timeout=5)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(
+            "CREATE TABLE IF NOT EXISTS related_files ("
+            " user_id TEXT NOT NULL, path TEXT NOT NULL, kind TEXT NOT NULL,"
+            " PRIMARY KEY (user_id, path));"
+            "CREATE INDEX IF NOT EXISTS related_files_path ON related_files (path);"
+            "CREATE TABLE IF NOT EXISTS entry_offsets ("
+            " path TEXT NOT NULL, entry_id TEXT NOT NULL, user_id TEXT,"
+            " offset INTEGER NOT NULL, length INTEGER NOT NULL,"
+            " PRIMARY KEY (path, entry_id));"
+        )
+        self._conn.commit()
+
+    # ------------------------------------------------------------------
+    # Lookups
+    # ------------------------------------------------------------------
+
+    def related_files(self, user_id: str) -> List[Dict[str, str]]:
+        """Files related to a user, in the shape VoiceMemorySearch expects"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT path, kind FROM related_files WHERE user_id = ? ORDER BY kind, path",
+                (user_id,)
+            ).fetchall()
+        return [{'path': path, 'type': f"{kind}_{Path(path).stem}"} for path, kind in rows]
+
+    async def related_files_async(self, user_id: str) -> List[Dict[str, str]]:
+        """related_files() off the event loop"""
+        return await asyncio.to_thread(self.related_files, user_id)
+
+    def entry_offsets(self, path: str, user_id: Optional[str] = None) -> List[Tuple[str, int, int]]:
+        """(entry_id, offset, length) of compacted entries in a file, optionally one user's only"""
+        query = "SELECT entry_id, offset, length FROM entry_offsets WHERE path = ? AND offset >= 0"
+        params: Tuple[Any, ...] = (str(path),)
+        if user_id is not None:
+            query += " AND user_id = ?"
+            params += (user_id,)
+        with self._lock:
+            return self._conn.execute(query + " ORDER BY offset", params).fetchall()
+
+    def read_entries(self, path: str, user_id: str) -> List[str]:
+        """Read only a user's entry blocks from a shared file"""
+        blocks = []
+        with open(path, 'rb') as f:
+            for _, offset, length in self.entry_offsets(path, user_id):
+                f.seek(offset)
+                blocks.append(f.read(length).decode('utf-8', errors='replace'))
+        return blocks
+
+    def is_empty(self) -> bool:
+        with self._lock:
+            return self._conn.execute("SELECT 1 FROM related_files LIMIT 1").fetchone() is None
+
+    # ------------------------------------------------------------------
+    # Maintenance (called by MDFileManager after each write)
+    # ------------------------------------------------------------------
+
+    def record_write(self, path: Path, kind: str, user_id: str, content: Optional[str] = None,
+                     entry_id: Optional[str] = None):
+        """Index a write to a file on behalf of `user_id`
+
+        `entry_id` (the entry just added) is attributed to `user_id`. When the
+        written `content` is known, offsets are recomputed from it; entries
+        still in the file's section log get their offsets on compaction.
+        """
+        path = str(path)
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR IGNORE INTO related_files (user_id, path, kind) VALUES (?, ?, ?)",
+                (user_id, path, kind)
+            )
+            if entry_id:
+                self._conn.execute(
+                    "INSERT OR IGNORE INTO entry_offsets (path, entry_id, user_id, offset, length) "
+                    "VALUES (?, ?, ?, -1, 0)",
+                    (path, entry_id, user_id)
+                )
+        if content is not None:
+            self.reindex(path, content)
+
+    async def record_write_async(self, path: Path, kind: str, user_id: str, content: Optional[str] = None,
+                                 entry_id: Optional[str] = None):
+        """record_write() off the event loop"""
+        await asyncio.to_thread(self.record_write, path, kind, user_id, content, entry_id)
+
+    def reindex(self, path: Path, content: str):
+        """Recompute entry offsets of a file from its full content
+
+        Offsets shift whenever entries are inserted ahead of older ones, so
+        they are rebuilt in one transaction; entry owners are preserved.
+        """
+        path = str(path)
+        offsets = scan_entry_offsets(content.encode('utf-8'))
+        with self._lock:
+            owners = dict(self._conn.execute(
+                "SELECT entry_id, user_id FROM entry_offsets WHERE path = ?", (path,)
+            ).fetchall())
+            with self._conn:
+                self._conn.execute("DELETE FROM entry_offsets WHERE path = ?", (path,))
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO entry_offsets (path, entry_id, user_id, offset, length) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    [(path, eid, owners.get(eid), offset, length) for eid, offset, length in offsets]
+                )
+
+    def remove_file(self, path: Path):
+        """Drop a deleted file from the index"""
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM related_files WHERE path = ?", (str(path),))
+            self._conn.execute("DELETE FROM entry_offsets WHERE path = ?", (str(path),))
+
+    # ------------------------------------------------------------------
+    # Offline rebuild / consistency check
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def scan(md_manager, user_ids: Iterable[str]) -> Tuple[set, list]:
+        """Derive index rows from the files on disk
+
+        A file is related to a user when the user id occurs in it (the rule
+        the old full-scan used); relationship files are matched by name.
+        Pending section-log entries are folded into the files first.
+        """
+        if hasattr(md_manager, 'flush_all'):
+            md_manager.flush_all()
+        user_ids = sorted(set(user_ids), key=len, reverse=True)
+        by_sanitized = {md_manager._sanitize_filename(user_id): user_id for user_id in user_ids}
+        related = set()
+        offsets = []
+
+        sources = [
+            ("contact", Path(md_manager.contacts_dir).glob("*.md")),
+            ("relationship", Path(md_manager.relationships_dir).glob("*.md")),
+            ("topic", Path(md_manager.topics_dir).glob("*.md")),
+        ]
+        for kind, files in sources:
+            for file_path in files:
+                path = str(file_path)
+                data = file_path.read_bytes()
+                text = data.decode('utf-8', errors='replace')
+
+                if kind == "relationship":
+                    owner = next(
+                        (uid for sanitized, uid in by_sanitized.items()
+                         if file_path.stem.startswith(f"{sanitized}_")), None
+                    )
+                    if owner:
+                        related.add((owner, path, kind))
+                else:
+                    for user_id in user_ids:
+                        if user_id in text:
+                            related.add((user_id, path, kind))
+
+                for entry_id, offset, length in scan_entry_offsets(data):
+                    block = data[offset:offset + length].decode('utf-8', errors='replace')
+                    owner = next((uid for uid in user_ids if uid in block), None)
+                    offsets.append((path, entry_id, owner, offset, length))
+        return related, offsets
+
+    @staticmethod
+    def known_users(md_manager) -> List[str]:
+        """User ids from the "# USER <id>" heading of every profile file"""
+        users = []
+        for profile in Path(md_manager.users_dir).glob("USER.*.md"):
+            with open(profile, 'r', encoding='utf-8', errors='replace') as f:
+                first_line = f.readline().strip()
+            if first_line.startswith("# USER "):
+                users.append(first_line[len("# USER "):].strip())
+        return users
+
+    def rebuild(self, md_manager, user_ids: Optional[Iterable[str]] = None) -> Dict[str, int]:
+        """Replace the whole index with one derived from the files"""
+        related, offsets = self.scan(md_manager, user_ids or self.known_users(md_manager))
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM related_files")
+            self._conn.execute("DELETE FROM entry_offsets")
+            self._conn.executemany(
+                "INSERT INTO related_files (user_id, path, kind) VALUES (?, ?, ?)", sorted(related)
+            )
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO entry_offsets (path, entry_id, user_id, offset, length) "
+                "VALUES (?, ?, ?, ?, ?)", offsets
+            )
+        logger.info(f"🗂️ Related file index rebuilt: {len(related)} links, {len(offsets)} entries")
+        return {'links': len(related), 'entries': len(offsets)}
+
+    def check(self, md_manager, user_ids: Optional[Iterable[str]] = None) -> Dict[str, Any]:
+        """Compare the index with the files without modifying the index"""
+        expected_links, expected_offsets = self.scan(md_manager, user_ids or self.known_users(md_manager))
+        with self._lock:
+            links = set(self._conn.execute("SELECT user_id, path, kind FROM related_files").fetchall())
+            offsets = set(self._conn.execute(
+                "SELECT path, entry_id, offset, length FROM entry_offsets WHERE offset >= 0"
+            ).fetchall())
+        # Owners are only known from writes, so offsets are compared without them
+        expected_positions = {(p, e, o, n) for p, e, _, o, n in expected_offsets}
+        report = {
+            'missing_links': sorted(expected_links - links),
+            'missing_entries': sorted(expected_positions - offsets),
+            'stale_entries': sorted(offsets - expected_positions),
+        }
+        report['consistent'] = not any(report.values())
+        # Links recorded for writes whose text never names the user are not errors
+        report['extra_links'] = sorted(links - expected_links)
+        return report
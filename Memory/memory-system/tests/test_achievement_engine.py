@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+Tests for the achievement engine
+Incremental unlocks against a full scan of the catalogue, rules added to a
+live engine, batched unlock notifications and the gaming service on top of it
+"""
+
+import os
+import sys
+import random
+import asyncio
+import logging
+import tempfile
+import unittest
+
+# Add parent directory to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from achievement_engine import AchievementEngine, AchievementRule, AT_MOST
+
+
+def full_scan(rules, counters):
+    return {rule.id for rule in rules if rule.counter in counters and rule.satisfied_by(counters[rule.counter])}
+
+
+class AchievementEngineTest(unittest.TestCase):
+
+    def test_matches_a_full_scan(self):
+        rng = random.Random(5)
+        rules = [AchievementRule(id=f"{counter}_{target}", counter=counter, target=target, events=(counter,))
+                 for counter in ("memories", "secrets", "matches") for target in rng.sample(range(1, 60), 12)]
+        rules.append(AchievementRule(id="hoarder", counter="memories", target=5, events=("import_memories",)))
+        engine = AchievementEngine(rules)
+
+        counters = {}
+        for _ in range(2000):
+            user = f"u{rng.randrange(5)}"
+            event = rng.choice(["memories", "secrets", "matches", "import_memories", "unrelated"])
+            before = full_scan(rules, counters.get(user, {}))
+            for counter in {rule.counter for rule in rules if event in rule.events}:
+                counters.setdefault(user, {})[counter] = counters.get(user, {}).get(counter, 0) + 1
+            unlocked = engine.record(user, event)
+            self.assertEqual({rule.id for rule in unlocked}, full_scan(rules, counters.get(user, {})) - before)
+
+        for user, values in counters.items():
+            self.assertEqual(set(engine.unlocked(user)), full_scan(rules, values))
+            self.assertTrue(all(engine.is_unlocked(user, rule_id) for rule_id in engine.unlocked(user)))
+        self.assertEqual(sum(engine.unlock_counts.values()), sum(len(full_scan(rules, v)) for v in counters.values()))
+
+    def test_at_most_rules_unlock_as_the_value_drops(self):
+        engine = AchievementEngine([AchievementRule(id=f"under_{s}", counter="win_time", target=s, comparison=AT_MOST)
+                                    for s in (120, 30, 60)])
+        self.assertEqual(engine.set_counter("u", "win_time", 300), [])
+        self.assertEqual([r.id for r in engine.set_counter("u", "win_time", 45)], ["under_120", "under_60"])
+        self.assertEqual([r.id for r in engine.set_counter("u", "win_time", 10)], ["under_30"])
+        self.assertEqual(engine.progress("u", "under_30"), {'value': 10, 'target': 30, 'unlocked': True})
+
+    def test_added_rules_unlock_for_users_already_past_them(self):
+        engine = AchievementEngine([AchievementRule(id="ten", counter="games", target=10, events=("game",))])
+        for _ in range(12):
+            engine.record("veteran", "game")
+        for _ in range(3):
+            engine.record("rookie", "game")
+        engine.drain_unlocks()
+
+        added = engine.add_rule(AchievementRule(id="five", counter="games", target=5, events=("game",)))
+        self.assertEqual([(user, rule.id) for user, rule in added], [("veteran", "five")])
+        added = engine.add_rule(AchievementRule(id="three", counter="games", target=3, events=("game",)))
+        self.assertEqual([(user, rule.id) for user, rule in added], [("veteran", "three"), ("rookie", "three")])
+        self.assertEqual(sorted(engine.unlocked("veteran")), ["five", "ten", "three"])
+        self.assertFalse(engine.is_unlocked("rookie", "five"))
+        self.assertEqual([r.id for r in engine.record("rookie", "game")], [])
+        self.assertEqual([r.id for r in engine.record("rookie", "game")], ["five"])
+
+        with self.assertRaises(ValueError):
+            engine.add_rule(AchievementRule(id="five", counter="games", target=6))
+        with self.assertRaises(ValueError):
+            engine.add_rule(AchievementRule(id="quick", counter="games", target=2, comparison=AT_MOST))
+
+    def test_unlocks_are_batched_until_drained(self):
+        engine = AchievementEngine([AchievementRule(id=f"n{n}", counter="c", target=n, events=("e",))
+                                    for n in (1, 2, 3)])
+        engine.record("a", "e", amount=2)
+        engine.record("b", "e")
+        engine.record("a", "e")
+        pending = engine.drain_unlocks()
+        self.assertEqual({user: [r.id for r in rules] for user, rules in pending.items()},
+                         {"a": ["n1", "n2", "n3"], "b": ["n1"]})
+        self.assertEqual(engine.drain_unlocks(), {})
+        self.assertEqual([r.id for r in engine.rules_for_event("e")], ["n1", "n2", "n3"])
+        self.assertEqual(engine.rules_for_event("other"), [])
+
+
+class GamingServiceAchievementTest(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        asyncio.get_running_loop().set_debug(False)
+        logging.disable(logging.CRITICAL)
+        try:
+            import memory_gaming_service
+        except ImportError as e:
+            self.skipTest(f"gaming service unavailable: {e}")
+        self.tmp = tempfile.TemporaryDirectory()
+        self.module = memory_gaming_service
+        self.service = memory_gaming_service.MemoryGamingService(archive_dir=self.tmp.name)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+        logging.disable(logging.NOTSET)
+
+    async def play(self, scores):
+        module = self.module
+        session = module.GameSession(id=f"s{len(self.service.state.recent_sessions)}",
+                                     game_type=module.GameType.MEMORY_MATCH, creator_id=next(iter(scores)),
+                                     players=list(scores), status=module.GameStatus.IN_PROGRESS,
+                                     scores=dict(scores))
+        self.service.state.add_session(session)
+        await self.service._end_game(session.id)
+        return session
+
+    def expected(self, stats):
+        """The requirement checks the service ran over the whole catalogue before"""
+        values = {
+            'games_played': stats.games_played,
+            'games_won': stats.games_won,
+            'streak': stats.longest_streak,
+            'unique_opponents': len(stats.unique_opponents)
+        }
+        unlocked = {a.id for a in self.service.achievements.values()
+                    if a.requirement_type in values and values[a.requirement_type] >= a.requirement_value}
+        if stats.fastest_win_time:
+            unlocked |= {a.id for a in self.service.achievements.values()
+                         if a.requirement_type == "speed_win" and stats.fastest_win_time <= a.requirement_value}
+        return unlocked
+
+    async def test_unlocks_follow_player_stats(self):
+        await self.play({"ann": 100, "bob": 10})
+        notifications = [n for n in self.service.get_notifications("ann") if 'achievements' in n['data']]
+        self.assertEqual(len(notifications), 1)
+        self.assertEqual(notifications[0]['title'], "🏆 3 Achievements Unlocked!")
+        self.assertEqual([a['achievement_id'] for a in notifications[0]['data']['achievements']],
+                         ["games_played_1", "games_won_1", "first_blood"])
+        self.assertEqual(notifications[0]['data']['points'], 10 + 20 + 50)
+        titles = [n['title'] for n in self.service.get_notifications("bob")]
+        self.assertIn("🏆 Achievement Unlocked!", titles)
+
+        rng = random.Random(11)
+        players = [f"p{n}" for n in range(15)] + ["ann"]
+        for _ in range(300):
+            a, b = rng.sample(players, 2)
+            await self.play({a: rng.randrange(0, 200), b: rng.randrange(0, 200)})
+        self.service.player_stats["ann"].fastest_win_time = 42
+        await self.service._check_achievements("ann")
+
+        for user_id, stats in self.service.player_stats.items():
+            self.assertEqual(set(self.service.player_achievements[user_id]), self.expected(stats))
+            self.assertEqual(stats.achievements_unlocked, self.service.player_achievements[user_id])
+        self.assertIn("speed_demon", self.service.player_achievements["ann"])
+        self.assertIn("social_butterfly", self.service.player_achievements["ann"])
+        for achievement in self.service.achievements.values():
+            self.assertEqual(len(achievement.unlocked_by), len(set(achievement.unlocked_by)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,295 @@
+#!/usr/bin/env python3
+"""
+Tests for the conversation classifier
+Keyword rules match whole words only, the confidence threshold tolerates
+values it does not know, and confident rule results skip the model while the
+rest fall back to it (or to the degraded result when it fails); batches,
+the request budget and the cache
+"""
+
+import os
+import sys
+import re
+import json
+import asyncio
+import logging
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+# Add parent directory to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from conversation_classifier import ConversationClassifier, ConversationContext, RequestBudget
+from classification_cache import ClassificationCache
+from md_file_manager import MemoryTag
+
+
+def make_classifier(**env):
+    with mock.patch.dict(os.environ, {'OPENAI_API_KEY': '', **env}):
+        return ConversationClassifier()
+
+
+class RuleClassificationTest(unittest.TestCase):
+
+    def setUp(self):
+        logging.disable(logging.CRITICAL)
+        self.classifier = make_classifier()
+
+    def tearDown(self):
+        logging.disable(logging.NOTSET)
+
+    def rules(self, message):
+        temporal_refs = self.classifier._extract_temporal_references(message)
+        return self.classifier._classify_by_rules(message, {}, temporal_refs)
+
+    def test_keywords_inside_other_words_do_not_match(self):
+        for message in ["I can't recall the lessons from tomorrow's class",
+                        "Waiting on a callback tomorrow",
+                        "The compassword puzzle was fun"]:
+            result = self.rules(message)
+            self.assertEqual(result['confidence'], 'low', message)
+            self.assertNotIn(result['primary_tag'], ('ultra_secret', 'secret'), message)
+
+    def test_whole_word_keywords_match(self):
+        result = self.rules("My SSN and bank account are in the drawer")
+        self.assertEqual(result['primary_tag'], 'secret')
+        self.assertEqual(result['confidence'], 'very_high')
+        self.assertEqual(result['reasoning'], "Rule match: ssn, bank account")
+
+        self.assertEqual(self.rules("New password: hunter2")['primary_tag'], 'ultra_secret')
+        self.assertEqual(self.rules("Dentist appointment tomorrow")['primary_tag'], 'chronological')
+        self.assertEqual(self.rules("Call the dentist tomorrow")['confidence'], 'high')
+
+    def test_repeated_keyword_counts_once(self):
+        self.assertEqual(self.rules("password? yes, the password")['confidence'], 'high')
+
+    def test_unknown_confidence_values_are_guarded(self):
+        self.assertFalse(self.classifier._rules_are_confident({'confidence': 'certain'}))
+        self.assertTrue(self.classifier._rules_are_confident({'confidence': 'very_high'}))
+
+        lenient = make_classifier(CLASSIFIER_RULE_CONFIDENCE='medium')
+        self.assertTrue(lenient._rules_are_confident({'confidence': 'medium'}))
+
+        misconfigured = make_classifier(CLASSIFIER_RULE_CONFIDENCE='strict')
+        self.assertEqual(misconfigured.rule_confidence_threshold, 'high')
+        self.assertTrue(misconfigured._rules_are_confident({'confidence': 'high'}))
+        self.assertFalse(misconfigured._rules_are_confident({'confidence': 'medium'}))
+
+
+class FakeCompletions:
+    """Stands in for openai_client.chat.completions"""
+
+    def __init__(self, reply=None, error=None):
+        self.reply = reply
+        self.error = error
+        self.calls = []
+
+    def create(self, **kwargs):
+        self.calls.append(kwargs)
+        if self.error:
+            raise self.error
+        reply = self.reply(kwargs['messages'][-1]['content']) if callable(self.reply) else self.reply
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=json.dumps(reply)))])
+
+
+class ModelFallbackTest(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        logging.disable(logging.CRITICAL)
+        self.context = ConversationContext(user_phone="+15550100", conversation_history=[])
+
+    async def asyncTearDown(self):
+        logging.disable(logging.NOTSET)
+
+    def classifier_with_model(self, **completions):
+        classifier = make_classifier()
+        classifier.openai_client = SimpleNamespace(chat=SimpleNamespace(completions=FakeCompletions(**completions)))
+        return classifier, classifier.openai_client.chat.completions
+
+    async def test_confident_rules_skip_the_model(self):
+        classifier, completions = self.classifier_with_model(reply={})
+        result = await classifier.classify_message("My password is hunter2", self.context)
+
+        self.assertEqual(result.primary_tag, MemoryTag.ULTRA_SECRET)
+        self.assertEqual(result.confidence.value, 'high')
+        self.assertEqual(completions.calls, [])
+
+        # Served from the cache on a repeat, whatever the spacing and punctuation
+        self.assertIs(await classifier.classify_message("my password is  hunter2!", self.context), result)
+        self.assertEqual(classifier.cache.stats['hits'], 1)
+
+    async def test_weak_rules_fall_back_to_the_model(self):
+        classifier, completions = self.classifier_with_model(reply={
+            'classification': {'primary_tag': 'confidential', 'confidence': 'medium',
+                               'reasoning': 'family health', 'importance_score': 0.7,
+                               'sentiment': 'negative'},
+            'topics': {'main_topics': ['health']}
+        })
+        result = await classifier.classify_message("Mum is not feeling well again", self.context)
+
+        self.assertEqual(len(completions.calls), 1)
+        self.assertEqual(result.primary_tag, MemoryTag.CONFIDENTIAL)
+        self.assertEqual(result.reasoning, 'family health')
+        self.assertEqual(result.topics, ['health'])
+
+    async def test_without_a_model_the_rule_result_is_used(self):
+        classifier = make_classifier()
+        result = await classifier.classify_message("Mum is not feeling well again", self.context)
+
+        self.assertEqual(result.primary_tag, MemoryTag.GENERAL)
+        self.assertEqual(result.confidence.value, 'low')
+        self.assertEqual(result.reasoning, 'Rule-based classification (no strong signals)')
+
+    async def test_failing_model_degrades_to_the_fallback_result(self):
+        classifier, completions = self.classifier_with_model(error=RuntimeError("rate limited"))
+        result = await classifier.classify_message("Mum is not feeling well again", self.context)
+
+        self.assertEqual(len(completions.calls), 1)
+        self.assertEqual(result.primary_tag, MemoryTag.GENERAL)
+        self.assertEqual(result.reasoning, 'Fallback classification')
+
+    async def test_fallback_results_are_not_cached(self):
+        classifier, completions = self.classifier_with_model(error=RuntimeError("rate limited"))
+        await classifier.classify_message("Mum is not feeling well again", self.context)
+        await classifier.classify_message("Mum is not feeling well again", self.context)
+        self.assertEqual(len(completions.calls), 2)
+
+        completions.error = None
+        completions.reply = {'classification': {'primary_tag': 'confidential', 'confidence': 'medium'}}
+        result = await classifier.classify_message("Mum is not feeling well again", self.context)
+        self.assertEqual(result.primary_tag, MemoryTag.CONFIDENTIAL)
+        self.assertIs(await classifier.classify_message("Mum is not feeling well again", self.context), result)
+        self.assertEqual(len(completions.calls), 3)
+
+
+class BatchClassificationTest(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        logging.disable(logging.CRITICAL)
+        self.context = ConversationContext(user_phone="+15550100", conversation_history=[])
+
+    async def asyncTearDown(self):
+        logging.disable(logging.NOTSET)
+
+    async def test_micro_batches_retry_only_missing_items(self):
+        dropped = set()
+
+        def answer(prompt):
+            indexes = [int(i) for i in re.findall(r'"index": (\d+)', prompt.split("Respond with")[0])]
+            if 3 in indexes and 3 not in dropped:
+                dropped.add(3)  # left out of the first response only
+                indexes.remove(3)
+            return {'results': [{'index': i, 'classification': {'primary_tag': 'general', 'confidence': 'medium',
+                                                                 'reasoning': f"model {i}"}}
+                                for i in indexes]}
+
+        classifier = make_classifier()
+        classifier.batch_retry_base_delay = 0
+        classifier.openai_client = SimpleNamespace(chat=SimpleNamespace(completions=FakeCompletions(reply=answer)))
+        completions = classifier.openai_client.chat.completions
+        messages = [(f"Chatted with Sam about the garden, part {n}", self.context) for n in range(5)]
+        messages.insert(2, ("The wifi password is on the fridge", self.context))
+
+        results = await classifier.batch_classify_messages(messages, batch_size=2)
+
+        self.assertEqual([r.reasoning for r in results],
+                         ["model 0", "model 1", "Rule match: password", "model 3", "model 4", "model 5"])
+        # Five model-bound messages in three batches, plus one retry for the dropped item
+        self.assertEqual(len(completions.calls), 4)
+        self.assertIn('"index": 3', completions.calls[-1]['messages'][-1]['content'])
+
+        # A repeat import is served entirely from the cache
+        await classifier.batch_classify_messages(messages, batch_size=2)
+        self.assertEqual(len(completions.calls), 4)
+
+    async def test_request_budget_caps_requests_and_tokens(self):
+        budget = RequestBudget(max_requests=2, max_tokens=100)
+        peak = {'requests': 0, 'tokens': 0}
+
+        async def request(tokens):
+            async with budget.reserve(tokens):
+                peak['requests'] = max(peak['requests'], budget.in_flight_requests)
+                peak['tokens'] = max(peak['tokens'], budget.in_flight_tokens)
+                await asyncio.sleep(0)
+
+        await asyncio.gather(*(request(60) for _ in range(4)), request(500))
+        self.assertEqual(peak['requests'], 1)  # two 60-token requests exceed the token cap
+        self.assertEqual(peak['tokens'], 500)  # an oversized request still runs alone
+
+        await asyncio.gather(*(request(40) for _ in range(6)))
+        self.assertEqual(peak['requests'], 2)
+        self.assertEqual((budget.in_flight_requests, budget.in_flight_tokens), (0, 0))
+
+    async def test_batch_fallback_results_are_not_cached(self):
+        def answer(prompt):
+            indexes = [int(i) for i in re.findall(r'"index": (\d+)', prompt.split("Respond with")[0])]
+            # Index 1 comes back without a primary tag and degrades to the fallback
+            return {'results': [{'index': i, 'classification': {'confidence': 'medium'} if i == 1 else
+                                 {'primary_tag': 'general', 'confidence': 'medium', 'reasoning': f"model {i}"}}
+                                for i in indexes]}
+
+        classifier = make_classifier()
+        classifier.openai_client = SimpleNamespace(chat=SimpleNamespace(completions=FakeCompletions(reply=answer)))
+        completions = classifier.openai_client.chat.completions
+        messages = [(f"Chatted with Sam about the garden, part {n}", self.context) for n in range(2)]
+
+        results = await classifier.batch_classify_messages(messages, batch_size=2)
+        self.assertEqual(results[0].reasoning, "model 0")
+        self.assertTrue(results[1].reasoning.startswith("Fallback classification"))
+
+        # Only the degraded message goes back to the model
+        await classifier.batch_classify_messages(messages, batch_size=2)
+        self.assertEqual(len(completions.calls), 2)
+        retried = completions.calls[-1]['messages'][-1]['content'].split("Respond with")[0]
+        self.assertEqual(re.findall(r'"index": (\d+)', retried), ['1'])
+
+
+class RequestBudgetLoopTest(unittest.TestCase):
+
+    def test_budget_is_usable_from_several_event_loops(self):
+        budget = RequestBudget(max_requests=1, max_tokens=100)
+
+        async def contend():
+            async def request():
+                async with budget.reserve(10):
+                    await asyncio.sleep(0)
+            await asyncio.gather(*(request() for _ in range(3)))
+
+        asyncio.run(contend())
+        asyncio.run(contend())
+        self.assertEqual((budget.in_flight_requests, budget.in_flight_tokens), (0, 0))
+
+
+class ClassificationCacheTest(unittest.IsolatedAsyncioTestCase):
+
+    async def test_cacheable_predicate_and_coalescing(self):
+        cache = ClassificationCache(max_entries=2)
+        calls = []
+        release = asyncio.Event()
+
+        async def compute(value):
+            calls.append(value)
+            await release.wait()
+            return value
+
+        waiters = [asyncio.ensure_future(cache.get_or_compute("k", lambda: compute("v"))) for _ in range(3)]
+        await asyncio.sleep(0)
+        release.set()
+        self.assertEqual(await asyncio.gather(*waiters), ["v"] * 3)
+        self.assertEqual((calls, cache.stats['coalesced']), (["v"], 2))
+
+        await cache.get_or_compute("bad", lambda: compute("degraded"), cacheable=lambda value: False)
+        await cache.get_or_compute("bad", lambda: compute("degraded"), cacheable=lambda value: False)
+        self.assertEqual(calls.count("degraded"), 2)
+        self.assertIsNone(cache.local.get("bad"))
+
+        # LRU bound
+        for key in ("a", "b", "c"):
+            cache.set(key, key)
+        self.assertEqual(len(cache.local), 2)
+        self.assertIsNone(cache.local.get("a"))
+
+
+if __name__ == '__main__':
+    unittest.main()
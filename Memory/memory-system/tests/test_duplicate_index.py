@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+Tests for the harvester's duplicate index
+Near-copies are found through LSH buckets as they would be by comparing every
+stored signature, and the index survives a restart
+"""
+
+import os
+import sys
+import random
+import tempfile
+import unittest
+from pathlib import Path
+
+# Add parent directory to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from agents.duplicate_index import DuplicateIndex, BloomFilter, lsh_bands
+
+WORDS = ("lunch dinner meeting sarah alex mom office park gym coffee tomorrow friday project "
+         "doctor birthday flight hotel garden movie concert budget report school pickup").split()
+
+
+def sentence(rng: random.Random, length: int) -> str:
+    return ' '.join(rng.choice(WORDS) for _ in range(length))
+
+
+def edit(rng: random.Random, text: str, changes: int) -> str:
+    words = text.split()
+    for _ in range(changes):
+        words[rng.randrange(len(words))] = rng.choice(WORDS)
+    return ' '.join(words)
+
+
+class DuplicateIndexTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = Path(self.tmp.name) / "signatures.idx"
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_exact_reformatted_and_edited_repeats(self):
+        index = DuplicateIndex(self.path)
+        original = "Had lunch with Sarah at the Italian place downtown, then a long walk in the park"
+        self.assertIsNone(index.check("u1", original))
+
+        self.assertEqual(index.check("u1", original).similarity, 1.0)
+        self.assertEqual(index.stats['exact'], 1)
+        reformatted = index.check("u1", "  had LUNCH with sarah at the italian place downtown -- then a long walk in the park!")
+        self.assertEqual(reformatted.similarity, 1.0)
+        self.assertEqual(reformatted.record, 0)
+        self.assertIsNotNone(index.check("u1", original + " today"))
+
+        # Different text, and the same text for another user, are new
+        self.assertIsNone(index.check("u1", "Flight to Berlin on Friday, hotel booked near the station"))
+        self.assertIsNone(index.check("u2", original))
+        self.assertEqual(len(index), 3)
+
+    def test_lsh_matches_exhaustive_comparison(self):
+        rng = random.Random(5)
+        index = DuplicateIndex(None, threshold=0.8)
+        stored = {}
+        found = missed = 0
+        for step in range(3000):
+            user = f"u{rng.randrange(10)}"
+            previous = stored.get(user, [])
+            if previous and rng.random() < 0.4:
+                text = edit(rng, rng.choice(previous)[1], rng.randint(0, 3))
+            else:
+                text = sentence(rng, rng.randint(6, 25))
+
+            signature = index.signature(text)
+            best = max((sum(a == b for a, b in zip(signature, other)) / index.num_perm
+                        for other, _ in previous), default=0.0)
+            match = index.check(user, text)
+            if match is not None:
+                # Never reports a pair below the threshold
+                self.assertGreaterEqual(match.similarity, 0.8)
+                self.assertLessEqual(match.similarity, best)
+            if best >= 0.8:
+                if match is None:
+                    missed += 1
+                else:
+                    found += 1
+            else:
+                self.assertIsNone(match)
+                stored.setdefault(user, []).append((signature, text))
+
+        self.assertGreater(found, 500)
+        self.assertGreater(found / (found + missed), 0.95)
+
+    def test_persists_and_grows_across_restarts(self):
+        rng = random.Random(9)
+        index = DuplicateIndex(self.path, max_users=3, bloom_capacity=100)
+        texts = [(f"u{i * 7 // 5000}", f"{sentence(rng, 12)} {i}") for i in range(5000)]
+        for user, text in texts:
+            index.check(user, text)
+        count = len(index)
+        self.assertGreater(count, 4096)
+        index.close()
+
+        reopened = DuplicateIndex(self.path, max_users=3)
+        self.assertEqual(len(reopened), count)
+        for user, text in rng.sample(texts, 50):
+            self.assertIsNotNone(reopened.check(user, text))
+            self.assertIsNotNone(reopened.check(user, text.upper() + "!!"))
+        self.assertEqual(len(reopened), count)
+        reopened.close()
+
+        with self.assertRaises(ValueError):
+            DuplicateIndex(self.path, num_perm=128)
+
+    def test_threshold_is_tunable(self):
+        index = DuplicateIndex(None, threshold=1.0)
+        base = "quarterly budget report for the garden project is due on friday morning"
+        index.check("u1", base)
+        edited = base.replace("friday", "monday")
+        self.assertIsNone(index.check("u1", edited, add=False))
+        self.assertIsNotNone(index.check("u1", base))
+
+        index.threshold = 0.6
+        match = index.check("u1", edited, add=False)
+        self.assertIsNotNone(match)
+        self.assertLess(match.similarity, 1.0)
+        self.assertEqual(lsh_bands(64, 0.6), (index.bands, index.rows))
+
+        with self.assertRaises(ValueError):
+            index.threshold = 0
+
+    def test_bloom_filter_has_no_false_negatives(self):
+        rng = random.Random(3)
+        bloom = BloomFilter(10000)
+        members = [rng.getrandbits(64) for _ in range(10000)]
+        for digest in members:
+            bloom.add(digest)
+        self.assertTrue(all(digest in bloom for digest in members))
+        false_positives = sum(rng.getrandbits(64) in bloom for _ in range(10000))
+        self.assertLess(false_positives, 300)
+
+
+if __name__ == '__main__':
+    unittest.main()
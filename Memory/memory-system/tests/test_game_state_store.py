@@ -0,0 +1,350 @@
+#!/usr/bin/env python3
+"""
+Tests for the game state store
+Per-user indexes, archival of completed sessions to disk segments with
+in-memory summaries rebuilt on restart, segment retention, eviction caps, and
+the gaming service on top of it
+"""
+
+import os
+import sys
+import gzip
+import asyncio
+import logging
+import tempfile
+import threading
+import unittest
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+# Add parent directory to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from game_state_store import GameStateStore
+
+
+@dataclass
+class Session:
+    id: str
+    players: List[str]
+    status: str = "in_progress"
+    created_at: datetime = field(default_factory=datetime.now)
+    ended_at: Optional[datetime] = None
+    scores: Dict[str, int] = field(default_factory=dict)
+    winner_id: Optional[str] = None
+    moves: List[Dict[str, Any]] = field(default_factory=list)
+    game_data: Dict[str, Any] = field(default_factory=dict)
+
+
+@dataclass
+class Invite:
+    id: str
+    to_user_id: str
+    expires_at: datetime
+    status: str = "pending"
+
+
+START = datetime(2025, 3, 3, 12)
+
+
+class GameStateStoreTest(unittest.TestCase):
+
+    def setUp(self):
+        logging.disable(logging.CRITICAL)
+        self.tmp = tempfile.TemporaryDirectory()
+        self.store = GameStateStore(self.tmp.name, archive_after=timedelta(hours=24), max_recent_sessions=100,
+                                    stale_session_after=timedelta(hours=72), max_notifications_per_user=3,
+                                    max_pending_invites_per_user=2, maintenance_interval=timedelta(minutes=10))
+
+    def tearDown(self):
+        self.tmp.cleanup()
+        logging.disable(logging.NOTSET)
+
+    def finish(self, session_id, players, ended_at, winner=None):
+        session = Session(session_id, players, created_at=ended_at - timedelta(minutes=5),
+                          scores={player: 10 * (n + 1) for n, player in enumerate(players)},
+                          moves=[{'n': 1}], game_data={'memories': ['x'] * 50})
+        self.store.add_session(session)
+        self.assertEqual(self.store.active_session_ids(players[0]), [session_id])
+        session.status, session.ended_at, session.winner_id = "completed", ended_at, winner
+        self.store.complete_session(session)
+        return session
+
+    def test_sessions_archive_to_daily_segments(self):
+        for n in range(6):
+            self.finish(f"s{n}", ["a", "b"] if n % 2 == 0 else ["a", "c"], START + timedelta(hours=6 * n),
+                        winner="a" if n < 3 else None)
+        self.assertEqual(self.store.active_session_ids("a"), [])
+        self.assertEqual([s.id for s in self.store.recent_user_sessions("c")], ["s5", "s3", "s1"])
+
+        # Sessions more than a day old go to disk, one segment per day they ended
+        now = START + timedelta(hours=40)
+        self.assertEqual(self.store.maintain(lambda session: None, now=now),
+                         {'abandoned': 0, 'archived': 3, 'segments_pruned': 0, 'invites_expired': 0,
+                          'notifications_expired': 0})
+        self.assertEqual(sorted(os.listdir(self.tmp.name)),
+                         ["sessions-2025-03-03.jsonl.gz", "sessions-2025-03-04.jsonl.gz"])
+        self.assertEqual(list(self.store.recent_sessions), ["s3", "s4", "s5"])
+        self.assertEqual([s.id for s in self.store.recent_user_sessions("b")], ["s4"])
+
+        self.assertEqual(self.store.archive_summary("a")['sessions'], 3)
+        self.assertEqual(self.store.archive_summary("a")['wins'], 3)
+        self.assertEqual(self.store.archive_summary("b"),
+                         {'sessions': 2, 'wins': 0, 'total_score': 40, 'best_score': 20, 'average_score': 20.0,
+                          'first_ended_at': START.isoformat(),
+                          'last_ended_at': (START + timedelta(hours=12)).isoformat()})
+
+        records = self.store.archived_sessions("a")
+        self.assertEqual([record['id'] for record in records], ["s2", "s1", "s0"])
+        self.assertEqual(records[0]['move_count'], 1)
+        self.assertNotIn('game_data', records[0])
+        self.assertEqual([record['id'] for record in self.store.archived_sessions("c")], ["s1"])
+        self.assertEqual(self.store.archived_sessions("nobody"), [])
+
+        # Within the maintenance interval nothing runs; a later pass appends to the segment
+        self.assertEqual(self.store.maintain(lambda session: None, now=now + timedelta(minutes=5))['archived'], 0)
+        self.assertEqual(self.store.maintain(lambda session: None, now=now + timedelta(days=2))['archived'], 3)
+        self.assertEqual([record['id'] for record in self.store.archived_sessions("a")],
+                         ["s5", "s4", "s3", "s2", "s1", "s0"])
+        self.assertEqual(self.store.sizes()['recent_sessions'], 0)
+
+    def test_archive_index_is_rebuilt_after_restart(self):
+        for n in range(6):
+            self.finish(f"s{n}", ["a", "b"] if n % 2 == 0 else ["a", "c"], START + timedelta(hours=6 * n),
+                        winner="a" if n < 3 else None)
+        self.store.maintain(lambda session: None, now=START + timedelta(days=3))
+        # A crash in the middle of a later append leaves a cut-short gzip member
+        with open(os.path.join(self.tmp.name, "sessions-2025-03-04.jsonl.gz"), 'ab') as segment:
+            segment.write(gzip.compress(b'{"id":"s9","players":["a"]}\n')[:20])
+
+        restarted = GameStateStore(self.tmp.name)
+        for user_id in ("a", "b", "c"):
+            self.assertEqual(restarted.archive_summary(user_id), self.store.archive_summary(user_id))
+        self.assertEqual([record['id'] for record in restarted.archived_sessions("a")],
+                         ["s5", "s4", "s3", "s2", "s1", "s0"])
+        self.assertEqual([record['id'] for record in restarted.archived_sessions("c", limit=2)], ["s5", "s3"])
+
+        # Sessions archived after the restart add to the rebuilt index
+        self.store = restarted
+        self.finish("s6", ["a", "c"], START + timedelta(days=2))
+        self.store.maintain(lambda session: None, now=START + timedelta(days=4))
+        self.assertEqual(self.store.archive_summary("a")['sessions'], 7)
+        self.assertEqual(self.store.archived_sessions("c", limit=1)[0]['id'], "s6")
+
+    def test_segments_past_retention_are_deleted(self):
+        self.store.archive_retention = timedelta(days=30)
+        self.finish("old", ["a", "b"], START)
+        self.finish("new", ["a", "c"], START + timedelta(days=20))
+        self.store.maintain(lambda session: None, now=START + timedelta(days=25))
+        self.assertEqual(self.store.archive_summary("a")['sessions'], 2)
+
+        result = self.store.maintain(lambda session: None, now=START + timedelta(days=31, hours=1))
+        self.assertEqual(result['segments_pruned'], 1)
+        self.assertEqual(os.listdir(self.tmp.name), ["sessions-2025-03-23.jsonl.gz"])
+        self.assertEqual(self.store.archive_summary("a")['sessions'], 1)
+        self.assertEqual(self.store.archive_summary("b")['sessions'], 0)
+        self.assertEqual([record['id'] for record in self.store.archived_sessions("a")], ["new"])
+
+    def test_recent_session_cap_archives_in_batches(self):
+        for n in range(101):
+            self.finish(f"s{n}", ["a", "b"], START + timedelta(minutes=n))
+        result = self.store.maintain(lambda session: None, now=START + timedelta(hours=2), force=True)
+        self.assertEqual(result['archived'], 1)
+
+        # Between maintenance passes, exceeding the cap archives down to 90%
+        self.finish("s101", ["a", "b"], START + timedelta(hours=2))
+        self.finish("s102", ["a", "b"], START + timedelta(hours=2))
+        result = self.store.maintain(lambda session: None, now=START + timedelta(hours=2, minutes=1))
+        self.assertEqual(result['archived'], 12)
+        self.assertEqual(len(self.store.recent_sessions), 90)
+        self.assertEqual(self.store.archive_summary("a")['sessions'], 13)
+
+    def test_stale_sessions_are_abandoned(self):
+        idle = Session("idle", ["a", "b"], created_at=START)
+        busy = Session("busy", ["a", "c"], created_at=START)
+        self.store.add_session(idle)
+        self.store.add_session(busy)
+        self.store.touch(busy, START + timedelta(hours=70))
+
+        abandoned = []
+
+        def abandon(session):
+            abandoned.append(session.id)
+            session.status, session.ended_at = "abandoned", START + timedelta(hours=73)
+
+        self.store.maintain(abandon, now=START + timedelta(hours=73))
+        self.assertEqual(abandoned, ["idle"])
+        self.assertEqual(self.store.active_session_ids("a"), ["busy"])
+        self.assertEqual(self.store.active_session_ids("b"), [])
+        self.assertEqual([s.id for s in self.store.recent_user_sessions("b")], ["idle"])
+
+    def test_invites_are_indexed_capped_and_expire(self):
+        invites = [Invite(f"i{n}", "a" if n < 3 else "b", START + timedelta(hours=n)) for n in range(4)]
+        for invite in invites:
+            self.store.add_invite(invite, now=START - timedelta(hours=1))
+
+        # The recipient's cap drops their oldest invite
+        self.assertEqual([i.id for i in self.store.pending_invites("a", now=START - timedelta(hours=1))],
+                         ["i1", "i2"])
+        self.assertIsNone(self.store.get_invite("i0"))
+
+        invites[2].status = "accepted"
+        self.store.close_invite(invites[2])
+        self.assertEqual([i.id for i in self.store.pending_invites("a", now=START - timedelta(hours=1))], ["i1"])
+        self.assertIs(self.store.get_invite("i2"), invites[2])  # Answered, kept until it expires
+
+        self.assertEqual(self.store.pending_invites("a", now=START + timedelta(hours=1)), [])
+        self.assertEqual(invites[1].status, "expired")
+        self.assertEqual(self.store.expire_invites(now=START + timedelta(hours=3)), 2)
+        self.assertEqual((invites[2].status, invites[3].status), ("accepted", "expired"))
+        self.assertEqual(self.store.sizes()['invites'], 0)
+
+    def test_notifications_are_per_user_and_capped(self):
+        for n in range(4):
+            self.store.add_notification({'id': f"n{n}", 'user_ids': ["a", "b"] if n % 2 else ["a"],
+                                         'delivered': False})
+        self.assertEqual(self.store.pending_notification_count("a"), 3)
+
+        taken = self.store.take_notifications("a")
+        self.assertEqual([(n['id'], n['delivered']) for n in taken], [("n1", True), ("n2", True), ("n3", True)])
+        self.assertEqual(self.store.take_notifications("a"), [])
+        # Delivery to one recipient leaves the others' copies pending
+        self.assertEqual([n['id'] for n in self.store.take_notifications("b")], ["n1", "n3"])
+        self.assertEqual(self.store.stats['notifications_dropped'], 1)
+
+    def test_undelivered_notifications_expire(self):
+        self.store.notification_ttl = timedelta(hours=1)
+        for n in range(3):
+            self.store.add_notification({'id': f"n{n}", 'user_ids': ["a", "b"]}, now=START + timedelta(minutes=20 * n))
+        self.assertEqual([n['id'] for n in self.store.take_notifications("b")], ["n0", "n1", "n2"])
+
+        self.assertEqual(self.store.expire_notifications(now=START + timedelta(minutes=90)), 2)
+        self.assertEqual([n['id'] for n in self.store.take_notifications("a")], ["n2"])
+        self.assertEqual(self.store.expire_notifications(now=START + timedelta(hours=5)), 0)
+        self.assertEqual(len(self.store._notification_order), 0)
+
+
+class GameStateStoreAsyncTest(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        asyncio.get_running_loop().set_debug(False)
+        logging.disable(logging.CRITICAL)
+        self.tmp = tempfile.TemporaryDirectory()
+        self.store = GameStateStore(self.tmp.name, archive_retention=timedelta(days=30))
+        self.io_threads = set()
+        for name in ('_write_segments', '_scan_archive', '_read_archived'):
+            self.record_thread(name)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+        logging.disable(logging.NOTSET)
+
+    def record_thread(self, name):
+        method = getattr(self.store, name)
+
+        def recorded(*args, **kwargs):
+            self.io_threads.add(threading.current_thread())
+            return method(*args, **kwargs)
+        setattr(self.store, name, recorded)
+
+    def finish(self, session_id, players, ended_at):
+        session = Session(session_id, players, status="completed", created_at=ended_at, ended_at=ended_at,
+                          scores={player: 5 for player in players}, winner_id=players[0])
+        self.store.add_session(session)
+        self.store.complete_session(session)
+
+    async def test_archive_io_runs_off_the_event_loop(self):
+        self.finish("old", ["a", "b"], START)
+        self.finish("s1", ["a", "b"], START + timedelta(days=40))
+        self.finish("s2", ["a"], START + timedelta(days=41))
+
+        # Two passes at once: the second leaves the work to the first
+        first, second = await asyncio.gather(
+            self.store.maintain_async(lambda session: None, now=START + timedelta(days=43)),
+            self.store.maintain_async(lambda session: None, now=START + timedelta(days=43)))
+        self.assertEqual((first['archived'], first['segments_pruned']), (3, 1))
+        self.assertEqual(second['archived'], 0)
+        self.assertEqual(list(self.store.recent_sessions), [])
+        self.assertEqual(self.store.archive_summary("a")['sessions'], 2)
+        self.assertEqual(self.store.archive_summary("b")['sessions'], 1)
+
+        records = await self.store.archived_sessions_async("a")
+        self.assertEqual([record['id'] for record in records], ["s2", "s1"])
+        self.assertTrue(self.io_threads)
+        self.assertNotIn(threading.current_thread(), self.io_threads)
+
+        restarted = GameStateStore(self.tmp.name)
+        await restarted.load_archive_async()
+        self.assertEqual(restarted.archive_summary("a"), self.store.archive_summary("a"))
+
+
+class GamingServiceStateTest(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        asyncio.get_running_loop().set_debug(False)
+        logging.disable(logging.CRITICAL)
+        try:
+            import memory_gaming_service
+        except ImportError as e:
+            self.skipTest(f"gaming service unavailable: {e}")
+        self.tmp = tempfile.TemporaryDirectory()
+        self.module = memory_gaming_service
+        self.service = memory_gaming_service.MemoryGamingService(archive_dir=self.tmp.name)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+        logging.disable(logging.NOTSET)
+
+    async def test_games_invites_and_history(self):
+        service, GameType = self.service, self.module.GameType
+        sent = await service.create_game_invite("alice", "bob", GameType.MEMORY_MATCH, "rematch?")
+        self.assertEqual([invite['invite_id'] for invite in service.get_pending_invites("bob")], [sent['invite_id']])
+        game = await service.accept_invite(sent['invite_id'], "bob")
+        self.assertEqual(service.get_pending_invites("bob"), [])
+        self.assertEqual((await service.accept_invite(sent['invite_id'], "bob"))['error'], "Invite already accepted")
+        self.assertEqual(service.get_player_stats("bob")['active_games'], [game['session_id']])
+
+        titles = [n['title'] for n in service.get_notifications("bob")]
+        self.assertEqual(titles, ["🎮 Game Invitation!", "🎮 New Game Started!"])
+        self.assertEqual([n['title'] for n in service.get_notifications("alice")], ["🎮 New Game Started!"])
+
+        session_ids = [game['session_id']]
+        for _ in range(3):
+            created = await service.create_game_session("alice", GameType.MEMORY_TRIVIA, ["alice", "carol"])
+            session_ids.append(created['session_id'])
+        for n, session_id in enumerate(session_ids):
+            session = service.active_sessions[session_id]
+            session.scores[session.players[0]] = 10 + n
+            await service._end_game(session_id)
+        self.assertEqual(service.get_player_stats("alice")['active_games'], [])
+
+        # Archive the first two games as if a day had passed since they ended
+        for session_id in session_ids[:2]:
+            service.state.recent_sessions[session_id].ended_at -= timedelta(days=2)
+        await service.state.maintain_async(service._abandon_session, force=True)
+        self.assertEqual(list(service.state.recent_sessions), session_ids[2:])
+
+        history = await service.get_session_history("alice", limit=3)
+        self.assertEqual([game['session_id'] for game in history], [session_ids[3], session_ids[2], session_ids[1]])
+        self.assertEqual(history[2]['game_type'], "memory_trivia")
+        self.assertEqual([game['session_id'] for game in await service.get_session_history("bob")], [session_ids[0]])
+        self.assertEqual(service.get_player_stats("alice")['archived_games']['sessions'], 2)
+        self.assertEqual(service.get_player_stats("alice")['total_points'], 10 + 11 + 12 + 13)
+
+    async def test_idle_games_are_abandoned(self):
+        created = await self.service.create_game_session("alice", self.module.GameType.MEMORY_MATCH,
+                                                         ["alice", "bob"])
+        session = self.service.active_sessions[created['session_id']]
+        self.service.state.touch(session, datetime.now() - timedelta(days=4))
+        self.service.get_notifications("bob")
+
+        await self.service.state.maintain_async(self.service._abandon_session, force=True)
+        self.assertEqual(session.status, self.module.GameStatus.ABANDONED)
+        self.assertEqual(self.service.get_player_stats("bob")['active_games'], [])
+        self.assertEqual([n['title'] for n in self.service.get_notifications("bob")], ["⌛ Game Abandoned"])
+        self.assertEqual((await self.service.get_session_history("bob"))[0]['status'], "abandoned")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,279 @@
+#!/usr/bin/env python3
+"""
+Tests for the durable job queue
+Leasing order, per-type limits, lease expiry, retries with backoff and the
+worker pool, against a SQLite jobs table
+"""
+
+import os
+import sys
+import time
+import asyncio
+import logging
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+from sqlalchemy import MetaData, Table, Column, String, Integer, Text, JSON, DateTime, Enum, Index, inspect
+
+# Add parent directory to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from database.models import DatabaseManager, Job, JobStatus, JobType
+from job_queue import JobQueue, JobWorkerPool
+
+
+class JobQueueTestCase(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        asyncio.get_running_loop().set_debug(False)
+        logging.disable(logging.CRITICAL)
+        self.tmp = tempfile.TemporaryDirectory()
+        self.db = DatabaseManager(f"sqlite:///{os.path.join(self.tmp.name, 'jobs.db')}")
+        self.db.create_tables()
+
+    async def asyncTearDown(self):
+        self.db.engine.dispose()
+        self.tmp.cleanup()
+        logging.disable(logging.NOTSET)
+
+    def job(self, job_id):
+        with self.db.get_session() as session:
+            return session.get(Job, job_id)
+
+
+class JobQueueTest(JobQueueTestCase):
+
+    async def test_leases_by_priority_then_age(self):
+        queue = JobQueue(self.db)
+        low = queue.enqueue(JobType.BACKUP, priority=0)
+        first = queue.enqueue(JobType.HARVEST, "u1", {'n': 1}, priority=5)
+        second = queue.enqueue(JobType.HARVEST, "u2", priority=5)
+        urgent = queue.enqueue(JobType.DAILY_DIGEST, priority=9)
+        queue.enqueue(JobType.HARVEST, priority=99, delay=60)  # Not due yet
+
+        leased = queue.lease("w1", limit=3)
+        self.assertEqual([job.id for job in leased], [urgent, first, second])
+        self.assertEqual(leased[1].metadata, {'n': 1})
+        self.assertEqual(leased[1].attempts, 1)
+        self.assertEqual([job.id for job in queue.lease("w2", limit=3)], [low])
+        self.assertEqual(queue.lease("w3", limit=3), [])
+
+        job = self.job(first)
+        self.assertEqual(job.status, JobStatus.RUNNING)
+        self.assertEqual(job.lease_owner, "w1")
+        self.assertGreater(job.lease_expires_at, datetime.utcnow())
+
+    async def test_per_type_limits(self):
+        queue = JobQueue(self.db, concurrency_limits={JobType.BACKUP: 1, JobType.HARVEST: 2})
+        backups = [queue.enqueue(JobType.BACKUP, priority=9) for _ in range(3)]
+        harvests = [queue.enqueue(JobType.HARVEST, priority=5) for _ in range(4)]
+        digest = queue.enqueue(JobType.DAILY_DIGEST, priority=0)
+
+        # The queued backups and harvests do not crowd out the digest behind them
+        leased = queue.lease("w1", limit=10)
+        self.assertEqual([job.id for job in leased], [backups[0]] + harvests[:2] + [digest])
+        self.assertEqual(queue.lease("w2", limit=10), [])
+
+        self.assertTrue(queue.complete(backups[0], "w1", {'ok': True}))
+        self.assertEqual([job.id for job in queue.lease("w2", limit=10)], [backups[1]])
+        self.assertEqual(self.job(backups[0]).status, JobStatus.COMPLETED)
+        self.assertEqual(self.job(backups[0]).result, {'ok': True})
+
+    async def test_failures_retry_with_backoff_then_fail(self):
+        queue = JobQueue(self.db, max_attempts=2, backoff_base=0.2, backoff_jitter=0)
+        job_id = queue.enqueue(JobType.HARVEST)
+
+        queue.lease("w1")
+        self.assertEqual(queue.fail(job_id, "w1", "boom"), JobStatus.PENDING)
+        job = self.job(job_id)
+        self.assertEqual(job.error, "boom")
+        self.assertGreater(job.scheduled_at, datetime.utcnow() + timedelta(seconds=0.1))
+        self.assertEqual(queue.lease("w1"), [])
+
+        await asyncio.sleep(0.25)
+        leased = queue.lease("w1")
+        self.assertEqual(leased[0].attempts, 2)
+        self.assertEqual(queue.fail(job_id, "w1", "boom again"), JobStatus.FAILED)
+        self.assertEqual(self.job(job_id).status, JobStatus.FAILED)
+        self.assertEqual(queue.lease("w1"), [])
+
+        self.assertEqual([queue.backoff(n) for n in (1, 2, 3)], [0.2, 0.4, 0.8])
+
+    async def test_expired_lease_is_retried_and_stale_owner_rejected(self):
+        queue = JobQueue(self.db, visibility_timeout=0.2, max_attempts=2)
+        job_id = queue.enqueue(JobType.BACKUP)
+        queue.lease("w1")
+
+        # Renewed in time: not leased again
+        await asyncio.sleep(0.12)
+        self.assertEqual(queue.renew("w1", [job_id]), 1)
+        await asyncio.sleep(0.12)
+        self.assertEqual(queue.lease("w2"), [])
+
+        # w1 goes silent; w2 picks the job up and w1 can no longer finish it
+        await asyncio.sleep(0.25)
+        self.assertEqual([job.attempts for job in queue.lease("w2")], [2])
+        self.assertFalse(queue.complete(job_id, "w1"))
+        self.assertIsNone(queue.fail(job_id, "w1", "late"))
+        self.assertEqual(queue.renew("w1", [job_id]), 0)
+
+        # Out of attempts when the second lease expires too
+        await asyncio.sleep(0.25)
+        self.assertEqual(queue.lease("w3"), [])
+        job = self.job(job_id)
+        self.assertEqual(job.status, JobStatus.FAILED)
+        self.assertIsNone(job.lease_owner)
+
+
+class SchemaUpgradeTest(unittest.TestCase):
+    """A jobs table created before leasing is upgraded in place"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.url = f"sqlite:///{os.path.join(self.tmp.name, 'jobs.db')}"
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def create_old_jobs_table(self):
+        """The jobs table as the first release created it, with one queued job"""
+        metadata = MetaData()
+        jobs = Table(
+            'jobs', metadata,
+            Column('id', String, primary_key=True),
+            Column('job_type', Enum(JobType), nullable=False),
+            Column('user_id', String, nullable=True),
+            Column('status', Enum(JobStatus)),
+            Column('progress', Integer),
+            Column('total_items', Integer),
+            Column('processed_items', Integer),
+            Column('result', JSON, nullable=True),
+            Column('error', Text, nullable=True),
+            Column('extra_metadata', JSON),
+            Column('scheduled_at', DateTime, nullable=True),
+            Column('started_at', DateTime, nullable=True),
+            Column('completed_at', DateTime, nullable=True),
+            Column('created_at', DateTime, index=True),
+            Column('updated_at', DateTime),
+            Index('idx_job_status', 'status'),
+            Index('idx_user_jobs', 'user_id', 'job_type'),
+            Index('idx_scheduled_jobs', 'scheduled_at', 'status'),
+        )
+        db = DatabaseManager(self.url)
+        metadata.create_all(db.engine)
+        now = datetime.utcnow()
+        with db.engine.begin() as connection:
+            connection.execute(jobs.insert().values(
+                id='old-job', job_type=JobType.HARVEST, user_id='u1', status=JobStatus.PENDING,
+                progress=0, total_items=0, processed_items=0, extra_metadata={'n': 1},
+                created_at=now, updated_at=now))
+        db.engine.dispose()
+
+    def test_old_jobs_table_is_upgraded_and_leasable(self):
+        self.create_old_jobs_table()
+        db = DatabaseManager(self.url)
+        try:
+            db.create_tables()
+            inspector = inspect(db.engine)
+            columns = {column['name'] for column in inspector.get_columns('jobs')}
+            self.assertLessEqual({'priority', 'attempts', 'max_attempts', 'lease_owner', 'lease_expires_at'}, columns)
+            indexes = {index['name'] for index in inspector.get_indexes('jobs')}
+            self.assertLessEqual({'idx_job_lease', 'idx_job_lease_expiry'}, indexes)
+
+            # Existing rows take the column defaults
+            with db.get_session() as session:
+                job = session.get(Job, 'old-job')
+                self.assertEqual((job.priority, job.attempts, job.max_attempts), (0, 0, 3))
+
+            queue = JobQueue(db)
+            newer = queue.enqueue(JobType.HARVEST, priority=5)
+            leased = queue.lease("w1", limit=2)
+            self.assertEqual([job.id for job in leased], [newer, 'old-job'])
+            self.assertEqual(leased[1].metadata, {'n': 1})
+            self.assertTrue(queue.complete('old-job', "w1"))
+
+            self.assertEqual(db.upgrade_schema(), [])
+        finally:
+            db.engine.dispose()
+
+
+class JobWorkerPoolTest(JobQueueTestCase):
+
+    async def test_pool_runs_jobs_within_limits(self):
+        limits = {JobType.BACKUP: 1, JobType.HARVEST: 3}
+        queue = JobQueue(self.db, concurrency_limits=limits, backoff_base=0.01)
+        job_ids = queue.enqueue_many(
+            [{'job_type': JobType.BACKUP, 'metadata': {'n': n}} for n in range(3)] +
+            [{'job_type': JobType.HARVEST, 'metadata': {'n': n}} for n in range(12)]
+        )
+
+        running = {job_type: 0 for job_type in limits}
+        peak = dict(running)
+        attempts = {}
+
+        async def handler(job):
+            running[job.job_type] += 1
+            peak[job.job_type] = max(peak[job.job_type], running[job.job_type])
+            try:
+                await asyncio.sleep(0.01)
+                attempts[job.id] = job.attempts
+                if job.metadata['n'] == 0 and job.attempts == 1:
+                    raise RuntimeError("first attempt fails")
+                return {'n': job.metadata['n']}
+            finally:
+                running[job.job_type] -= 1
+
+        pool = JobWorkerPool(queue, handler, workers=6, poll_interval=0.02)
+        task = asyncio.create_task(pool.run())
+        deadline = time.monotonic() + 10
+        while pool.stats['completed'] < len(job_ids) and time.monotonic() < deadline:
+            await asyncio.sleep(0.02)
+        pool.stop()
+        await task
+
+        self.assertEqual(pool.stats['completed'], len(job_ids))
+        self.assertEqual(pool.stats['retried'], 2)
+        self.assertEqual(peak, limits)
+        self.assertEqual(sorted(attempts.values()).count(2), 2)
+        self.assertEqual(queue.counts(), {'backup': {'completed': 3}, 'harvest': {'completed': 12}})
+
+
+class JobManagerQueueTest(JobQueueTestCase):
+
+    async def asyncSetUp(self):
+        await super().asyncSetUp()
+        try:
+            import background_jobs
+        except ImportError as e:
+            self.skipTest(f"background jobs unavailable: {e}")
+        self.manager = background_jobs.JobManager(str(self.db.engine.url))
+        self.manager.memory_harvester = None  # Mock harvest
+
+    async def asyncTearDown(self):
+        self.manager.db_manager.engine.dispose()
+        self.manager.executor.shutdown()
+        await super().asyncTearDown()
+
+    async def test_scheduled_jobs_are_queued_and_run_by_the_pool(self):
+        await self.manager.run_harvest_job("u1")
+        await self.manager.run_daily_digest_job("u1")
+        statuses = [job['status'] for job in self.manager.get_active_jobs()]
+        self.assertEqual(statuses, ['pending', 'pending'])
+
+        worker = asyncio.create_task(self.manager.process_job_queue())
+        job_id = await self.manager.enqueue_job(JobType.HARVEST, user_id="u2", metadata={'sources': []})
+        deadline = time.monotonic() + 10
+        while self.manager.get_active_jobs() and time.monotonic() < deadline:
+            await asyncio.sleep(0.02)
+        self.manager.worker_pool.stop()
+        await worker
+
+        status = self.manager.get_job_status(job_id)
+        self.assertEqual(status['status'], 'completed')
+        self.assertEqual(status['priority'], 10)
+        self.assertEqual(status['attempts'], 1)
+        self.assertEqual(self.manager.active_jobs, {})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+"""
+Tests for the job unit of work
+Batched inserts, coalesced progress checkpoints, savepoint recovery from
+rejected rows, retries skipping committed rows, and the harvest job writing
+through it; the before/after write benchmark still runs
+"""
+
+import os
+import sys
+import asyncio
+import logging
+import tempfile
+import unittest
+import subprocess
+from datetime import datetime, timedelta
+
+from sqlalchemy import event
+
+# Add parent directory to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from database.models import DatabaseManager, BehavioralInsight, HarvestedItem, Job, JobType
+from job_queue import JobQueue
+from job_unit_of_work import JobUnitOfWork
+
+
+def insight(n, **values):
+    return dict({'user_id': "u1", 'insight_type': 'test', 'title': f"Insight {n}",
+                 'description': "test", 'confidence': 0.5}, **values)
+
+
+class JobUnitOfWorkTest(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        asyncio.get_running_loop().set_debug(False)
+        logging.disable(logging.CRITICAL)
+        self.tmp = tempfile.TemporaryDirectory()
+        self.db = DatabaseManager(f"sqlite:///{os.path.join(self.tmp.name, 'jobs.db')}")
+        self.db.create_tables()
+        self.job_id = JobQueue(self.db).enqueue(JobType.INSIGHT_GENERATION, "u1")
+
+        self.commits = 0
+        event.listen(self.db.engine, 'commit', self.count_commit)
+
+    def count_commit(self, connection):
+        self.commits += 1
+
+    async def asyncTearDown(self):
+        self.db.engine.dispose()
+        self.tmp.cleanup()
+        logging.disable(logging.NOTSET)
+
+    def job(self):
+        with self.db.get_session() as session:
+            return session.get(Job, self.job_id)
+
+    def insights(self):
+        with self.db.get_session() as session:
+            return sorted(row.title for row in session.query(BehavioralInsight).all())
+
+    async def test_rows_and_progress_commit_per_batch(self):
+        with JobUnitOfWork(self.db, self.job_id, batch_size=4, checkpoint_interval=3600) as unit:
+            ids = []
+            for n in range(10):
+                ids.append(unit.add(BehavioralInsight, insight(n)))
+                unit.checkpoint(n + 1, 10)
+                if n == 5:
+                    # First batch is in, flushed by the fourth add before its checkpoint
+                    self.assertEqual(len(self.insights()), 4)
+                    self.assertEqual((self.job().processed_items, self.job().progress), (3, 30))
+
+        self.assertEqual(self.commits, 3)
+        self.assertEqual(unit.summary(), {'rows_written': 10, 'rows_skipped': 0, 'rows_failed': 0, 'commits': 3})
+        self.assertEqual(len(set(ids)), 10)
+        self.assertEqual(len(self.insights()), 10)
+        job = self.job()
+        self.assertEqual((job.progress, job.processed_items, job.total_items), (100, 10, 10))
+
+    async def test_checkpoints_are_time_based(self):
+        unit = JobUnitOfWork(self.db, self.job_id, batch_size=1000, checkpoint_interval=3600)
+        for n in range(50):
+            unit.checkpoint(n + 1, 100)
+        self.assertEqual(self.commits, 0)
+
+        # Once the interval has passed the next checkpoint is written
+        unit._last_checkpoint -= 3600
+        unit.checkpoint(51)
+        self.assertEqual(self.commits, 1)
+        self.assertEqual(self.job().progress, 51)
+
+        unit.flush()
+        self.assertEqual(self.commits, 1)  # Nothing new to write
+
+    async def test_rejected_rows_are_skipped_within_the_batch(self):
+        with JobUnitOfWork(self.db, batch_size=100) as unit:
+            unit.add(BehavioralInsight, insight(0, id="taken"))
+        self.commits = 0
+
+        with JobUnitOfWork(self.db, self.job_id, batch_size=100) as unit:
+            unit.add(BehavioralInsight, insight(1))
+            unit.add(BehavioralInsight, insight(2, id="taken"))  # Duplicate key
+            unit.add(BehavioralInsight, insight(3, confidence=None))  # NOT NULL
+            unit.add(BehavioralInsight, insight(4))
+            unit.checkpoint(4, 4)
+
+        self.assertEqual(self.commits, 1)
+        self.assertEqual([row['id'] for row in unit.failed], ["taken", unit.failed[1]['id']])
+        self.assertIn("NOT NULL", unit.failed[1]['error'])
+        self.assertEqual(unit.summary(), {'rows_written': 2, 'rows_skipped': 0, 'rows_failed': 2, 'commits': 1})
+        self.assertEqual(self.insights(), ["Insight 0", "Insight 1", "Insight 4"])
+        self.assertEqual(self.job().progress, 100)
+
+    async def test_unflushed_rows_dropped_when_job_fails(self):
+        with self.assertRaises(RuntimeError):
+            with JobUnitOfWork(self.db, self.job_id, batch_size=3) as unit:
+                for n in range(5):
+                    unit.add(BehavioralInsight, insight(n))
+                raise RuntimeError("job failed")
+        self.assertEqual(len(self.insights()), 3)
+        self.assertEqual(unit.pending, [])
+
+    async def test_retry_skips_rows_committed_by_the_failed_attempt(self):
+        def run(fail_at=None):
+            with JobUnitOfWork(self.db, self.job_id, batch_size=4) as unit:
+                for n in range(10):
+                    if n == fail_at:
+                        raise RuntimeError("worker lost")
+                    unit.add(BehavioralInsight, insight(n))
+            return unit
+
+        with self.assertRaises(RuntimeError):
+            run(fail_at=9)
+        self.assertEqual(len(self.insights()), 8)
+
+        unit = run()
+        self.assertEqual(unit.summary(), {'rows_written': 2, 'rows_skipped': 8, 'rows_failed': 0, 'commits': 3})
+        self.assertEqual(self.insights(), sorted(f"Insight {n}" for n in range(10)))
+
+        # Another job's rows get ids of their own
+        other = JobQueue(self.db).enqueue(JobType.INSIGHT_GENERATION, "u1")
+        with JobUnitOfWork(self.db, other) as unit:
+            unit.add(BehavioralInsight, insight(0))
+        self.assertEqual(unit.summary()['rows_written'], 1)
+        self.assertEqual(len(self.insights()), 11)
+
+    async def test_harvest_job_writes_in_batches(self):
+        try:
+            import background_jobs
+            from agents import MemoryHarvesterAgent
+        except ImportError as e:
+            self.skipTest(f"background jobs unavailable: {e}")
+        manager = background_jobs.JobManager(str(self.db.engine.url))
+        manager.memory_harvester = MemoryHarvesterAgent(config={'data_dir': self.tmp.name})
+        start = datetime(2025, 3, 1, 9)
+        items = [{'source': 'chat_message', 'content': f"Note {n}: met Sarah about project {n * 7919}",
+                  'timestamp': (start + timedelta(minutes=n)).isoformat()} for n in range(120)]
+        items.insert(60, {'source': 'no_such_source', 'content': "skipped"})
+
+        os.environ['JOB_BATCH_SIZE'] = '50'
+        try:
+            result = await manager._execute_harvest_job(self.job_id, "u1", {'items': items})
+            # A retry runs on a fresh worker, without the first harvester's duplicate index
+            manager.memory_harvester = MemoryHarvesterAgent(config={'data_dir': os.path.join(self.tmp.name, 'retry')})
+            retried = await manager._execute_harvest_job(self.job_id, "u1", {'items': items})
+        finally:
+            del os.environ['JOB_BATCH_SIZE']
+            manager.db_manager.engine.dispose()
+            manager.executor.shutdown()
+
+        self.assertEqual(result['items_harvested'], 120)
+        self.assertEqual(result['writes'], {'rows_written': 120, 'rows_skipped': 0, 'rows_failed': 0, 'commits': 3})
+        # Running the job again (a retry) writes nothing new
+        self.assertEqual(retried['item_ids'], result['item_ids'])
+        self.assertEqual(retried['writes'], {'rows_written': 0, 'rows_skipped': 120, 'rows_failed': 0, 'commits': 3})
+        with self.db.get_session() as session:
+            rows = session.query(HarvestedItem).order_by(HarvestedItem.created_at).all()
+            self.assertEqual([row.id for row in rows], result['item_ids'])
+            self.assertEqual(rows[-1].created_at, start + timedelta(minutes=119))
+        job = self.job()
+        self.assertEqual((job.progress, job.processed_items, job.total_items), (100, 121, 121))
+
+
+class JobWritesBenchmarkTest(unittest.TestCase):
+
+    def test_benchmark_runs(self):
+        script = os.path.join(os.path.dirname(__file__), '..', '..', 'scripts', 'bench_job_writes.py')
+        completed = subprocess.run([sys.executable, script, "--items", "20", "--batch-sizes", "5"],
+                                   capture_output=True, text=True, timeout=300)
+        self.assertEqual(completed.returncode, 0, completed.stderr)
+        rows = {line[2:30].strip(): line.split() for line in completed.stdout.splitlines()
+                if line.startswith("  ")}
+        # Both write patterns store every item
+        self.assertEqual(rows["commit per item + progress"][-1], "20")
+        self.assertEqual(rows["unit of work, batch 5"][-1], "20")
+
+
+if __name__ == '__main__':
+    unittest.main()
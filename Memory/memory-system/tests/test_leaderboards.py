@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+Tests for the leaderboards
+Skip list ranking against a sorted reference, sliding-window expiry and the
+gaming service keeping its boards up to date as games end
+"""
+
+import os
+import sys
+import random
+import asyncio
+import logging
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+
+# Add parent directory to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from leaderboards import RankedScores, WindowedScores
+
+
+def reference_order(scores):
+    return sorted(scores, key=lambda member: (-scores[member], member))
+
+
+class RankedScoresTest(unittest.TestCase):
+
+    def test_matches_a_sorted_reference(self):
+        rng = random.Random(7)
+        ranking, scores = RankedScores(seed=1), {}
+        for step in range(5000):
+            member = f"u{rng.randrange(300)}"
+            if rng.random() < 0.1:
+                self.assertEqual(ranking.remove(member), member in scores)
+                scores.pop(member, None)
+            else:
+                scores[member] = rng.randrange(-10, 100)
+                ranking.set(member, scores[member])
+
+            if step % 250 == 0:
+                with self.subTest(step=step):
+                    order = reference_order(scores)
+                    self.assertEqual(len(ranking), len(order))
+                    self.assertEqual([member for member, _ in ranking], order)
+                    self.assertEqual([ranking.rank(member) for member in order], list(range(1, len(order) + 1)))
+                    self.assertEqual(ranking.top(5), [(n + 1, m, scores[m]) for n, m in enumerate(order[:5])])
+                    middle = len(order) // 2
+                    self.assertEqual([m for _, m, _ in ranking.around(order[middle], 3)],
+                                     order[middle - 3:middle + 4])
+
+    def test_edges(self):
+        ranking = RankedScores()
+        self.assertEqual((ranking.top(3), ranking.rank("a"), ranking.around("a", 2)), ([], None, []))
+
+        for member, score in [("a", 5), ("b", 9), ("c", 5), ("d", 1)]:
+            ranking.set(member, score)
+        self.assertEqual(ranking.top(10), [(1, "b", 9), (2, "a", 5), (3, "c", 5), (4, "d", 1)])
+        self.assertEqual(ranking.around("b", 1), [(1, "b", 9), (2, "a", 5)])
+        self.assertEqual(ranking.around("d", 1), [(3, "c", 5), (4, "d", 1)])
+        self.assertEqual(ranking.range(5, 1), [])
+
+        self.assertEqual(ranking.increment("d", 10), 11)
+        self.assertEqual(ranking.rank("d"), 1)
+        self.assertEqual(ranking.score("x", 0), 0)
+
+
+class WindowedScoresTest(unittest.TestCase):
+
+    def test_sums_expire_with_their_buckets(self):
+        start = datetime(2025, 3, 3, 9, 30)
+        weekly = WindowedScores(window=timedelta(days=7), bucket=timedelta(hours=1))
+        weekly.add("a", 10, start, now=start)
+        weekly.add("b", 4, start + timedelta(days=1), now=start + timedelta(days=1))
+        weekly.add("a", 5, start + timedelta(days=2), now=start + timedelta(days=2))
+        weekly.add("b", 0, start + timedelta(days=3), now=start + timedelta(days=3))
+        weekly.add("c", 7, start + timedelta(hours=2), now=start + timedelta(days=3))  # Late, older bucket
+
+        now = start + timedelta(days=3)
+        self.assertEqual(weekly.top(10, now), [(1, "a", 15), (2, "c", 7), (3, "b", 4)])
+        self.assertEqual([bucket for bucket, _ in weekly.buckets][:2],
+                         [datetime(2025, 3, 3, 9), datetime(2025, 3, 3, 11)])
+
+        # The 09:00 bucket ends at 10:00 and leaves the window a week later
+        self.assertEqual(weekly.score("a", datetime(2025, 3, 10, 9, 59)), 15)
+        self.assertEqual(weekly.top(10, datetime(2025, 3, 10, 10)), [(1, "c", 7), (2, "a", 5), (3, "b", 4)])
+        self.assertEqual(weekly.rank("b", start + timedelta(days=8, hours=1)), 2)
+        # b stays with 0 points while its game from day three is in the window
+        self.assertEqual(weekly.top(10, start + timedelta(days=9, hours=1)), [(1, "b", 0)])
+        self.assertEqual(weekly.top(10, start + timedelta(days=11)), [])
+        self.assertEqual((len(weekly.buckets), len(weekly)), (0, 0))
+
+        weekly.add("d", 3, start, now=start + timedelta(days=8))  # Already outside the window
+        self.assertEqual(len(weekly), 0)
+
+
+class GamingServiceLeaderboardTest(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        asyncio.get_running_loop().set_debug(False)
+        logging.disable(logging.CRITICAL)
+        try:
+            import memory_gaming_service
+        except ImportError as e:
+            self.skipTest(f"gaming service unavailable: {e}")
+        self.tmp = tempfile.TemporaryDirectory()
+        self.module = memory_gaming_service
+        self.service = memory_gaming_service.MemoryGamingService(archive_dir=self.tmp.name)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+        logging.disable(logging.NOTSET)
+
+    async def play(self, scores):
+        module = self.module
+        session = module.GameSession(id=f"s{len(self.service.state.recent_sessions)}",
+                                     game_type=module.GameType.MEMORY_MATCH, creator_id=next(iter(scores)),
+                                     players=list(scores), status=module.GameStatus.IN_PROGRESS,
+                                     scores=dict(scores))
+        self.service.state.add_session(session)
+        await self.service._end_game(session.id)
+        return session
+
+    async def test_boards_follow_finished_games(self):
+        rng = random.Random(3)
+        players = [f"p{n}" for n in range(40)]
+        for _ in range(120):
+            a, b = rng.sample(players, 2)
+            await self.play({a: rng.randrange(0, 200), b: rng.randrange(0, 200)})
+        old = await self.play({"p0": 1000, "p1": 0})
+        old.ended_at -= timedelta(days=8)  # Reported in the window it was played in
+        self.service.weekly_leaderboard = WindowedScores()
+        for session in self.service.state.recent_sessions.values():
+            for pid, score in session.scores.items():
+                self.service.weekly_leaderboard.add(pid, score, session.ended_at)
+
+        stats = self.service.player_stats
+        order = reference_order({pid: s.total_points for pid, s in stats.items()})
+        board = self.service.get_leaderboard("global", limit=10)
+        self.assertEqual([entry['user_id'] for entry in board], order[:10])
+        self.assertEqual([entry['rank'] for entry in board], list(range(1, 11)))
+
+        user = order[20]
+        around = self.service.get_leaderboard("global", user_id=user, limit=5, around_me=True)
+        self.assertEqual([entry['user_id'] for entry in around], order[18:23])
+        self.assertEqual(self.service.get_player_rank(user)['rank'], 21)
+        self.assertEqual(self.service.get_player_stats(user)['global_rank'], 21)
+
+        week_start = datetime.now() - timedelta(days=7)
+        weekly_points = {}
+        for session in self.service.state.recent_sessions.values():
+            if session.ended_at >= week_start:
+                for pid, score in session.scores.items():
+                    weekly_points[pid] = weekly_points.get(pid, 0) + score
+        weekly = self.service.get_leaderboard("weekly", limit=100)
+        self.assertEqual([(entry['user_id'], entry['points']) for entry in weekly],
+                         [(pid, weekly_points[pid]) for pid in reference_order(weekly_points)])
+
+        # A new player is ranked once seen, behind everyone with points
+        self.assertEqual(self.service.get_player_stats("newcomer")['global_rank'], len(stats))
+        self.assertEqual(self.service.get_player_rank("newcomer", "weekly")['rank'], None)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+Tests for the MDFileManager entry cache
+Cached and incrementally extended entries must match a fresh parse of the file
+"""
+
+import os
+import sys
+import random
+import tempfile
+import unittest
+from unittest import mock
+from pathlib import Path
+
+# Add parent directory to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from md_entry_cache import parse_entries
+from md_file_manager import MDFileManager, MemoryTag
+
+USER = "+15550000001"
+CONTACTS = ["Mom", "Alex"]
+WORDS = ["dinner", "work", "project", "doctor", "money", "trip", "garden", "movie"]
+
+
+class EntryCacheTest(unittest.IsolatedAsyncioTestCase):
+    """EntryCache behind get_user_memories / search_memories"""
+
+    async def asyncSetUp(self):
+        environ = mock.patch.dict(os.environ, {'MD_LOG_FSYNC': '0'})
+        environ.start()
+        self.addCleanup(environ.stop)
+        self.tmp = tempfile.TemporaryDirectory()
+        self.manager = MDFileManager(base_dir=self.tmp.name)
+        self.rng = random.Random(7)
+        self.written = 0
+
+    async def asyncTearDown(self):
+        self.tmp.cleanup()
+
+    async def _write(self, count: int, contacts: bool = False):
+        for _ in range(count):
+            self.written += 1
+            await self.manager.update_file(
+                USER, f"note {self.written} about {' '.join(self.rng.sample(WORDS, 2))}",
+                self.rng.choice(list(MemoryTag)), USER,
+                related_contacts=self.rng.sample(CONTACTS, 1) if contacts else None
+            )
+
+    def _assert_matches_fresh_parse(self, path: Path):
+        expected = parse_entries(self.manager.storage.read_text(path))
+        self.assertEqual(self.manager.entry_cache.entries(path), expected, path)
+        expected.sort(key=lambda entry: entry['metadata'].get('time', ''), reverse=True)
+        self.assertEqual(list(self.manager.entry_cache.newest_first(path)), expected, path)
+
+    async def test_matches_fresh_parse_across_appends_and_compaction(self):
+        # Small threshold so logs are folded into the markdown along the way
+        self.manager.storage.compact_min_bytes = 4096
+        self.manager.storage.compact_ratio = 0.2
+        await self._write(1, contacts=True)
+        paths = [p for d in (self.manager.users_dir, self.manager.contacts_dir,
+                             self.manager.relationships_dir, self.manager.topics_dir)
+                 for p in d.glob('*.md')]
+
+        for _ in range(40):
+            await self._write(self.rng.randint(1, 5), contacts=True)
+            for path in paths:
+                self._assert_matches_fresh_parse(path)
+
+        stats = self.manager.entry_cache.stats
+        self.assertGreater(self.manager.storage.stats['compactions'], 0)
+        self.assertGreater(stats['incremental'], 0)
+
+        result = await self.manager.get_user_memories(USER, limit=1000)
+        self.assertEqual(result['count'], self.written)
+
+    async def test_unchanged_file_is_not_parsed_again(self):
+        await self._write(30)
+        first = await self.manager.get_user_memories(USER)
+        stats = dict(self.manager.entry_cache.stats)
+
+        for _ in range(5):
+            self.assertEqual(await self.manager.get_user_memories(USER), first)
+            await self.manager.search_memories(USER, "dinner")
+        after = self.manager.entry_cache.stats
+        self.assertEqual(after['full'], stats['full'])
+        self.assertEqual(after['incremental'], stats['incremental'])
+        self.assertEqual(after['records_parsed'], stats['records_parsed'])
+        self.assertEqual(after['hits'], stats['hits'] + 10)
+
+        # One new entry parses one record, not the file
+        await self._write(1)
+        result = await self.manager.get_user_memories(USER, limit=1000)
+        self.assertEqual(result['count'], 31)
+        self.assertEqual(self.manager.entry_cache.stats['full'], stats['full'])
+        self.assertEqual(self.manager.entry_cache.stats['records_parsed'], stats['records_parsed'] + 1)
+
+    async def test_results_are_copies(self):
+        await self._write(10)
+        result = await self.manager.search_memories(USER, "note")
+        self.assertTrue(result['memories'])
+        cached = self.manager.entry_cache.entries(self.manager._get_user_file_path(USER))
+        self.assertTrue(all('relevance_score' not in entry for entry in cached))
+
+    async def test_tag_filter_and_newest_first(self):
+        await self._write(40)
+        everything = (await self.manager.get_user_memories(USER, limit=1000))['memories']
+        times = [m['metadata']['time'] for m in everything]
+        self.assertEqual(times, sorted(times, reverse=True))
+
+        for tag in MemoryTag:
+            tagged = (await self.manager.get_user_memories(USER, tag=tag, limit=1000))['memories']
+            self.assertEqual(tagged, [m for m in everything if m['metadata']['tag'] == f'#{tag.value}'])
+
+    async def test_streaming_reads_single_section(self):
+        await self._write(40)
+        path = self.manager._get_user_file_path(USER)
+        content = self.manager.storage.read_text(path)
+        in_file_order = parse_entries(content)
+
+        for tag in MemoryTag:
+            self.manager.entry_cache.invalidate(path)
+            streamed = [m async for m in self.manager.iter_user_memories(USER, tag=tag)]
+            self.assertEqual(streamed, [m for m in in_file_order if m['metadata']['tag'] == f'#{tag.value}'])
+
+        # From the cache as well, and a caller can stop early
+        self.manager.entry_cache.entries(path)
+        first = []
+        async for memory in self.manager.iter_user_memories(USER):
+            first.append(memory)
+            if len(first) == 3:
+                break
+        self.assertEqual(first, in_file_order[:3])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+"""
+Tests for the MD file organizer
+Parsing a user file includes entries still waiting in its section log
+"""
+
+import os
+import sys
+import logging
+import tempfile
+import unittest
+
+# Add parent directory to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from md_file_organizer import MDFileOrganizer
+from md_section_log import SectionLogStore
+
+TEMPLATE = ("# User: +15550100\n\n## Memories\n\n"
+            "#### [id:e1] [tag:general] [ts:2024-05-01T09:00:00]\nLikes tomatoes\n\n---\n")
+
+
+class ParseMDFileTest(unittest.TestCase):
+
+    def setUp(self):
+        logging.disable(logging.CRITICAL)
+        self.tmp = tempfile.TemporaryDirectory()
+        self.organizer = MDFileOrganizer(base_dir=self.tmp.name)
+        self.path = self.organizer.users_dir / "USER.+15550100.md"
+        self.path.write_text(TEMPLATE)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+        logging.disable(logging.NOTSET)
+
+    def test_pending_log_entries_are_parsed(self):
+        # A large compaction threshold keeps the entry in the log
+        store = SectionLogStore(fsync=False, compact_min_bytes=1 << 20)
+        store.append(self.path, [{
+            'id': "e2", 'kind': 'user', 'anchor': "## Memories\n",
+            'entry': "#### [id:e2] [tag:secret] [ts:2024-05-02T09:00:00]\nGate code is 4411\n"
+        }])
+        self.assertNotIn("[id:e2]", self.path.read_text())
+
+        entries = self.organizer.parse_md_file(self.path)
+        self.assertEqual(sorted((e.id, e.tag) for e in entries), [("e1", "general"), ("e2", "secret")])
+        self.assertNotIn("[id:e2]", self.path.read_text())  # read only, nothing compacted
+
+
+if __name__ == '__main__':
+    unittest.main()
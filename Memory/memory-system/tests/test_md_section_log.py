@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Tests for the markdown section log
+Appends are rendered on read, torn frames from a crash are dropped and
+truncated, and compaction only rewrites files that have pending records
+"""
+
+import os
+import sys
+import json
+import tempfile
+import unittest
+from pathlib import Path
+
+# Add parent directory to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from md_section_log import SectionLogStore, LOG_HEADER, FRAME
+
+TEMPLATE = "# Topic: Garden\n\n## Related Entries\n\n---\n"
+
+
+def record(n: int) -> dict:
+    return {'id': f"e{n}", 'kind': 'topic', 'anchor': "## Related Entries\n",
+            'entry': f"#### e{n}\nnote {n}\n"}
+
+
+class SectionLogStoreTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = Path(self.tmp.name) / "garden.md"
+        self.compacted = []
+        self.store = self.make_store()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def make_store(self, **kwargs):
+        kwargs.setdefault('compact_min_bytes', 1 << 20)
+        return SectionLogStore(fsync=False, on_compact=lambda path, content: self.compacted.append(path),
+                               **kwargs)
+
+    def test_append_is_rendered_on_read(self):
+        self.store.append(self.path, [record(1)], template=TEMPLATE)
+        self.store.append(self.path, [record(2), record(3)])
+
+        self.assertEqual(self.path.read_text(), TEMPLATE)
+        content = self.store.read_text(self.path)
+        # Newest first under the section heading, as the old rewrites did
+        self.assertLess(content.index("#### e3"), content.index("#### e2"))
+        self.assertLess(content.index("#### e2"), content.index("#### e1"))
+        self.assertEqual(self.store.stats['records'], 3)
+
+        with self.assertRaises(FileNotFoundError):
+            self.store.append(Path(self.tmp.name) / "missing.md", [record(4)])
+
+    def test_torn_frame_is_ignored_and_truncated(self):
+        self.store.append(self.path, [record(1), record(2)], template=TEMPLATE)
+        log_path = self.store.log_path(self.path)
+        valid_size = log_path.stat().st_size
+
+        # A crash mid-append: a frame whose payload fails its CRC
+        with open(log_path, 'ab') as f:
+            f.write(FRAME.pack(40, 12345) + b'{"id": "e3", "kind": "top')
+
+        restarted = self.make_store()
+        self.assertEqual([r['id'] for r in restarted.pending(self.path)], ["e1", "e2"])
+        self.assertGreaterEqual(restarted.stats['torn_records'], 1)
+
+        restarted.append(self.path, [record(4)])
+        self.assertEqual([r['id'] for r in restarted.pending(self.path)], ["e1", "e2", "e4"])
+        # The torn tail was cut before the new frame went on
+        new_frame = FRAME.size + len(json.dumps(record(4), ensure_ascii=False).encode('utf-8'))
+        self.assertEqual(log_path.stat().st_size, valid_size + new_frame)
+
+    def test_compaction_folds_records_once(self):
+        self.store.append(self.path, [record(1), record(2)], template=TEMPLATE)
+        expected = self.store.read_text(self.path)
+
+        self.assertEqual(self.store.flush([self.path]), 1)
+        self.assertEqual(self.path.read_text(), expected)
+        self.assertEqual(self.store.log_path(self.path).stat().st_size, LOG_HEADER.size)
+        self.assertEqual(self.compacted, [self.path])
+
+        # Nothing pending: repeated flushes do not rewrite the file or the log
+        mtimes = (self.path.stat().st_mtime_ns, self.store.log_path(self.path).stat().st_mtime_ns)
+        for _ in range(100):
+            self.assertEqual(self.store.flush([self.path]), 0)
+            self.assertFalse(self.store.compact(self.path))
+        self.assertEqual((self.path.stat().st_mtime_ns, self.store.log_path(self.path).stat().st_mtime_ns), mtimes)
+        self.assertEqual(self.store.stats['compactions'], 1)
+        self.assertEqual(self.compacted, [self.path])
+
+    def test_append_compacts_past_the_size_threshold(self):
+        store = self.make_store(compact_min_bytes=0, compact_ratio=0.5)
+        store.append(self.path, [record(1)], template=TEMPLATE)
+        self.assertEqual(store.stats['compactions'], 1)
+        self.assertIn("#### e1", self.path.read_text())
+        self.assertEqual(store.pending(self.path), [])
+
+    def test_stores_share_one_lock_per_file(self):
+        other = self.make_store()
+        self.assertIs(self.store.lock(self.path), other.lock(self.path))
+        relative = os.path.relpath(self.path)
+        self.assertIs(self.store.lock(Path(relative)), other.lock(self.path))
+        self.assertIsNot(self.store.lock(self.path), self.store.lock(Path(self.tmp.name) / "other.md"))
+
+        # One store compacting while another appends never loses a record
+        self.store.append(self.path, [record(1)], template=TEMPLATE)
+        other.append(self.path, [record(2)])
+        self.store.compact(self.path)
+        other.append(self.path, [record(3)])
+        self.assertEqual([r['id'] for r in self.store.pending(self.path)], ["e3"])
+        content = other.read_text(self.path)
+        self.assertTrue(all(f"#### e{n}" in content for n in (1, 2, 3)))
+
+
+if __name__ == '__main__':
+    unittest.main()
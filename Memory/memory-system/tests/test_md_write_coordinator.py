@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+Stress Tests for MDFileManager concurrent writes
+Thousands of concurrent update_file calls must not lose a single entry, and
+writers queued behind an in-flight write go out in one append
+"""
+
+import os
+import sys
+import random
+import asyncio
+import tempfile
+import threading
+import unittest
+from unittest import mock
+from collections import Counter
+from pathlib import Path
+
+# Add parent directory to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from md_file_manager import MDFileManager, MemoryTag
+
+USERS = [f"+1555000{i:04d}" for i in range(8)]
+CONTACTS = ["Mom", "Dad", "Alex", "Sam"]
+WORDS = ["dinner", "work", "project", "doctor", "money", "trip", "garden", "movie"]
+TOPIC_TEMPLATE = "# Topic: Batch\n\n## Related Entries\n\n"
+
+
+def topic_record(n: int) -> dict:
+    return {'id': f"e{n}", 'kind': 'topic', 'anchor': "## Related Entries\n", 'entry': f"#### e{n}\nnote {n}\n"}
+
+
+class ConcurrentWriteStressTest(unittest.IsolatedAsyncioTestCase):
+    """update_file under heavy concurrency"""
+
+    async def asyncSetUp(self):
+        # Debug-mode callback tracing would dominate a stress test
+        asyncio.get_running_loop().set_debug(False)
+        # fsync'd appends would dominate; scoped to this test only
+        environ = mock.patch.dict(os.environ, {'MD_LOG_FSYNC': '0'})
+        environ.start()
+        self.addCleanup(environ.stop)
+        self.tmp = tempfile.TemporaryDirectory()
+        self.manager = MDFileManager(base_dir=self.tmp.name)
+
+    async def asyncTearDown(self):
+        self.tmp.cleanup()
+
+    async def _write_all(self, writes: int):
+        rng = random.Random(42)
+        calls = []
+        for i in range(writes):
+            calls.append((
+                rng.choice(USERS),
+                f"note {i} about {' '.join(rng.sample(WORDS, 2))}",
+                rng.choice(list(MemoryTag)),
+                rng.sample(CONTACTS, rng.randint(0, 2))
+            ))
+
+        results = await asyncio.gather(*[
+            self.manager.update_file(user, message, tag, user, related_contacts=contacts)
+            for user, message, tag, contacts in calls
+        ])
+        return calls, results
+
+    def _entry_ids(self, path: Path):
+        content = self.manager.storage.read_text(path)
+        return [line[5:].strip() for line in content.split('\n') if line.startswith('#### ')]
+
+    async def test_no_lost_entries(self):
+        writes = 3000
+        calls, results = await self._write_all(writes)
+        self.assertTrue(all(result['success'] for result in results))
+
+        expected = Counter()
+        for (user, message, _, contacts), result in zip(calls, results):
+            for file_path in result['files_updated']:
+                expected[file_path] += 1
+            # Every file the entry belongs to was reported as updated
+            self.assertEqual(len(result['files_updated']),
+                             1 + 2 * len(contacts) + len(self.manager._extract_topics(message)))
+
+        for file_path, count in expected.items():
+            ids = self._entry_ids(Path(file_path))
+            self.assertEqual(len(ids), count, file_path)
+            self.assertEqual(len(set(ids)), count, file_path)
+
+        # Concurrent entries for the same file were coalesced
+        self.assertGreater(self.manager.writes.stats['largest_batch'], 1)
+        self.assertLess(self.manager.writes.stats['writes'], self.manager.writes.stats['records'])
+
+        # Folding the logs into the markdown keeps every entry
+        self.manager.flush_all()
+        for file_path, count in expected.items():
+            self.assertEqual(len(self._entry_ids(Path(file_path))), count, file_path)
+
+    async def test_writers_queued_behind_a_write_share_one_append(self):
+        coordinator = self.manager.writes
+        path = Path(self.tmp.name) / "batch.md"
+        started, release = threading.Event(), threading.Event()
+        store_append = coordinator.store.append
+
+        def held_append(*args):
+            started.set()
+            release.wait(5)
+            return store_append(*args)
+
+        with mock.patch.object(coordinator.store, "append", held_append):
+            first = asyncio.ensure_future(coordinator.append(path, topic_record(0), TOPIC_TEMPLATE))
+            await asyncio.to_thread(started.wait, 5)
+            # Everyone arriving while the first write is in flight queues up
+            rest = [asyncio.ensure_future(coordinator.append(path, topic_record(n))) for n in range(1, 50)]
+            await asyncio.sleep(0)
+            release.set()
+            await asyncio.gather(first, *rest)
+
+        self.assertEqual(coordinator.stats['writes'], 2)
+        self.assertEqual(coordinator.stats['largest_batch'], 49)
+        self.assertEqual(sorted(r['id'] for r in coordinator.store.pending(path)),
+                         sorted(f"e{n}" for n in range(50)))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Tests for the concurrent memory file search
+Top-k across files, skipping files that cannot improve it, and searching
+section-log entries that have not been compacted without writing anything
+"""
+
+import os
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+# Add parent directory to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from memory_file_search import MemoryFileSearch, ParsedFileCache
+from md_section_log import SectionLogStore
+
+TOPIC = "# Topic: Garden\n\n## Related Entries\n\n"
+
+
+def memory(day: int, tag: str, content: str) -> str:
+    return f"- **[2025-01-{day:02d} 12:00:00]** [{tag}]: {content}"
+
+
+class MemoryFileSearchTest(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.dir = Path(self.tmp.name)
+
+    async def asyncTearDown(self):
+        self.tmp.cleanup()
+
+    def write(self, name: str, *memories: str) -> dict:
+        path = self.dir / name
+        path.write_text(TOPIC + "\n".join(memories) + "\n")
+        return {'path': str(path), 'type': f"topic_{path.stem}"}
+
+    async def test_top_k_across_files_respects_tags(self):
+        files = [
+            self.write("garden.md", memory(1, "general", "Planted tomatoes in the garden"),
+                       memory(2, "secret", "Garden shed code is 1234")),
+            self.write("trip.md", memory(3, "general", "Garden tour on the trip"),
+                       memory(4, "general", "Booked the hotel")),
+        ]
+        search = MemoryFileSearch(max_workers=2, budget_seconds=5)
+
+        results = await search.search(files, "garden tomatoes", ["general"], k=2)
+        self.assertEqual([r['content'] for r in results],
+                         ["Planted tomatoes in the garden", "Garden tour on the trip"])
+        self.assertEqual(results[0]['source_file'], "topic_garden")
+        self.assertNotIn("secret", {r['tag'] for r in results})
+
+    async def test_cached_files_that_cannot_improve_top_k_are_skipped(self):
+        files = [self.write(f"f{n}.md", memory(1, "general", "garden party" if n == 0 else "hotel booking"))
+                 for n in range(5)]
+        search = MemoryFileSearch(max_workers=1, budget_seconds=5)
+        await search.search(files, "hotel", ["general"], k=5)
+        self.assertEqual(search.stats['files_scanned'], 5)
+
+        # Only the one file whose vocabulary can match is read again
+        results = await search.search(files, "garden party", ["general"], k=1)
+        self.assertEqual([r['content'] for r in results], ["garden party"])
+        self.assertEqual(search.stats['files_scanned'], 6)
+        self.assertEqual(search.stats['files_skipped'], 4)
+
+    async def test_pending_log_entries_are_searched_without_flushing(self):
+        store = SectionLogStore(fsync=False, compact_min_bytes=1 << 20)
+        info = self.write("garden.md", memory(1, "general", "Planted tomatoes"))
+        path = Path(info['path'])
+        search = MemoryFileSearch(max_workers=2, budget_seconds=5, cache=ParsedFileCache(
+            read_text=store.read_text, version=store.version
+        ))
+
+        def append(day, content):
+            store.append(path, [{'id': f"e{day}", 'kind': 'topic', 'anchor': "## Related Entries\n",
+                                 'entry': memory(day, "general", content)}])
+
+        append(2, "Watered the basil")
+        before = path.read_bytes()
+        results = await search.search([info], "basil", ["general"])
+        self.assertEqual([r['content'] for r in results], ["Watered the basil"])
+
+        # A later append is picked up: the version covers the log as well
+        append(3, "Harvested more basil")
+        results = await search.search([info], "basil", ["general"])
+        self.assertEqual(len(results), 2)
+
+        # Nothing was written on the read path
+        self.assertEqual(path.read_bytes(), before)
+        self.assertEqual(store.stats['compactions'], 0)
+        self.assertEqual(len(store.pending(path)), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,261 @@
+#!/usr/bin/env python3
+"""
+Tests for the agent message bus
+Bounded mailboxes, batch receive, consumer concurrency and request/reply,
+in process, over the broker socket and with agents in other processes
+"""
+
+import os
+import sys
+import asyncio
+import logging
+import tempfile
+import unittest
+from datetime import datetime
+
+# Add parent directory to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from agents.base_agent import BaseAgent, AgentMessage, AgentCapability, AgentState
+from agents.message_bus import (
+    InProcessMessageBus, MessageBroker, SocketMessageBus, AgentRequestError,
+    MailboxFullError, UnknownAgentError, default_message_bus, spawn_agent_process
+)
+
+
+class EchoAgent(BaseAgent):
+    """Echoes request content back, slowly enough to overlap"""
+
+    def __init__(self, agent_id: str = "echo", config=None):
+        super().__init__(agent_id, [AgentCapability.MEMORY_PROCESSING], config)
+        self.running = 0
+        self.peak = 0
+
+    async def _initialize_components(self):
+        pass
+
+    async def _handle_message(self, message):
+        self.running += 1
+        self.peak = max(self.peak, self.running)
+        try:
+            await asyncio.sleep(0.02)
+            if message.message_type == "fail":
+                raise ValueError("asked to fail")
+            return {'echo': message.content, 'by': self.agent_id}
+        finally:
+            self.running -= 1
+
+
+def message(recipient_id, n=0, message_type="note"):
+    return AgentMessage("test", recipient_id, message_type, {'n': n}, datetime.now())
+
+
+class MessageBusTestCase(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        asyncio.get_running_loop().set_debug(False)
+        logging.disable(logging.CRITICAL)
+        self.tmp = tempfile.TemporaryDirectory()
+
+    async def asyncTearDown(self):
+        self.tmp.cleanup()
+        logging.disable(logging.NOTSET)
+
+    async def check_mailbox(self, bus):
+        await bus.register("inbox", capacity=3)
+        for n in range(3):
+            await bus.publish(message("inbox", n))
+        with self.assertRaises(MailboxFullError):
+            await bus.publish(message("inbox", 3), timeout=0.05)
+
+        # A blocked sender gets in once a receiver makes room
+        blocked = asyncio.create_task(bus.publish(message("inbox", 4), timeout=5))
+        await asyncio.sleep(0.05)
+        self.assertFalse(blocked.done())
+        self.assertEqual([m.content['n'] for m in await bus.receive("inbox", max_messages=2)], [0, 1])
+        await blocked
+        self.assertEqual([m.content['n'] for m in await bus.receive("inbox", max_messages=10)], [2, 4])
+        self.assertEqual(await bus.receive("inbox", max_messages=10, timeout=0.05), [])
+
+        with self.assertRaises(UnknownAgentError):
+            await bus.publish(message("nobody"))
+
+    async def check_agents(self, bus):
+        agent = EchoAgent(config={'message_bus': bus, 'mailbox_size': 4})
+        caller = EchoAgent("caller", config={'message_bus': bus})
+        await agent.initialize()
+        server = asyncio.create_task(agent.serve(concurrency=3, poll_interval=0.05))
+        await asyncio.sleep(0.05)
+
+        replies = await asyncio.gather(*(caller.request("echo", "note", {'n': n}, timeout=5) for n in range(12)))
+        self.assertEqual([reply['echo']['n'] for reply in replies], list(range(12)))
+        with self.assertRaisesRegex(AgentRequestError, "asked to fail"):
+            await caller.request("echo", "fail", {}, timeout=5)
+
+        await agent.shutdown()
+        await server
+        self.assertEqual(agent.peak, 3)
+        self.assertEqual(agent.statistics['messages_processed'], 13)
+        with self.assertRaises(UnknownAgentError):
+            await caller.send_message("echo", "note", {})
+
+
+class InProcessMessageBusTest(MessageBusTestCase):
+
+    async def test_bounded_mailbox_and_batch_receive(self):
+        await self.check_mailbox(InProcessMessageBus())
+
+    async def test_concurrent_consumer_and_requests(self):
+        await self.check_agents(InProcessMessageBus())
+
+    async def test_request_times_out(self):
+        bus = InProcessMessageBus()
+        await bus.register("silent")
+        with self.assertRaises(asyncio.TimeoutError):
+            await bus.request(message("silent"), timeout=0.05)
+        self.assertEqual(bus._replies, {})
+
+    async def test_agents_default_to_the_loop_bus(self):
+        receiver, sender = EchoAgent("receiver"), EchoAgent("sender")
+        self.assertEqual(await receiver.receive_message(), None)
+        await sender.send_message("receiver", "note", {'n': 1})
+        received = await receiver.receive_message()
+        self.assertEqual((received.sender_id, received.content), ("sender", {'n': 1}))
+        self.assertIs(receiver.message_bus, default_message_bus())
+
+    async def test_shutdown_waits_for_handlers_in_flight(self):
+        bus = InProcessMessageBus()
+        agent = EchoAgent(config={'message_bus': bus})
+        caller = EchoAgent("caller", config={'message_bus': bus})
+        release = asyncio.Event()
+        handle = agent._handle_message
+
+        async def slow_handle(message):
+            await release.wait()
+            return await handle(message)
+        agent._handle_message = slow_handle
+        server = asyncio.create_task(agent.serve(poll_interval=0.05))
+        await asyncio.sleep(0.05)
+
+        reply = asyncio.create_task(caller.request("echo", "note", {'n': 1}, timeout=5))
+        await asyncio.sleep(0.05)
+        self.assertEqual(agent.state, AgentState.PROCESSING)
+        shutdown = asyncio.create_task(agent.shutdown())
+        await asyncio.sleep(0.1)
+        self.assertFalse(shutdown.done())  # the handler still holds the mailbox
+
+        release.set()
+        await shutdown
+        self.assertEqual((await reply)['echo'], {'n': 1})
+        self.assertEqual(agent.state, AgentState.TERMINATED)
+        await server  # returns rather than receiving on the released mailbox
+        with self.assertRaises(UnknownAgentError):
+            await caller.send_message("echo", "note", {})
+
+    async def test_pattern_analyzer_failures_are_error_replies(self):
+        try:
+            from agents.pattern_analyzer import PatternAnalyzerAgent
+        except ImportError as e:
+            self.skipTest(f"pattern analyzer unavailable: {e}")
+        bus = InProcessMessageBus()
+        analyzer = PatternAnalyzerAgent(config={'message_bus': bus})
+        caller = EchoAgent("caller", config={'message_bus': bus})
+        server = asyncio.create_task(analyzer.serve(poll_interval=0.05))
+        await asyncio.sleep(0.05)
+
+        async def broken_statistics():
+            raise RuntimeError("statistics store offline")
+        analyzer._get_pattern_statistics = broken_statistics
+        with self.assertRaisesRegex(AgentRequestError, "statistics store offline"):
+            await caller.request(analyzer.agent_id, "get_pattern_stats", {}, timeout=5)
+        self.assertEqual(analyzer.statistics['errors'], 1)
+
+        # The agent keeps serving after a failed request
+        reply = await caller.request(analyzer.agent_id, "analyze_patterns", {'memories': []}, timeout=5)
+        self.assertEqual(reply, {'detected_patterns': []})
+
+        await analyzer.shutdown()
+        await server
+
+
+class SocketMessageBusTest(MessageBusTestCase):
+
+    async def asyncSetUp(self):
+        await super().asyncSetUp()
+        self.path = os.path.join(self.tmp.name, 'bus.sock')
+        self.broker = MessageBroker(self.path)
+        await self.broker.start()
+        self.clients = [SocketMessageBus(self.path) for _ in range(2)]
+
+    async def asyncTearDown(self):
+        for client in self.clients:
+            await client.close()
+        await self.broker.close()
+        await super().asyncTearDown()
+
+    async def test_bounded_mailbox_and_batch_receive(self):
+        await self.check_mailbox(self.clients[0])
+
+    async def test_concurrent_consumer_and_requests(self):
+        await self.check_agents(self.clients[0])
+
+    async def test_clients_share_mailboxes(self):
+        consumer, producer = self.clients
+        await consumer.register("shared")
+        sent = message("shared", 7)
+        sent.correlation_id = "c1"
+        await producer.publish(sent)
+        received, = await consumer.receive("shared", 5, timeout=1)
+        self.assertEqual(received.to_dict(), sent.to_dict())
+
+        # Registrations go with the connection
+        await consumer.close()
+        await asyncio.sleep(0.05)
+        with self.assertRaises(UnknownAgentError):
+            await producer.publish(message("shared"))
+
+
+class AgentProcessTest(MessageBusTestCase):
+
+    async def test_pattern_analyzers_in_other_processes(self):
+        try:
+            from agents.pattern_analyzer import PatternAnalyzerAgent
+            from test_pattern_analyzer import make_memories
+        except ImportError as e:
+            self.skipTest(f"pattern analyzer unavailable: {e}")
+        path = os.path.join(self.tmp.name, 'bus.sock')
+        broker = MessageBroker(path)
+        await broker.start()
+        processes = [spawn_agent_process("agents.pattern_analyzer:PatternAnalyzerAgent", path, concurrency=2)
+                     for _ in range(2)]
+        bus = SocketMessageBus(path)
+        try:
+            batches = [make_memories(seed, 150) for seed in range(4)]
+            for batch in batches:
+                for memory in batch:
+                    memory['timestamp'] = memory['timestamp'].isoformat()
+            # Holding the mailbox lets requests queue while the processes start
+            await bus.register("pattern_analyzer")
+            replies = await asyncio.gather(*(
+                bus.request(AgentMessage("test", "pattern_analyzer", "analyze_patterns", {'memories': batch},
+                                         datetime.now()), timeout=120)
+                for batch in batches
+            ))
+
+            local = PatternAnalyzerAgent()
+            for batch, reply in zip(batches, replies):
+                expected = await local._analyze_patterns_from_memories(batch)
+                self.assertTrue(expected)
+                self.assertEqual([p['id'] for p in reply['detected_patterns']], [p['id'] for p in expected])
+        finally:
+            await bus.close()
+            await broker.close()
+            for process in processes:
+                process.join(timeout=10)
+                if process.is_alive():
+                    process.terminate()
+        self.assertEqual([process.exitcode for process in processes], [0, 0])
+
+
+if __name__ == '__main__':
+    unittest.main()
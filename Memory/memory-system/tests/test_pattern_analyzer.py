@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+"""
+Tests for the pattern analyzer's detectors
+The vectorised detectors must report exactly what the row-by-row loops they
+replaced reported, pattern for pattern and in the same order
+"""
+
+import os
+import sys
+import json
+import random
+import asyncio
+import hashlib
+import logging
+import statistics
+import unittest
+from dataclasses import asdict
+from datetime import datetime, timedelta
+from collections import defaultdict, Counter
+
+import pandas as pd
+
+# Add parent directory to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from agents.pattern_analyzer import PatternAnalyzerAgent, DetectedPattern, PatternType
+
+ACTIVITIES = ["Went to the gym", "Lunch with the team", "Called mom", "Read a chapter",
+              "Cooked pasta", "Walked the dog", "Weekly review", "Groceries"]
+PEOPLE = ["Sarah", "Alex", "Mom", "Dan", "Maria"]
+
+
+def make_memories(seed: int, count: int, span_days: int = 60):
+    """Memories clustered around a few hours, with repeated timestamps and activities"""
+    rng = random.Random(seed)
+    start = datetime(2025, 1, 6)
+    memories = []
+    for i in range(count):
+        when = start + timedelta(days=rng.randrange(span_days), hours=rng.choice([7, 8, 12, 18, 19, 22]),
+                                 minutes=rng.choice([0, 5, 20, 40, 55]))
+        if rng.random() < 0.2:
+            participants = rng.choice(PEOPLE)  # a bare name rather than a list
+        else:
+            participants = rng.sample(PEOPLE, rng.choice([0, 0, 1, 1, 2, 3]))
+        if when.hour == 7 and rng.random() < 0.7:
+            content = ACTIVITIES[0]  # a morning routine
+        else:
+            content = rng.choice(ACTIVITIES[:3]) if rng.random() < 0.5 else rng.choice(ACTIVITIES)
+        memories.append({
+            'id': f"m{i}",
+            'timestamp': when,
+            'content': content,
+            'participants': participants,
+            'metadata': {'location': rng.choice(["home", "office", "gym", ""])},
+            'tags': [],
+            'quality_score': 0.8,
+            'sentiment': {'score': rng.uniform(-1, 1), 'label': 'neutral'},
+        })
+    return memories
+
+
+def pattern(id, pattern_type, strength, confidence, description, frequency, triggers,
+            participants=(), locations=(), time_windows=(), supporting_memories=(), metadata=None):
+    return DetectedPattern(id, pattern_type, strength, confidence, description, frequency, triggers,
+                           list(participants), list(locations), list(time_windows), list(supporting_memories),
+                           datetime.now(), datetime.now(), 0.0, metadata)
+
+
+class LoopDetectors(PatternAnalyzerAgent):
+    """The detectors as they were before vectorisation, used as the reference"""
+
+    async def _analyze_daily_patterns(self, df):
+        patterns = []
+        df['day_of_week'] = pd.to_datetime(df['timestamp']).dt.day_name()
+        for day, group in df.groupby('day_of_week'):
+            if len(group) < 3:
+                continue
+            for activity, count in group['activity'].value_counts().items():
+                if count < 3:
+                    continue
+                total_days = len(group['timestamp'].dt.date.unique())
+                frequency = count / total_days if total_days > 0 else 0
+                if frequency >= 0.3:
+                    hour_counts = Counter(pd.to_datetime(group[group['activity'] == activity]['timestamp']).dt.hour)
+                    patterns.append(pattern(
+                        f"daily_{day}_{activity}_{hashlib.md5(f'{day}{activity}'.encode()).hexdigest()[:8]}",
+                        PatternType.TEMPORAL, self._calculate_pattern_strength(frequency), min(frequency, 0.95),
+                        f"User typically does '{activity}' on {day}s",
+                        {'type': 'daily', 'day': day, 'rate': frequency}, [f"day_of_week:{day}"],
+                        group['participants'].explode().unique(), group['location'].unique(),
+                        [{'start_hour': h, 'end_hour': (h + 1) % 24, 'frequency': c}
+                         for h, c in hour_counts.items() if c >= 2],
+                        group['memory_id'].unique(),
+                        {'day_of_week': day, 'activity': activity, 'sample_size': count}))
+        return patterns
+
+    async def _analyze_weekly_patterns(self, df):
+        patterns = []
+        df['week'] = pd.to_datetime(df['timestamp']).dt.isocalendar().week
+        df['year'] = pd.to_datetime(df['timestamp']).dt.year
+        df['year_week'] = df['year'].astype(str) + '_' + df['week'].astype(str)
+        weekly_activities = defaultdict(list)
+        for week, group in df.groupby('year_week'):
+            for activity, count in group['activity'].value_counts().items():
+                weekly_activities[activity].append(count)
+        for activity, counts in weekly_activities.items():
+            if len(counts) >= 3:
+                avg_count = statistics.mean(counts)
+                consistency = 1 - (statistics.stdev(counts) / avg_count) if avg_count > 0 else 0
+                if consistency >= 0.6 and avg_count >= 2:
+                    patterns.append(pattern(
+                        f"weekly_{activity}_{hashlib.md5(activity.encode()).hexdigest()[:8]}",
+                        PatternType.TEMPORAL, self._calculate_pattern_strength(consistency), min(consistency, 0.95),
+                        f"User regularly does '{activity}' weekly",
+                        {'type': 'weekly', 'avg_count': avg_count, 'consistency': consistency}, ["weekly_cycle"],
+                        metadata={'activity': activity, 'weekly_average': avg_count, 'weeks_analyzed': len(counts)}))
+        return patterns
+
+    async def _analyze_hourly_patterns(self, df):
+        patterns = []
+        df['hour'] = pd.to_datetime(df['timestamp']).dt.hour
+        for hour, group in df.groupby('hour'):
+            if len(group) < 5:
+                continue
+            for activity, count in group['activity'].value_counts().items():
+                frequency = count / len(group)
+                if count >= 3 and frequency >= 0.4:
+                    patterns.append(pattern(
+                        f"hourly_{hour}_{activity}_{hashlib.md5(f'{hour}{activity}'.encode()).hexdigest()[:8]}",
+                        PatternType.TEMPORAL, self._calculate_pattern_strength(frequency), min(frequency, 0.95),
+                        f"User typically does '{activity}' around {hour}:00",
+                        {'type': 'hourly', 'hour': hour, 'rate': frequency}, [f"hour:{hour}"],
+                        time_windows=[{'start_hour': hour, 'end_hour': (hour + 1) % 24}],
+                        metadata={'hour': hour, 'activity': activity, 'sample_size': count}))
+        return patterns
+
+    async def _analyze_activity_sequences(self, df):
+        sequences, current, last = [], [], None
+        for _, row in df.sort_values('timestamp', kind='stable').iterrows():
+            now = pd.to_datetime(row['timestamp'])
+            if last is None or (now - last).total_seconds() <= 3600:
+                current.append(row['activity'])
+            else:
+                if len(current) >= 2:
+                    sequences.append(current)
+                current = [row['activity']]
+            last = now
+        if len(current) >= 2:
+            sequences.append(current)
+        sequence_counts = Counter((seq[i], seq[i + 1]) for seq in sequences for i in range(len(seq) - 1))
+
+        patterns = []
+        for (activity1, activity2), count in sequence_counts.items():
+            frequency = count / len(sequences) if sequences else 0
+            if count >= 3 and frequency >= 0.2:
+                patterns.append(pattern(
+                    f"sequence_{activity1}_{activity2}_{hashlib.md5(f'{activity1}{activity2}'.encode()).hexdigest()[:8]}",
+                    PatternType.BEHAVIORAL, self._calculate_pattern_strength(frequency), min(frequency, 0.95),
+                    f"User typically does '{activity2}' after '{activity1}'",
+                    {'type': 'sequence', 'rate': frequency, 'count': count}, [f"activity:{activity1}"],
+                    metadata={'sequence': [activity1, activity2], 'sample_size': count}))
+        return patterns
+
+    async def _detect_social_patterns(self, analysis_data):
+        df = pd.DataFrame(analysis_data['social_features'])
+        all_participants = []
+        for participants in df['participants']:
+            if isinstance(participants, list):
+                all_participants.extend(participants)
+            elif participants:
+                all_participants.append(participants)
+
+        patterns = []
+        for participant, count in Counter(all_participants).items():
+            frequency = count / len(df)
+            if count >= 3 and frequency >= 0.1:
+                participant_data = df[df['participants'].apply(
+                    lambda x: participant in x if isinstance(x, list) else participant == x)]
+                common_activities = participant_data['activity'].value_counts().head(3).to_dict()
+                patterns.append(pattern(
+                    f"social_{participant}_{hashlib.md5(participant.encode()).hexdigest()[:8]}",
+                    PatternType.SOCIAL, self._calculate_pattern_strength(frequency), min(frequency, 0.95),
+                    f"User frequently interacts with {participant}",
+                    {'type': 'social', 'rate': frequency, 'count': count}, [], [participant],
+                    metadata={'participant': participant, 'interaction_count': count,
+                              'common_activities': common_activities}))
+        return patterns
+
+
+def comparable(patterns):
+    """Patterns as JSON without their detection times; numpy scalars show up as reprs"""
+    rows = []
+    for detected in patterns:
+        row = asdict(detected)
+        del row['first_detected'], row['last_updated']
+        rows.append(json.dumps(row, default=repr))
+    return rows
+
+
+class VectorisedDetectorTest(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        asyncio.get_running_loop().set_debug(False)
+        logging.disable(logging.CRITICAL)
+        self.agent = PatternAnalyzerAgent()
+        self.reference = LoopDetectors()
+
+    async def asyncTearDown(self):
+        logging.disable(logging.NOTSET)
+
+    async def assertSameDetections(self, memories):
+        data = await self.agent._prepare_memory_data_for_analysis(memories)
+        for name, features in (('_analyze_daily_patterns', 'temporal_features'),
+                               ('_analyze_weekly_patterns', 'temporal_features'),
+                               ('_analyze_hourly_patterns', 'temporal_features'),
+                               ('_analyze_activity_sequences', 'behavioral_features')):
+            with self.subTest(detector=name):
+                expected = await getattr(self.reference, name)(pd.DataFrame(data[features]))
+                actual = await getattr(self.agent, name)(pd.DataFrame(data[features]))
+                self.assertEqual(comparable(actual), comparable(expected))
+        with self.subTest(detector='_detect_social_patterns'):
+            expected = await self.reference._detect_social_patterns(data)
+            actual = await self.agent._detect_social_patterns(data)
+            self.assertEqual(comparable(actual), comparable(expected))
+
+    async def test_detectors_match_row_loops(self):
+        for seed, count, span_days in ((1, 40, 14), (2, 300, 60), (3, 2000, 400), (4, 5000, 30)):
+            with self.subTest(seed=seed):
+                await self.assertSameDetections(make_memories(seed, count, span_days))
+
+    async def test_detectors_report_patterns(self):
+        memories = make_memories(5, 3000, 40)
+        data = await self.agent._prepare_memory_data_for_analysis(memories)
+        temporal = pd.DataFrame(data['temporal_features'])
+        for name in ('_analyze_daily_patterns', '_analyze_weekly_patterns', '_analyze_hourly_patterns'):
+            self.assertTrue(await getattr(self.agent, name)(temporal.copy()), name)
+        self.assertTrue(await self.agent._analyze_activity_sequences(pd.DataFrame(data['behavioral_features'])))
+        self.assertTrue(await self.agent._detect_social_patterns(data))
+
+        daily = (await self.agent._analyze_daily_patterns(temporal.copy()))[0]
+        self.assertTrue(daily.time_windows)
+        self.assertIsInstance(daily.time_windows[0]['start_hour'], int)
+        self.assertEqual(len(daily.supporting_memories), len(set(daily.supporting_memories)))
+
+    async def test_single_memory_and_empty_frames(self):
+        await self.assertSameDetections(make_memories(6, 1))
+        self.assertEqual(await self.agent._detect_social_patterns({'social_features': []}), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
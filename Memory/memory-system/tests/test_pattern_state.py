@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+"""
+Tests for the incremental pattern state
+Patterns derived from a state fed in batches, and saved and restored between
+them, must equal a full analysis of every memory it has seen, including
+memories ingested after newer ones
+"""
+
+import os
+import sys
+import json
+import random
+import asyncio
+import logging
+import tempfile
+import unittest
+from datetime import timedelta
+
+import pandas as pd
+
+# Add parent directory to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from agents.pattern_analyzer import PatternAnalyzerAgent
+from agents.pattern_state import PatternState
+from test_pattern_analyzer import make_memories, comparable
+
+
+def in_order(memories):
+    return sorted(memories, key=lambda memory: (memory['timestamp'], memory['id']))
+
+
+def without_times(patterns):
+    rows = []
+    for pattern in patterns:
+        pattern = dict(pattern)
+        del pattern['first_detected'], pattern['last_updated']
+        rows.append(json.dumps(pattern, default=repr))
+    return rows
+
+
+class PatternStateTest(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        asyncio.get_running_loop().set_debug(False)
+        logging.disable(logging.CRITICAL)
+        self.agent = PatternAnalyzerAgent()
+
+    async def asyncTearDown(self):
+        logging.disable(logging.NOTSET)
+
+    async def detectors(self, memories):
+        """Every detector's patterns for the memories, unfiltered, in analysis order"""
+        data = await self.agent._prepare_memory_data_for_analysis(memories)
+        temporal = pd.DataFrame(data['temporal_features'])
+        patterns = []
+        for name in ('_analyze_daily_patterns', '_analyze_weekly_patterns', '_analyze_hourly_patterns'):
+            patterns += await getattr(self.agent, name)(temporal.copy())
+        patterns += await self.agent._analyze_activity_sequences(pd.DataFrame(data['behavioral_features']))
+        patterns += await self.agent._detect_social_patterns(data)
+        patterns += await self.agent._detect_emotional_patterns(data)
+        return patterns
+
+    async def test_batches_match_full_recomputation(self):
+        for seed, count, span_days, batches in ((1, 40, 14, 3), (2, 300, 60, 5), (3, 2000, 400, 8), (4, 3000, 30, 4)):
+            with self.subTest(seed=seed):
+                rng = random.Random(seed)
+                memories = in_order(make_memories(seed, count, span_days))
+                cuts = [0] + sorted(rng.sample(range(1, count), batches - 1)) + [count]
+
+                state = PatternState()
+                for start, end in zip(cuts, cuts[1:]):
+                    # Arrival order within a batch does not matter, nor do repeats of old memories
+                    batch = memories[start:end] + memories[:start][-3:]
+                    rng.shuffle(batch)
+                    incremental = await self.agent.update_user_patterns("u1", batch, state)
+                    state = PatternState.from_dict(json.loads(json.dumps(state.to_dict(), allow_nan=False)))
+
+                    seen = memories[:end]
+                    self.assertEqual(state.memories, len(seen))
+                    self.assertEqual(comparable(self.agent._derive_patterns(state)),
+                                     comparable(await self.detectors(seen)))
+                    self.assertEqual(without_times(incremental),
+                                     without_times(await self.agent._analyze_patterns_from_memories(seen)))
+                self.assertTrue(incremental)
+
+    async def test_select_new_skips_seen_and_undated_memories(self):
+        memories = in_order(make_memories(7, 200, 20))
+        state = PatternState()
+        await self.agent.update_user_patterns("u1", memories[:150], state)
+        before = json.dumps(state.to_dict())
+
+        # Already folded in or without a timestamp: ignored
+        undated = dict(memories[160], id="undated", timestamp=None)
+        self.assertEqual(state.select_new(memories[:150] + [undated]), [])
+        await self.agent.update_user_patterns("u1", memories[100:150] + [undated], state)
+        self.assertEqual(json.dumps(state.to_dict()), before)
+
+        # New but older than the watermark: the state has to be rebuilt
+        late = dict(memories[10], id="late")
+        self.assertEqual(state.select_new([late, late]), [late])
+        self.assertFalse(state.follows_watermark([late]))
+        with self.assertRaises(ValueError):
+            await self.agent.update_user_patterns("u1", [late], state)
+        self.assertNotIn("u1", self.agent.pattern_states)
+        self.assertEqual(json.dumps(state.to_dict()), before)
+
+        # Same timestamp as the watermark, later id: new
+        same_time = dict(memories[149], id=memories[149]['id'] + "z")
+        self.assertEqual(state.select_new([same_time]), [same_time])
+        self.assertTrue(state.follows_watermark([same_time]))
+
+    async def test_empty_state(self):
+        state = PatternState()
+        self.assertEqual(await self.agent.update_user_patterns("u1", [], state), [])
+        self.assertEqual(PatternState.from_dict(state.to_dict()).to_dict(), state.to_dict())
+        self.assertIs(self.agent.pattern_states["u1"], state)
+
+
+class PatternAnalysisJobTest(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        asyncio.get_running_loop().set_debug(False)
+        logging.disable(logging.CRITICAL)
+        try:
+            import background_jobs
+        except ImportError as e:
+            self.skipTest(f"background jobs unavailable: {e}")
+        self.models = background_jobs
+        self.tmp = tempfile.TemporaryDirectory()
+        self.manager = background_jobs.JobManager(f"sqlite:///{os.path.join(self.tmp.name, 'jobs.db')}")
+        self.manager.db_manager.create_tables()
+        self.manager.pattern_analyzer = PatternAnalyzerAgent()
+        self.manager.pattern_ingest_lag = timedelta(0)
+
+    async def asyncTearDown(self):
+        self.manager.db_manager.engine.dispose()
+        self.manager.executor.shutdown()
+        self.tmp.cleanup()
+        logging.disable(logging.NOTSET)
+
+    def harvest(self, memories):
+        with self.manager.db_manager.get_session() as session:
+            for memory in memories:
+                session.add(self.models.HarvestedItem(
+                    id=memory['id'], user_id="u1", content=memory['content'],
+                    source_type=self.models.SourceType.MANUAL_ENTRY, participants=memory['participants'],
+                    sentiment=memory['sentiment'], extra_metadata=memory['metadata'],
+                    created_at=memory['timestamp']
+                ))
+            session.commit()
+
+    async def test_job_folds_in_new_items_only(self):
+        memories = in_order(make_memories(8, 600, 30))
+        reference = PatternAnalyzerAgent()
+
+        self.harvest(memories[:400])
+        result = await self.manager._execute_pattern_analysis_job("job1", "u1", {})
+        self.assertEqual(result['memories_seen'], 400)
+
+        self.harvest(memories[400:])
+        result = await self.manager._execute_pattern_analysis_job("job2", "u1", {})
+        # Only the items ingested since the first run are read
+        self.assertEqual(result['memories_read'], 200)
+        self.assertEqual(result['memories_seen'], 600)
+        self.assertFalse(result['state_rebuilt'])
+
+        expected = await reference._analyze_patterns_from_memories(memories)
+        self.assertEqual(sorted(result['pattern_ids']), sorted(f"u1_{p['id']}" for p in expected))
+        with self.manager.db_manager.get_session() as session:
+            active = session.query(self.models.DetectedPattern).filter_by(user_id="u1", is_active=True).count()
+            record = session.get(self.models.UserPatternState, "u1")
+            self.assertEqual(active, len(expected))
+            self.assertEqual(record.memories_seen, 600)
+            self.assertEqual(record.watermark_id, memories[-1]['id'])
+            self.assertEqual(record.watermark_at, memories[-1]['timestamp'])
+            self.assertIsNotNone(record.ingested_through)
+
+    async def test_job_counts_items_older_than_the_watermark(self):
+        memories = in_order(make_memories(9, 500, 30))
+        reference = PatternAnalyzerAgent()
+
+        self.harvest(memories[:400])
+        await self.manager._execute_pattern_analysis_job("job1", "u1", {})
+
+        # A backfilled memory from before everything already counted
+        late = dict(memories[5], id="backfilled", timestamp=memories[0]['timestamp'] - timedelta(days=3))
+        self.harvest(memories[400:450] + [late])
+        result = await self.manager._execute_pattern_analysis_job("job2", "u1", {})
+        self.assertTrue(result['state_rebuilt'])
+        self.assertEqual(result['memories_seen'], 451)
+
+        seen = in_order(memories[:450] + [late])
+        expected = await reference._analyze_patterns_from_memories(seen)
+        self.assertEqual(sorted(result['pattern_ids']), sorted(f"u1_{p['id']}" for p in expected))
+
+        # The rebuilt state carries on incrementally
+        self.harvest(memories[450:])
+        result = await self.manager._execute_pattern_analysis_job("job3", "u1", {})
+        self.assertFalse(result['state_rebuilt'])
+        self.assertEqual((result['memories_read'], result['memories_seen']), (50, 501))
+        expected = await reference._analyze_patterns_from_memories(in_order(memories + [late]))
+        self.assertEqual(sorted(result['pattern_ids']), sorted(f"u1_{p['id']}" for p in expected))
+
+
+if __name__ == '__main__':
+    unittest.main()
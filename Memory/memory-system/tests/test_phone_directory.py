@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+"""
+Tests for the indexed PhoneDirectory
+Lookups must answer exactly like the original dict-based directory
+"""
+
+import os
+import sys
+import json
+import random
+import tempfile
+import unittest
+
+# Add parent directory to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from phone_directory import PhoneDirectory
+
+NAMES = ["Elena", "Maria", "Ana", "Andrei", "Alexandru", "Ioana", "Mihai", "Mihaela",
+         "Dan", "Daniel", "Dana", "Bogdan", "Cristina", "Cristi", "Radu", "Ela"]
+RELATIONSHIPS = ["wife", "mother", "father", "friend", "colleague", "contact", "Brother"]
+
+
+class ReferenceDirectory:
+    """The original in-memory directory semantics, for comparison"""
+
+    def __init__(self, normalize):
+        self.normalize = normalize
+        self.directory = {}
+
+    def register(self, user, name, phone, relationship):
+        user = self.normalize(user)
+        self.directory.setdefault(user, {'contacts': {}})['contacts'][name.lower()] = {
+            'name': name, 'phone': self.normalize(phone), 'relationship': relationship
+        }
+
+    def update(self, user, name, phone, relationship):
+        contacts = self.directory.get(self.normalize(user), {}).get('contacts', {})
+        if name.lower() in contacts:
+            if phone:
+                contacts[name.lower()]['phone'] = self.normalize(phone)
+            if relationship:
+                contacts[name.lower()]['relationship'] = relationship
+
+    def delete(self, user, name):
+        self.directory.get(self.normalize(user), {}).get('contacts', {}).pop(name.lower(), None)
+
+    def find(self, user, query):
+        query = query.lower()
+        contacts = self.directory.get(self.normalize(user), {}).get('contacts', {})
+        if query in contacts:
+            return contacts[query]['phone']
+        for name, contact in contacts.items():
+            if query in name or name in query:
+                return contact['phone']
+        for contact in contacts.values():
+            if contact['relationship'].lower() == query:
+                return contact['phone']
+        return None
+
+    def by_relationship(self, user, relationship):
+        contacts = self.directory.get(self.normalize(user), {}).get('contacts', {})
+        return [c['name'] for c in contacts.values() if c['relationship'].lower() == relationship.lower()]
+
+    def reverse(self, phone):
+        phone = self.normalize(phone)
+        return [(user, c['name'], c['relationship'])
+                for user, data in self.directory.items()
+                for c in data['contacts'].values() if c['phone'] == phone]
+
+
+class PhoneDirectoryTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.directory = PhoneDirectory(data_dir=self.tmp.name)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_matches_reference_under_random_operations(self):
+        rng = random.Random(11)
+        reference = ReferenceDirectory(self.directory._normalize_phone)
+        users = [f"0744{i:06d}" for i in range(6)]
+        phones = [f"0722{i:06d}" for i in range(25)]
+        # Keep only a few users' name indexes so eviction and reloads are exercised
+        self.directory.max_indexed_users = 2
+
+        for step in range(3000):
+            user = rng.choice(users)
+            name = rng.choice(NAMES)
+            if rng.random() < 0.1:
+                name = name.upper()
+            op = rng.random()
+            if op < 0.35:
+                phone, relationship = rng.choice(phones), rng.choice(RELATIONSHIPS)
+                self.directory.register_contact(user, name, phone, relationship)
+                reference.register(user, name, phone, relationship)
+            elif op < 0.45:
+                phone = rng.choice(phones + [None])
+                relationship = rng.choice(RELATIONSHIPS + [None])
+                self.directory.update_contact(user, name, phone, relationship)
+                reference.update(user, name, phone, relationship)
+            elif op < 0.55:
+                self.directory.delete_contact(user, name)
+                reference.delete(user, name)
+            elif op < 0.8:
+                query = rng.choice([name, name[:rng.randint(1, len(name))], name + "escu",
+                                    rng.choice(RELATIONSHIPS), "x" + name[1:]])
+                self.assertEqual(self.directory.find_phone_by_name(user, query),
+                                 reference.find(user, query), (step, user, query))
+            elif op < 0.9:
+                relationship = rng.choice(RELATIONSHIPS)
+                self.assertEqual(
+                    [c['name'] for c in self.directory.find_contacts_by_relationship(user, relationship)],
+                    reference.by_relationship(user, relationship)
+                )
+            else:
+                phone = rng.choice(phones)
+                self.assertEqual(
+                    [(r['user_phone'], r['contact_name'], r['relationship'])
+                     for r in self.directory.get_reverse_lookup(phone)],
+                    reference.reverse(phone)
+                )
+
+        for user in users:
+            self.assertEqual(
+                [(c['name'], c['phone'], c['relationship']) for c in self.directory.get_all_contacts(user)],
+                [(c['name'], c['phone'], c['relationship'])
+                 for c in reference.directory.get(self.directory._normalize_phone(user), {}).get('contacts', {}).values()]
+            )
+
+    def test_persists_across_instances(self):
+        self.directory.register_contact("0744602272", "Elena", "0744123456", "wife")
+        self.directory.register_contacts("0744602272", [
+            {'name': f"Friend {i}", 'phone': f"07440000{i:02d}", 'relationship': "friend"} for i in range(20)
+        ])
+        self.directory.delete_contact("0744602272", "Friend 3")
+        exported = self.directory.export_directory()['directory']
+
+        reopened = PhoneDirectory(data_dir=self.tmp.name)
+        self.assertEqual(reopened.export_directory()['directory'], exported)
+        self.assertEqual(reopened.find_phone_by_name("+40744602272", "elena"), "+40744123456")
+        self.assertEqual(reopened.get_statistics()['total_contacts'], 20)
+
+    def test_imports_legacy_json_file(self):
+        legacy = {
+            "+40744602272": {
+                "registered_at": "2025-01-01T10:00:00",
+                "contacts": {
+                    "elena": {"name": "Elena", "phone": "+40744123456", "relationship": "wife",
+                              "added_at": "2025-01-01T10:00:00", "last_updated": "2025-01-01T10:00:00"}
+                }
+            }
+        }
+        data_dir = os.path.join(self.tmp.name, "legacy")
+        os.makedirs(data_dir)
+        with open(os.path.join(data_dir, "phone_directory.json"), 'w', encoding='utf-8') as f:
+            json.dump(legacy, f)
+
+        directory = PhoneDirectory(data_dir=data_dir)
+        self.assertEqual(directory.export_directory()['directory'], legacy)
+        self.assertEqual(directory.get_reverse_lookup("0744123456")[0]['contact_name'], "Elena")
+
+    def test_search_contacts_prefix_and_fuzzy(self):
+        for i, name in enumerate(NAMES):
+            self.directory.register_contact("0744602272", name, f"07221000{i:02d}", "friend")
+
+        prefix = self.directory.search_contacts("0744602272", "mih")
+        self.assertEqual([c['name'] for c in prefix], ["Mihai", "Mihaela"])
+
+        misspelled = self.directory.search_contacts("0744602272", "Cristnia", limit=1)
+        self.assertEqual(misspelled[0]['name'], "Cristina")
+
+        self.assertEqual(self.directory.search_contacts("0744602272", "zzzz"), [])
+        self.assertEqual(self.directory.search_contacts("0799999999", "elena"), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Tests for the related file index
+User -> file links and per-entry offsets, kept by MDFileManager writes and
+consistent with a rebuild from the files
+"""
+
+import os
+import sys
+import asyncio
+import logging
+import tempfile
+import threading
+import unittest
+from pathlib import Path
+from unittest import mock
+
+# Add parent directory to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from related_file_index import RelatedFileIndex, scan_entry_offsets
+from md_file_manager import MDFileManager, MemoryTag
+
+SHARED_FILE = """# Contact: Sam
+
+### Recent Interactions
+
+#### e1
+- **Source:** +15550001
+Lunch with Sam
+
+#### e2
+- **Source:** +15550002
+Sam's birthday
+
+---
+"""
+
+
+class RelatedFileIndexTest(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.index = RelatedFileIndex(Path(self.tmp.name) / "related_files.db")
+        self.shared = Path(self.tmp.name) / "sam.md"
+        self.shared.write_text(SHARED_FILE)
+
+    async def asyncTearDown(self):
+        self.tmp.cleanup()
+
+    def test_scan_entry_offsets(self):
+        data = SHARED_FILE.encode()
+        entries = scan_entry_offsets(data)
+        self.assertEqual([entry_id for entry_id, _, _ in entries], ["e1", "e2"])
+        _, offset, length = entries[1]
+        self.assertEqual(data[offset:offset + length].decode(), "#### e2\n- **Source:** +15550002\nSam's birthday\n\n")
+
+    async def test_writes_link_users_and_own_entries(self):
+        await self.index.record_write_async(self.shared, "contact", "+15550001", entry_id="e1")
+        await self.index.record_write_async(self.shared, "contact", "+15550002", entry_id="e2")
+        # Entries still in the section log have no offset yet
+        self.assertEqual(self.index.entry_offsets(str(self.shared)), [])
+
+        self.index.reindex(self.shared, SHARED_FILE)
+        self.assertEqual(await self.index.related_files_async("+15550001"),
+                         [{'path': str(self.shared), 'type': 'contact_sam'}])
+        self.assertEqual(await self.index.related_files_async("+15550009"), [])
+
+        blocks = self.index.read_entries(str(self.shared), "+15550002")
+        self.assertEqual(len(blocks), 1)
+        self.assertIn("Sam's birthday", blocks[0])
+
+        # Owners survive a reindex after an entry is inserted ahead of the others
+        moved = SHARED_FILE.replace("#### e1", "#### e0\nNew note\n\n#### e1")
+        self.index.reindex(self.shared, moved)
+        self.assertEqual([entry for entry, _, _ in self.index.entry_offsets(str(self.shared), "+15550001")], ["e1"])
+
+        self.index.remove_file(self.shared)
+        self.assertTrue(self.index.is_empty())
+        self.assertEqual(self.index.entry_offsets(str(self.shared)), [])
+
+    async def test_async_variants_run_in_a_worker_thread(self):
+        threads = []
+        original = self.index.related_files
+
+        def related_files(user_id):
+            threads.append(threading.get_ident())
+            return original(user_id)
+
+        with mock.patch.object(self.index, "related_files", related_files):
+            await self.index.related_files_async("+15550001")
+        self.assertNotEqual(threads, [threading.get_ident()])
+        self.assertEqual(len(threads), 1)
+
+
+class ManagedIndexTest(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        asyncio.get_running_loop().set_debug(False)
+        logging.disable(logging.CRITICAL)
+        self.tmp = tempfile.TemporaryDirectory()
+        self.manager = MDFileManager(base_dir=self.tmp.name)
+
+    async def asyncTearDown(self):
+        self.tmp.cleanup()
+        logging.disable(logging.NOTSET)
+
+    async def test_index_matches_a_rebuild_from_the_files(self):
+        await self.manager.update_file("+15550001", "Dinner with Sam about the garden project",
+                                       MemoryTag.GENERAL, "+15550001", related_contacts=["Sam"])
+        await self.manager.update_file("+15550002", "Called Sam about the trip",
+                                       MemoryTag.GENERAL, "+15550002", related_contacts=["Sam"])
+
+        related = await self.manager.related_index.related_files_async("+15550001")
+        kinds = {info['type'].split('_', 1)[0] for info in related}
+        self.assertEqual(kinds, {"contact", "relationship", "topic"})
+        self.assertNotIn("+15550002", " ".join(info['path'] for info in related if 'relationship' in info['type']))
+
+        self.manager.flush_all()
+        report = self.manager.related_index.check(self.manager)
+        self.assertTrue(report['consistent'], report)
+
+        fresh = RelatedFileIndex(Path(self.tmp.name) / "rebuilt.db")
+        fresh.rebuild(self.manager)
+        self.assertEqual(fresh.related_files("+15550001"), self.manager.related_index.related_files("+15550001"))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+"""
+Tests for the staged ingestion pipeline
+The pipelined MemoryHarvesterAgent.process_batch must return what the
+sequential path returns, and a slow stage must hold back the intake
+"""
+
+import os
+import sys
+import asyncio
+import logging
+import unittest
+from datetime import datetime, timedelta
+
+# Add parent directory to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from agents.staged_pipeline import StagedPipeline, Stage, Finished
+from agents.memory_harvester import MemoryHarvesterAgent, RawMemoryInput, SourceType
+
+BASE_TIME = datetime(2025, 3, 1, 9, 0)
+
+
+def make_inputs(count: int):
+    inputs = []
+    for i in range(count):
+        when = BASE_TIME + timedelta(minutes=37 * i)
+        kind = i % 5
+        if kind == 0:
+            raw = RawMemoryInput(f"Lunch with Sarah #{i % 40} downtown, see you tomorrow at 5pm!",
+                                 SourceType.CHAT_MESSAGE, {'platform': 'whatsapp'}, when, 'user1')
+        elif kind == 1:
+            raw = RawMemoryInput({'subject': f"Project update {i}", 'body': "Meeting moved to Friday, urgent",
+                                  'from': 'boss@work.com', 'to': ['me@work.com']},
+                                 SourceType.EMAIL, {'platform': 'gmail'}, when, 'user1')
+        elif kind == 2:
+            raw = RawMemoryInput({'title': f"Dentist {i}", 'description': "Checkup", 'location': 'Clinic',
+                                  'start_time': when.isoformat(), 'end_time': (when + timedelta(hours=1)).isoformat()},
+                                 SourceType.CALENDAR_EVENT, {}, when, 'user2')
+        elif kind == 3:
+            raw = RawMemoryInput(f"Remember to buy milk and call mom {i % 7}", SourceType.SMS, {}, when, 'user2')
+        else:
+            # Invalid: no user
+            raw = RawMemoryInput(f"orphan {i}", SourceType.MANUAL_ENTRY, {}, when, None)
+        inputs.append(raw)
+    return inputs
+
+
+def comparable(memory):
+    if memory is None:
+        return None
+    metadata = dict(memory.metadata)
+    metadata['processing'] = {k: v for k, v in metadata['processing'].items() if k != 'processed_at'}
+    return (memory.id, memory.content, memory.participants, memory.tags, memory.quality_score,
+            memory.quality_level, memory.context, metadata, memory.sentiment, memory.location)
+
+
+class HarvesterPipelineTest(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        asyncio.get_running_loop().set_debug(False)
+        logging.disable(logging.CRITICAL)
+
+    async def asyncTearDown(self):
+        logging.disable(logging.NOTSET)
+
+    async def test_batch_matches_sequential_processing(self):
+        inputs = make_inputs(300)
+
+        sequential = MemoryHarvesterAgent(config={'data_dir': None})
+        await sequential.initialize()
+        expected = []
+        for source_inputs in sequential._group_by_source_type(inputs).values():
+            for raw_input in source_inputs:
+                try:
+                    expected.append(await sequential.process_memory(raw_input))
+                except ValueError:
+                    pass
+
+        pipelined = MemoryHarvesterAgent(config={'data_dir': None,
+                                                 'pipeline': {'content': {'workers': 3, 'queue_size': 4},
+                                                              'quality': {'workers': 2}}})
+        await pipelined.initialize()
+        results = await pipelined.process_batch(inputs)
+
+        self.assertEqual([comparable(m) for m in results], [comparable(m) for m in expected])
+        self.assertIn(None, results)  # duplicates
+        self.assertEqual(pipelined.processing_stats['error_count'], 60)
+        self.assertEqual(pipelined.processing_stats['total_processed'],
+                         sequential.processing_stats['total_processed'])
+
+        stats = (await pipelined.get_processing_stats())['pipeline']
+        self.assertEqual(stats['items'], 300)
+        self.assertEqual(stats['stages']['intake']['items'], 300)
+        self.assertEqual(stats['stages']['intake']['failed'], 60)
+        self.assertEqual(stats['stages']['quality']['items'],
+                         sequential.processing_stats['total_processed'])
+
+    async def test_stream_yields_every_new_memory(self):
+        agent = MemoryHarvesterAgent(config={'data_dir': None})
+        await agent.initialize()
+
+        async def source():
+            for raw_input in make_inputs(200):
+                yield raw_input
+
+        memories = [memory async for memory in agent.process_stream(source())]
+        self.assertEqual(len(memories), agent.processing_stats['total_processed'])
+        self.assertEqual(len({m.id for m in memories}), len(memories))
+        self.assertEqual(agent.processing_stats['error_count'], 40)
+
+    async def test_stream_failures_go_through_the_error_stats(self):
+        agent = MemoryHarvesterAgent(config={'data_dir': None})
+        await agent.initialize()
+        failed = []
+
+        async def record(raw_input, error):
+            failed.append(raw_input.user_id)
+        agent._update_error_stats = record
+
+        memories = [memory async for memory in agent.process_stream(make_inputs(20))]
+        self.assertEqual(len(failed), 4)
+        self.assertEqual(failed, [None] * 4)  # the inputs without a user
+        self.assertTrue(memories)
+
+
+class StagedPipelineTest(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        asyncio.get_running_loop().set_debug(False)
+
+    async def test_slow_stage_holds_back_intake(self):
+        fed = 0
+        in_flight = []
+
+        def source():
+            nonlocal fed
+            for i in range(200):
+                fed += 1
+                yield i
+
+        async def fast(value):
+            return value
+
+        async def slow(value):
+            await asyncio.sleep(0.001)
+            if value % 50 == 7:
+                raise RuntimeError("bad item")
+            return value * 2
+
+        async def early(value):
+            return Finished(-1) if value % 10 == 0 else value
+
+        pipeline = StagedPipeline([Stage('a', early, workers=2, queue_size=3),
+                                   Stage('b', fast, workers=1, queue_size=3),
+                                   Stage('c', slow, workers=2, queue_size=3)],
+                                  output_queue_size=3)
+        results = {}
+        async for index, value, error in pipeline.run(source()):
+            in_flight.append(fed - len(results))
+            results[index] = error if error is not None else value
+
+        # Queues (4 x 3) plus one item held by each worker and the feeder
+        self.assertLessEqual(max(in_flight), 4 * 3 + 5 + 1)
+        self.assertEqual(sorted(results), list(range(200)))
+        for i in range(200):
+            if i % 10 == 0:
+                self.assertEqual(results[i], -1)
+            elif i % 50 == 7:
+                self.assertIsInstance(results[i], RuntimeError)
+            else:
+                self.assertEqual(results[i], i * 2)
+
+        stats = pipeline.stats.to_dict()
+        self.assertEqual(stats['stages']['c']['items'], 180)
+        self.assertEqual(stats['stages']['c']['failed'], 4)
+        self.assertGreater(stats['intake_blocked_seconds'], 0)
+        self.assertGreater(stats['stages']['c']['utilisation'], stats['stages']['b']['utilisation'])
+
+    async def test_input_error_is_raised_after_draining(self):
+        def source():
+            yield 1
+            yield 2
+            raise KeyError("broken source")
+
+        async def double(value):
+            return value * 2
+
+        seen = []
+        with self.assertRaises(KeyError):
+            async for index, value, error in StagedPipeline([Stage('only', double, workers=2)]).run(source()):
+                seen.append(value)
+        self.assertEqual(sorted(seen), [2, 4])
+
+    async def test_worker_killed_by_base_exception_does_not_hang_run(self):
+        class Abort(BaseException):
+            pass
+
+        async def fragile(value):
+            if value == 3:
+                raise Abort()
+            return value
+
+        async def fast(value):
+            return value
+
+        for workers in (1, 3):
+            seen = []
+            pipeline = StagedPipeline([Stage('first', fragile, workers=workers, queue_size=2),
+                                       Stage('second', fast, workers=2, queue_size=2)], output_queue_size=2)
+
+            async def consume():
+                async for index, value, error in pipeline.run(range(50)):
+                    seen.append(value)
+
+            with self.assertRaises(Abort):
+                await asyncio.wait_for(consume(), timeout=5)
+            self.assertNotIn(3, seen)
+
+    async def test_source_killed_by_base_exception_does_not_hang_run(self):
+        class Abort(BaseException):
+            pass
+
+        def source():
+            yield 1
+            raise Abort()
+
+        async def double(value):
+            return value * 2
+
+        seen = []
+
+        async def consume():
+            async for index, value, error in StagedPipeline([Stage('only', double, workers=2)]).run(source()):
+                seen.append(value)
+
+        with self.assertRaises(Abort):
+            await asyncio.wait_for(consume(), timeout=5)
+        self.assertEqual(seen, [2])
+
+
+if __name__ == '__main__':
+    unittest.main()
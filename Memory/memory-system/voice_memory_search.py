@@ -34,6 +34,7 @@ from voice_authentication_service import (
     MemoryAccessLevel
 )
 from confidential_manager import ConfidentialManager, SecurityLevel, AccessLevel
+from memory_file_search import MemoryFileSearch, ParsedFileCache
 
 logger = logging.getLogger(__name__)
 
@@ -93,6 +94,15 @@ class VoiceMemorySearch:
         # Active voice sessions cache
         self.active_voice_sessions = {}
         
+        # Concurrent related-file search with parsed-block cache; files are read
+        # with their pending section-log entries, so searches never flush
+        self.file_search = MemoryFileSearch(cache=ParsedFileCache(
+            int(os.getenv('VOICE_SEARCH_CACHE_FILES', 2048)),
+            read_text=self.md_manager.storage.read_text,
+            version=self.md_manager.storage.version
+        ))
+        self.max_results = 20
+        
         logger.info("🔊 Voice Memory Search System initialized")
     
     async def verify_voice_authentication(self, 
@@ -409,166 +419,44 @@ class VoiceMemorySearch:
                                    accessible_tags: List[MemoryTag]) -> List[Dict]:
         """Search through user's memory files"""
         try:
-            results = []
-            
-            # Search in user's main file
-            user_memories = await self.md_manager.search_memories(
-                phone_number=user_id,
-                search_query=query,
-                tags=accessible_tags
+            # Related files (contacts, relationships, topics) are scanned concurrently
+            # while the user's main file is searched
+            related_files = await self._get_related_files(user_id)
+            user_memories, related_results = await asyncio.gather(
+                self.md_manager.search_memories(user_id, query),
+                self.file_search.search(related_files, query, accessible_tags, k=self.max_results)
             )
             
+            results = []
+            accessible_values = {tag.value for tag in accessible_tags}
             if user_memories.get('success') and user_memories.get('memories'):
                 for memory in user_memories['memories']:
+                    tag = memory.get('metadata', {}).get('tag', '#general').lstrip('#')
+                    if tag not in accessible_values:
+                        continue
                     results.append({
                         'content': memory.get('content', ''),
-                        'timestamp': memory.get('timestamp', ''),
-                        'tag': memory.get('tag', 'general'),
+                        'timestamp': memory.get('metadata', {}).get('time', ''),
+                        'tag': tag,
                         'source_file': f"user_{user_id}",
                         'relevance_score': memory.get('relevance_score', 0.5)
                     })
             
-            # Search in related files (contacts, relationships, topics)
-            related_files = await self._get_related_files(user_id)
-            
-            for file_info in related_files:
-                file_results = await self._search_file(
-                    file_path=file_info['path'],
-                    query=query,
-                    accessible_tags=accessible_tags
-                )
-                
-                for result in file_results:
-                    result['source_file'] = file_info['type']
-                    results.append(result)
+            results.extend(related_results)
             
             # Sort by relevance
             results.sort(key=lambda x: x.get('relevance_score', 0), reverse=True)
             
-            return results[:20]  # Return top 20 results
+            return results[:self.max_results]
             
         except Exception as e:
             logger.error(f"Error searching user memories: {e}")
             return []
     
     async def _get_related_files(self, user_id: str) -> List[Dict]:
-        """Get list of related memory files for user"""
-        related_files = []
-        
-        # Get user's contacts
-        contacts_dir = Path(self.md_manager.contacts_dir)
-        if contacts_dir.exists():
-            for contact_file in contacts_dir.glob("*.md"):
-                # Check if contact is related to user
-                content = contact_file.read_text()
-                if user_id in content:
-                    related_files.append({
-                        'path': str(contact_file),
-                        'type': f"contact_{contact_file.stem}"
-                    })
-        
-        # Get user's relationships
-        relationships_dir = Path(self.md_manager.relationships_dir)
-        if relationships_dir.exists():
-            sanitized_user = self.md_manager._sanitize_filename(user_id)
-            for rel_file in relationships_dir.glob(f"{sanitized_user}_*.md"):
-                related_files.append({
-                    'path': str(rel_file),
-                    'type': f"relationship_{rel_file.stem}"
-                })
-        
-        # Get user's topics
-        topics_dir = Path(self.md_manager.topics_dir)
-        if topics_dir.exists():
-            for topic_file in topics_dir.glob("*.md"):
-                content = topic_file.read_text()
-                if user_id in content:
-                    related_files.append({
-                        'path': str(topic_file),
-                        'type': f"topic_{topic_file.stem}"
-                    })
-        
-        return related_files
-    
-    async def _search_file(self, 
-                          file_path: str, 
-                          query: str,
-                          accessible_tags: List[MemoryTag]) -> List[Dict]:
-        """Search within a specific file"""
-        results = []
-        
-        try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                content = f.read()
-            
-            # Parse memories from file
-            memories = self._parse_memories_from_content(content)
-            
-            # Search for query in memories
-            query_lower = query.lower()
-            query_words = set(query_lower.split())
-            
-            for memory in memories:
-                # Check if memory tag is accessible
-                memory_tag_str = memory.get('tag', 'general').lower()
-                try:
-                    memory_tag = MemoryTag(memory_tag_str)
-                    if memory_tag not in accessible_tags:
-                        continue
-                except:
-                    continue
-                
-                # Calculate relevance
-                memory_content = memory.get('content', '').lower()
-                relevance = self._calculate_relevance(query_words, memory_content)
-                
-                if relevance > 0.1:  # Threshold for inclusion
-                    memory['relevance_score'] = relevance
-                    results.append(memory)
-            
-        except Exception as e:
-            logger.error(f"Error searching file {file_path}: {e}")
-        
-        return results
-    
-    def _parse_memories_from_content(self, content: str) -> List[Dict]:
-        """Parse memories from markdown content"""
-        memories = []
-        
-        # Parse memory entries (format: - **[timestamp]** [tag]: content)
-        pattern = r'-\s+\*\*\[([\d\-:\s]+)\]\*\*\s+\[([^\]]+)\]:\s+(.+?)(?=\n-\s+\*\*\[|\n##|\Z)'
-        matches = re.finditer(pattern, content, re.DOTALL)
-        
-        for match in matches:
-            timestamp, tag, memory_content = match.groups()
-            memories.append({
-                'timestamp': timestamp.strip(),
-                'tag': tag.strip(),
-                'content': memory_content.strip()
-            })
-        
-        return memories
-    
-    def _calculate_relevance(self, query_words: set, content: str) -> float:
-        """Calculate relevance score between query and content"""
-        content_words = set(content.lower().split())
-        
-        # Calculate word overlap
-        overlap = query_words.intersection(content_words)
-        
-        if not query_words:
-            return 0.0
-        
-        # Basic relevance: percentage of query words found
-        relevance = len(overlap) / len(query_words)
-        
-        # Boost for exact phrase match
-        query_phrase = ' '.join(query_words)
-        if query_phrase in content.lower():
-            relevance += 0.5
-        
-        # Normalize to 0-1 range
-        return min(relevance, 1.0)
+        """Get list of related memory files for user (contacts, relationships, topics)"""
+        # Maintained by MDFileManager on every write; see related_file_index.py
+        return await self.md_manager.related_index.related_files_async(user_id)
     
     def _calculate_confidence(self, search_results: List[Dict]) -> float:
         """Calculate confidence score for search results"""
@@ -393,7 +393,7 @@ class WhatsAppCloudAPI:
                     
                     if audio_data:
                         # Transcribe the audio
-                        success, transcribed_text = voice_transcriber.transcribe_audio(audio_data, 'ogg')
+                        success, transcribed_text = await voice_transcriber.transcribe_audio_async(audio_data, 'ogg')
                         
                         if success and transcribed_text:
                             logger.info(f"🎤 Transcribed: {transcribed_text}")
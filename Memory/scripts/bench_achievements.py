@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Achievement Benchmark
+Grows the achievement catalogue and compares the previous evaluation (every
+locked achievement checked against the player's stats on each event) with the
+achievement engine, which only evaluates the rules on counters the event
+touched: cost per event, and the unlocks both produce
+"""
+
+import os
+import sys
+import time
+import random
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'memory-system'))
+
+from achievement_engine import AchievementEngine, AchievementRule
+
+EVENTS_PER_COUNTER = 4
+
+
+def catalogue(size, rng):
+    """Tiered rules spread over counters; each counter is fed by a few event types"""
+    counters = max(1, size // 50)
+    return [AchievementRule(id=f"a{n}", counter=f"c{n % counters}", target=rng.randrange(1, 1000),
+                            events=tuple(f"e{n % counters}_{k}" for k in range(EVENTS_PER_COUNTER)))
+            for n in range(size)]
+
+
+def previous(rules, traffic):
+    """Scan the whole catalogue on every event, as the managers did"""
+    counters, unlocked = {}, {}
+    start = time.perf_counter()
+    for user_id, event in traffic:
+        values = counters.setdefault(user_id, {})
+        done = unlocked.setdefault(user_id, set())
+        # One increment per counter, whatever the number of rules on it
+        for counter in {rule.counter for rule in rules if event in rule.events}:
+            values[counter] = values.get(counter, 0) + 1
+        for rule in rules:
+            if rule.id not in done and rule.counter in values and rule.satisfied_by(values[rule.counter]):
+                done.add(rule.id)
+    elapsed = time.perf_counter() - start
+    return elapsed / len(traffic) * 1e6, sum(len(done) for done in unlocked.values())
+
+
+def incremental(rules, traffic):
+    engine = AchievementEngine(rules)
+    start = time.perf_counter()
+    for user_id, event in traffic:
+        engine.record(user_id, event)
+    engine.drain_unlocks()
+    elapsed = time.perf_counter() - start
+    return elapsed / len(traffic) * 1e6, sum(engine.unlock_counts.values())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 1000, 10000, 100000])
+    parser.add_argument("--events", type=int, default=20000)
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--scan-budget", type=int, default=20_000_000,
+                        help="skip the previous scan when events x rules exceeds this")
+    args = parser.parse_args()
+
+    print(f"{args.events} events, {args.users} users")
+    print(f"  {'rules':>8}{'previous us/event':>20}{'engine us/event':>18}{'unlocks':>10}")
+    for size in args.sizes:
+        rng = random.Random(size)
+        rules = catalogue(size, rng)
+        # Events land on a small hot set of counters, like real activity
+        counters = max(1, size // 50)
+        traffic = [(f"user_{rng.randrange(args.users)}",
+                    f"e{min(int(rng.expovariate(0.5)), counters - 1)}_{rng.randrange(EVENTS_PER_COUNTER)}")
+                   for _ in range(args.events)]
+
+        engine_us, engine_unlocks = incremental(rules, traffic)
+        if args.events * size <= args.scan_budget:
+            scan_traffic = traffic
+        else:
+            scan_traffic = traffic[:max(1, args.scan_budget // size)]
+        scan_us, scan_unlocks = previous(rules, scan_traffic)
+        if scan_traffic is traffic:
+            assert scan_unlocks == engine_unlocks, (scan_unlocks, engine_unlocks)
+        print(f"  {size:8}{scan_us:20.1f}{engine_us:18.1f}{engine_unlocks:10}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+Batch Classification Throughput Benchmark
+Imports a synthetic chat history through batch_classify_messages against a local
+mock completion endpoint that rate-limits excess concurrency with HTTP 429
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import asyncio
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'memory-system'))
+
+CLASSIFICATION = {
+    "primary_tag": "general",
+    "confidence": "medium",
+    "reasoning": "Mock model",
+    "importance_score": 0.5,
+    "sentiment": "neutral"
+}
+
+
+def make_handler(latency_ms: float, per_message_ms: float, concurrency_limit: int):
+    """Mock chat completions endpoint with a concurrency-based rate limit"""
+    state = {"in_flight": 0, "requests": 0, "rejected": 0}
+    lock = threading.Lock()
+
+    class MockCompletionHandler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def _reply(self, status: int, body: dict):
+            payload = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+            prompt = body["messages"][-1]["content"]
+
+            with lock:
+                state["requests"] += 1
+                if state["in_flight"] >= concurrency_limit:
+                    state["rejected"] += 1
+                    self._reply(429, {"error": {"message": "Rate limit reached", "type": "rate_limit"}})
+                    return
+                state["in_flight"] += 1
+
+            try:
+                indexes = [int(i) for i in re.findall(r'"index": (\d+)', prompt.split("Respond with")[0])]
+                if indexes:
+                    content = {"results": [{"index": i, "classification": CLASSIFICATION} for i in indexes]}
+                else:
+                    content = {"classification": CLASSIFICATION}
+                time.sleep((latency_ms + per_message_ms * max(1, len(indexes))) / 1000)
+            finally:
+                with lock:
+                    state["in_flight"] -= 1
+
+            self._reply(200, {
+                "id": "chatcmpl-mock",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": body.get("model", "mock"),
+                "choices": [{
+                    "index": 0,
+                    "finish_reason": "stop",
+                    "message": {"role": "assistant", "content": json.dumps(content)}
+                }],
+                "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}
+            })
+
+    return MockCompletionHandler, state
+
+
+def unbudgeted_call(classifier):
+    """_call_openai as it was before RequestBudget: straight to the client"""
+    async def call(prompt: str, max_tokens: int = 150, json_mode: bool = False) -> str:
+        extra_args = {'response_format': {"type": "json_object"}} if json_mode else {}
+        try:
+            response = await asyncio.to_thread(
+                classifier.openai_client.chat.completions.create,
+                model=classifier.model,
+                messages=[{"role": "user", "content": prompt}],
+                max_completion_tokens=max_tokens,
+                temperature=0.3,
+                **extra_args
+            )
+        except Exception:
+            return classifier._get_fallback_response(prompt)
+        return (response.choices[0].message.content or '').strip()
+    return call
+
+
+async def run(messages: int, latency_ms: float, per_message_ms: float, limit: int, batch_size: int):
+    handler, state = make_handler(latency_ms, per_message_ms, limit)
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    os.environ["OPENAI_BASE_URL"] = f"http://127.0.0.1:{server.server_port}/v1"
+    os.environ.setdefault("OPENAI_API_KEY", "sk-mock")
+
+    from conversation_classifier import (ConversationClassifier, ConversationContext, RequestBudget,
+                                         FALLBACK_REASONING)
+
+    context = ConversationContext(user_phone="+15550000000", conversation_history=[])
+    history = [(f"Chatted with Sam about the garden, message {i}", context) for i in range(messages)]
+
+    print(f"{messages} messages, mock latency {latency_ms:.0f}ms + {per_message_ms:.0f}ms/message, "
+          f"provider concurrency limit {limit}")
+
+    # Previous behaviour: classify_message per message, all fired at once,
+    # each calling the client directly with no budget and no batch retries
+    unbounded = ConversationClassifier(pipeline_mode="combined")
+    unbounded._call_openai = unbudgeted_call(unbounded)
+    state.update(requests=0, rejected=0)
+    start = time.perf_counter()
+    results = await asyncio.gather(*(unbounded.classify_message(message, ctx) for message, ctx in history))
+    elapsed = time.perf_counter() - start
+    failed = sum(1 for r in results if r.reasoning.startswith(FALLBACK_REASONING))
+    print(f"Unbounded per-message: {messages / elapsed:8.1f} msg/s, {state['requests']} requests, "
+          f"{state['rejected']} rate-limited, {failed} defaulted")
+
+    # Micro-batched under the in-flight budget
+    batched = ConversationClassifier(pipeline_mode="combined")
+    batched.request_budget = RequestBudget(max_requests=limit, max_tokens=10 ** 9)
+    state.update(requests=0, rejected=0)
+    start = time.perf_counter()
+    results = await batched.batch_classify_messages(history, batch_size=batch_size)
+    elapsed = time.perf_counter() - start
+    failed = sum(1 for r in results if r.reasoning.startswith("Batch processing failed"))
+    print(f"Micro-batched (x{batch_size}): {messages / elapsed:8.1f} msg/s, {state['requests']} requests, "
+          f"{state['rejected']} rate-limited, {failed} defaulted")
+
+    server.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--messages", type=int, default=2000)
+    parser.add_argument("--latency-ms", type=float, default=100)
+    parser.add_argument("--per-message-ms", type=float, default=5)
+    parser.add_argument("--limit", type=int, default=8)
+    parser.add_argument("--batch-size", type=int, default=20)
+    args = parser.parse_args()
+    asyncio.run(run(args.messages, args.latency_ms, args.per_message_ms, args.limit, args.batch_size))
+
+
+if __name__ == "__main__":
+    main()
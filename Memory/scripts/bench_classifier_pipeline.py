@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""
+Conversation Classifier Pipeline Benchmark
+Runs ConversationClassifier against a local fake completion server with injected
+latency and reports per-message p50/p99 for each pipeline mode
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'memory-system'))
+
+COMBINED_RESPONSE = {
+    "classification": {
+        "primary_tag": "general",
+        "confidence": "medium",
+        "reasoning": "Fake model",
+        "importance_score": 0.5,
+        "sentiment": "neutral"
+    },
+    "entities": {"people": ["Alex"], "action_items": []},
+    "contacts": {"speaker": None, "mentioned_contacts": ["Alex"], "new_contacts": [],
+                 "relationship_context": ""},
+    "topics": {"main_topics": ["plans"], "subtopics": [], "topic_relationships": [],
+               "topic_importance": {}, "new_topics": []}
+}
+
+STAGE_RESPONSES = {
+    "Analyze the following message and classify": COMBINED_RESPONSE["classification"],
+    "Extract relevant entities": COMBINED_RESPONSE["entities"],
+    "Identify and extract contact information": COMBINED_RESPONSE["contacts"],
+    "Analyze the topics and themes": COMBINED_RESPONSE["topics"],
+}
+
+
+def make_handler(latency_ms: float, jitter_ms: float):
+    """Build a request handler that answers chat completions after a delay"""
+
+    class FakeCompletionHandler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+            prompt = body["messages"][-1]["content"]
+
+            content = COMBINED_RESPONSE
+            for marker, response in STAGE_RESPONSES.items():
+                if marker in prompt:
+                    content = response
+                    break
+
+            time.sleep(max(0.0, random.gauss(latency_ms, jitter_ms)) / 1000)
+            payload = json.dumps({
+                "id": "chatcmpl-fake",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": body.get("model", "fake"),
+                "choices": [{
+                    "index": 0,
+                    "finish_reason": "stop",
+                    "message": {"role": "assistant", "content": json.dumps(content)}
+                }],
+                "usage": {"prompt_tokens": 100, "completion_tokens": 50, "total_tokens": 150}
+            }).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+    return FakeCompletionHandler
+
+
+def start_server(latency_ms: float, jitter_ms: float) -> ThreadingHTTPServer:
+    """Start the fake completion server on a free local port"""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), make_handler(latency_ms, jitter_ms))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+async def run(messages: int, latency_ms: float, jitter_ms: float):
+    server = start_server(latency_ms, jitter_ms)
+    os.environ["OPENAI_BASE_URL"] = f"http://127.0.0.1:{server.server_port}/v1"
+    os.environ.setdefault("OPENAI_API_KEY", "sk-fake")
+
+    from conversation_classifier import ConversationClassifier, ConversationContext
+
+    context = ConversationContext(
+        user_phone="+15550000000",
+        conversation_history=[],
+        known_contacts=["Alex"],
+        recent_topics=["plans"]
+    )
+    # Mix of messages that need the model and ones the rules settle alone
+    corpus = [
+        f"Alex said the new cafe downtown is worth a try #{i}" if i % 4 else
+        f"My password for the router is hunter{i}"
+        for i in range(messages)
+    ]
+
+    async def legacy(classifier, message):
+        """Previous behaviour: four model stages awaited in series"""
+        await classifier._classify_primary_tag(message, context)
+        await classifier._extract_entities(message, context)
+        await classifier._identify_contacts(message, context)
+        await classifier._analyze_topics(message, context)
+
+    print(f"Fake model latency {latency_ms:.0f}±{jitter_ms:.0f}ms, {messages} messages")
+    for mode in ("sequential", "concurrent", "combined"):
+        classifier = ConversationClassifier(pipeline_mode=None if mode == "sequential" else mode)
+        latencies = []
+        for message in corpus:
+            start = time.perf_counter()
+            if mode == "sequential":
+                await legacy(classifier, message)
+            else:
+                await classifier.classify_message(message, context)
+            latencies.append((time.perf_counter() - start) * 1000)
+        print(f"{mode:>10}: p50 {percentile(latencies, 0.5):7.1f}ms  "
+              f"p99 {percentile(latencies, 0.99):7.1f}ms")
+
+    server.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--messages", type=int, default=100)
+    parser.add_argument("--latency-ms", type=float, default=150)
+    parser.add_argument("--jitter-ms", type=float, default=40)
+    args = parser.parse_args()
+    asyncio.run(run(args.messages, args.latency_ms, args.jitter_ms))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+"""
+Duplicate Detector Benchmark
+Streams a synthetic corpus of memories with exact repeats, reformatted
+repeats, light edits and unrelated texts through the duplicate index and
+reports precision/recall against exhaustive shingle comparison at several
+thresholds, next to the previous exact-hash check; then fills a file-backed
+index and measures lookup latency and reopen time
+"""
+
+import os
+import sys
+import time
+import random
+import hashlib
+import argparse
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'memory-system'))
+
+from agents.duplicate_index import DuplicateIndex, shingle_hashes
+
+WORDS = ("had lunch dinner meeting with sarah alex mom dad the office park gym coffee tomorrow friday "
+         "project doctor birthday flight hotel garden movie concert budget report school pickup call "
+         "remember to buy milk bread tickets for trip weekend at 5pm 9am monday plan review").split()
+
+
+def make_corpus(rng: random.Random, users: int, per_user: int):
+    """[(user, text)] in arrival order"""
+    corpus = []
+    for u in range(users):
+        user = f"user{u}"
+        seen = []
+        for _ in range(per_user):
+            roll = rng.random()
+            if seen and roll < 0.10:
+                text = rng.choice(seen)
+            elif seen and roll < 0.20:
+                text = rng.choice(seen)
+                text = rng.choice([text.upper(), text.replace(' ', '  ') + '!', f"  {text.capitalize()}."])
+            elif seen and roll < 0.35:
+                words = rng.choice(seen).split()
+                words[rng.randrange(len(words))] = rng.choice(WORDS)
+                text = ' '.join(words)
+            elif seen and roll < 0.45:
+                words = rng.choice(seen).split()
+                for _ in range(len(words) // 2):
+                    words[rng.randrange(len(words))] = rng.choice(WORDS)
+                text = ' '.join(words)
+            else:
+                text = ' '.join(rng.choice(WORDS) for _ in range(rng.randint(8, 30)))
+            seen.append(text)
+            corpus.append((user, text))
+    rng.shuffle(corpus)
+    return corpus
+
+
+def ground_truth(corpus, threshold: float):
+    """Whether each text is at least `threshold` Jaccard-similar to an earlier kept text of its user"""
+    kept = {}
+    truth = []
+    for user, text in corpus:
+        shingles = shingle_hashes(text)
+        best = max((len(shingles & other) / len(shingles | other) for other in kept.get(user, ())), default=0.0)
+        truth.append(best >= threshold)
+        if best < threshold:
+            kept.setdefault(user, []).append(shingles)
+    return truth
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def bench_quality(args):
+    corpus = make_corpus(random.Random(1), args.users, args.per_user)
+    print(f"corpus: {len(corpus)} texts, {args.users} users")
+    print(f"  {'method':<16}{'precision':>10}{'recall':>9}{'p50 us':>9}{'p99 us':>9}{'stored':>9}")
+
+    thresholds = [float(t) for t in args.thresholds.split(',')]
+    truth_at = {threshold: ground_truth(corpus, threshold) for threshold in thresholds}
+
+    # Previous behaviour: sha256 of the content, one global set
+    hashes = set()
+    flagged = []
+    for user, text in corpus:
+        digest = hashlib.sha256(text.encode()).hexdigest()
+        flagged.append(digest in hashes)
+        hashes.add(digest)
+    report("exact sha256", flagged, truth_at[thresholds[0]], [], len(hashes))
+
+    for threshold in thresholds:
+        index = DuplicateIndex(None, threshold=threshold)
+        flagged, latencies = [], []
+        for user, text in corpus:
+            start = time.perf_counter()
+            flagged.append(index.check(user, text) is not None)
+            latencies.append((time.perf_counter() - start) * 1e6)
+        report(f"lsh t={threshold}", flagged, truth_at[threshold], latencies, len(index))
+
+
+def report(label, flagged, truth, latencies, stored):
+    true_positives = sum(f and t for f, t in zip(flagged, truth))
+    precision = true_positives / max(1, sum(flagged))
+    recall = true_positives / max(1, sum(truth))
+    p50 = f"{percentile(latencies, 0.5):9.0f}" if latencies else f"{'-':>9}"
+    p99 = f"{percentile(latencies, 0.99):9.0f}" if latencies else f"{'-':>9}"
+    print(f"  {label:<16}{precision:>10.3f}{recall:>9.3f}{p50}{p99}{stored:>9}")
+
+
+def bench_scale(args, tmp: str):
+    rng = random.Random(2)
+    path = Path(tmp) / "content_signatures.idx"
+    index = DuplicateIndex(path)
+    start = time.perf_counter()
+    for i in range(args.records):
+        index.check(f"user{rng.randrange(args.scale_users)}",
+                    ' '.join(rng.choice(WORDS) for _ in range(rng.randint(8, 30))) + f" {i}")
+    fill = time.perf_counter() - start
+    index.close()
+    print(f"file-backed: {args.records} records for {args.scale_users} users in {fill:.1f}s "
+          f"({args.records / fill:,.0f}/s), {path.stat().st_size / 2 ** 20:.0f} MB")
+
+    start = time.perf_counter()
+    index = DuplicateIndex(path)
+    print(f"  reopen (scan store, rebuild Bloom filter)  {(time.perf_counter() - start) * 1000:8.1f} ms")
+
+    users = [f"user{rng.randrange(args.scale_users)}" for _ in range(args.ops)]
+    texts = [' '.join(rng.choice(WORDS) for _ in range(20)) for _ in range(args.ops)]
+    for label in ("cold user index", "warm user index"):
+        latencies = []
+        for user, text in zip(users, texts):
+            start = time.perf_counter()
+            index.check(user, text, add=False)
+            latencies.append((time.perf_counter() - start) * 1e6)
+        print(f"  check, {label:<16} p50 {percentile(latencies, 0.5):8.0f} us   p99 {percentile(latencies, 0.99):8.0f} us")
+    print(f"  Bloom negatives skipped the exact lookup for {index.stats['bloom_negative']} of {2 * args.ops} checks")
+    index.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--per-user", type=int, default=200)
+    parser.add_argument("--thresholds", default="0.7,0.8,0.85,0.9")
+    parser.add_argument("--records", type=int, default=200000)
+    parser.add_argument("--scale-users", type=int, default=2000)
+    parser.add_argument("--ops", type=int, default=2000)
+    parser.add_argument("--dir", help="Directory for the index file (default: a temporary one)")
+    args = parser.parse_args()
+
+    bench_quality(args)
+    with tempfile.TemporaryDirectory(dir=args.dir) as tmp:
+        bench_scale(args, tmp)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Game State Benchmark
+Simulates weeks of gaming traffic and compares the previous unbounded lists
+(every completed session and notification kept in memory, notifications
+found by scanning) with the game state store: Python heap in use as the
+days go by, and the cost of per-user notification and history queries
+"""
+
+import os
+import sys
+import time
+import random
+import argparse
+import tempfile
+import tracemalloc
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'memory-system'))
+
+from game_state_store import GameStateStore
+from memory_gaming_service import GameSession, GameStatus, GameType
+
+
+def play(rng, number, players, now):
+    a, b = rng.sample(players, 2)
+    session = GameSession(id=f"game_{number}", game_type=GameType.MEMORY_MATCH, creator_id=a, players=[a, b],
+                          status=GameStatus.COMPLETED, created_at=now - timedelta(minutes=10),
+                          started_at=now - timedelta(minutes=9), ended_at=now,
+                          scores={a: rng.randrange(200), b: rng.randrange(200)},
+                          game_data={'cards': [f"memory card {n}" for n in range(16)], 'matched': []})
+    session.moves = [{'player': a, 'move': {'card': n}, 'result': {'points': 10}, 'timestamp': now}
+                     for n in range(10)]
+    session.winner_id = max(session.scores, key=session.scores.get)
+    notification = {'id': f"notif_{number}", 'user_ids': [a, b], 'title': "🏁 Game Ended!",
+                    'data': {'session_id': session.id, 'scores': session.scores}, 'delivered': False}
+    return session, notification
+
+
+def previous_notifications(queue, user_id):
+    found = []
+    for notification in queue:
+        if user_id in notification['user_ids'] and not notification['delivered']:
+            found.append(notification)
+            notification['delivered'] = True
+    return found
+
+
+def timed(operation, users):
+    start = time.perf_counter()
+    for user_id in users:
+        operation(user_id)
+    return (time.perf_counter() - start) / len(users) * 1e6
+
+
+def run(label, days, games_per_day, players, store_dir=None):
+    rng = random.Random(7)
+    completed, queue = [], []
+    store = GameStateStore(store_dir, max_recent_sessions=games_per_day * 2) if store_dir else None
+    start = datetime(2025, 1, 1)
+    rows = []
+    tracemalloc.start()
+    for day in range(days):
+        for n in range(games_per_day):
+            now = start + timedelta(days=day, seconds=n * 86400 // games_per_day)
+            session, notification = play(rng, day * games_per_day + n, players, now)
+            if store:
+                store.add_session(session)
+                store.complete_session(session)
+                store.add_notification(notification, now)
+                store.maintain(lambda session: None, now=now)
+            else:
+                completed.append(session)
+                queue.append(notification)
+
+        if (day + 1) % max(1, days // 6) == 0 or day + 1 == days:
+            users = rng.sample(players, 50)
+            if store:
+                notifications = timed(store.take_notifications, users)
+                history = timed(lambda user_id: store.recent_user_sessions(user_id)[:20], users)
+            else:
+                notifications = timed(lambda user_id: previous_notifications(queue, user_id), users)
+                history = timed(lambda user_id: sorted((s for s in completed if user_id in s.players),
+                                                       key=lambda s: s.ended_at, reverse=True)[:20], users)
+            rows.append((day + 1, tracemalloc.get_traced_memory()[0] / 1e6, notifications, history))
+    tracemalloc.stop()
+
+    print(f"{label}:")
+    print(f"  {'day':>5}{'heap MB':>10}{'notifications us':>18}{'history us':>12}")
+    for day, heap, notifications, history in rows:
+        print(f"  {day:5}{heap:10.1f}{notifications:18.1f}{history:12.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--days", type=int, default=60)
+    parser.add_argument("--games-per-day", type=int, default=2000)
+    parser.add_argument("--players", type=int, default=5000)
+    args = parser.parse_args()
+
+    players = [f"user_{n}" for n in range(args.players)]
+    print(f"{args.days} days, {args.games_per_day} games/day, {args.players} players")
+    run("previous: unbounded lists", args.days, args.games_per_day, players)
+    with tempfile.TemporaryDirectory() as directory:
+        run("game state store", args.days, args.games_per_day, players, directory)
+        size = sum(os.path.getsize(os.path.join(directory, name)) for name in os.listdir(directory))
+        print(f"  archive on disk: {len(os.listdir(directory))} segments, {size / 1e6:.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
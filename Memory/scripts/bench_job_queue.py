@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Job Queue Benchmark
+Measures leasing throughput of the durable job queue with no-op jobs, then
+runs a mixed nightly workload (long backups, harvests, pattern analyses)
+once one job at a time in arrival order, as the old in-process queue did, and
+once on the worker pool with the job manager's priorities and per-type
+limits, reporting per-type throughput and queue wait
+"""
+
+import os
+import sys
+import time
+import random
+import asyncio
+import logging
+import argparse
+import tempfile
+import statistics
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'memory-system'))
+
+from database.models import DatabaseManager, Job, JobType
+from job_queue import JobQueue, JobWorkerPool
+from background_jobs import JOB_CONCURRENCY_LIMITS, JOB_PRIORITIES
+
+# Seconds each job type takes in the mixed workload, and how many are queued
+WORKLOAD = {
+    JobType.BACKUP: (2.0, 2),
+    JobType.PATTERN_ANALYSIS: (0.2, 40),
+    JobType.INSIGHT_GENERATION: (0.1, 40),
+    JobType.HARVEST: (0.02, 400),
+}
+
+
+def fresh_queue(directory, name, **kwargs):
+    db = DatabaseManager(f"sqlite:///{os.path.join(directory, name)}")
+    db.create_tables()
+    return JobQueue(db, **kwargs)
+
+
+async def drain(queue, handler, workers, total):
+    pool = JobWorkerPool(queue, handler, workers=workers, poll_interval=0.05)
+    start = time.perf_counter()
+    task = asyncio.create_task(pool.run())
+    while pool.stats['completed'] < total:
+        await asyncio.sleep(0.01)
+    elapsed = time.perf_counter() - start
+    pool.stop()
+    await task
+    return elapsed
+
+
+async def throughput(directory, jobs, workers):
+    queue = fresh_queue(directory, f"throughput_{workers}.db")
+    queue.enqueue_many({'job_type': JobType.HARVEST, 'priority': random.randrange(10)} for _ in range(jobs))
+
+    async def noop(job):
+        return None
+
+    return jobs / await drain(queue, noop, workers, jobs)
+
+
+async def mixed(directory, label, workers, limits, priorities):
+    queue = fresh_queue(directory, f"mixed_{workers}.db", concurrency_limits=limits)
+    specs = [{'job_type': job_type, 'priority': priorities.get(job_type, 0)}
+             for job_type, (_, count) in WORKLOAD.items() for _ in range(count)]
+    random.Random(1).shuffle(specs)
+    specs.sort(key=lambda spec: spec['job_type'] != JobType.BACKUP)  # Backups queued first, as at 1 AM
+    queue.enqueue_many(specs)
+
+    async def work(job):
+        await asyncio.sleep(WORKLOAD[job.job_type][0])
+
+    elapsed = await drain(queue, work, workers, len(specs))
+    with queue.db_manager.get_session() as session:
+        rows = session.query(Job.job_type, Job.created_at, Job.started_at, Job.completed_at).all()
+
+    print(f"  {label}: {len(specs)} jobs in {elapsed:.1f}s")
+    print(f"    {'type':<20}{'jobs':>6}{'jobs/s':>9}{'wait p50 s':>12}{'wait p95 s':>12}{'done by s':>11}")
+    for job_type in WORKLOAD:
+        typed = [row for row in rows if row.job_type == job_type]
+        waits = sorted((row.started_at - row.created_at).total_seconds() for row in typed)
+        last = max((row.completed_at - row.created_at).total_seconds() for row in typed)
+        p95 = waits[min(len(waits) - 1, int(len(waits) * 0.95))]
+        print(f"    {job_type.value:<20}{len(typed):>6}{len(typed) / last:9.1f}"
+              f"{statistics.median(waits):12.2f}{p95:12.2f}{last:11.1f}")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--jobs", type=int, default=5000, help="No-op jobs per throughput run")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 4, 16, 64])
+    parser.add_argument("--mixed-workers", type=int, default=8)
+    args = parser.parse_args()
+    logging.disable(logging.CRITICAL)
+
+    with tempfile.TemporaryDirectory() as directory:
+        print("no-op throughput (lease + complete, SQLite):")
+        for workers in args.workers:
+            print(f"  {workers:>3} workers: {await throughput(directory, args.jobs, workers):8.0f} jobs/s")
+
+        print("mixed workload:")
+        await mixed(directory, "one at a time, FIFO", 1, {}, {})
+        await mixed(directory, f"pool of {args.mixed_workers}, limits + priorities",
+                    args.mixed_workers, JOB_CONCURRENCY_LIMITS, JOB_PRIORITIES)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
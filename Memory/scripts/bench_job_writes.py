@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Job Writes Benchmark
+Runs a harvest job over the same items on SQLite: without storing anything
+(the harvester's own cost), with the previous write pattern (a session and
+commit per item plus a committed progress tick) and through the job unit of
+work at several batch sizes, reporting wall time, write overhead and commits
+"""
+
+import os
+import sys
+import time
+import asyncio
+import logging
+import argparse
+import tempfile
+from datetime import datetime, timedelta
+
+from sqlalchemy import event
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'memory-system'))
+
+from background_jobs import JobManager, HarvestSourceType
+from database.models import HarvestedItem, Job, JobType, SourceType
+from agents import MemoryHarvesterAgent, RawMemoryInput, ContentType
+
+
+def raw_input(raw_item, user_id):
+    return RawMemoryInput(
+        content=raw_item['content'],
+        source_type=HarvestSourceType[raw_item['source'].upper()],
+        source_metadata={'user_id': user_id},
+        timestamp=datetime.fromisoformat(raw_item['timestamp']),
+        user_id=user_id,
+        content_type=ContentType.TEXT
+    )
+
+
+async def harvest_only(manager, job_id, user_id, items):
+    """Processing without storing, the part of the job writes cannot speed up"""
+    for raw_item in items:
+        await manager.memory_harvester.process_memory(raw_input(raw_item, user_id))
+    return {'items_harvested': 0}
+
+
+async def previous_progress(manager, job_id, progress):
+    """The job progress update the harvest loop committed after every item"""
+    with manager.db_manager.get_session() as session:
+        job = session.query(Job).filter_by(id=job_id).first()
+        if job:
+            job.progress = min(100, max(0, progress))
+            job.updated_at = datetime.utcnow()
+            session.commit()
+
+
+async def previous_harvest(manager, job_id, user_id, items):
+    """The harvest executor's loop before the unit of work"""
+    harvested_items = []
+    for index, raw_item in enumerate(items):
+        processed = await manager.memory_harvester.process_memory(raw_input(raw_item, user_id))
+        if processed:
+            with manager.db_manager.get_session() as session:
+                item = HarvestedItem(
+                    user_id=user_id,
+                    content=processed.content,
+                    source_type=SourceType[raw_item['source'].upper()],
+                    quality_score=processed.quality_score,
+                    extra_metadata=processed.metadata,
+                    tags=processed.tags,
+                    created_at=processed.timestamp
+                )
+                session.add(item)
+                session.commit()
+                harvested_items.append(item.id)
+        await previous_progress(manager, job_id, (index + 1) * 100 // len(items))
+    return {'items_harvested': len(harvested_items)}
+
+
+async def run(directory, name, items, harvest):
+    manager = JobManager(f"sqlite:///{os.path.join(directory, name + '.db')}")
+    manager.db_manager.create_tables()
+    manager.memory_harvester = MemoryHarvesterAgent(config={'data_dir': os.path.join(directory, name)})
+    await manager.memory_harvester.initialize()
+    job_id = manager.job_queue.enqueue(JobType.HARVEST, "u1")
+
+    commits = []
+    event.listen(manager.db_manager.engine, 'commit', lambda connection: commits.append(1))
+    start = time.perf_counter()
+    result = await harvest(manager, job_id, "u1", items)
+    elapsed = time.perf_counter() - start
+    manager.db_manager.engine.dispose()
+    manager.executor.shutdown()
+    return elapsed, len(commits), result['items_harvested']
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--items", type=int, default=2000)
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[50, 500, 2000])
+    args = parser.parse_args()
+    logging.disable(logging.CRITICAL)
+
+    start = datetime(2025, 3, 1)
+    items = [{'source': 'chat_message', 'content': f"Note {n}: caught up with Sarah about project {n * 7919}",
+              'timestamp': (start + timedelta(minutes=n)).isoformat()} for n in range(args.items)]
+
+    with tempfile.TemporaryDirectory() as directory:
+        print(f"harvest job, {args.items} items, SQLite:")
+        print(f"  {'writes':<28}{'wall s':>8}{'writes s':>10}{'commits':>9}{'items/s':>9}{'stored':>8}")
+        baseline, commits, stored = await run(directory, "none", items, harvest_only)
+        print(f"  {'none (harvester only)':<28}{baseline:8.2f}{0:10.2f}{commits:9}{args.items / baseline:9.0f}{stored:8}")
+        elapsed, commits, stored = await run(directory, "previous", items, previous_harvest)
+        print(f"  {'commit per item + progress':<28}{elapsed:8.2f}{elapsed - baseline:10.2f}{commits:9}"
+              f"{args.items / elapsed:9.0f}{stored:8}")
+
+        for batch_size in args.batch_sizes:
+            os.environ['JOB_BATCH_SIZE'] = str(batch_size)
+
+            async def harvest(manager, job_id, user_id, items):
+                return await manager._execute_harvest_job(job_id, user_id, {'items': items})
+
+            elapsed, commits, stored = await run(directory, f"batch_{batch_size}", items, harvest)
+            label = f"unit of work, batch {batch_size}"
+            print(f"  {label:<28}{elapsed:8.2f}{elapsed - baseline:10.2f}{commits:9}"
+                  f"{args.items / elapsed:9.0f}{stored:8}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Leaderboard Benchmark
+Ranks a large player population and compares the gaming service's previous
+leaderboard build (sort every player per request) with the skip list kept up
+to date on each finished game: score updates, top-k, rank of a player and
+the window around them, plus weekly buckets expiring a day of games
+"""
+
+import os
+import sys
+import time
+import random
+import argparse
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'memory-system'))
+
+from leaderboards import RankedScores, WindowedScores
+
+
+def per_op(operation, repeat):
+    start = time.perf_counter()
+    for n in range(repeat):
+        operation(n)
+    return (time.perf_counter() - start) / repeat * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--players", type=int, default=1_000_000)
+    parser.add_argument("--queries", type=int, default=20000)
+    parser.add_argument("--top", type=int, default=100)
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    players = [f"user_{n}" for n in range(args.players)]
+    points = {player: int(rng.paretovariate(1.2) * 100) for player in players}
+
+    print(f"{args.players} players")
+    start = time.perf_counter()
+    ranking = RankedScores(seed=1)
+    for player in players:
+        ranking.set(player, points[player])
+    print(f"  build skip list             {time.perf_counter() - start:10.2f} s")
+
+    repeat = max(1, min(5, 10_000_000 // args.players))
+    start = time.perf_counter()
+    for _ in range(repeat):
+        ordered = sorted(points.items(), key=lambda x: x[1], reverse=True)[:args.top]
+    previous = (time.perf_counter() - start) / repeat * 1e6
+    # Ties may be ordered differently, so compare the scores
+    same = [score for _, score in ordered] == [score for _, _, score in ranking.top(args.top)]
+    print(f"  previous: sort for top {args.top:<5} {previous:10.0f} us/request (same scores: {same})")
+
+    samples = [rng.choice(players) for _ in range(args.queries)]
+    gains = [rng.randrange(0, 500) for _ in range(args.queries)]
+
+    def update(n):
+        points[samples[n]] += gains[n]
+        ranking.set(samples[n], points[samples[n]])
+
+    print(f"  game ended (score update)   {per_op(update, args.queries):10.1f} us")
+    print(f"  top {args.top:<24}{per_op(lambda n: ranking.top(args.top), args.queries // 10):10.1f} us")
+    print(f"  rank of player              {per_op(lambda n: ranking.rank(samples[n]), args.queries):10.1f} us")
+    print(f"  around player (+-5)         {per_op(lambda n: ranking.around(samples[n], 5), args.queries):10.1f} us")
+
+    expected = sorted(points.items(), key=lambda x: (-x[1], x[0]))[:args.top]
+    assert [(member, score) for _, member, score in ranking.top(args.top)] == expected
+
+    # Weekly board: a week of games at one per player, then a day expires
+    weekly = WindowedScores(window=timedelta(days=7), bucket=timedelta(hours=1))
+    week_start = datetime(2025, 3, 3)
+    games = min(args.players, 500_000)
+    step = timedelta(days=7) / games
+    now = week_start
+    start = time.perf_counter()
+    for n in range(games):
+        now = week_start + step * n
+        weekly.add(players[n], gains[n % len(gains)], now, now=now)
+    elapsed = time.perf_counter() - start
+    print(f"weekly board, {games} games over 7 days")
+    print(f"  add game                    {elapsed / games * 1e6:10.1f} us")
+
+    now += timedelta(days=1)
+    start = time.perf_counter()
+    weekly.expire(now)
+    print(f"  expire one day of buckets   {(time.perf_counter() - start) * 1000:10.1f} ms "
+          f"({games - len(weekly)} players left the board)")
+    print(f"  top {args.top:<24}{per_op(lambda n: weekly.top(args.top, now), args.queries // 10):10.1f} us")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+MD Storage Write Benchmark
+Measures the cost of adding one memory entry to a user file of growing size with
+the old full-file rewrite and with the section log
+"""
+
+import os
+import sys
+import time
+import argparse
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'memory-system'))
+
+from md_section_log import SectionLogStore
+
+SECTIONS = [
+    "### Chronological Memories",
+    "### General Information",
+    "### Confidential Information",
+    "### Secret Information",
+    "### Ultra-Secret Information",
+]
+
+
+def entry_markdown(i: int) -> str:
+    return (f"#### mem_{i:08d}\n**Time:** 2025-01-01 10:00:00  \n**Tag:** `#general`  \n"
+            f"**Confidence:** 1.00  \n\nBenchmark memory number {i} about dinner plans and work\n")
+
+
+def make_user_file(size_bytes: int) -> str:
+    """User file in the MDFileManager layout, padded with entries to ~size_bytes"""
+    head = "# USER +15550000000\n\n## Profile\n- **Last Updated:** 2025-01-01 10:00:00\n\n---\n\n## Memory Entries\n\n"
+    per_section = max(1, size_bytes // len(entry_markdown(0)) // len(SECTIONS))
+    body = []
+    for s, header in enumerate(SECTIONS):
+        body.append(f"{header}\n*Section description*\n\n")
+        body.extend(entry_markdown(s * per_section + i) + "\n" for i in range(per_section))
+    return head + ''.join(body) + "---\n\n*File created by benchmark*\n"
+
+
+def legacy_append(path: Path, header: str, entry_md: str):
+    """Previous behaviour: read, splice into the section, rewrite the whole file"""
+    content = path.read_text(encoding='utf-8')
+    lines = content.split('\n')
+    section_index = next(i for i, line in enumerate(lines) if line.strip() == header)
+    insert_index = len(lines)
+    for i in range(section_index + 1, len(lines)):
+        if lines[i].startswith('###') or lines[i].startswith('---'):
+            insert_index = i
+            break
+    lines.insert(insert_index, entry_md)
+    lines.insert(insert_index + 1, "")
+    path.write_text('\n'.join(lines), encoding='utf-8')
+
+
+def measure(fn, writes: int) -> float:
+    start = time.perf_counter()
+    for i in range(writes):
+        fn(i)
+    return (time.perf_counter() - start) / writes * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes-mb", default="0.1,1,10,30")
+    parser.add_argument("--writes", type=int, default=200)
+    parser.add_argument("--fsync", action="store_true", help="fdatasync every section-log append")
+    args = parser.parse_args()
+
+    print(f"{args.writes} writes per size, fsync={'on' if args.fsync else 'off'}")
+    print(f"{'file size':>10} {'rewrite ms/write':>18} {'section log ms/write':>22}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for size_mb in (float(s) for s in args.sizes_mb.split(',')):
+            content = make_user_file(int(size_mb * 1024 * 1024))
+
+            legacy_path = Path(tmp) / "legacy.md"
+            legacy_path.write_text(content, encoding='utf-8')
+            legacy_writes = max(5, min(args.writes, int(args.writes / max(size_mb, 1))))
+            legacy_ms = measure(
+                lambda i: legacy_append(legacy_path, SECTIONS[i % 5], entry_markdown(10 ** 7 + i)),
+                legacy_writes
+            )
+
+            log_path = Path(tmp) / "log.md"
+            log_path.write_text(content, encoding='utf-8')
+            store = SectionLogStore(fsync=args.fsync)
+            log_ms = measure(
+                lambda i: store.append(log_path, [{
+                    'id': f"mem_{10 ** 7 + i}", 'kind': 'user', 'anchor': SECTIONS[i % 5],
+                    'entry': entry_markdown(10 ** 7 + i), 'touch': "2025-01-02 10:00:00"
+                }]),
+                args.writes
+            )
+            print(f"{size_mb:>8.1f}MB {legacy_ms:>18.2f} {log_ms:>22.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+Memory Harvester Pipeline Benchmark
+Ingests synthetic mixed-source inputs one at a time through process_memory and
+then through the staged pipeline, and reports end-to-end throughput and
+per-stage utilisation. --io-latency-ms adds an awaited delay to one metadata
+extractor and one validator to model lookups that wait on a remote service
+"""
+
+import os
+import sys
+import time
+import random
+import asyncio
+import logging
+import argparse
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'memory-system'))
+
+from agents.memory_harvester import MemoryHarvesterAgent, RawMemoryInput, SourceType
+
+PEOPLE = ["Sarah", "Alex", "Mom", "Dan", "Maria", "John"]
+PLACES = ["downtown", "the office", "Central Park", "the gym", "home"]
+ACTIVITIES = ["lunch", "a meeting", "a run", "dinner", "coffee", "the dentist"]
+
+
+def make_input(rng: random.Random, i: int) -> RawMemoryInput:
+    when = datetime(2025, 1, 1) + timedelta(minutes=11 * i)
+    user = f"user{rng.randrange(500)}"
+    person, place, activity = rng.choice(PEOPLE), rng.choice(PLACES), rng.choice(ACTIVITIES)
+    text = f"Had {activity} with {person} at {place} #{i}, see you tomorrow at {rng.randint(1, 12)}pm"
+    if rng.random() < 0.03:
+        text = f"Had {activity} with {person} at {place}"  # repeats: duplicates
+    kind = rng.randrange(7)
+    if kind == 0:
+        return RawMemoryInput(text, SourceType.CHAT_MESSAGE, {'platform': 'whatsapp'}, when, user)
+    if kind == 1:
+        return RawMemoryInput({'subject': f"{activity.title()} with {person}", 'body': text,
+                               'from': f"{person.lower()}@mail.com", 'to': [f"{user}@mail.com"]},
+                              SourceType.EMAIL, {'platform': 'gmail'}, when, user)
+    if kind == 2:
+        return RawMemoryInput({'title': f"{activity.title()} #{i}", 'description': text, 'location': place,
+                               'start_time': when.isoformat(), 'end_time': (when + timedelta(hours=1)).isoformat()},
+                              SourceType.CALENDAR_EVENT, {}, when, user)
+    if kind == 3:
+        return RawMemoryInput(text, SourceType.SMS, {}, when, user)
+    if kind == 4:
+        return RawMemoryInput({'url': f"https://example.com/{i}", 'title': f"Article {i}", 'content': text},
+                              SourceType.WEB_CLIP, {}, when, user)
+    if kind == 5:
+        return RawMemoryInput({'text': text, 'platform': 'twitter', 'likes': rng.randrange(100)},
+                              SourceType.SOCIAL_MEDIA, {}, when, user)
+    return RawMemoryInput(text, SourceType.MANUAL_ENTRY, {}, when, user)
+
+
+def make_inputs(count: int):
+    rng = random.Random(42)
+    return (make_input(rng, i) for i in range(count))
+
+
+def add_io_latency(agent: MemoryHarvesterAgent, latency_ms: float):
+    """Make one extractor and one validator await a remote call"""
+    delay = latency_ms / 1000
+
+    def slowed(method):
+        async def call(*args):
+            await asyncio.sleep(delay)
+            return await method(*args)
+        return call
+
+    location = agent.metadata_extractors['location_extractor']
+    location.extract = slowed(location.extract)
+    relevance = agent.quality_validators['relevance_validator']
+    relevance.validate = slowed(relevance.validate)
+
+
+async def new_agent(args, config=None) -> MemoryHarvesterAgent:
+    agent = MemoryHarvesterAgent(config={'data_dir': None, **(config or {})})
+    await agent.initialize()
+    if args.io_latency_ms:
+        add_io_latency(agent, args.io_latency_ms)
+    return agent
+
+
+async def bench_sequential(args) -> float:
+    agent = await new_agent(args)
+    count = args.sequential_inputs or args.inputs
+    start = time.perf_counter()
+    for raw_input in make_inputs(count):
+        try:
+            await agent.process_memory(raw_input)
+        except Exception:
+            pass
+    elapsed = time.perf_counter() - start
+    print(f"sequential process_memory: {count} inputs in {elapsed:.1f}s ({count / elapsed:,.0f}/s)")
+    return count / elapsed
+
+
+async def bench_pipeline(args) -> float:
+    workers = {'workers': args.workers, 'queue_size': args.queue_size}
+    agent = await new_agent(args, config={'pipeline': {'content': workers, 'metadata': workers,
+                                                       'quality': workers}})
+    processed = 0
+    async for _ in agent.process_stream(make_inputs(args.inputs)):
+        processed += 1
+
+    stats = agent.pipeline.stats.to_dict()
+    print(f"staged pipeline: {stats['items']} inputs ({processed} new memories) in {stats['wall_seconds']:.1f}s "
+          f"({stats['throughput_per_second']:,.0f}/s), intake blocked {stats['intake_blocked_seconds']:.1f}s")
+    print(f"  {'stage':<10}{'workers':>8}{'items':>9}{'busy s':>9}{'blocked s':>11}{'util':>7}{'queue hw':>10}")
+    for name, stage in stats['stages'].items():
+        print(f"  {name:<10}{stage['workers']:>8}{stage['items']:>9}{stage['busy_seconds']:>9.1f}"
+              f"{stage['blocked_seconds']:>11.1f}{stage['utilisation']:>7.2f}{stage['queue_high_water']:>10}")
+    return stats['throughput_per_second']
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--inputs", type=int, default=100000)
+    parser.add_argument("--sequential-inputs", type=int, default=0,
+                        help="Inputs for the sequential baseline (default: same as --inputs)")
+    parser.add_argument("--workers", type=int, default=4, help="Workers per stage after intake")
+    parser.add_argument("--queue-size", type=int, default=64)
+    parser.add_argument("--io-latency-ms", type=float, default=0.0)
+    args = parser.parse_args()
+    logging.disable(logging.CRITICAL)
+
+    sequential = await bench_sequential(args)
+    pipelined = await bench_pipeline(args)
+    print(f"speedup: {pipelined / sequential:.2f}x")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
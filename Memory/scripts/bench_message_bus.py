@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+Message Bus Benchmark
+Measures one-way throughput at several receive batch sizes and request/reply
+latency on the in-process bus and over the broker socket, then spreads
+pattern analysis requests over a growing number of agent processes
+"""
+
+import os
+import sys
+import time
+import asyncio
+import logging
+import argparse
+import tempfile
+import statistics
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'memory-system'))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'memory-system', 'tests'))
+
+from agents.base_agent import AgentMessage
+from agents.message_bus import InProcessMessageBus, MessageBroker, SocketMessageBus, spawn_agent_process
+
+
+def note(recipient_id, n):
+    return AgentMessage("bench", recipient_id, "note", {'n': n}, datetime.now())
+
+
+async def throughput(producer, consumer, messages, batch_size):
+    """Messages/s from one sender to one receiver taking `batch_size` at a time"""
+    await consumer.register("sink", capacity=1000)
+
+    async def send():
+        for n in range(messages):
+            await producer.publish(note("sink", n))
+
+    start = time.perf_counter()
+    sender = asyncio.create_task(send())
+    received = 0
+    while received < messages:
+        received += len(await consumer.receive("sink", batch_size, timeout=5))
+    await sender
+    elapsed = time.perf_counter() - start
+    await consumer.unregister("sink")
+    return messages / elapsed
+
+
+async def latency(caller, server, requests):
+    """Median and p99 request/reply round trip in ms, against an echo loop"""
+    await server.register("echo")
+
+    async def echo():
+        while True:
+            for message in await server.receive("echo", 64):
+                await server.publish(AgentMessage("echo", message.reply_to, "reply", message.content,
+                                                  datetime.now(), correlation_id=message.correlation_id))
+
+    task = asyncio.create_task(echo())
+    samples = []
+    for n in range(requests):
+        start = time.perf_counter()
+        await caller.request(note("echo", n), timeout=5)
+        samples.append((time.perf_counter() - start) * 1000)
+    task.cancel()
+    await server.unregister("echo")
+    samples.sort()
+    return statistics.median(samples), samples[int(len(samples) * 0.99) - 1]
+
+
+async def agent_processes(path, count, batches):
+    """Seconds to analyse `batches` with `count` pattern analyzer processes"""
+    processes = [spawn_agent_process("agents.pattern_analyzer:PatternAnalyzerAgent", path, concurrency=1)
+                 for _ in range(count)]
+    bus = SocketMessageBus(path)
+    try:
+        # Wait until every process has joined the mailbox before timing
+        await bus.register("pattern_analyzer")
+        warmup = [bus.request(AgentMessage("bench", "pattern_analyzer", "analyze_patterns",
+                                           {'memories': batches[0][:20]}, datetime.now()), timeout=300)
+                  for _ in range(count * 4)]
+        await asyncio.gather(*warmup)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(
+            bus.request(AgentMessage("bench", "pattern_analyzer", "analyze_patterns", {'memories': batch},
+                                     datetime.now()), timeout=300)
+            for batch in batches
+        ))
+        return time.perf_counter() - start
+    finally:
+        await bus.close()
+        for process in processes:
+            process.terminate()
+            process.join()
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--messages", type=int, default=20000)
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 64])
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--processes", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--analysis-batches", type=int, default=16)
+    args = parser.parse_args()
+    logging.disable(logging.CRITICAL)
+    print(f"{os.cpu_count()} CPUs")
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'bus.sock')
+        broker = MessageBroker(path)
+        await broker.start()
+        local = InProcessMessageBus()
+        clients = [SocketMessageBus(path) for _ in range(2)]
+
+        print(f"one-way, {args.messages} messages:")
+        for batch_size in args.batch_sizes:
+            rate = await throughput(local, local, args.messages, batch_size)
+            remote = await throughput(clients[0], clients[1], args.messages, batch_size)
+            print(f"  receive batch {batch_size:<4} in-process {rate:10.0f} msg/s   socket {remote:9.0f} msg/s")
+
+        print(f"request/reply, {args.requests} requests:")
+        median, p99 = await latency(local, local, args.requests)
+        print(f"  in-process  median {median:.3f} ms  p99 {p99:.3f} ms")
+        median, p99 = await latency(clients[0], clients[1], args.requests)
+        print(f"  socket      median {median:.3f} ms  p99 {p99:.3f} ms")
+        for client in clients:
+            await client.close()
+
+        if args.processes:
+            from test_pattern_analyzer import make_memories
+            batches = [make_memories(seed, 300) for seed in range(args.analysis_batches)]
+            for batch in batches:
+                for memory in batch:
+                    memory['timestamp'] = memory['timestamp'].isoformat()
+            print(f"pattern analysis, {len(batches)} requests of 300 memories:")
+            for count in args.processes:
+                elapsed = await agent_processes(path, count, batches)
+                print(f"  {count} process{'es' if count > 1 else '  '}  {elapsed:7.2f} s  "
+                      f"{len(batches) / elapsed:6.2f} requests/s")
+        await broker.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Pattern Analyzer Detector Benchmark
+Builds a synthetic memory frame (routine activities at habitual hours mixed
+with one-off memories, lists of participants) and times each detector
+against the row-by-row loops it replaced, which the differential tests keep
+as their reference; pass a smaller --baseline-rows to extrapolate the loops
+linearly instead of running them on the full frame
+"""
+
+import os
+import sys
+import time
+import asyncio
+import logging
+import argparse
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'memory-system'))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'memory-system', 'tests'))
+
+from agents.pattern_analyzer import PatternAnalyzerAgent
+from test_pattern_analyzer import LoopDetectors
+
+PEOPLE = np.array(["Sarah", "Alex", "Mom", "Dad", "Dan", "Maria", "John", "Ioana", "Mihai", "Elena"], dtype=object)
+PLACES = np.array(["home", "office", "gym", "", "Central Park"], dtype=object)
+
+
+def make_frames(rows: int, routines: int, days: int, seed: int = 0):
+    """temporal, behavioral and social feature frames for `rows` memories"""
+    rng = np.random.default_rng(seed)
+    # Routine activities at habitual hours, the rest one-off memories
+    routine = rng.random(rows) < 0.6
+    kinds = rng.integers(0, routines, rows)
+    activity = np.where(routine, np.char.add("Routine activity ", kinds.astype(str)).astype(object),
+                        np.char.add("One-off memory ", np.arange(rows).astype(str)).astype(object))
+    hours = np.where(routine, (7 + kinds * 5) % 24, rng.integers(0, 24, rows)) + rng.choice([0, 0, 0, 1], rows)
+    offsets = (np.sort(rng.integers(0, days, rows)) * 86400 + hours % 24 * 3600 + rng.integers(0, 3600, rows))
+    timestamps = pd.Timestamp("2022-01-03") + pd.to_timedelta(offsets, unit="s")
+
+    sizes = rng.choice([0, 0, 1, 1, 2, 3], rows)
+    participants = [list(PEOPLE[rng.choice(len(PEOPLE), size, replace=False)]) for size in sizes]
+    memory_id = np.char.add("m", np.arange(rows).astype(str)).astype(object)
+
+    temporal = pd.DataFrame({'memory_id': memory_id, 'timestamp': timestamps, 'activity': activity,
+                             'participants': participants, 'location': PLACES[rng.integers(0, len(PLACES), rows)]})
+    behavioral = pd.DataFrame({'memory_id': memory_id, 'timestamp': timestamps, 'activity': activity})
+    social = {'social_features': pd.DataFrame({'memory_id': memory_id, 'timestamp': timestamps,
+                                               'participants': participants,
+                                               'activity': activity}).to_dict('records')}
+    return temporal, behavioral, social
+
+
+async def time_detectors(agent, temporal, behavioral, social):
+    timings = {}
+    for name in ('_analyze_daily_patterns', '_analyze_weekly_patterns', '_analyze_hourly_patterns'):
+        frame = temporal.copy()
+        start = time.perf_counter()
+        found = await getattr(agent, name)(frame)
+        timings[name] = (time.perf_counter() - start, len(found))
+    frame = behavioral.copy()
+    start = time.perf_counter()
+    found = await agent._analyze_activity_sequences(frame)
+    timings['_analyze_activity_sequences'] = (time.perf_counter() - start, len(found))
+    start = time.perf_counter()
+    found = await agent._detect_social_patterns(social)
+    timings['_detect_social_patterns'] = (time.perf_counter() - start, len(found))
+    return timings
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--baseline-rows", type=int, default=0,
+                        help="Rows for the row-loop baseline (default: same as --rows)")
+    parser.add_argument("--skip-baseline", action="store_true")
+    parser.add_argument("--routines", type=int, default=40)
+    parser.add_argument("--days", type=int, default=3 * 365)
+    args = parser.parse_args()
+    logging.disable(logging.CRITICAL)
+
+    frames = make_frames(args.rows, args.routines, args.days)
+    vectorised = await time_detectors(PatternAnalyzerAgent(), *frames)
+
+    baseline = {}
+    if not args.skip_baseline:
+        baseline_rows = args.baseline_rows or args.rows
+        baseline_frames = make_frames(baseline_rows, args.routines, args.days)
+        scale = args.rows / baseline_rows
+        baseline = {name: (seconds * scale, found)
+                    for name, (seconds, found) in (await time_detectors(LoopDetectors(), *baseline_frames)).items()}
+
+    print(f"{args.rows} memories, {args.routines} routines over {args.days} days")
+    print(f"  {'detector':<30}{'patterns':>9}{'vectorised s':>14}{'loops s':>10}{'speedup':>9}")
+    for name, (seconds, found) in vectorised.items():
+        loop_seconds = baseline.get(name, (None,))[0]
+        loops = f"{loop_seconds:10.2f}{loop_seconds / seconds:8.1f}x" if loop_seconds else f"{'-':>10}{'-':>9}"
+        print(f"  {name:<30}{found:>9}{seconds:14.2f}{loops}")
+    total = sum(seconds for seconds, _ in vectorised.values())
+    if baseline:
+        loop_total = sum(seconds for seconds, _ in baseline.values())
+        print(f"  {'total':<30}{'':>9}{total:14.2f}{loop_total:10.2f}{loop_total / total:8.1f}x")
+    else:
+        print(f"  {'total':<30}{'':>9}{total:14.2f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Pattern State Benchmark
+Simulates scheduled pattern analysis over a growing memory history: each run
+either re-analyses every memory (the previous behaviour) or folds only the
+memories added since the last run into a saved pattern state and derives the
+patterns from it, checking both give the same patterns
+"""
+
+import os
+import sys
+import json
+import time
+import asyncio
+import logging
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'memory-system'))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'memory-system', 'tests'))
+
+from agents.pattern_analyzer import PatternAnalyzerAgent
+from agents.pattern_state import PatternState
+from test_pattern_analyzer import make_memories
+
+
+def without_times(patterns):
+    return [json.dumps({k: v for k, v in p.items() if k not in ('first_detected', 'last_updated')}, default=repr)
+            for p in patterns]
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--history", type=int, default=200_000, help="Memories before the first run")
+    parser.add_argument("--per-run", type=int, default=500, help="Memories added between runs")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--days", type=int, default=3 * 365)
+    args = parser.parse_args()
+    logging.disable(logging.CRITICAL)
+
+    total = args.history + args.per_run * args.runs
+    memories = sorted(make_memories(0, total, args.days), key=lambda m: (m['timestamp'], m['id']))
+    agent = PatternAnalyzerAgent()
+
+    # Initial fold of the history, then save it as the job would
+    start = time.perf_counter()
+    state = PatternState()
+    await agent.update_user_patterns("u1", memories[:args.history], state)
+    saved = json.dumps(state.to_dict())
+    print(f"initial state: {args.history} memories folded in {time.perf_counter() - start:.2f}s, "
+          f"{len(saved) / 2 ** 20:.1f} MB as JSON")
+
+    print(f"  {'memories':>9}{'full s':>9}{'load s':>9}{'update s':>10}{'save s':>9}{'speedup':>9}  same")
+    for run in range(1, args.runs + 1):
+        seen = args.history + run * args.per_run
+        new = memories[seen - args.per_run:seen]
+
+        start = time.perf_counter()
+        full = await agent._analyze_patterns_from_memories(memories[:seen])
+        full_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        state = PatternState.from_dict(json.loads(saved))
+        load_seconds = time.perf_counter() - start
+        start = time.perf_counter()
+        incremental = await agent.update_user_patterns("u1", new, state)
+        update_seconds = time.perf_counter() - start
+        start = time.perf_counter()
+        saved = json.dumps(state.to_dict())
+        save_seconds = time.perf_counter() - start
+
+        incremental_seconds = load_seconds + update_seconds + save_seconds
+        print(f"  {seen:>9}{full_seconds:9.2f}{load_seconds:9.2f}{update_seconds:10.3f}{save_seconds:9.2f}"
+              f"{full_seconds / incremental_seconds:8.1f}x  {without_times(full) == without_times(incremental)}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+Phone Directory Benchmark
+Loads users x contacts into the indexed PhoneDirectory and measures writes, name
+lookups, fuzzy search and reverse lookups; the previous JSON directory (full
+rewrite per change, linear scans) is measured on a smaller directory for reference
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'memory-system'))
+
+from phone_directory import PhoneDirectory
+
+SYLLABLES = ["an", "el", "ma", "ri", "io", "da", "ne", "mi", "ha", "cr", "is", "ti",
+             "bo", "gd", "ra", "du", "al", "ex", "so", "fi", "lu", "ca", "vi", "or"]
+
+
+def make_name(rng: random.Random) -> str:
+    return ''.join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))).capitalize() + \
+        f" {rng.choice(SYLLABLES).capitalize()}{rng.randint(0, 999)}"
+
+
+NAME_POOL = []
+
+
+def make_contacts(rng: random.Random, count: int, phone_pool: int):
+    if not NAME_POOL:
+        pool_rng = random.Random(0)
+        NAME_POOL.extend({make_name(pool_rng) for _ in range(200000)})
+    return [{'name': name, 'phone': f"07{rng.randrange(phone_pool):08d}",
+             'relationship': rng.choice(["friend", "colleague", "family", "contact"])}
+            for name in rng.sample(NAME_POOL, count)]
+
+
+def timed(fn, repeat: int) -> float:
+    """Mean milliseconds per call"""
+    start = time.perf_counter()
+    for i in range(repeat):
+        fn(i)
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def bench_indexed(args, tmp: str):
+    rng = random.Random(1)
+    phone_pool = args.users * 50
+    directory = PhoneDirectory(data_dir=tmp)
+
+    start = time.perf_counter()
+    for u in range(args.users):
+        directory.register_contacts(f"0744{u:06d}", make_contacts(rng, args.contacts, phone_pool))
+        if u and u % 10000 == 0:
+            print(f"  loaded {u} users ({time.perf_counter() - start:.0f}s)", flush=True)
+    load_seconds = time.perf_counter() - start
+    total = args.users * args.contacts
+    print(f"indexed: loaded {args.users} users x {args.contacts} contacts in {load_seconds:.1f}s "
+          f"({total / load_seconds:,.0f} contacts/s), "
+          f"db {os.path.getsize(directory.db_file) / 2 ** 20:,.0f} MB")
+
+    users = [f"0744{rng.randrange(args.users):06d}" for _ in range(args.ops)]
+    names = {user: [c['name'] for c in directory.get_all_contacts(user)] for user in set(users[:50])}
+    sample = [(user, rng.choice(names[user])) for user in users[:50]]
+
+    directory.name_indexes.clear()
+    cold = timed(lambda i: directory.find_phone_by_name(users[i], "nobody"), args.ops)
+    warm_exact = timed(lambda i: directory.find_phone_by_name(*sample[i % len(sample)]), args.ops)
+    warm_partial = timed(lambda i: directory.find_phone_by_name(
+        sample[i % len(sample)][0], sample[i % len(sample)][1][:4].lower()), args.ops)
+    fuzzy = timed(lambda i: directory.search_contacts(
+        sample[i % len(sample)][0], sample[i % len(sample)][1][::-1][:6]), args.ops)
+    register = timed(lambda i: directory.register_contact(
+        users[i], f"New Contact {i}", f"07{rng.randrange(phone_pool):08d}", "friend"), args.ops)
+    reverse = timed(lambda i: directory.get_reverse_lookup(f"07{rng.randrange(phone_pool):08d}"), args.ops)
+
+    print(f"  register_contact            {register:8.3f} ms")
+    print(f"  find_phone_by_name (cold)   {cold:8.3f} ms   (loads the user's name index)")
+    print(f"  find_phone_by_name exact    {warm_exact:8.3f} ms")
+    print(f"  find_phone_by_name partial  {warm_partial:8.3f} ms")
+    print(f"  search_contacts (fuzzy)     {fuzzy:8.3f} ms")
+    print(f"  get_reverse_lookup          {reverse:8.3f} ms")
+
+
+def bench_legacy(args, tmp: str):
+    """Previous behaviour: one dict, json.dump on every change, linear scans"""
+    rng = random.Random(1)
+    phone_pool = args.legacy_users * 50
+    directory = {
+        f"+40744{u:06d}": {'contacts': {c['name'].lower(): dict(c, phone=f"+40{c['phone'][1:]}")
+                                        for c in make_contacts(rng, args.contacts, phone_pool)}}
+        for u in range(args.legacy_users)
+    }
+    path = Path(tmp) / "phone_directory.json"
+
+    def save(i):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(directory, f, indent=2, ensure_ascii=False)
+
+    def partial(i):
+        query = "zz"
+        for name in directory[f"+40744{i % args.legacy_users:06d}"]['contacts']:
+            if query in name or name in query:
+                break
+
+    def reverse(i):
+        phone = f"+407{rng.randrange(phone_pool):08d}"
+        return [c for data in directory.values() for c in data['contacts'].values() if c['phone'] == phone]
+
+    writes = max(1, min(args.ops, 5))
+    print(f"legacy: {args.legacy_users} users x {args.contacts} contacts")
+    print(f"  register_contact (rewrite)  {timed(save, writes):8.3f} ms")
+    print(f"  find_phone_by_name partial  {timed(partial, args.ops):8.3f} ms")
+    print(f"  get_reverse_lookup (scan)   {timed(reverse, max(1, args.ops // 100)):8.3f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--users", type=int, default=100000)
+    parser.add_argument("--contacts", type=int, default=500)
+    parser.add_argument("--ops", type=int, default=1000)
+    parser.add_argument("--legacy-users", type=int, default=2000)
+    parser.add_argument("--dir", help="Directory for the database (default: a temporary one)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(dir=args.dir) as tmp:
+        bench_indexed(args, tmp)
+    with tempfile.TemporaryDirectory(dir=args.dir) as tmp:
+        bench_legacy(args, tmp)
+
+
+if __name__ == "__main__":
+    main()
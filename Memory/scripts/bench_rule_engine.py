@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Rule Engine Throughput Benchmark
+Classifies a large synthetic corpus with the original per-keyword/per-pattern loop
+and with the compiled rule engine, and reports messages/sec for each
+"""
+
+import os
+import re
+import sys
+import time
+import random
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'app'))
+
+from memory.classifier import MessageClassifier
+
+WORDS = [
+    "meeting", "tomorrow", "at 3:30 PM", "12/05/2024", "next week", "on Friday", "I like",
+    "my favorite band", "password: hunter2", "account number: 12345", "123-45-6789", "secret",
+    "credit card 4111 1111 1111 1111", "diagnosed", "lawyer", "urgent information", "my will",
+    "the", "and", "we", "talked", "about", "coffee", "with", "Sam", "later", "dinner", "garden",
+    "weekend", "trip", "photos", "kids", "school", "work", "project", "lunch", "weather",
+]
+
+
+def legacy_classify(message: str) -> str:
+    """The original MessageClassifier.classify loop"""
+    if not message:
+        return "GENERAL"
+    message_lower = message.lower()
+    scores = {}
+    for category, config in MessageClassifier.CATEGORIES.items():
+        score = 0
+        for keyword in config["keywords"]:
+            if keyword in message_lower:
+                score += 2
+        for pattern in config["patterns"]:
+            if re.search(pattern, message_lower, re.IGNORECASE):
+                score += 3
+        scores[category] = score * config["priority"]
+
+    if "ultra secret" in message_lower or "ultrasecret" in message_lower:
+        return "ULTRA_SECRET"
+    elif "secret" in message_lower and "ultra" not in message_lower:
+        return "SECRET"
+    elif "confidential" in message_lower:
+        return "CONFIDENTIAL"
+    elif any(word in message_lower for word in ["tomorrow", "yesterday", "appointment", "meeting"]):
+        return "CHRONOLOGICAL"
+    if max(scores.values()) > 0:
+        return max(scores, key=scores.get)
+    return "GENERAL"
+
+
+def make_corpus(size: int, min_words: int, max_words: int, seed: int = 1):
+    rng = random.Random(seed)
+    return [" ".join(rng.choices(WORDS, k=rng.randint(min_words, max_words))) for _ in range(size)]
+
+
+def measure(label: str, fn, corpus):
+    start = time.perf_counter()
+    results = fn(corpus)
+    elapsed = time.perf_counter() - start
+    print(f"{label:>10}: {len(corpus) / elapsed:10.0f} msg/s")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--messages", type=int, default=50000)
+    parser.add_argument("--min-words", type=int, default=4)
+    parser.add_argument("--max-words", type=int, default=30)
+    args = parser.parse_args()
+
+    corpus = make_corpus(args.messages, args.min_words, args.max_words)
+    classifier = MessageClassifier()
+    print(f"{args.messages} messages, {args.min_words}-{args.max_words} words each")
+
+    legacy = measure("legacy", lambda msgs: [legacy_classify(m) for m in msgs], corpus)
+    compiled = measure("compiled", classifier.classify_batch, corpus)
+
+    mismatches = sum(1 for a, b in zip(legacy, compiled) if a != b)
+    print(f"category mismatches: {mismatches}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Voice Note Transcoding Benchmark
+Compares voice-notes/sec for temp-file ffmpeg, piped ffmpeg pool and in-process decoding
+"""
+
+import os
+import sys
+import time
+import asyncio
+import tempfile
+import argparse
+import subprocess
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from app.voice.transcoder import AudioTranscoder, FFMPEG_BINARY, INPROCESS_AVAILABLE
+
+
+def make_voice_note(seconds: float) -> bytes:
+    """Generate an OGG/Opus sample similar to a WhatsApp voice note"""
+    return subprocess.run(
+        [FFMPEG_BINARY, '-hide_banner', '-loglevel', 'error',
+         '-f', 'lavfi', '-i', f'sine=frequency=440:duration={seconds}',
+         '-ac', '1', '-ar', '48000', '-c:a', 'libopus', '-b:a', '24k', '-f', 'ogg', 'pipe:1'],
+        capture_output=True, check=True
+    ).stdout
+
+
+def legacy_convert(data: bytes) -> bytes:
+    """Previous approach: temp files plus a blocking ffmpeg spawn"""
+    with tempfile.NamedTemporaryFile(suffix='.ogg', delete=False) as src:
+        src.write(data)
+        src_path = src.name
+    out_path = src_path.replace('.ogg', '.wav')
+    subprocess.check_call(
+        [FFMPEG_BINARY, '-y', '-i', src_path, '-ar', '16000', '-ac', '1', out_path],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    with open(out_path, 'rb') as f:
+        result = f.read()
+    os.unlink(src_path)
+    os.unlink(out_path)
+    return result
+
+
+async def bench_legacy(data: bytes, notes: int) -> float:
+    """Legacy conversions awaited one at a time from a coroutine"""
+    start = time.perf_counter()
+    for _ in range(notes):
+        legacy_convert(data)
+    return notes / (time.perf_counter() - start)
+
+
+async def bench_pool(data: bytes, notes: int, concurrency: int, inprocess: bool) -> float:
+    """Piped conversions on the bounded pool"""
+    transcoder = AudioTranscoder(max_concurrency=concurrency, prefer_inprocess=inprocess)
+    start = time.perf_counter()
+    await asyncio.gather(*(transcoder.to_wav(data, 'ogg') for _ in range(notes)))
+    return notes / (time.perf_counter() - start)
+
+
+async def run(notes: int, seconds: float, concurrency: int):
+    """Run all variants and print voice-notes/sec"""
+    data = make_voice_note(seconds)
+    print(f"Voice note: {seconds:.0f}s, {len(data)} bytes; {notes} notes per run")
+    print(f"Temp files + blocking ffmpeg: {await bench_legacy(data, notes):8.1f} notes/sec")
+    print(f"Piped ffmpeg pool (x{concurrency}):   {await bench_pool(data, notes, concurrency, False):8.1f} notes/sec")
+    if INPROCESS_AVAILABLE:
+        print(f"In-process Opus decode:       {await bench_pool(data, notes, concurrency, True):8.1f} notes/sec")
+    else:
+        print("In-process Opus decode:       unavailable (numpy/soundfile not installed)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--notes", type=int, default=100)
+    parser.add_argument("--seconds", type=float, default=10.0)
+    parser.add_argument("--concurrency", type=int, default=os.cpu_count() or 2)
+    args = parser.parse_args()
+    asyncio.run(run(args.notes, args.seconds, args.concurrency))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+WebSocket Broadcast Load Test
+Measures broadcast tick latency with many simulated dashboard clients, some slow
+"""
+
+import os
+import sys
+import time
+import json
+import asyncio
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from app.api.websocket import ConnectionManager
+
+
+class FakeWebSocket:
+    """Minimal stand-in for a Starlette WebSocket"""
+
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+        self.received = 0
+        self.closed = False
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, message: str):
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        self.received += 1
+
+    async def close(self, code: int = 1000):
+        self.closed = True
+
+
+async def serial_broadcast(clients, message: str):
+    """Previous implementation: await each send in turn"""
+    for client in clients:
+        await client.send_text(message)
+
+
+async def run(clients: int, slow: int, slow_delay: float, ticks: int):
+    """Run the load test and print tick latencies"""
+    frame = json.dumps({"cpu": 1.0, "memory": 2.0, "responseTime": {"p50": 1}})
+
+    # Baseline: serial sends
+    sockets = [FakeWebSocket(slow_delay if i < slow else 0) for i in range(clients)]
+    start = time.perf_counter()
+    await serial_broadcast(sockets, frame)
+    serial_ms = (time.perf_counter() - start) * 1000
+
+    # Fan-out with per-connection writers
+    manager = ConnectionManager(send_timeout=slow_delay / 2)
+    manager.metrics_collector.system_sampler.interval = 60  # keep psutil out of the way
+    sockets = [FakeWebSocket(slow_delay if i < slow else 0) for i in range(clients)]
+    for ws in sockets:
+        await manager.connect(ws)
+    if manager.broadcast_task:
+        manager.broadcast_task.cancel()
+        manager.broadcast_task = None
+
+    tick_ms = []
+    for _ in range(ticks):
+        start = time.perf_counter()
+        await manager.broadcast(frame)
+        tick_ms.append((time.perf_counter() - start) * 1000)
+        await asyncio.sleep(0.05)
+
+    await asyncio.sleep(slow_delay)
+    fast_received = min(ws.received for ws in sockets[slow:]) if clients > slow else 0
+
+    print(f"Clients: {clients} ({slow} slow, {slow_delay * 1000:.0f}ms per send)")
+    print(f"Serial broadcast, one tick: {serial_ms:.1f}ms")
+    print(f"Fan-out broadcast tick: max {max(tick_ms):.2f}ms, "
+          f"mean {sum(tick_ms) / len(tick_ms):.2f}ms over {ticks} ticks")
+    print(f"Frames delivered to every fast client: {fast_received}")
+    print(f"Slow clients evicted: {manager.evicted}")
+
+    for channel in list(manager.channels.values()):
+        channel.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--clients", type=int, default=1000)
+    parser.add_argument("--slow", type=int, default=50)
+    parser.add_argument("--slow-delay", type=float, default=0.5)
+    parser.add_argument("--ticks", type=int, default=20)
+    args = parser.parse_args()
+    asyncio.run(run(args.clients, args.slow, args.slow_delay, args.ticks))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+"""
+Check Related File Index
+Compares the user -> contact/relationship/topic file index with the memory files
+on disk, and optionally rebuilds it from the files
+"""
+
+import os
+import sys
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'memory-system'))
+
+from md_file_manager import MDFileManager
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--base-dir", default="memory-system/users",
+                        help="MDFileManager base directory")
+    parser.add_argument("--rebuild", action="store_true",
+                        help="Rebuild the index from the files instead of only checking it")
+    args = parser.parse_args()
+
+    manager = MDFileManager(base_dir=args.base_dir)
+    index = manager.related_index
+
+    if args.rebuild:
+        counts = index.rebuild(manager)
+        print(f"Rebuilt index: {counts['links']} user/file links, {counts['entries']} entries")
+        return
+
+    report = index.check(manager)
+    for key in ("missing_links", "missing_entries", "stale_entries", "extra_links"):
+        print(f"{key}: {len(report[key])}")
+        for row in report[key][:20]:
+            print(f"  {row}")
+    print("✓ Index consistent" if report['consistent'] else "✗ Index out of date (run with --rebuild)")
+    sys.exit(0 if report['consistent'] else 1)
+
+
+if __name__ == "__main__":
+    main()
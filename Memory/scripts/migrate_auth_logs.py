@@ -0,0 +1,33 @@
+#!/usr/bin/env python3
+"""
+Migrate Voice Guard Authentication Logs
+Converts legacy auth_log_<phone>.json files into binary attempt ring files
+"""
+
+import os
+import sys
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from app.voice.attempt_log import AttemptLog
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--data-dir", default="memory-system/voice_auth",
+                        help="Voice Guard data directory")
+    parser.add_argument("--remove", action="store_true",
+                        help="Delete JSON logs after successful conversion")
+    args = parser.parse_args()
+
+    log = AttemptLog(args.data_dir)
+    migrated = log.migrate_directory(remove=args.remove)
+
+    for name, count in migrated.items():
+        print(f"✓ {name}: {count} attempts")
+    print(f"Migrated {len(migrated)} log file(s)")
+
+
+if __name__ == "__main__":
+    main()
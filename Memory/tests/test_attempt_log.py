@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+"""
+Test Attempt Log
+Ring wraparound, truncated details and the sliding failure window of the
+Voice Guard attempt rings
+"""
+
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import time
+from app.voice.attempt_log import AttemptLog, HEADER, RECORD
+
+
+def test_ring_wraps_around_keeping_the_newest(tmp_path):
+    log = AttemptLog(tmp_path, capacity=5)
+    base = time.time() - 100
+    for n in range(12):
+        log.append("+15550001", "authentication", n % 2 == 0, f"attempt {n}", timestamp=base + n)
+
+    attempts = log.read("+15550001")
+    assert [a["details"] for a in attempts] == [f"attempt {n}" for n in range(7, 12)]
+    assert [a["success"] for a in attempts] == [False, True, False, True, False]
+    # The file never grows past the ring
+    assert os.path.getsize(tmp_path / "auth_log_15550001.bin") == HEADER.size + 5 * RECORD.size
+
+    # A fresh instance reads the same ring and keeps appending in place
+    reopened = AttemptLog(tmp_path, capacity=5)
+    reopened.append("+15550001", "reset", True, "attempt 12", timestamp=base + 12)
+    attempts = reopened.read("+15550001")
+    assert [a["details"] for a in attempts] == [f"attempt {n}" for n in range(8, 13)]
+    assert attempts[-1]["action"] == "reset"
+
+
+def test_long_details_are_truncated_to_the_record(tmp_path):
+    log = AttemptLog(tmp_path, capacity=3)
+    log.append("+15550002", "enrollment", True, "x" * 200)
+    assert log.read("+15550002")[0]["details"] == "x" * (RECORD.size - 10)
+
+
+def test_failure_window_survives_restart(tmp_path):
+    log = AttemptLog(tmp_path, capacity=10, window_seconds=60)
+    log.append("+15550003", "authentication", False, "old", timestamp=time.time() - 120)
+    for _ in range(3):
+        log.append("+15550003", "authentication", False, "bad passphrase")
+    log.append("+15550003", "authentication", True, "ok")
+    assert log.recent_failures("+15550003") == 3
+
+    assert AttemptLog(tmp_path, capacity=10, window_seconds=60).recent_failures("+15550003") == 3
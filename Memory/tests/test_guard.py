@@ -213,6 +213,35 @@ class TestVoiceGuard:
         log_files = list(log_dir.glob("*.json"))
         assert len(log_files) > 0
     
+    def test_rate_limit_counts_recent_failures(self, tmp_path):
+        """Test sliding failure counter and legacy log migration"""
+        import json
+        legacy = {
+            "attempts": [
+                {"timestamp": (datetime.now() - timedelta(hours=2)).isoformat(),
+                 "action": "authentication", "success": False, "details": "old"},
+                {"timestamp": datetime.now().isoformat(),
+                 "action": "authentication", "success": False, "details": "recent"},
+                {"timestamp": datetime.now().isoformat(),
+                 "action": "authentication", "success": True, "details": "ok"},
+            ]
+        }
+        with open(tmp_path / "auth_log_1234567890.json", "w") as f:
+            json.dump(legacy, f)
+        
+        guard = VoiceGuard(data_dir=str(tmp_path))
+        user_phone = "+1234567890"
+        
+        # Only the recent failure counts after migration
+        assert guard._get_recent_attempts(user_phone) == 1
+        assert len(guard.get_authentication_log(user_phone)) == 3
+        
+        for _ in range(4):
+            guard._log_authentication(user_phone, "authentication", False, "Incorrect passphrase")
+        
+        assert guard._get_recent_attempts(user_phone) == 5
+        assert guard._check_rate_limit(user_phone) is False
+    
     def test_passphrase_normalization(self, guard):
         """Test passphrase normalization for consistency"""
         passphrase1 = "THE QUICK BROWN FOX"
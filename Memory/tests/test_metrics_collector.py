@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+Test Metrics Collector
+Streaming histograms, command timings, data cleanup and Prometheus export
+"""
+
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import time
+import random
+import importlib
+import pytest
+from app.api.histograms import LogHistogram, RollingHistogram, HistogramSeries
+
+
+class FakeClock:
+    def __init__(self, now: float = 1000.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class TestHistograms:
+    """Quantiles, windows and series of the log histograms"""
+
+    def test_quantiles_within_relative_accuracy(self):
+        rng = random.Random(1)
+        values = sorted(rng.lognormvariate(3, 1) for _ in range(5000))
+        histogram = LogHistogram(relative_accuracy=0.01)
+        for value in values:
+            histogram.record(value)
+
+        for q, estimate in zip((0.5, 0.95, 0.99), histogram.quantiles((0.5, 0.95, 0.99))):
+            exact = values[int(q * (len(values) - 1))]
+            assert abs(estimate - exact) <= 0.02 * exact
+            assert histogram.quantile(q) == estimate
+
+    def test_rolling_window_expires_old_slices(self):
+        clock = FakeClock()
+        rolling = RollingHistogram(window_seconds=60, slices=6, clock=clock)
+        for _ in range(10):
+            rolling.record(100)
+        clock.now += 30
+        rolling.record(5)
+
+        assert rolling.window().count == 11
+        assert rolling.window(10).count == 1
+        clock.now += 45
+        assert rolling.window().count == 1
+        assert rolling.total.count == 11
+
+    def test_series_fold_excess_keys(self):
+        series = HistogramSeries(max_series=3, window_seconds=60, slices=6)
+        for key in ("a", "b", "c", "d", "e"):
+            series.record(key, 10)
+        assert sorted(series.series) == ["a", "b", "other"]
+        assert series.series["other"].total.count == 3
+        assert len(series.series) <= series.max_series
+
+
+class TestMetricsCollector:
+    """The collector behind the WebSocket dashboard and /metrics"""
+
+    @pytest.fixture
+    def websocket(self):
+        pytest.importorskip("fastapi")
+        from app.api import websocket
+        return websocket
+
+    def test_commands_and_endpoints_in_snapshot(self, websocket):
+        collector = websocket.MetricsCollector()
+        collector.system_sampler.latest = websocket.SystemSampler()._sample(None)
+        collector.record_request("alice", 12.0, "/memories/{memory_id}")
+        collector.record_command("search", 40.0)
+        collector.record_command("search", 60.0)
+
+        snapshot = collector.get_snapshot()
+        assert snapshot.active_users == 1
+        assert snapshot.request_rate == 1
+        assert set(snapshot.endpoint_response_times) == {"/memories/{memory_id}"}
+        assert set(snapshot.command_response_times) == {"search"}
+        assert 39 <= snapshot.command_response_times["search"]["p50"] <= 61
+
+    def test_cleanup_drops_idle_users(self, websocket):
+        collector = websocket.MetricsCollector()
+        collector.record_request("old", 5.0)
+        collector.record_request("recent", 5.0)
+        collector.active_users["old"] = time.time() - websocket.ACTIVE_USER_RETENTION - 1
+
+        collector.cleanup_old_data()
+        assert list(collector.active_users) == ["recent"]
+
+    def test_route_label_uses_the_route_template(self, websocket):
+        class Route:
+            path = "/memories/{memory_id}"
+
+        class Request:
+            def __init__(self, scope):
+                self.scope = scope
+
+        assert websocket.route_label(Request({"route": Route(), "path": "/memories/123"})) == "/memories/{memory_id}"
+        assert websocket.route_label(Request({"path": "/nope/42"})) == "unmatched"
+
+    def test_registration_survives_repeats_and_reloads(self, websocket):
+        prometheus_client = pytest.importorskip("prometheus_client")
+        registry = prometheus_client.CollectorRegistry()
+
+        assert websocket.register_metrics_collector(registry)
+        assert websocket.register_metrics_collector(registry)
+
+        reloaded = importlib.reload(websocket)
+        reloaded.manager.metrics_collector.record_command("help", 3.0)
+        assert reloaded.register_metrics_collector(registry)
+
+        output = prometheus_client.generate_latest(registry).decode()
+        assert 'memory_app_command_duration_milliseconds_count{command="help"} 1.0' in output
+
+    def test_webhook_times_each_command(self, websocket):
+        webhook = pytest.importorskip("app.webhook")
+        collector = websocket.manager.metrics_collector
+        messages = [
+            {"type": "text", "text": {"body": "Search: dentist"}},
+            {"type": "text", "text": {"body": "remember to call mum"}},
+            {"type": "audio"},
+        ]
+        for _ in webhook._timed_commands(messages):
+            pass
+
+        assert {"search", "text", "audio"} <= set(collector.command_times.series)
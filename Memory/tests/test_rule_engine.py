@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Test Compiled Rule Engine
+Differential tests against the original per-keyword/per-pattern classifier
+"""
+
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'app'))
+
+import re
+import random
+import pytest
+from memory.classifier import MessageClassifier
+from memory.rule_engine import AhoCorasick, DIGIT_TRIGGER, pattern_triggers
+
+
+def reference_classify(message: str) -> str:
+    """The original MessageClassifier.classify loop"""
+    if not message:
+        return "GENERAL"
+
+    message_lower = message.lower()
+    scores = {}
+    for category, config in MessageClassifier.CATEGORIES.items():
+        score = 0
+        for keyword in config["keywords"]:
+            if keyword in message_lower:
+                score += 2
+        for pattern in config["patterns"]:
+            if re.search(pattern, message_lower, re.IGNORECASE):
+                score += 3
+        score *= config["priority"]
+        scores[category] = score
+
+    if "ultra secret" in message_lower or "ultrasecret" in message_lower:
+        return "ULTRA_SECRET"
+    elif "secret" in message_lower and "ultra" not in message_lower:
+        return "SECRET"
+    elif "confidential" in message_lower:
+        return "CONFIDENTIAL"
+    elif any(word in message_lower for word in ["tomorrow", "yesterday", "appointment", "meeting"]):
+        return "CHRONOLOGICAL"
+
+    if max(scores.values()) > 0:
+        return max(scores, key=scores.get)
+    return "GENERAL"
+
+
+FRAGMENTS = [
+    "meeting", "tomorrow", "at 3:30 PM", "12/05/2024", "next week", "on Friday", "in March",
+    "I like", "my favorite band", "password: hunter2", "pin", "account number: 12345",
+    "123-45-6789", "secret", "ultra secret", "ultrasecret", "top secret", "confidential",
+    "bank #: 998877", "credit card 4111 1111 1111 1111", "diagnosed", "medication",
+    "legal", "my will", "testament", "critical data", "urgent information", "lawyer",
+    "willing", "identity", "pinnacle", "timeline", "ultra", "accounting", "acc 42",
+    "the", "and", "we", "talked", "about", "coffee", "Sam", "later", "!!", "?",
+]
+
+
+def synthetic_corpus(size: int, seed: int = 7):
+    rng = random.Random(seed)
+    corpus = []
+    for _ in range(size):
+        words = rng.sample(FRAGMENTS, rng.randint(1, 8))
+        if rng.random() < 0.3:
+            words = [w.upper() for w in words]
+        corpus.append(" ".join(words))
+    return corpus
+
+
+class TestRuleEngine:
+    """Compiled engine must agree with the original classifier"""
+
+    @pytest.fixture
+    def classifier(self):
+        return MessageClassifier()
+
+    def test_identical_categories_on_synthetic_corpus(self, classifier):
+        corpus = synthetic_corpus(5000)
+        for message in corpus:
+            assert classifier.classify(message) == reference_classify(message), message
+
+    def test_batch_matches_single(self, classifier):
+        corpus = synthetic_corpus(200, seed=11)
+        assert classifier.classify_batch(corpus) == [classifier.classify(m) for m in corpus]
+
+    def test_overlapping_keywords_are_all_found(self):
+        automaton = AhoCorasick(["he", "she", "his", "hers", "secret", "ultra secret"])
+        assert automaton.find_all("ushers") == {"she", "he", "hers"}
+        assert automaton.find_all("ultra secret") == {"secret", "ultra secret"}
+
+    def test_pattern_triggers(self):
+        assert pattern_triggers(r"\b(?:credit\s*card|Bank)\s*:?\d") == {"credit", "bank"}
+        assert pattern_triggers(r"\b\d{3}-\d{2}-\d{4}\b") == {DIGIT_TRIGGER}
+        assert pattern_triggers(r"\b(?:password|pin|code):\s*\S+\b") == {"password", "pin", "code"}
+        # No leading literal: the pattern is always run
+        assert pattern_triggers(r"\w+@\w+") is None
+        assert pattern_triggers(r"(?:a|\w)b") is None
+
+    def test_reload_rules(self, classifier, monkeypatch):
+        categories = {name: dict(config) for name, config in MessageClassifier.CATEGORIES.items()}
+        categories["GENERAL"] = dict(categories["GENERAL"], keywords=["gardening"])
+        monkeypatch.setattr(classifier, "CATEGORIES", categories)
+        classifier.reload_rules()
+        assert classifier.classify("gardening") == "GENERAL"
+        assert "gardening" in classifier.engine.keyword_categories
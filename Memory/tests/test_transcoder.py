@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Test Audio Transcoder
+The bounded ffmpeg pipe pool across event loops, timeouts and failures, and
+the async transcription path staying off the blocking variants
+"""
+
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import io
+import wave
+import asyncio
+import pytest
+from app.voice import transcoder
+from app.voice.transcoder import AudioTranscoder, TranscodeError, pcm_to_wav
+
+
+@pytest.fixture
+def fake_ffmpeg(tmp_path, monkeypatch):
+    """An 'ffmpeg' that echoes stdin, so the pipe plumbing runs without ffmpeg installed"""
+    def install(body: str):
+        script = tmp_path / "ffmpeg"
+        script.write_text("#!/bin/sh\n" + body + "\n")
+        script.chmod(0o755)
+        monkeypatch.setattr(transcoder, "FFMPEG_BINARY", str(script))
+    install("cat")
+    return install
+
+
+def test_pcm_to_wav_header():
+    wav_bytes = pcm_to_wav(b"\x01\x00" * 1600)
+    with wave.open(io.BytesIO(wav_bytes)) as wav:
+        assert (wav.getnchannels(), wav.getsampwidth(), wav.getframerate()) == (1, 2, 16000)
+        assert wav.getnframes() == 1600
+
+
+def test_pool_works_across_event_loops(fake_ffmpeg):
+    pool = AudioTranscoder(max_concurrency=1, prefer_inprocess=False)
+
+    async def contended():
+        # Two jobs against a cap of one makes the semaphore bind to this loop
+        return await asyncio.gather(*(pool.to_wav(b"\x00\x01" * 100, 'mp3') for _ in range(2)))
+
+    for _ in range(2):
+        results = asyncio.run(contended())
+        assert all(len(result) == 44 + 200 for result in results)
+    assert pool.stats['ffmpeg_jobs'] == 4
+
+
+def test_timeout_and_failure(fake_ffmpeg):
+    pool = AudioTranscoder(timeout=0.5, prefer_inprocess=False)
+
+    fake_ffmpeg("exec sleep 5")
+    with pytest.raises(TranscodeError):
+        asyncio.run(pool.to_wav(b"audio", 'ogg'))
+    assert pool.stats['timeouts'] == 1
+
+    fake_ffmpeg("echo 'Invalid data' >&2; exit 1")
+    with pytest.raises(TranscodeError, match="Invalid data"):
+        asyncio.run(pool.to_ogg_opus(b"audio", 'mp3'))
+    assert pool.stats['failures'] == 1
+
+
+@pytest.mark.asyncio
+async def test_transcribe_audio_async_uses_async_conversion(monkeypatch):
+    from app.voice import transcription
+
+    class Pool:
+        async def to_wav(self, audio_data, source_format='ogg'):
+            return pcm_to_wav(audio_data)
+
+        def to_wav_sync(self, audio_data, source_format='ogg'):
+            raise AssertionError("blocking conversion on the async path")
+
+    transcriber = transcription.VoiceTranscriber()
+    transcriber.voice_enabled = True
+    monkeypatch.setattr(transcription, "get_transcoder", lambda: Pool())
+    monkeypatch.setattr(transcriber, "transcribe_with_azure", lambda wav: None)
+    monkeypatch.setattr(transcriber, "transcribe_with_whisper", lambda wav: "search: dentist")
+
+    assert await transcriber.transcribe_audio_async(b"\x00\x00" * 10) == (True, "search: dentist")
@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+Test TTS Cache
+Frequency sketch estimates and aging, W-TinyLFU admission and eviction under
+the byte budget, index rebuild from disk and single-flight synthesis
+"""
+
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import random
+import asyncio
+import pytest
+from collections import Counter
+
+pytest.importorskip("aiofiles")
+
+from app.voice.tts_cache import FrequencySketch, TTSCache, make_cache_key, ENTRY_SUFFIX
+
+# 1000-byte entries: 4-byte header length + '{}' + audio
+AUDIO = b"\x00" * 994
+
+
+def files(cache):
+    return sorted(path.stem for path in cache.cache_dir.glob(f"*{ENTRY_SUFFIX}"))
+
+
+class TestFrequencySketch:
+
+    def test_never_underestimates(self):
+        sketch = FrequencySketch(width=256, sample_factor=1000)
+        rng = random.Random(3)
+        counts = Counter(f"k{int(rng.paretovariate(1.1))}" for _ in range(3000))
+        for key, count in counts.items():
+            for _ in range(count):
+                sketch.increment(key)
+        for key, count in counts.items():
+            assert sketch.estimate(key) >= min(count, sketch.max_count)
+        assert sketch.estimate("never seen") <= max(sketch.estimate(key) for key in counts)
+
+    def test_aging_halves_counts(self):
+        sketch = FrequencySketch(width=64, sample_factor=1)
+        for _ in range(12):
+            sketch.increment("hot")
+        assert sketch.estimate("hot") == 12
+        for n in range(64 - 12):
+            sketch.increment(f"other{n}")
+        assert sketch.estimate("hot") == 6
+        assert sketch.additions == 32
+
+
+def test_cache_key_normalizes_text():
+    assert make_cache_key("Hello   world\n", "jenny", None, "ogg") == make_cache_key("Hello world", "jenny", "", "ogg")
+    assert make_cache_key("Hello world", "jenny", None, "ogg") != make_cache_key("Hello world", "guy", None, "ogg")
+
+
+@pytest.mark.asyncio
+async def test_one_off_entries_do_not_flush_hot_ones(tmp_path):
+    cache = TTSCache(tmp_path, max_bytes=10_000, window_fraction=0.1)  # window 1 entry, main 9
+    hot = [f"hot{n}" for n in range(5)]
+    for key in hot:
+        await cache.put(key, AUDIO, {})
+    for _ in range(4):
+        for key in hot:
+            assert await cache.get(key) is not None
+
+    for n in range(50):
+        key = f"once{n}"
+        assert await cache.get(key) is None
+        await cache.put(key, AUDIO, {})
+
+    for key in hot:
+        assert await cache.get(key) == (AUDIO, {})
+    assert cache.stats['rejections'] > 0
+    assert cache.total_bytes <= cache.max_bytes
+    assert files(cache) == sorted(list(cache.window) + list(cache.main))
+
+
+@pytest.mark.asyncio
+async def test_popular_candidate_displaces_cold_victim(tmp_path):
+    cache = TTSCache(tmp_path, max_bytes=10_000, window_fraction=0.1)
+    for n in range(10):
+        await cache.put(f"cold{n}", AUDIO, {})
+    assert len(cache.main) == 9
+
+    # Requested often before it was ever stored
+    for _ in range(3):
+        await cache.get("popular")
+    await cache.put("popular", AUDIO, {})
+    await cache.put("pusher", AUDIO, {})  # overflows the window
+
+    assert "popular" in cache.main
+    assert cache.stats['evictions'] == 1
+    assert "cold0" not in cache.main and "cold0" not in files(cache)
+    assert cache.main_bytes <= cache.main_bytes_limit
+
+
+@pytest.mark.asyncio
+async def test_index_rebuilt_from_disk_within_budget(tmp_path):
+    cache = TTSCache(tmp_path, max_bytes=10_000, window_fraction=0.1)
+    for n in range(8):
+        await cache.put(f"k{n}", AUDIO, {"voice": "jenny"})
+
+    reopened = TTSCache(tmp_path, max_bytes=10_000, window_fraction=0.1)
+    assert sorted(reopened.main) == sorted(list(cache.main) + list(cache.window))
+    assert await reopened.get("k7") == (AUDIO, {"voice": "jenny"})
+
+    shrunk = TTSCache(tmp_path, max_bytes=5_000, window_fraction=0.1)
+    assert shrunk.main_bytes <= shrunk.main_bytes_limit
+    assert files(shrunk) == sorted(shrunk.main)
+
+
+@pytest.mark.asyncio
+async def test_concurrent_misses_synthesize_once(tmp_path):
+    cache = TTSCache(tmp_path, max_bytes=10_000)
+    release = asyncio.Event()
+    calls = 0
+
+    async def synthesize():
+        nonlocal calls
+        calls += 1
+        await release.wait()
+        return AUDIO, {}
+
+    waiters = [asyncio.ensure_future(cache.get_or_create("phrase", synthesize)) for _ in range(5)]
+    await asyncio.sleep(0)
+    release.set()
+    results = await asyncio.gather(*waiters)
+
+    assert calls == 1
+    assert results == [(AUDIO, {})] * 5
+    assert cache.stats['coalesced'] == 4
+    assert await cache.get_or_create("phrase", synthesize) == (AUDIO, {})
+    assert calls == 1
@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""
+Test WebSocket Broadcast
+Fan-out through per-connection writers: a slow or failing dashboard client
+is evicted without holding up or aborting delivery to the others
+"""
+
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import asyncio
+import pytest
+import pytest_asyncio
+
+pytest.importorskip("fastapi")
+
+from app.api.websocket import ConnectionManager, SystemSampler
+
+
+class FakeWebSocket:
+    """Records frames and signals once it has seen `expect` non-metrics frames"""
+
+    def __init__(self, expect: int = 0):
+        self.frames = []
+        self.expect = expect
+        self.done = asyncio.Event()
+        self.closed = False
+
+    async def accept(self):
+        pass
+
+    @property
+    def events(self):
+        """Frames other than the JSON metrics snapshots"""
+        return [frame for frame in self.frames if not frame.startswith("{")]
+
+    async def send_text(self, message: str):
+        self.frames.append(message)
+        if len(self.events) >= self.expect:
+            self.done.set()
+
+    async def close(self, code: int = 1000):
+        self.closed = True
+
+
+class StalledWebSocket(FakeWebSocket):
+    """Never completes a send after the first one"""
+
+    def __init__(self):
+        super().__init__()
+        self.stalled = asyncio.Event()
+
+    async def send_text(self, message: str):
+        if self.frames:
+            self.stalled.set()
+            await asyncio.Event().wait()
+        self.frames.append(message)
+
+
+class BrokenWebSocket(FakeWebSocket):
+    """Fails every send after the first one"""
+
+    async def send_text(self, message: str):
+        if self.frames:
+            raise ConnectionResetError("client went away")
+        self.frames.append(message)
+
+
+async def until(condition, timeout: float = 2.0):
+    """Wait for a condition driven by the writer tasks"""
+    async def poll():
+        while not condition():
+            await asyncio.sleep(0)
+    await asyncio.wait_for(poll(), timeout)
+
+
+@pytest_asyncio.fixture
+async def manager():
+    manager = ConnectionManager(max_queue=8, send_timeout=0.2)
+    manager.metrics_collector.system_sampler.latest = SystemSampler()._sample(None)
+    yield manager
+    channels = list(manager.channels.values())
+    for websocket in list(manager.active_connections):
+        manager.disconnect(websocket)
+    await asyncio.gather(*(channel.writer_task for channel in channels), return_exceptions=True)
+
+
+@pytest.mark.asyncio
+async def test_stalled_client_does_not_block_broadcast(manager):
+    stalled = StalledWebSocket()
+    fast = FakeWebSocket(expect=3)
+    await manager.connect(stalled)
+    await manager.connect(fast)
+
+    for n in range(3):
+        # Returns without waiting on any client's send
+        await asyncio.wait_for(manager.broadcast(f"event {n}", metrics=False), 0.05)
+
+    await asyncio.wait_for(fast.done.wait(), 1)
+    assert fast.events == ["event 0", "event 1", "event 2"]
+
+    # The stalled client times out and is evicted; the other keeps its channel
+    await asyncio.wait_for(stalled.stalled.wait(), 1)
+    await until(lambda: manager.evicted == 1)
+    assert stalled.closed
+    assert manager.active_connections == [fast]
+
+
+@pytest.mark.asyncio
+async def test_failing_client_does_not_abort_broadcast(manager):
+    broken = BrokenWebSocket()
+    clients = [FakeWebSocket(expect=2) for _ in range(3)]
+    await manager.connect(clients[0])
+    await manager.connect(broken)
+    for websocket in clients[1:]:
+        await manager.connect(websocket)
+
+    await manager.broadcast("first", metrics=False)
+    await until(lambda: manager.evicted == 1)
+    await manager.broadcast("second", metrics=False)
+
+    for websocket in clients:
+        await asyncio.wait_for(websocket.done.wait(), 1)
+        assert websocket.events == ["first", "second"]
+    assert broken not in manager.active_connections
+    assert len(manager.active_connections) == 3
+
+
+@pytest.mark.asyncio
+async def test_overflowing_client_is_evicted_and_metrics_coalesce(manager):
+    stalled = StalledWebSocket()
+    fast = FakeWebSocket()
+    await manager.connect(stalled)
+    await manager.connect(fast)
+    await manager.broadcast("first", metrics=False)
+    await asyncio.wait_for(stalled.stalled.wait(), 1)
+
+    # Metrics frames replace each other instead of queueing up
+    for n in range(20):
+        await manager.broadcast(f"metrics {n}")
+    assert manager.evicted == 0
+
+    for n in range(manager.max_queue + 1):
+        await manager.broadcast(f"event {n}", metrics=False)
+        await asyncio.sleep(0)  # the fast client's writer keeps up
+    assert manager.evicted == 1
+    assert manager.active_connections == [fast]